@@ -815,6 +815,35 @@ int bpt_list_start(bpt_t *tree, bpt_list_item_t *item)
    return 1;
 }
 
+int bpt_list_start_at(bpt_t *tree, bpt_list_item_t *item, void *key)
+{
+   bpt_nd_t *node;
+   int i;
+   //leaf where the key is or where it would be inserted
+   node = bpt_search_leaf(key, tree);
+   if (node == NULL) {
+      return 0;
+   }
+   for (i = 0; i < node->count - 1; i++) {
+      if (tree->compare((char *) (node->key) + i * tree->size_of_key, key) >= 0) {
+         break;
+      }
+   }
+   if (i == node->count - 1) {
+      //all keys in the leaf are less, the first key of the next leaf is greater
+      node = bpt_ndlf_next(node);
+      if (node == NULL || node->count == 1) {
+         return 0;
+      }
+      i = 0;
+   }
+   item->index_of_value = i;
+   item->value = ((bpt_nd_ext_leaf_t *) node->extend)->value[i];
+   bpt_copy_key(item->key, 0, node->key, i, tree->size_of_key);
+   item->leaf = node;
+   return 1;
+}
+
 bpt_list_item_t *bpt_list_init(bpt_t *btree)
 {
    bpt_list_item_t *item = NULL;
@@ -210,6 +210,19 @@ bpt_list_item_t *bpt_list_init(bpt_t *btree);
  */
 int bpt_list_start(bpt_t *tree, bpt_list_item_t *item);
 
+/*!
+ * \brief Start iteration at the key
+ * Function sets the iteration structure to point to the first item
+ * in the sorted list whose key is greater than or equal to the given key.
+ * It is used for iterating through a range of keys in O(log n + k).
+ * Key is than stored in item->key and value in item->value.
+ * \param[in] tree pointer to B+ tree.
+ * \param[out] item pointer to iteration structure.
+ * \param[in] key lower bound of keys.
+ * \return 1 ON SUCCESS,  0 there is no such item.
+ */
+int bpt_list_start_at(bpt_t *tree, bpt_list_item_t *item, void *key);
+
 
 /*!
  * \brief Get next item from list
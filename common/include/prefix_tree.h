@@ -372,6 +372,18 @@ prefix_tree_domain_t * prefix_tree_insert(prefix_tree_t * tree, const char *stri
  */
 prefix_tree_domain_t * prefix_tree_search(prefix_tree_t * tree, const char *string, int length);
 
+/*!
+ * \brief Search the most specific domain of the string in prefix tree
+ * Function finds the longest domain stored in the tree which is the string itself
+ * or its parent domain (e.g. "example.com" for "www.example.com" in suffix tree).
+ * Domains are not inserted and counters are not changed.
+ * \param[in] tree pointer to the prefix tree
+ * \param[in] string searched string
+ * \param[in] length length of string
+ * \return found domain or NULL
+ */
+prefix_tree_domain_t * prefix_tree_search_longest(prefix_tree_t * tree, const char *string, int length);
+
 /*!
  * \brief Add domain to prefix tree and set it to the exception state
  * Function adds domain to the prefix tree  and set it to the exception state
@@ -1002,6 +1002,79 @@ prefix_tree_domain_t * prefix_tree_search(prefix_tree_t * tree,const  char *stri
    return NULL;
 }
 
+prefix_tree_domain_t * prefix_tree_search_longest(prefix_tree_t * tree, const char *string, int length)
+{
+   int i, index, map_number;
+   prefix_tree_inner_node_t *node;
+   prefix_tree_domain_t *longest = NULL;
+   node = tree->root;
+
+   if (tree->prefix_suffix == PREFIX) {
+      //prefix tree
+      index = 0;
+      while (node != NULL) {
+            for (i=0; i < node->length; i++) {
+               if (index < length && node->string[i] == string[index]) {
+                  index++;
+               } else {
+                  return longest;
+               }
+            }
+            if (index >= length || string[index] == tree->domain_separator) {
+               if (node->domain == NULL) {
+                  return longest;
+               } else if (node->domain->parent != NULL) {
+                  //domain of the root is not a domain of the string
+                  longest = node->domain;
+               }
+               if (index >= length) {
+                  return longest;
+               }
+               index++;
+               node = node->domain->child;
+            } else {
+               if (node->child == NULL) {
+                  return longest;
+               }
+               map_number = prefix_tree_map_character_to_number(string[index]);
+               node = node->child[map_number];
+            }
+      }
+   } else {
+      //suffix tree
+      index = length - 1;
+      while (node != NULL) {
+            for (i=0; i < node->length; i++) {
+               if (index >= 0 && node->string[i] == string[index]) {
+                  index--;
+               } else {
+                  return longest;
+               }
+            }
+            if (index < 0 || string[index] == tree->domain_separator) {
+               if (node->domain == NULL) {
+                  return longest;
+               } else if (node->domain->parent != NULL) {
+                  //domain of the root is not a domain of the string
+                  longest = node->domain;
+               }
+               if (index < 0) {
+                  return longest;
+               }
+               index--;
+               node = node->domain->child;
+            } else {
+               if (node->child == NULL) {
+                  return longest;
+               }
+               map_number = prefix_tree_map_character_to_number(string[index]);
+               node = node->child[map_number];
+            }
+      }
+   }
+   return longest;
+}
+
 
 
 double prefix_tree_most_used_domain_percent_of_subdomains(prefix_tree_t *tree, int depth)
@@ -244,6 +244,68 @@ exit_label:
    return ret_val;
 }
 
+int check_range_of_items(test_pair_t *pairs, void *tree, uint32_t test_count)
+{
+   int ret_val = 0;
+   bpt_list_item_t *b_item = NULL;
+   uint32_t i, j, k;
+   b_key_t key_st;
+   double time_diff;
+   struct timespec start_time = {0,0}, end_time = {0,0};
+   clock_gettime(CLOCK_MONOTONIC, &start_time);
+   b_item = bpt_list_init(tree);
+   if (b_item == NULL) {
+      fprintf(stderr,"ERROR during initializing list iterator structure\n");
+      ret_val = -1;
+      goto exit_label;
+   }
+   //keys are 0..test_count-1, iteration has to start at the first remaining key >= lower bound
+   for (k = 0; k < 1000; k++) {
+      key_st.key = rand() % (test_count + 1);
+      j = key_st.key;
+      while (j < test_count && pairs[j].deleted == 1) {
+         j++;
+      }
+      //check the first 10 items of the range
+      if (bpt_list_start_at(tree, b_item, &key_st) == 0) {
+         if (j < test_count) {
+            fprintf(stderr, "ERROR, iteration from key %u is empty, expected key: %u\n", key_st.key, pairs[j].key);
+            ret_val = -4;
+            goto exit_label;
+         }
+         continue;
+      }
+      for (i = 0; i < 10; i++) {
+         if (j >= test_count || pairs[j].key != ((b_key_t *) b_item->key)->key ||
+             pairs[j].value != ((b_value_t *) b_item->value)->value) {
+            fprintf(stderr, "ERROR, during iteration from key %u. Key in the tree: %u\n", key_st.key, ((b_key_t *) b_item->key)->key);
+            ret_val = -4;
+            goto exit_label;
+         }
+         j++;
+         while (j < test_count && pairs[j].deleted == 1) {
+            j++;
+         }
+         if (bpt_list_item_next(tree, b_item) == 0) {
+            break;
+         }
+      }
+   }
+
+exit_label:
+   if (b_item != NULL) {
+      bpt_list_clean(b_item);
+      b_item = NULL;
+   }
+   if (ret_val >= 0) {
+      clock_gettime(CLOCK_MONOTONIC, &end_time);
+      time_diff = difftime_ms(end_time, start_time);
+      time_one_set_of_test += time_diff;
+      printf("OK. Time: %fs\n", time_diff);
+   }
+   return ret_val;
+}
+
 int run_tests(int test_count, int tree_size_leaf)
 {
    int rand_del, is_there_next, ret;
@@ -378,6 +440,14 @@ int run_tests(int test_count, int tree_size_leaf)
       goto exit_label;
    }
 
+   printf("TEST - Check range of remaining items after deleting. - Iteration from key.\n");
+   ret = check_range_of_items(pairs, tree, test_count);
+   if (ret < 0) {
+      //error
+      ret_val = ret;
+      goto exit_label;
+   }
+
    //delete items during iterating the list of items.
    printf("TEST - Delete approximately 50%% remaining items during iteration the sorted list of items.\n");
    clock_gettime(CLOCK_MONOTONIC, &start_time);
@@ -195,6 +195,63 @@ int test_tree_content(prefix_tree_t *tree, int test_count,  int toward, const ch
    return 0;
 }
 
+int test_search_longest(int toward)
+{
+   int ret_val = 0, i;
+   prefix_tree_t *tree;
+   prefix_tree_domain_t *domain;
+   char str[MAX_LENGTH+1];
+   //searched string and expected domain (or "" if nothing should be found)
+   static const char *suffix_tests[][2] = {
+      {"www.example.com", "example.com"},
+      {"a.b.evil.example.com", "b.evil.example.com"},
+      {"example.com", "example.com"},
+      {"xexample.com", "com"},
+      {"com", "com"},
+      {"example.org", ""},
+      {"", ""},
+   };
+   static const char *prefix_tests[][2] = {
+      {"user@example.com", "user@example.com"},
+      {"user@example.com@x", "user@example.com"},
+      {"user@examples", "user"},
+      {"admin@example.com", ""},
+   };
+   const char *(*tests)[2] = (toward == SUFFIX) ? suffix_tests : prefix_tests;
+   int count = (toward == SUFFIX) ? sizeof(suffix_tests) / sizeof(suffix_tests[0]) : sizeof(prefix_tests) / sizeof(prefix_tests[0]);
+
+   tree = prefix_tree_initialize(toward, sizeof(value_t), toward == SUFFIX ? '.' : '@', DOMAIN_EXTENSION_NO, RELAXATION_AFTER_DELETE_NO);
+   if (tree == NULL) {
+      fprintf(stderr, "ERROR: initialization of the tree\n");
+      return -1;
+   }
+   if (toward == SUFFIX) {
+      prefix_tree_insert(tree, "example.com", 11);
+      prefix_tree_insert(tree, "c.b.evil.example.com", 20);
+   } else {
+      prefix_tree_insert(tree, "user@example.com", 16);
+   }
+   for (i = 0; i < count; i++) {
+      domain = prefix_tree_search_longest(tree, tests[i][0], strlen(tests[i][0]));
+      if (domain == NULL) {
+         str[0] = 0;
+      } else {
+         prefix_tree_read_string(tree, domain, str);
+      }
+      if (strcmp(str, tests[i][1]) != 0) {
+         fprintf(stderr, "ERROR: the longest domain of \"%s\" is \"%s\", expected \"%s\"\n", tests[i][0], str, tests[i][1]);
+         ret_val = -4;
+         break;
+      }
+   }
+   if (ret_val == 0 && tree->count_of_inserting != (toward == SUFFIX ? 2 : 1)) {
+      fprintf(stderr, "ERROR: searching changed counters of the tree\n");
+      ret_val = -4;
+   }
+   prefix_tree_destroy(tree);
+   return ret_val;
+}
+
 int run_tests(int test_count, int toward, int domain_extension, int relaxation_after_delete)
 {
    int ret_val = 0;
@@ -316,6 +373,11 @@ exit_label:
 int main(int argc, char **argv)
 {
    int i, test = 1, ret;
+   printf("TEST - Search the longest domain of strings\n");
+   if ((ret = test_search_longest(SUFFIX)) < 0 || (ret = test_search_longest(PREFIX)) < 0) {
+      return ret;
+   }
+   printf("OK\n\n");
    for (i = 0; i  < TEST_SIZE_ARR_SIZE; i++) {
       printf("%d.TEST - count of items = %u, PREFIX, DOMAIN_EXTENSION_YES, RELAXATION_AFTER_DELETE_YES\n"\
              "---------------------------------------------------\n", test++, test_size_arr[i]);
@@ -177,6 +177,7 @@ extern char *trap_default_socket_path_format;
 #define TRAP_IFC_TYPE_UNIX      'u' ///< trap_ifc_tcpip via UNIX socket(input&output part)
 #define TRAP_IFC_TYPE_SERVICE   's' ///< service ifc
 #define TRAP_IFC_TYPE_FILE      'f' ///< trap_ifc_file (input&output part)
+#define TRAP_IFC_TYPE_SHM       'm' ///< trap_ifc_shm via POSIX shared memory (input&output part)
 extern char trap_ifc_type_supported[];
 
 /**
@@ -200,7 +201,8 @@ enum trap_ifc_type {
 enum trap_ifcctl_request {
    TRAPCTL_AUTOFLUSH_TIMEOUT = 1,  ///< Set timeout of automatic buffer flushing for interface, expects uint64_t argument with number of microseconds. It can be set to #TRAP_NO_AUTO_FLUSH to disable autoflush.
    TRAPCTL_BUFFERSWITCH = 2,       ///< Enable/disable buffering - could be dangerous on input interface!!! expects char argument with value 1 (default value after libtrap initialization - enabled) or 0 (for disabling buffering on interface).
-   TRAPCTL_SETTIMEOUT = 3          ///< Set interface timeout (int32_t): in microseconds for non-blocking mode; timeout can be also: TRAP_WAIT, TRAP_HALFWAIT, or TRAP_NO_WAIT.
+   TRAPCTL_SETTIMEOUT = 3,         ///< Set interface timeout (int32_t): in microseconds for non-blocking mode; timeout can be also: TRAP_WAIT, TRAP_HALFWAIT, or TRAP_NO_WAIT.
+   TRAPCTL_ADAPTIVE = 4            ///< Enable adaptive buffering of output interface, expects int32_t argument with target latency in microseconds, 0 disables it. Size of buffers and autoflush timeout are derived from the rate of data and the latency.
 };
 /**@}*/
 
@@ -629,6 +631,15 @@ int trap_ifcctl(int8_t type, uint32_t ifcidx, int32_t request, ... /* arg */);
  */
 void trap_send_flush(uint32_t ifc);
 
+/**
+ * \brief Set module-specific statistics sent via service IFC.
+ *
+ * \param[in] json_stats  String with JSON object, NULL removes the statistics.
+ * \return TRAP_E_OK on success, TRAP_E_BAD_FPARAMS if json_stats is not a JSON object.
+ * \see trap_ctx_set_module_stats()
+ */
+int trap_set_module_stats(const char *json_stats);
+
 /**
  * @}
  *//* basic API */
@@ -825,6 +836,19 @@ void trap_ctx_send_flush(trap_ctx_t *ctx, uint32_t ifc);
  */
 int trap_ctx_get_client_count(trap_ctx_t *ctx, uint32_t ifcidx);
 
+/**
+ * \brief Set module-specific statistics.
+ *
+ * The statistics are given as a string with JSON object.  They are sent
+ * via service IFC (e.g. to supervisor) together with the IFC counters
+ * under the "module" key.  Previously set statistics are replaced.
+ *
+ * \param[in] ctx    Pointer to the private libtrap context data (#trap_ctx_init()).
+ * \param[in] json_stats  String with JSON object, NULL removes the statistics.
+ * \return TRAP_E_OK on success, TRAP_E_BAD_FPARAMS if json_stats is not a JSON object.
+ */
+int trap_ctx_set_module_stats(trap_ctx_t *ctx, const char *json_stats);
+
 /**
  * \brief Create dump files.
  *
@@ -49,12 +49,19 @@
 #include <arpa/inet.h>
 #include <wordexp.h>
 #include <unistd.h>
+#include <fcntl.h>
+#include <endian.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <sys/time.h>
 
 #include "../include/libtrap/trap.h"
 #include "trap_ifc.h"
 #include "trap_internal.h"
 #include "trap_error.h"
 #include "ifc_file.h"
+#include "trap_codec.h"
+
 
 /**
  * \addtogroup trap_ifc TRAP communication module interface
@@ -66,6 +73,357 @@
  */
 
 
+/**
+ * \brief Decompress one buffer of input file.
+ *
+ * It is called either by the decompression thread or by the receiving thread
+ * when no job is pending, so codec_state is never used concurrently.
+ * \param[in] c   pointer to module private data
+ * \param[in] job   description of compressed data and destination
+ * \return 0 on success, -1 on error
+ */
+static int file_decompress(file_private_t *c, const file_codec_job_t *job)
+{
+   const trap_codec_t *codec = trap_codec_by_id(job->codec_id);
+
+   if (codec == NULL) {
+      VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: unsupported codec %"PRIu8" in file %s.", c->ifc_idx, job->codec_id, c->filename);
+      return -1;
+   }
+   if (c->codec != codec) {
+      if (c->codec != NULL) {
+         c->codec->free(c->codec_state, 0);
+      }
+      c->codec = codec;
+      c->codec_state = codec->create(0, -1);
+      if (c->codec_state == NULL) {
+         c->codec = NULL;
+         return -1;
+      }
+   }
+   if (codec->decompress(c->codec_state, job->src, job->src_len, c->raw_bufs[job->dst], job->raw_len) != 0) {
+      VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: corrupted compressed buffer in file %s.", c->ifc_idx, c->filename);
+      return -1;
+   }
+   return 0;
+}
+
+/**
+ * \brief Decompression thread of file input interface.
+ * \param[in] arg   pointer to module private data
+ */
+static void *trap_codec_thread(void *arg)
+{
+   file_private_t *c = (file_private_t *) arg;
+   int result;
+
+   pthread_mutex_lock(&c->codec_lock);
+   while (1) {
+      while (c->job.state != 1 && !c->codec_thread_stop) {
+         pthread_cond_wait(&c->codec_cond, &c->codec_lock);
+      }
+      if (c->codec_thread_stop) {
+         break;
+      }
+      pthread_mutex_unlock(&c->codec_lock);
+      result = file_decompress(c, &c->job);
+      pthread_mutex_lock(&c->codec_lock);
+      c->job.result = result;
+      c->job.state = 2;
+      pthread_cond_broadcast(&c->codec_cond);
+   }
+   pthread_mutex_unlock(&c->codec_lock);
+   return NULL;
+}
+
+/**
+ * \brief Stop decompression thread and free resources of codec.
+ * \param[in] c   pointer to module private data
+ */
+static void file_codec_free(file_private_t *c)
+{
+   int compress = (c->mode[0] != 'r');
+
+   if (c->codec_thread_running) {
+      pthread_mutex_lock(&c->codec_lock);
+      c->codec_thread_stop = 1;
+      pthread_cond_broadcast(&c->codec_cond);
+      pthread_mutex_unlock(&c->codec_lock);
+      pthread_join(c->codec_thread, NULL);
+      pthread_mutex_destroy(&c->codec_lock);
+      pthread_cond_destroy(&c->codec_cond);
+      c->codec_thread_running = 0;
+   }
+   if (c->codec != NULL && c->codec_state != NULL) {
+      c->codec->free(c->codec_state, compress);
+      c->codec_state = NULL;
+   }
+   free(c->codec_buf);
+   c->codec_buf = NULL;
+   free(c->raw_bufs[0]);
+   free(c->raw_bufs[1]);
+   c->raw_bufs[0] = c->raw_bufs[1] = NULL;
+}
+
+/**
+ * \brief Unmap the current input file.
+ * \param[in] c   pointer to module private data
+ */
+static void file_unmap(file_private_t *c)
+{
+   if (c->map != NULL) {
+      munmap(c->map, c->map_size);
+      c->map = NULL;
+   }
+   c->map_size = 0;
+   c->map_offset = 0;
+   c->map_released = 0;
+}
+
+/**
+ * \brief Map the current input file into memory if it is possible.
+ *
+ * Non-regular (e.g. /dev/stdin) and empty files are read using stdio.  The file
+ * must not be truncated while it is mapped, access to the missing pages raises SIGBUS.
+ * \param[in] c   pointer to module private data
+ */
+static void file_map(file_private_t *c)
+{
+   struct stat st;
+   void *map;
+   int fd = fileno(c->fd);
+
+   posix_fadvise(fd, 0, 0, POSIX_FADV_SEQUENTIAL);
+   if (!c->use_mmap || fstat(fd, &st) != 0 || !S_ISREG(st.st_mode) || st.st_size == 0 ||
+       (uint64_t) st.st_size > SIZE_MAX) {
+      return;
+   }
+
+   map = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+   if (map == MAP_FAILED) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "INPUT FILE IFC[%"PRIu32"]: mmap of \"%s\" failed, using stdio.", c->ifc_idx, c->filename);
+      return;
+   }
+   madvise(map, st.st_size, MADV_SEQUENTIAL);
+   c->map = map;
+   c->map_size = st.st_size;
+   c->map_offset = 0;
+   c->map_released = 0;
+}
+
+/**
+ * \brief Ask kernel to read the beginning of the next input file into page cache.
+ * \param[in] c   pointer to module private data
+ */
+static void file_prefetch_next(file_private_t *c)
+{
+   int fd;
+
+   if (c->file_index + 1 >= c->file_cnt) {
+      return;
+   }
+   fd = open(c->files[c->file_index + 1], O_RDONLY);
+   if (fd < 0) {
+      return;
+   }
+   posix_fadvise(fd, 0, TRAP_FILE_PREFETCH_SIZE, POSIX_FADV_WILLNEED);
+   close(fd);
+}
+
+/**
+ * \brief Return already consumed pages of the mapping to the kernel.
+ * \param[in] c   pointer to module private data
+ */
+static void file_release_consumed(file_private_t *c)
+{
+   size_t end;
+
+   if (c->map_offset - c->map_released < TRAP_FILE_RELEASE_SIZE) {
+      return;
+   }
+   end = c->map_offset & ~((size_t) sysconf(_SC_PAGESIZE) - 1);
+   madvise(c->map + c->map_released, end - c->map_released, MADV_DONTNEED);
+   c->map_released = end;
+}
+
+size_t file_read(file_private_t *c, void *dst, size_t size)
+{
+   if (c->map == NULL) {
+      return fread(dst, 1, size, c->fd);
+   }
+
+   if (size > c->map_size - c->map_offset) {
+      size = c->map_size - c->map_offset;
+   }
+   memcpy(dst, c->map + c->map_offset, size);
+   c->map_offset += size;
+   return size;
+}
+
+/**
+ * \brief Check whether the whole current input file was read.
+ * \param[in] c   pointer to module private data
+ * \return non-zero at the end of file
+ */
+static int file_eof(file_private_t *c)
+{
+   if (c->map == NULL) {
+      return feof(c->fd);
+   }
+   return c->map_offset >= c->map_size;
+}
+
+/**
+ * \brief Get the read position in the current input file.
+ * \param[in] c   pointer to module private data
+ * \return offset from the beginning of the file
+ */
+static uint64_t file_tell(file_private_t *c)
+{
+   if (c->map == NULL) {
+      return ftello(c->fd);
+   }
+   return c->map_offset;
+}
+
+/**
+ * \brief Set the read position in the current input file.
+ * \param[in] c   pointer to module private data
+ * \param[in] offset   offset from the beginning of the file
+ * \return 0 on success, -1 on error
+ */
+static int file_seek(file_private_t *c, uint64_t offset)
+{
+   if (c->map == NULL) {
+      return fseeko(c->fd, offset, SEEK_SET);
+   }
+   if (offset > c->map_size) {
+      return -1;
+   }
+   c->map_offset = offset;
+   return 0;
+}
+
+/**
+ * \brief Get the current time in microseconds since epoch.
+ */
+static uint64_t file_index_time(void)
+{
+   struct timeval tv;
+
+   gettimeofday(&tv, NULL);
+   return (uint64_t) tv.tv_sec * 1000000 + tv.tv_usec;
+}
+
+/**
+ * \brief Find buffers of the current input file that belong to the requested time range.
+ *
+ * Sets seek_offset, stop_offset and skip_file according to the sidecar index.
+ * Files without index are read completely.
+ * \param[in] c   pointer to module private data
+ */
+static void file_index_load(file_private_t *c)
+{
+   file_index_entry_t entry;
+   char *index_name = NULL;
+   FILE *index_fd;
+   char found_start = 0;
+
+   c->seek_offset = 0;
+   c->stop_offset = UINT64_MAX;
+   c->skip_file = 0;
+   if (!c->time_filter) {
+      return;
+   }
+
+   if (asprintf(&index_name, "%s" TRAP_FILE_INDEX_SUFFIX, c->filename) < 0) {
+      return;
+   }
+   index_fd = fopen(index_name, "rb");
+   if (index_fd == NULL) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "INPUT FILE IFC[%"PRIu32"]: no index \"%s\", the whole file will be read.", c->ifc_idx, index_name);
+      free(index_name);
+      return;
+   }
+   free(index_name);
+
+   while (fread(&entry, sizeof(entry), 1, index_fd) == 1) {
+      if (!found_start) {
+         if (be64toh(entry.last) < c->start_time) {
+            continue;
+         }
+         found_start = 1;
+         c->seek_offset = be64toh(entry.offset);
+      }
+      if (be64toh(entry.first) > c->end_time) {
+         c->stop_offset = be64toh(entry.offset);
+         break;
+      }
+   }
+   fclose(index_fd);
+
+   if (!found_start || c->stop_offset == c->seek_offset) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "INPUT FILE IFC[%"PRIu32"]: skipping \"%s\", it has no data in the time range.", c->ifc_idx, c->filename);
+      c->skip_file = 1;
+   }
+}
+
+/**
+ * \brief Open sidecar index for the data file that was just opened by the output interface.
+ * \param[in] c   pointer to module private data
+ * \param[in] data_filename   name of the opened data file
+ */
+static void file_index_open(file_private_t *c, const char *data_filename)
+{
+   char *index_name = NULL;
+
+   if (!c->write_index) {
+      return;
+   }
+   if (asprintf(&index_name, "%s" TRAP_FILE_INDEX_SUFFIX, data_filename) < 0) {
+      VERBOSE(CL_ERROR, "OUTPUT FILE IFC[%"PRIu32"]: memory allocation failed.", c->ifc_idx);
+      return;
+   }
+   c->index_fd = fopen(index_name, c->mode);
+   if (c->index_fd == NULL) {
+      VERBOSE(CL_ERROR, "OUTPUT FILE IFC[%"PRIu32"]: unable to open index \"%s\", index will not be written.", c->ifc_idx, index_name);
+   }
+   free(index_name);
+   c->index_last_time = file_index_time();
+}
+
+/**
+ * \brief Close sidecar index of the output interface.
+ * \param[in] c   pointer to module private data
+ */
+static void file_index_close(file_private_t *c)
+{
+   if (c->index_fd != NULL) {
+      fclose(c->index_fd);
+      c->index_fd = NULL;
+   }
+}
+
+/**
+ * \brief Append entry of the buffer that was just written into sidecar index.
+ * \param[in] c   pointer to module private data
+ * \param[in] offset   offset of the buffer in the data file
+ */
+static void file_index_write(file_private_t *c, uint64_t offset)
+{
+   file_index_entry_t entry;
+   uint64_t now = file_index_time();
+
+   entry.offset = htobe64(offset);
+   entry.first = htobe64(c->index_last_time);
+   entry.last = htobe64(now);
+   c->index_last_time = now;
+   if (fwrite(&entry, sizeof(entry), 1, c->index_fd) != 1) {
+      VERBOSE(CL_ERROR, "OUTPUT FILE IFC[%"PRIu32"]: unable to write index, index will not be written.", c->ifc_idx);
+      file_index_close(c);
+   }
+}
+
 /**
  * \brief Close file and free allocated memory.
  * \param[in] priv   pointer to module private data
@@ -85,6 +443,9 @@ void file_destroy(void *priv)
          free(config->files);
       }
 
+      file_codec_free(config);
+      file_unmap(config);
+      file_index_close(config);
       if (config->fd) {
          fclose(config->fd);
       }
@@ -135,6 +496,12 @@ static void file_create_dump(void *priv, uint32_t idx, const char *path)
    }
 
    fprintf(fd, "Filename: %s\nMode: %s\nTerminated status: %c\n", cf->filename, cf->mode, cf->is_terminated);
+   if (cf->mode[0] == 'r') {
+      fprintf(fd, "Read: %s\nMapped: %zu/%zu B\n", cf->use_mmap ? "mmap" : "stdio", cf->map_offset, cf->map_size);
+   }
+   if (cf->codec != NULL) {
+      fprintf(fd, "Codec: %s\n", cf->codec->name);
+   }
    fclose(fd);
    free(config_file);
 }
@@ -199,6 +566,8 @@ int open_next_file(file_private_t *c, char *new_filename)
       return -1;
    }
 
+   file_unmap(c);
+   file_index_close(c);
    if (c->fd != NULL) {
       fclose(c->fd);
       c->fd = NULL;
@@ -207,12 +576,21 @@ int open_next_file(file_private_t *c, char *new_filename)
    free(c->filename);
    c->filename = new_filename;
    c->neg_initialized = 0;
+   c->peeked = 0;
    c->fd = fopen(c->filename, c->mode);
    if (c->fd == NULL) {
       VERBOSE(CL_ERROR, "FILE IFC [%d]: could not open a new file: \"%s\" after changing data format.", c->ifc_idx, c->filename);
       return -1;
    }
 
+   if (c->mode[0] == 'r') {
+      file_map(c);
+      file_prefetch_next(c);
+      file_index_load(c);
+   } else {
+      file_index_open(c, c->filename);
+   }
+
    return 0;
 }
 
@@ -224,34 +602,50 @@ int open_next_file(file_private_t *c, char *new_filename)
  */
 
 /**
- * \brief Read data from a file.
- * \param[in] priv   pointer to module private data
- * \param[out] data  pointer to a memory block in which data is to be stored
- * \param[out] size  pointer to a memory block in which size of read data is to be stored
- * \param[in] timeout   NOT USED IN THIS INTERFACE
- * \return 0 on success (TRAP_E_OK), TRAP_E_IO_ERROR if error occurs during reading, TRAP_E_TERMINATED if interface was terminated.
+ * \brief Continue with the next input file.
+ * \param[in] config   pointer to module private data
+ * \return TRAP_E_OK on success, TRAP_E_TERMINATED if there is no next file, TRAP_E_IO_ERROR on error
  */
-int file_recv(void *priv, void *data, uint32_t *size, int timeout)
+static int file_recv_next_file(file_private_t *config)
+{
+   char *next_file = get_next_file(config);
+
+   if (!next_file) {
+      return TRAP_E_TERMINATED;
+   }
+   if (open_next_file(config, next_file) != 0) {
+      return trap_errorf(config->ctx, TRAP_E_IO_ERROR, "INPUT FILE IFC[%d]: unable to open next file.", config->ifc_idx);
+   }
+   return TRAP_E_OK;
+}
+
+/**
+ * \brief Read header of the next buffer, continue with the next file at the end of the current one.
+ * \param[in] config   pointer to module private data
+ * \param[out] size    size of payload of the buffer
+ * \param[out] end     set to 1 when there are no more data in any file
+ * \return TRAP_E_OK on success, TRAP_E_FORMAT_MISMATCH if negotiation failed, TRAP_E_IO_ERROR on error
+ */
+static int file_recv_header(file_private_t *config, uint32_t *size, char *end)
 {
    size_t loaded;
-   char *next_file = NULL;
-   /* header of message inside the buffer */
-   uint16_t *m_head = data;
    uint32_t data_size = 0;
+   int ret;
 
-   file_private_t *config = (file_private_t*) priv;
-
-   if (config->is_terminated) {
-      return trap_error(config->ctx, TRAP_E_TERMINATED);
+   *end = 0;
+   if (config->peeked) {
+      /* header was read by file_codec_prefetch() */
+      config->peeked = 0;
+      *size = config->peeked_size;
+      return TRAP_E_OK;
    }
 
-   /* Check whether the file stream is opened */
-   if (config->fd == NULL) {
-      return trap_error(config->ctx, TRAP_E_NOT_INITIALIZED);
+next_buffer:
+   if (config->skip_file) {
+      goto next_file;
    }
 
 #ifdef ENABLE_NEGOTIATION
-neg_start:
    if (config->neg_initialized == 0) {
       switch(input_ifc_negotiation((void *) config, TRAP_IFC_TYPE_FILE)) {
       case NEG_RES_FMT_UNKNOWN:
@@ -273,6 +667,11 @@ neg_start:
          config->neg_initialized = 1;
          break;
 
+      case NEG_RES_FMT_CHANGED:
+         VERBOSE(CL_VERBOSE_LIBRARY, "Input_ifc_negotiation result: success (format has changed; it was not first negotiation).");
+         config->neg_initialized = 1;
+         break;
+
       case NEG_RES_FAILED:
          VERBOSE(CL_VERBOSE_LIBRARY, "Input_ifc_negotiation result: failed (error while receiving hello message from output interface).");
          return TRAP_E_FORMAT_MISMATCH;
@@ -288,27 +687,25 @@ neg_start:
    }
 #endif
 
-   /* Reads 4 bytes from the file, determining the length of bytes to be read to @param[out] data */
-   loaded = fread(&data_size, sizeof(uint32_t), 1, config->fd);
-   if (loaded != 1) {
-      if (feof(config->fd)) {
-         next_file = get_next_file(priv);
-         if (!next_file) {
-            /* set size of buffer to the size of 1 message (including its header) */
-            (*size) = 2;
-            /* set the header of message to 0B */
-            *m_head = 0;
-
-            return TRAP_E_OK;
-         } else {
-            if (open_next_file(config, next_file) == 0) {
-#ifdef ENABLE_NEGOTIATION
-               goto neg_start;
-#endif
-            } else {
-               return trap_errorf(config->ctx, TRAP_E_IO_ERROR, "INPUT FILE IFC[%d]: unable to open next file.", config->ifc_idx);
-            }
+   if (config->time_filter) {
+      if (config->seek_offset != 0) {
+         /* negotiation is done, jump to the first buffer in the time range */
+         if (file_seek(config, config->seek_offset) != 0) {
+            VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: unable to seek in file %s, index does not match data.", config->ifc_idx, config->filename);
+            goto next_file;
          }
+         config->seek_offset = 0;
+      }
+      if (file_tell(config) >= config->stop_offset) {
+         goto next_file;
+      }
+   }
+
+   /* Reads 4 bytes from the file, determining the length of bytes to be read */
+   loaded = file_read(config, &data_size, sizeof(uint32_t));
+   if (loaded != sizeof(uint32_t)) {
+      if (file_eof(config)) {
+         goto next_file;
       } else {
          VERBOSE(CL_ERROR, "INPUT FILE IFC: read error occurred in file: %s", config->filename);
          return trap_errorf(config->ctx, TRAP_E_IO_ERROR, "INPUT FILE IFC: unable to read");
@@ -316,15 +713,252 @@ neg_start:
    }
 
    *size = ntohl(data_size);
-   /* Reads (*size) bytes from the file */
-   loaded = fread(data, 1, (*size), config->fd);
-   if (loaded != (*size)) {
-         VERBOSE(CL_ERROR, "INPUT FILE IFC: read incorrect number of bytes from file: %s. Attempted to read %d bytes, but the actual count of bytes read was %zu.", config->filename, (*size), loaded);
+   return TRAP_E_OK;
+
+next_file:
+   ret = file_recv_next_file(config);
+   if (ret == TRAP_E_OK) {
+      goto next_buffer;
+   } else if (ret == TRAP_E_TERMINATED) {
+      /* no more files */
+      *end = 1;
+      return TRAP_E_OK;
+   }
+   return ret;
+}
+
+/**
+ * \brief Read compressed buffer of input file whose length header was read.
+ * \param[in] c   pointer to module private data
+ * \param[in] length   length from the header of buffer (without TRAP_CODEC_COMPRESSED flag)
+ * \param[out] job   description of compressed data (src, src_len, raw_len and codec_id are set)
+ * \return 0 on success, -1 on error
+ */
+static int file_codec_read(file_private_t *c, uint32_t length, file_codec_job_t *job)
+{
+   trap_codec_header_t header;
+
+   if (length < sizeof(header) || file_read(c, &header, sizeof(header)) != sizeof(header)) {
+      VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: truncated compressed buffer in file %s.", c->ifc_idx, c->filename);
+      return -1;
+   }
+   job->codec_id = header.codec;
+   job->raw_len = ntohl(header.raw_length);
+   job->src_len = length - sizeof(header);
+   if (job->raw_len > TRAP_IFC_MESSAGEQ_SIZE) {
+      VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: compressed buffer is too big (%"PRIu32" B) in file %s.", c->ifc_idx, job->raw_len, c->filename);
+      return -1;
+   }
+
+   if (c->raw_bufs[0] == NULL) {
+      c->raw_bufs[0] = malloc(TRAP_IFC_MESSAGEQ_SIZE);
+      c->raw_bufs[1] = malloc(TRAP_IFC_MESSAGEQ_SIZE);
+      if (c->raw_bufs[0] == NULL || c->raw_bufs[1] == NULL) {
+         VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: memory allocation failed.", c->ifc_idx);
+         return -1;
+      }
+   }
+
+   if (c->map != NULL) {
+      if (job->src_len > c->map_size - c->map_offset) {
+         VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: truncated compressed buffer in file %s.", c->ifc_idx, c->filename);
+         return -1;
+      }
+      job->src = c->map + c->map_offset;
+      c->map_offset += job->src_len;
+      return 0;
+   }
+
+   if (c->codec_buf_size < job->src_len) {
+      free(c->codec_buf);
+      c->codec_buf = malloc(job->src_len);
+      if (c->codec_buf == NULL) {
+         c->codec_buf_size = 0;
+         VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: memory allocation failed.", c->ifc_idx);
+         return -1;
+      }
+      c->codec_buf_size = job->src_len;
+   }
+   if (file_read(c, c->codec_buf, job->src_len) != job->src_len) {
+      VERBOSE(CL_ERROR, "INPUT FILE IFC[%"PRIu32"]: truncated compressed buffer in file %s.", c->ifc_idx, c->filename);
+      return -1;
+   }
+   job->src = c->codec_buf;
+   return 0;
+}
+
+/**
+ * \brief Start decompression of the next buffer of the current file in the background.
+ *
+ * It is done only for files with compressed buffers.  The header of an uncompressed
+ * buffer is kept for file_recv_header().
+ * \param[in] c   pointer to module private data
+ */
+static void file_codec_prefetch(file_private_t *c)
+{
+   uint32_t data_size;
+
+   if (!c->compressed_seen || (c->time_filter && file_tell(c) >= c->stop_offset)) {
+      return;
+   }
+   if (file_read(c, &data_size, sizeof(data_size)) != sizeof(data_size)) {
+      return;
+   }
+   data_size = ntohl(data_size);
+   if (!(data_size & TRAP_CODEC_COMPRESSED)) {
+      c->peeked = 1;
+      c->peeked_size = data_size;
+      return;
+   }
+
+   c->job.dst = c->raw_cur ^ 1;
+   if (file_codec_read(c, data_size & ~TRAP_CODEC_COMPRESSED, &c->job) != 0) {
+      c->job.result = -1;
+      c->job.state = 2;
+      return;
+   }
+
+   if (!c->codec_thread_running) {
+      pthread_mutex_init(&c->codec_lock, NULL);
+      pthread_cond_init(&c->codec_cond, NULL);
+      c->codec_thread_stop = 0;
+      if (pthread_create(&c->codec_thread, NULL, trap_codec_thread, c) != 0) {
+         pthread_mutex_destroy(&c->codec_lock);
+         pthread_cond_destroy(&c->codec_cond);
+         /* decompress it now */
+         c->job.result = file_decompress(c, &c->job);
+         c->job.state = 2;
+         return;
+      }
+      c->codec_thread_running = 1;
+   }
+
+   pthread_mutex_lock(&c->codec_lock);
+   c->job.state = 1;
+   pthread_cond_signal(&c->codec_cond);
+   pthread_mutex_unlock(&c->codec_lock);
+}
+
+/**
+ * \brief Get the next buffer of input file.
+ *
+ * Buffers are returned directly from the mapped file or from the decompressed
+ * buffer (zero-copy).  Uncompressed buffers of files that could not be mapped
+ * are read into the internal buffer of libtrap.
+ * \param[in] priv   pointer to module private data
+ * \param[in,out] data  internal buffer of libtrap on input, pointer to the buffer
+ * (valid until the next call) on output
+ * \param[out] size  pointer to a memory block in which size of the buffer is to be stored
+ * \param[in] timeout   NOT USED IN THIS INTERFACE
+ * \return 0 on success (TRAP_E_OK), TRAP_E_IO_ERROR if error occurs during reading, TRAP_E_TERMINATED if interface was terminated.
+ */
+static int file_recv_buffer(void *priv, void **data, uint32_t *size, int timeout)
+{
+   file_private_t *config = (file_private_t*) priv;
+   file_codec_job_t job;
+   char end;
+   int ret;
+
+   if (config->is_terminated) {
+      return trap_error(config->ctx, TRAP_E_TERMINATED);
+   }
+
+   /* Check whether the file stream is opened */
+   if (config->fd == NULL) {
+      return trap_error(config->ctx, TRAP_E_NOT_INITIALIZED);
    }
 
+   if (config->job.state != 0) {
+      /* the next buffer was decompressed in advance */
+      if (config->job.state == 1) {
+         pthread_mutex_lock(&config->codec_lock);
+         while (config->job.state == 1) {
+            pthread_cond_wait(&config->codec_cond, &config->codec_lock);
+         }
+         pthread_mutex_unlock(&config->codec_lock);
+      }
+      config->job.state = 0;
+      if (config->job.result != 0) {
+         return trap_errorf(config->ctx, TRAP_E_IO_ERROR, "INPUT FILE IFC[%"PRIu32"]: unable to decompress buffer.", config->ifc_idx);
+      }
+      config->raw_cur = config->job.dst;
+      *data = config->raw_bufs[config->raw_cur];
+      (*size) = config->job.raw_len;
+      if (config->map != NULL) {
+         file_release_consumed(config);
+      }
+      file_codec_prefetch(config);
+      return TRAP_E_OK;
+   }
+
+   if (config->map != NULL) {
+      /* the previous buffer was consumed by libtrap */
+      file_release_consumed(config);
+   }
+
+   ret = file_recv_header(config, size, &end);
+   if (ret != TRAP_E_OK) {
+      return ret;
+   }
+   if (end) {
+      /* buffer with 1 message of 0B (including its header) */
+      config->eof_msg = 0;
+      *data = &config->eof_msg;
+      (*size) = sizeof(config->eof_msg);
+      return TRAP_E_OK;
+   }
+
+   if ((*size) & TRAP_CODEC_COMPRESSED) {
+      job.dst = config->raw_cur ^ 1;
+      if (file_codec_read(config, (*size) & ~TRAP_CODEC_COMPRESSED, &job) != 0 || file_decompress(config, &job) != 0) {
+         return trap_errorf(config->ctx, TRAP_E_IO_ERROR, "INPUT FILE IFC[%"PRIu32"]: unable to decompress buffer.", config->ifc_idx);
+      }
+      config->raw_cur = job.dst;
+      config->compressed_seen = 1;
+      *data = config->raw_bufs[config->raw_cur];
+      (*size) = job.raw_len;
+      file_codec_prefetch(config);
+      return TRAP_E_OK;
+   }
+   config->compressed_seen = 0;
+
+   if (config->map == NULL) {
+      /* Reads (*size) bytes from the file */
+      if (file_read(config, *data, (*size)) != (*size)) {
+         VERBOSE(CL_ERROR, "INPUT FILE IFC: read incorrect number of bytes from file: %s.", config->filename);
+      }
+      return TRAP_E_OK;
+   }
+
+   if ((*size) > config->map_size - config->map_offset) {
+      VERBOSE(CL_ERROR, "INPUT FILE IFC: read incorrect number of bytes from file: %s. Attempted to read %"PRIu32" bytes, but the actual count of bytes read was %zu.", config->filename, (*size), config->map_size - config->map_offset);
+      (*size) = config->map_size - config->map_offset;
+   }
+   *data = config->map + config->map_offset;
+   config->map_offset += (*size);
    return TRAP_E_OK;
 }
 
+/**
+ * \brief Read data from a file.
+ * \param[in] priv   pointer to module private data
+ * \param[out] data  pointer to a memory block in which data is to be stored
+ * \param[out] size  pointer to a memory block in which size of read data is to be stored
+ * \param[in] timeout   NOT USED IN THIS INTERFACE
+ * \return 0 on success (TRAP_E_OK), TRAP_E_IO_ERROR if error occurs during reading, TRAP_E_TERMINATED if interface was terminated.
+ */
+int file_recv(void *priv, void *data, uint32_t *size, int timeout)
+{
+   void *buffer = data;
+   int ret;
+
+   ret = file_recv_buffer(priv, &buffer, size, timeout);
+   if (ret == TRAP_E_OK && buffer != data) {
+      memcpy(data, buffer, (*size));
+   }
+   return ret;
+}
+
 char *file_recv_ifc_get_id(void *priv)
 {
    if (priv == NULL) {
@@ -350,13 +984,55 @@ uint8_t file_recv_ifc_is_conn(void *priv)
    return 0;
 }
 
+/**
+ * \brief Parse and strip optional parameters from the end of params of file input interface.
+ * \param[in,out] priv   pointer to module private data
+ * \param[in,out] params   list of files followed by optional parameters, parameters are removed
+ * \return TRAP_E_OK on success, TRAP_E_BADPARAMS on unknown value
+ */
+static int file_recv_parse_params(file_private_t *priv, char *params)
+{
+   char *param, *endptr;
+   double value;
+
+   priv->start_time = 0;
+   priv->end_time = UINT64_MAX;
+   while ((param = strrchr(params, ':')) != NULL) {
+      if (strncmp(param + 1, "start=", 6) == 0 || strncmp(param + 1, "end=", 4) == 0) {
+         value = strtod(strchr(param, '=') + 1, &endptr);
+         if (*endptr != '\0' || endptr == strchr(param, '=') + 1 || value < 0) {
+            return trap_errorf(priv->ctx, TRAP_E_BADPARAMS, "CREATE INPUT FILE IFC: bad time \"%s\", seconds since epoch expected", param + 1);
+         }
+         if (param[1] == 's') {
+            priv->start_time = value * 1000000;
+         } else {
+            priv->end_time = value * 1000000;
+         }
+         priv->time_filter = 1;
+      } else if (strncmp(param + 1, "read=", 5) == 0) {
+         if (strcmp(param + 6, "mmap") == 0) {
+            priv->use_mmap = 1;
+         } else if (strcmp(param + 6, "stdio") == 0) {
+            priv->use_mmap = 0;
+         } else {
+            return trap_errorf(priv->ctx, TRAP_E_BADPARAMS, "CREATE INPUT FILE IFC: unknown read mode \"%s\"", param + 6);
+         }
+      } else {
+         break;
+      }
+      *param = '\0';
+   }
+   return TRAP_E_OK;
+}
+
 /**
  * \brief Allocate and initiate file input interface.
  * This function is called by TRAP library to initialize one input interface.
  *
  * \param[in,out] ctx   Pointer to the private libtrap context data (trap_ctx_init()).
- * \param[in] params    Configuration string containing *file_name*,
- * where file_name is a path to a file from which data is to be read
+ * \param[in] params    Configuration string containing *file_name[:read=mode][:start=time][:end=time]*,
+ * where file_name is a path to a file from which data is to be read,
+ * mode is stdio (default) or mmap and time is in seconds since epoch
  * \param[in,out] ifc   IFC interface used for calling file module.
  * \param[in] idx       Index of IFC that is created.
  * \return 0 on success (TRAP_E_OK), TRAP_E_MEMORY, TRAP_E_BADPARAMS on error
@@ -366,6 +1042,7 @@ int create_file_recv_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_if
    file_private_t *priv;
    size_t name_length;
    wordexp_t files_exp;
+   char *files_param;
    int i, j;
 
    if (params == NULL) {
@@ -380,26 +1057,47 @@ int create_file_recv_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_if
 
    priv->ctx = ctx;
    priv->ifc_idx = idx;
+   /* a mapped file that is truncated meanwhile causes SIGBUS, mmap must be requested */
+   priv->use_mmap = 0;
+
+   files_param = strdup(params);
+   if (!files_param) {
+      free(priv);
+      return trap_error(ctx, TRAP_E_MEMORY);
+   }
+   if (file_recv_parse_params(priv, files_param) != TRAP_E_OK) {
+      free(files_param);
+      free(priv);
+      return TRAP_E_BADPARAMS;
+   }
+
    /* Perform shell-like expansion of ~ */
-   if (wordexp(params, &files_exp, 0) != 0) {
-      VERBOSE(CL_ERROR, "CREATE INPUT FILE IFC: unable to perform shell-like expand of: %s", params);
+   if (wordexp(files_param, &files_exp, 0) != 0) {
+      VERBOSE(CL_ERROR, "CREATE INPUT FILE IFC: unable to perform shell-like expand of: %s", files_param);
+      free(files_param);
       free(priv);
       return trap_errorf(ctx, TRAP_E_BADPARAMS, "CREATE INPUT FILE IFC: unable to perform shell-like expand");
    }
+   free(files_param);
 
-   priv->file_cnt = files_exp.we_wordc;
-   priv->files = (char**) calloc(priv->file_cnt, sizeof(char*));
+   priv->files = (char**) calloc(files_exp.we_wordc, sizeof(char*));
    if (!priv->files) {
       free(priv);
       wordfree(&files_exp);
       return trap_error(ctx, TRAP_E_MEMORY);
    }
 
-   for (i = 0; i < priv->file_cnt; i++) {
+   priv->file_cnt = 0;
+   for (i = 0; i < files_exp.we_wordc; i++) {
       name_length = strlen(files_exp.we_wordv[i]);
-      priv->files[i] = (char*) calloc(name_length + 1, sizeof(char));
-      if (!priv->files[i]) {
-         for (j = i - 1; j >= 0; j --) {
+      if (name_length > strlen(TRAP_FILE_INDEX_SUFFIX) &&
+          strcmp(files_exp.we_wordv[i] + name_length - strlen(TRAP_FILE_INDEX_SUFFIX), TRAP_FILE_INDEX_SUFFIX) == 0) {
+         /* sidecar index matched by globbing, it is not a data file */
+         continue;
+      }
+      priv->files[priv->file_cnt] = (char*) calloc(name_length + 1, sizeof(char));
+      if (!priv->files[priv->file_cnt]) {
+         for (j = priv->file_cnt - 1; j >= 0; j --) {
             free(priv->files[j]);
          }
 
@@ -409,10 +1107,16 @@ int create_file_recv_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_if
          return trap_error(ctx, TRAP_E_MEMORY);
       }
 
-      strncpy(priv->files[i], files_exp.we_wordv[i], name_length);
+      strncpy(priv->files[priv->file_cnt], files_exp.we_wordv[i], name_length);
+      priv->file_cnt++;
    }
 
    wordfree(&files_exp);
+   if (priv->file_cnt == 0) {
+      free(priv->files);
+      free(priv);
+      return trap_errorf(ctx, TRAP_E_BADPARAMS, "CREATE INPUT FILE IFC: no file to read");
+   }
    priv->filename = priv->files[0];
 
    /* Sets mode and filename */
@@ -433,9 +1137,13 @@ int create_file_recv_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_if
 
    priv->file_index = 0;
    priv->is_terminated = 0;
+   file_map(priv);
+   file_prefetch_next(priv);
+   file_index_load(priv);
 
    /* Fills interface structure */
    ifc->recv = file_recv;
+   ifc->recv_buffer = file_recv_buffer;
    ifc->terminate = file_terminate;
    ifc->destroy = file_destroy;
    ifc->create_dump = file_create_dump;
@@ -483,6 +1191,8 @@ int file_send(void *priv, const void *data, uint32_t size, int timeout)
    int ret_val = 0;
    file_private_t *config = (file_private_t*) priv;
    size_t written;
+   off_t offset = 0;
+   size_t compressed_size;
 
    if (config->is_terminated) {
       return trap_error(config->ctx, TRAP_E_TERMINATED);
@@ -510,6 +1220,30 @@ int file_send(void *priv, const void *data, uint32_t size, int timeout)
    }
 #endif
 
+   if (config->index_fd != NULL) {
+      offset = ftello(config->fd);
+   }
+
+   if (config->codec != NULL && size > sizeof(trap_buffer_header_t)) {
+      /* compressed buffer: length header with flag, codec header, compressed payload */
+      trap_codec_header_t *header = (trap_codec_header_t *) (config->codec_buf + sizeof(uint32_t));
+      uint8_t *payload = config->codec_buf + sizeof(uint32_t) + sizeof(trap_codec_header_t);
+
+      compressed_size = config->codec_buf_size - (payload - config->codec_buf);
+      config->codec_raw_bytes += size;
+      if (config->codec->compress(config->codec_state, (const uint8_t *) data + sizeof(trap_buffer_header_t),
+                                  size - sizeof(trap_buffer_header_t), payload, &compressed_size) == 0 &&
+          compressed_size + sizeof(trap_codec_header_t) < size - sizeof(trap_buffer_header_t)) {
+         *((uint32_t *) config->codec_buf) = htonl(TRAP_CODEC_COMPRESSED | (compressed_size + sizeof(trap_codec_header_t)));
+         header->codec = config->codec->id;
+         header->raw_length = htonl(size - sizeof(trap_buffer_header_t));
+         data = config->codec_buf;
+         size = compressed_size + (payload - config->codec_buf);
+      }
+      /* otherwise the buffer is stored uncompressed */
+      config->codec_bytes += size;
+   }
+
    /* Writes data_length bytes to the file */
    written = fwrite(data, 1, size, config->fd);
    if (written != size) {
@@ -517,6 +1251,10 @@ int file_send(void *priv, const void *data, uint32_t size, int timeout)
       return trap_errorf(config->ctx, TRAP_E_IO_ERROR, "OUTPUT FILE IFC: unable to write");
    }
 
+   if (config->index_fd != NULL) {
+      file_index_write(config, offset);
+   }
+
    if (config->file_change_time != 0) {
       time_t current_time = time(NULL);
       if (difftime(current_time, config->starting_time) / 60 >= config->file_change_time) {
@@ -554,6 +1292,23 @@ int32_t file_get_client_count(void *priv)
    return 1;
 }
 
+/**
+ * \brief Add compression counters into statistics of output IFC.
+ * \param[in] priv   pointer to module private data
+ * \param[in,out] stats   JSON object with counters of the IFC
+ */
+static void file_send_get_stats(void *priv, json_t *stats)
+{
+   file_private_t *config = (file_private_t *) priv;
+
+   if (config->codec == NULL) {
+      return;
+   }
+   json_object_set_new(stats, "codec", json_string(config->codec->name));
+   json_object_set_new(stats, "codec-raw-bytes", json_integer(config->codec_raw_bytes));
+   json_object_set_new(stats, "codec-bytes", json_integer(config->codec_bytes));
+}
+
 char *file_send_ifc_get_id(void *priv)
 {
    if (priv == NULL) {
@@ -574,6 +1329,7 @@ char *file_send_ifc_get_id(void *priv)
  * \param[in] params    Configuration string containing colon separated values of these parameters (in this exact order): *file_name*:*open_mode*,
  * where file_name is a path to a file in which data is to be written and
  * open_mode is either a - append or w - write, if no mode is specified, the file will be opened in append mode.
+ * Optional parameters time=, size=, index, compress= and level= follow.
  * \param[in,out] ifc   IFC interface used for calling file module.
  * \param[in] idx       Index of IFC that is created.
  * \return 0 on success (TRAP_E_OK), TRAP_E_MEMORY, TRAP_E_BADPARAMS on error
@@ -603,6 +1359,7 @@ int create_file_send_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_i
    priv->file_index = 0;
    priv->file_cnt = 0;
    priv->filename = dest = NULL;
+   priv->codec_level = -1;
    /* Set default mode */
    strcpy(priv->mode, "ab");
 
@@ -686,6 +1443,18 @@ int create_file_send_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_i
             }
          } else if (length > 5 && strncmp(params_next, "size=", 5) == 0) {
             priv->file_change_size = atoi(params_next + 5);
+         } else if (length == 5 && strncmp(params_next, "index", 5) == 0) {
+            priv->write_index = 1;
+         } else if (length > 9 && strncmp(params_next, "compress=", 9) == 0) {
+            priv->codec = trap_codec_by_name(params_next + 9, length - 9);
+            if (priv->codec == NULL) {
+               VERBOSE(CL_ERROR, "CREATE OUTPUT FILE IFC[%d]: unsupported codec \"%.*s\".", priv->ifc_idx, (int) length - 9, params_next + 9);
+               free(priv->filename);
+               free(priv);
+               return trap_errorf(ctx, TRAP_E_BADPARAMS, "OUTPUT FILE IFC: unsupported codec");
+            }
+         } else if (length > 6 && strncmp(params_next, "level=", 6) == 0) {
+            priv->codec_level = atoi(params_next + 6);
          }
 
          if (params_next[length] == '\0') {
@@ -715,9 +1484,15 @@ int create_file_send_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_i
       } while (access(buffer, F_OK) != -1);
 
       priv->fd = fopen(buffer, priv->mode);
+      if (priv->fd != NULL) {
+         file_index_open(priv, buffer);
+      }
       free(buffer);
    } else {
       priv->fd = fopen(priv->filename, priv->mode);
+      if (priv->fd != NULL) {
+         file_index_open(priv, priv->filename);
+      }
    }
 
    if (priv->fd == NULL) {
@@ -727,6 +1502,17 @@ int create_file_send_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_i
       return trap_errorf(ctx, TRAP_E_BADPARAMS, "unable to open file");
    }
 
+   if (priv->codec != NULL) {
+      priv->codec_state = priv->codec->create(1, priv->codec_level);
+      priv->codec_buf_size = sizeof(uint32_t) + sizeof(trap_codec_header_t) + priv->codec->bound(TRAP_IFC_MESSAGEQ_SIZE);
+      priv->codec_buf = malloc(priv->codec_buf_size);
+      if (priv->codec_state == NULL || priv->codec_buf == NULL) {
+         VERBOSE(CL_ERROR, "CREATE OUTPUT FILE IFC[%d]: unable to initialize codec %s.", priv->ifc_idx, priv->codec->name);
+         file_destroy(priv);
+         return trap_errorf(ctx, TRAP_E_BADPARAMS, "OUTPUT FILE IFC: unable to initialize codec");
+      }
+   }
+
    priv->is_terminated = 0;
 
    /* Fills interface structure */
@@ -735,6 +1521,7 @@ int create_file_send_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_i
    ifc->terminate = file_terminate;
    ifc->destroy = file_destroy;
    ifc->get_client_count = file_get_client_count;
+   ifc->get_stats = file_send_get_stats;
    ifc->create_dump = file_create_dump;
    ifc->priv = priv;
    ifc->get_id = file_send_ifc_get_id;
@@ -43,8 +43,24 @@
 #ifndef _TRAP_IFC_FILE_H_
 #define _TRAP_IFC_FILE_H_
 
+#include <pthread.h>
 #include "trap_ifc.h"
 
+struct trap_codec_s;
+
+/**
+ * Job of the decompression thread of file input interface.
+ */
+typedef struct file_codec_job_s {
+   const uint8_t *src; /**< Compressed data */
+   uint32_t src_len; /**< Size of compressed data */
+   uint32_t raw_len; /**< Size of decompressed data */
+   uint8_t codec_id; /**< Codec used to compress data */
+   int dst; /**< Index of decompressed buffer to fill (raw_bufs) */
+   char state; /**< 0 - no job, 1 - waiting for the thread, 2 - finished */
+   int result; /**< 0 on success, -1 if decompression failed */
+} file_codec_job_t;
+
 typedef struct file_private_s {
    trap_ctx_priv_t *ctx;
    FILE *fd;
@@ -60,12 +76,82 @@ typedef struct file_private_s {
    uint32_t ifc_idx;
    uint32_t file_change_size;
    uint32_t file_change_time;
+   char use_mmap; /**< Input: map files into memory (read=mmap) instead of reading them using stdio (default) */
+   uint8_t *map; /**< Input: mapping of the current file, NULL when stdio is used */
+   size_t map_size; /**< Input: size of the mapping */
+   size_t map_offset; /**< Input: read cursor into the mapping */
+   size_t map_released; /**< Input: bytes at the beginning of the mapping already returned to the kernel */
+   uint16_t eof_msg; /**< Input: empty message passed to libtrap at the end of input */
+   char time_filter; /**< Input: start= or end= was given */
+   char skip_file; /**< Input: the current file has no data in the time range */
+   uint64_t start_time; /**< Input: start of the time range (microseconds since epoch) */
+   uint64_t end_time; /**< Input: end of the time range (microseconds since epoch) */
+   uint64_t seek_offset; /**< Input: offset of the first buffer in the time range, 0 if unknown */
+   uint64_t stop_offset; /**< Input: offset of the first buffer after the time range */
+   char write_index; /**< Output: write sidecar index of buffers */
+   FILE *index_fd; /**< Output: sidecar index of the current file, NULL if it is not written */
+   uint64_t index_last_time; /**< Output: time of the previous written buffer (microseconds since epoch) */
+   const struct trap_codec_s *codec; /**< Output: codec to compress buffers (NULL - no compression), Input: codec of codec_state */
+   int codec_level; /**< Output: compression level, -1 means default of the codec */
+   void *codec_state; /**< Compression or decompression context of codec */
+   uint8_t *codec_buf; /**< Output: compressed buffer, Input: compressed data read by stdio */
+   size_t codec_buf_size; /**< Size of codec_buf */
+   uint64_t codec_raw_bytes; /**< Output: bytes of buffers passed to codec */
+   uint64_t codec_bytes; /**< Output: bytes of written compressed buffers */
+   uint8_t *raw_bufs[2]; /**< Input: decompressed buffers, one is passed to libtrap, the other one is filled by the thread */
+   int raw_cur; /**< Input: index of decompressed buffer passed to libtrap */
+   char peeked; /**< Input: header of the next buffer was already read */
+   uint32_t peeked_size; /**< Input: header of the next buffer (host byte order) */
+   char compressed_seen; /**< Input: the last buffer was compressed, decompress the next one in advance */
+   file_codec_job_t job; /**< Input: decompression job */
+   pthread_t codec_thread; /**< Input: decompression thread */
+   char codec_thread_running; /**< Input: codec_thread was started */
+   char codec_thread_stop; /**< Input: request to stop codec_thread */
+   pthread_mutex_t codec_lock; /**< Input: protects job */
+   pthread_cond_t codec_cond; /**< Input: signals new job or its result */
 } file_private_t;
 
+/**
+ * Suffix of the sidecar index file, it is appended to the name of the data file.
+ */
+#define TRAP_FILE_INDEX_SUFFIX ".idx"
+
+/**
+ * Entry of the sidecar index, one entry is written for every buffer.
+ *
+ * All members are stored in network byte order.  Messages of the buffer were
+ * stored by the module in the time range (first, last].
+ */
+typedef struct file_index_entry_s {
+   uint64_t offset; /**< Offset of the buffer (its length header) in the data file */
+   uint64_t first; /**< Time of the previous buffer or opening of the file (microseconds since epoch) */
+   uint64_t last; /**< Time when the buffer was written (microseconds since epoch) */
+} file_index_entry_t;
+
+/**
+ * Size of the beginning of the next input file that is prefetched
+ * into page cache when the current file is opened.
+ */
+#define TRAP_FILE_PREFETCH_SIZE  (16 * 1024 * 1024)
+
+/**
+ * Consumed part of the mapped input file is released after every
+ * TRAP_FILE_RELEASE_SIZE bytes to keep memory footprint low.
+ */
+#define TRAP_FILE_RELEASE_SIZE  (64 * 1024 * 1024)
+
+/** Read data from the current input file (mapped or opened by stdio).
+ *  @param[in] c   Pointer to private data of file input interface.
+ *  @param[out] dst   Memory where data will be stored.
+ *  @param[in] size   Number of bytes to read.
+ *  @return Number of read bytes, less than size at the end of file.
+ */
+size_t file_read(file_private_t *c, void *dst, size_t size);
+
 /** Create file receive interface (input ifc).
  *  Receive function of this interface reads data from defined file.
  *  @param[in] ctx   Pointer to the private libtrap context data (#trap_ctx_init()).
- *  @param[in] params <filename> expected.
+ *  @param[in] params <filename>[:read=<mmap|stdio>][:start=<time>][:end=<time>] expected.
  *  @param[out] ifc Created interface.
  *  @return Error code (0 on success). Generated interface is returned in ifc.
  */
@@ -75,8 +161,10 @@ int create_file_recv_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_if
 /** Create file send interface (output ifc).
  *  Send function of this interface stores data into defined file.
  *  @param[in] ctx   Pointer to the private libtrap context data (#trap_ctx_init()).
- *  @param[in] params <filename>:<mode>
+ *  @param[in] params <filename>:<mode>:<time=>:<size=>:<index>:<compress=>:<level=>
  *                    <mode> is optional, w - write, a - append. Append is set as default mode.
+ *                    <index> enables sidecar index of buffers.
+ *                    <compress=> selects codec to compress buffers, <level=> its compression level.
  *  @param[out] ifc Created interface.
  *  @return Error code (0 on success). Generated interface is returned in ifc.
  */
@@ -0,0 +1,997 @@
+/**
+ * \file ifc_shm.c
+ * \brief TRAP shared memory interfaces
+ * \date 2026
+ */
+/*
+ * Copyright (C) 2026 CESNET
+ *
+ * LICENSE TERMS
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions
+ * are met:
+ * 1. Redistributions of source code must retain the above copyright
+ *    notice, this list of conditions and the following disclaimer.
+ * 2. Redistributions in binary form must reproduce the above copyright
+ *    notice, this list of conditions and the following disclaimer in
+ *    the documentation and/or other materials provided with the
+ *    distribution.
+ * 3. Neither the name of the Company nor the names of its contributors
+ *    may be used to endorse or promote products derived from this
+ *    software without specific prior written permission.
+ *
+ * ALTERNATIVELY, provided that this notice is retained in full, this
+ * product may be distributed under the terms of the GNU General Public
+ * License (GPL) version 2 or later, in which case the provisions
+ * of the GPL apply INSTEAD OF those given above.
+ *
+ * This software is provided ``as is'', and any express or implied
+ * warranties, including, but not limited to, the implied warranties of
+ * merchantability and fitness for a particular purpose are disclaimed.
+ * In no event shall the company or contributors be liable for any
+ * direct, indirect, incidental, special, exemplary, or consequential
+ * damages (including, but not limited to, procurement of substitute
+ * goods or services; loss of use, data, or profits; or business
+ * interruption) however caused and on any theory of liability, whether
+ * in contract, strict liability, or tort (including negligence or
+ * otherwise) arising in any way out of the use of this software, even
+ * if advised of the possibility of such damage.
+ *
+ */
+#define _GNU_SOURCE
+#include <string.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <inttypes.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <signal.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <sys/syscall.h>
+#include <linux/futex.h>
+
+#include "../include/libtrap/trap.h"
+#include "trap_ifc.h"
+#include "trap_internal.h"
+#include "trap_error.h"
+#include "ifc_shm.h"
+
+/**
+ * \addtogroup trap_ifc TRAP communication module interface
+ * @{
+ */
+/**
+ * \addtogroup shm_ifc shared memory interface module
+ *
+ * Single producer single consumer ring buffer in a POSIX shared memory
+ * object.  The sender creates the object, the receiver attaches to it.
+ * Both sides sleep on futex words stored in the shared header, signalling
+ * costs a syscall only when the other side is actually waiting.
+ * @{
+ */
+
+/** Records in the ring are aligned to 8 bytes. */
+#define SHM_ALIGN(x) (((x) + 7) & ~((uint64_t) 7))
+
+/** Maximal duration of one sleep (in microseconds), liveness of the peer is checked after it. */
+#define SHM_WAIT_STEP 1000000
+
+/** Delay (in microseconds) between attempts of the receiver to attach to the segment. */
+#define SHM_ATTACH_STEP 100000
+
+/** Internal return code of shm_ring_write(): receiver has gone or was replaced. */
+#define SHM_E_DISCONNECTED -1
+
+static inline uint64_t shm_now(void)
+{
+   struct timespec ts;
+   clock_gettime(CLOCK_MONOTONIC, &ts);
+   return (uint64_t) ts.tv_sec * 1000000 + ts.tv_nsec / 1000;
+}
+
+static inline int shm_futex_wait(uint32_t *addr, uint32_t val, uint64_t usec)
+{
+   struct timespec ts;
+   ts.tv_sec = usec / 1000000;
+   ts.tv_nsec = (usec % 1000000) * 1000;
+   return syscall(SYS_futex, addr, FUTEX_WAIT, val, &ts, NULL, 0);
+}
+
+static inline void shm_futex_wake(uint32_t *addr)
+{
+   syscall(SYS_futex, addr, FUTEX_WAKE, INT_MAX, NULL, NULL, 0);
+}
+
+/**
+ * \brief Increment futex word and wake the peer if it announced it is going to sleep.
+ * \param[in] seq   futex word
+ * \param[in] waiting   flag set by the peer before sleeping on seq
+ */
+static inline void shm_notify(uint32_t *seq, uint32_t *waiting)
+{
+   __atomic_add_fetch(seq, 1, __ATOMIC_SEQ_CST);
+   if (__atomic_load_n(waiting, __ATOMIC_SEQ_CST)) {
+      __atomic_store_n(waiting, 0, __ATOMIC_RELAXED);
+      shm_futex_wake(seq);
+   }
+}
+
+/**
+ * \brief Increment futex word and wake all its waiters unconditionally.
+ * \param[in] seq   futex word
+ */
+static inline void shm_wake(uint32_t *seq)
+{
+   __atomic_add_fetch(seq, 1, __ATOMIC_SEQ_CST);
+   shm_futex_wake(seq);
+}
+
+static inline int shm_pid_alive(int32_t pid)
+{
+   return pid != 0 && (kill(pid, 0) == 0 || errno != ESRCH);
+}
+
+/**
+ * \brief Compute duration of the next sleep.
+ * \param[in] timeout   TRAP_WAIT, TRAP_HALFWAIT, TRAP_NO_WAIT or timeout in microseconds
+ * \param[in] entry     time of the entry into the send/recv function
+ * \return 0 when the timeout has expired, otherwise time to sleep in microseconds.
+ */
+static uint64_t shm_wait_step(int timeout, uint64_t entry)
+{
+   uint64_t elapsed;
+
+   if (timeout == TRAP_WAIT || timeout == TRAP_HALFWAIT) {
+      return SHM_WAIT_STEP;
+   }
+   if (timeout <= 0) {
+      return 0;
+   }
+   elapsed = shm_now() - entry;
+   if (elapsed >= (uint64_t) timeout) {
+      return 0;
+   }
+   elapsed = timeout - elapsed;
+   return (elapsed < SHM_WAIT_STEP ? elapsed : SHM_WAIT_STEP);
+}
+
+/**
+ * \brief Split parameters into identifier and optional size.
+ * \param[in] params    <name>[:size=<size>]
+ * \param[out] name     allocated identifier
+ * \param[out] size     size in MB, untouched when not given
+ * \return TRAP_E_OK, TRAP_E_BADPARAMS or TRAP_E_MEMORY
+ */
+static int shm_parse_params(const char *params, char **name, uint64_t *size)
+{
+   const char *delim;
+   char *end;
+   unsigned long val;
+
+   if (params == NULL || params[0] == 0 || params[0] == ':') {
+      return TRAP_E_BADPARAMS;
+   }
+   delim = strchr(params, ':');
+   if (delim == NULL) {
+      *name = strdup(params);
+   } else {
+      *name = strndup(params, delim - params);
+      if (strncmp(delim + 1, "size=", 5) != 0) {
+         free(*name);
+         *name = NULL;
+         return TRAP_E_BADPARAMS;
+      }
+      errno = 0;
+      val = strtoul(delim + 6, &end, 10);
+      if (errno != 0 || *end != 0 || val == 0 || val > 4096) {
+         free(*name);
+         *name = NULL;
+         return TRAP_E_BADPARAMS;
+      }
+      *size = val;
+   }
+   if (*name == NULL) {
+      return TRAP_E_MEMORY;
+   }
+   return TRAP_E_OK;
+}
+
+/**
+ * \addtogroup shm_sender
+ * @{
+ */
+
+int shm_hello_write(shm_sender_private_t *c, const void *data, uint32_t size)
+{
+   char *p;
+
+   if (c->hello_size + size > c->hello_alloc) {
+      p = realloc(c->hello, c->hello_size + size);
+      if (p == NULL) {
+         return 0;
+      }
+      c->hello = p;
+      c->hello_alloc = c->hello_size + size;
+   }
+   memcpy(c->hello + c->hello_size, data, size);
+   c->hello_size += size;
+   return size;
+}
+
+/**
+ * \brief Detach dead receiver from the ring.
+ * \param[in] r     shared ring
+ * \param[in] pid   PID of the receiver that was found dead
+ */
+static void shm_sender_drop(shm_ring_t *r, int32_t pid)
+{
+   if (__atomic_compare_exchange_n(&r->receiver_pid, &pid, 0, 0, __ATOMIC_SEQ_CST, __ATOMIC_SEQ_CST)) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "SHM IFC: receiver (pid %"PRId32") is gone.", pid);
+      shm_wake(&r->conn_seq);
+   }
+}
+
+/**
+ * \brief Publish one record in the ring, wait for free space if needed.
+ * \param[in] c     sender private data
+ * \param[in] type  type of record (SHM_REC_*)
+ * \param[in] hdr   first part of the payload
+ * \param[in] hdr_size  size of hdr
+ * \param[in] data  second part of the payload
+ * \param[in] size  size of data
+ * \param[in] timeout   timeout given to send function
+ * \param[in] entry     time of the entry into the send function
+ * \return TRAP_E_OK, TRAP_E_TIMEOUT, TRAP_E_TERMINATED, TRAP_E_BADPARAMS or SHM_E_DISCONNECTED
+ */
+static int shm_ring_write(shm_sender_private_t *c, uint32_t type, const void *hdr, uint32_t hdr_size,
+                          const void *data, uint32_t size, int timeout, uint64_t entry)
+{
+   shm_ring_t *r = c->ring;
+   shm_rec_header_t *rec;
+   uint64_t len = SHM_ALIGN(sizeof(shm_rec_header_t) + hdr_size + size);
+   uint64_t head = r->head, tail, off, pad, step;
+   uint32_t seq;
+   int32_t pid;
+
+   if (len > r->size / 2) {
+      return trap_errorf(c->ctx, TRAP_E_BADPARAMS, "SHM IFC[%"PRIu32"]: message does not fit into the ring.", c->ifc_idx);
+   }
+
+   off = head % r->size;
+   pad = (r->size - off < len) ? r->size - off : 0;
+
+   /* wait until the receiver consumes enough data */
+   while (1) {
+      seq = __atomic_load_n(&r->tail_seq, __ATOMIC_SEQ_CST);
+      tail = __atomic_load_n(&r->tail, __ATOMIC_SEQ_CST);
+      if (r->size - (head - tail) >= pad + len) {
+         break;
+      }
+      if (c->is_terminated) {
+         return trap_error(c->ctx, TRAP_E_TERMINATED);
+      }
+      pid = __atomic_load_n(&r->receiver_pid, __ATOMIC_SEQ_CST);
+      if (pid == 0 || __atomic_load_n(&r->conn_gen, __ATOMIC_SEQ_CST) != c->conn_gen) {
+         return SHM_E_DISCONNECTED;
+      }
+      step = shm_wait_step(timeout, entry);
+      if (step == 0) {
+         if (!shm_pid_alive(pid)) {
+            shm_sender_drop(r, pid);
+         }
+         return TRAP_E_TIMEOUT;
+      }
+      __atomic_store_n(&r->send_waiting, 1, __ATOMIC_SEQ_CST);
+      if (__atomic_load_n(&r->tail, __ATOMIC_SEQ_CST) != tail) {
+         continue;
+      }
+      if (shm_futex_wait(&r->tail_seq, seq, step) == -1 && errno == ETIMEDOUT && !shm_pid_alive(pid)) {
+         shm_sender_drop(r, pid);
+      }
+   }
+
+   if (pad != 0) {
+      rec = (shm_rec_header_t *) (r->data + off);
+      rec->size = pad - sizeof(shm_rec_header_t);
+      rec->type = SHM_REC_WRAP;
+      off = 0;
+   }
+   rec = (shm_rec_header_t *) (r->data + off);
+   rec->size = hdr_size + size;
+   rec->type = type;
+   memcpy(rec + 1, hdr, hdr_size);
+   memcpy((uint8_t *) (rec + 1) + hdr_size, data, size);
+
+   __atomic_store_n(&r->head, head + pad + len, __ATOMIC_SEQ_CST);
+   shm_notify(&r->head_seq, &r->recv_waiting);
+   return TRAP_E_OK;
+}
+
+/**
+ * \brief Negotiate with a newly attached receiver, hello message is published as a SHM_REC_HELLO record.
+ * \param[in] c     sender private data
+ * \param[in] gen   generation of the receiver's connection
+ * \param[in] timeout   timeout given to send function
+ * \param[in] entry     time of the entry into the send function
+ * \return Same as shm_ring_write(), TRAP_E_NOT_INITIALIZED when negotiation failed.
+ */
+static int shm_sender_hello(shm_sender_private_t *c, uint32_t gen, int timeout, uint64_t entry)
+{
+   int ret_val;
+
+   c->conn_gen = gen;
+   c->hello_size = 0;
+#ifdef ENABLE_NEGOTIATION
+   ret_val = output_ifc_negotiation((void *) c, TRAP_IFC_TYPE_SHM, 0);
+   if (ret_val == NEG_RES_FMT_UNKNOWN) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "SHM output_ifc_negotiation result: failed (unknown data format of this output interface -> refuse client).");
+      return trap_error(c->ctx, TRAP_E_NOT_INITIALIZED);
+   } else if (ret_val != NEG_RES_OK) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "SHM output_ifc_negotiation result: failed (error while preparing hello message).");
+      return trap_error(c->ctx, TRAP_E_NOT_INITIALIZED);
+   }
+#endif
+   ret_val = shm_ring_write(c, SHM_REC_HELLO, &gen, sizeof(gen), c->hello, c->hello_size, timeout, entry);
+   if (ret_val == TRAP_E_OK) {
+      VERBOSE(CL_VERBOSE_LIBRARY, "SHM output_ifc_negotiation result: success.");
+      c->neg_initialized = 1;
+   }
+   return ret_val;
+}
+
+/**
+ * \brief Store buffer into the ring.
+ * \param[in] priv  pointer to module private data
+ * \param[in] data  pointer to data to write
+ * \param[in] size  size of data to write
+ * \param[in] timeout   TRAP_WAIT waits for a receiver, otherwise the function
+ * fails with TRAP_E_TIMEOUT when no receiver is attached
+ * \return 0 on success (TRAP_E_OK), TRAP_E_TIMEOUT, TRAP_E_TERMINATED
+ */
+int shm_sender_send(void *priv, const void *data, uint32_t size, int timeout)
+{
+   shm_sender_private_t *c = (shm_sender_private_t *) priv;
+   shm_ring_t *r = c->ring;
+   uint64_t entry = shm_now();
+   uint32_t seq, gen;
+   int ret_val;
+
+   while (1) {
+      if (c->is_terminated) {
+         return trap_error(c->ctx, TRAP_E_TERMINATED);
+      }
+
+      seq = __atomic_load_n(&r->conn_seq, __ATOMIC_SEQ_CST);
+      if (__atomic_load_n(&r->receiver_pid, __ATOMIC_SEQ_CST) == 0) {
+         if (timeout != TRAP_WAIT) {
+            return TRAP_E_TIMEOUT;
+         }
+         shm_futex_wait(&r->conn_seq, seq, SHM_WAIT_STEP);
+         continue;
+      }
+
+      gen = __atomic_load_n(&r->conn_gen, __ATOMIC_SEQ_CST);
+      if (gen != c->conn_gen || c->neg_initialized == 0) {
+         c->neg_initialized = 0;
+         ret_val = shm_sender_hello(c, gen, timeout, entry);
+         if (ret_val == SHM_E_DISCONNECTED) {
+            continue;
+         } else if (ret_val != TRAP_E_OK) {
+            return ret_val;
+         }
+      }
+
+      ret_val = shm_ring_write(c, SHM_REC_DATA, NULL, 0, data, size, timeout, entry);
+      if (ret_val != SHM_E_DISCONNECTED) {
+         return ret_val;
+      }
+   }
+}
+
+/**
+ * \brief Force new negotiation (e.g. after change of data format).
+ * \param[in] priv  pointer to module private data
+ */
+void shm_sender_disconnect_clients(void *priv)
+{
+   ((shm_sender_private_t *) priv)->neg_initialized = 0;
+}
+
+int32_t shm_sender_get_client_count(void *priv)
+{
+   shm_sender_private_t *c = (shm_sender_private_t *) priv;
+   if (c == NULL || c->ring == NULL) {
+      return 0;
+   }
+   return (__atomic_load_n(&c->ring->receiver_pid, __ATOMIC_SEQ_CST) != 0 ? 1 : 0);
+}
+
+char *shm_sender_get_id(void *priv)
+{
+   if (priv == NULL) {
+      return NULL;
+   }
+   return ((shm_sender_private_t *) priv)->name;
+}
+
+/**
+ * \brief Set interface state as terminated and wake the blocked send function.
+ * \param[in] priv  pointer to module private data
+ */
+void shm_sender_terminate(void *priv)
+{
+   shm_sender_private_t *c = (shm_sender_private_t *) priv;
+
+   if (c) {
+      c->is_terminated = 1;
+      if (c->ring) {
+         shm_wake(&c->ring->tail_seq);
+         shm_wake(&c->ring->conn_seq);
+      }
+   } else {
+      VERBOSE(CL_ERROR, "SHM IFC: attempt to terminate IFC that is probably not initialized.");
+   }
+}
+
+/**
+ * \brief Mark the ring as closed, remove the shared memory object and free allocated memory.
+ * \param[in] priv  pointer to module private data
+ */
+void shm_sender_destroy(void *priv)
+{
+   shm_sender_private_t *c = (shm_sender_private_t *) priv;
+
+   if (c) {
+      if (c->ring) {
+         __atomic_store_n(&c->ring->closed, 1, __ATOMIC_SEQ_CST);
+         shm_wake(&c->ring->head_seq);
+         munmap(c->ring, c->map_size);
+         shm_unlink(c->shm_name);
+      }
+      free(c->hello);
+      free(c->shm_name);
+      free(c->name);
+      free(c);
+   } else {
+      VERBOSE(CL_ERROR, "SHM IFC: attempt to destroy IFC that is probably not initialized.");
+   }
+}
+
+static void shm_create_dump(const char *name, const char *shm_name, shm_ring_t *r, char dir, uint32_t idx, const char *path)
+{
+   char *config_file = NULL;
+   FILE *fd = NULL;
+
+   if (asprintf(&config_file, "%s/trap-%c%02"PRIu32"-config.txt", path, dir, idx) == -1) {
+      VERBOSE(CL_ERROR, "SHM IFC: not enough memory, dump failed. (%s:%d)", __FILE__, __LINE__);
+      return;
+   }
+   fd = fopen(config_file, "w");
+   free(config_file);
+   if (fd == NULL) {
+      VERBOSE(CL_ERROR, "SHM IFC: unable to write to dump file. (%s:%d)", __FILE__, __LINE__);
+      return;
+   }
+   fprintf(fd, "Name: %s\nObject: %s\n", name, shm_name);
+   if (r != NULL) {
+      fprintf(fd, "Size: %"PRIu64"\nHead: %"PRIu64"\nTail: %"PRIu64"\nSender PID: %"PRId32"\nReceiver PID: %"PRId32"\nConnection: %"PRIu32"\n",
+              r->size, r->head, r->tail, r->sender_pid, r->receiver_pid, r->conn_gen);
+   }
+   fclose(fd);
+}
+
+static void shm_sender_create_dump(void *priv, uint32_t idx, const char *path)
+{
+   shm_sender_private_t *c = (shm_sender_private_t *) priv;
+   shm_create_dump(c->name, c->shm_name, c->ring, 'o', idx, path);
+}
+
+/**
+ * \brief Remove the shared memory object if it was left by a sender that is not running anymore.
+ * \param[in] shm_name  name of the shared memory object
+ * \return 1 when the object was removed, 0 when it is in use or it is not a TRAP ring.
+ */
+static int shm_remove_stale(const char *shm_name)
+{
+   struct stat st;
+   shm_ring_t *r;
+   int32_t pid;
+   int fd, stale;
+
+   fd = shm_open(shm_name, O_RDONLY, 0);
+   if (fd == -1) {
+      /* removed meanwhile, try to create it again */
+      return errno == ENOENT;
+   }
+   if (fstat(fd, &st) == -1 || st.st_size < sizeof(shm_ring_t)) {
+      close(fd);
+      return 0;
+   }
+   r = mmap(NULL, sizeof(shm_ring_t), PROT_READ, MAP_SHARED, fd, 0);
+   close(fd);
+   if (r == MAP_FAILED) {
+      return 0;
+   }
+   pid = __atomic_load_n(&r->sender_pid, __ATOMIC_SEQ_CST);
+   stale = __atomic_load_n(&r->magic, __ATOMIC_SEQ_CST) == SHM_RING_MAGIC && !shm_pid_alive(pid);
+   munmap(r, sizeof(shm_ring_t));
+   if (!stale) {
+      VERBOSE(CL_ERROR, "CREATE OUTPUT SHM IFC: shared memory object \"%s\" is used by another sender (pid %"PRId32").", shm_name, pid);
+      return 0;
+   }
+   VERBOSE(CL_VERBOSE_LIBRARY, "CREATE OUTPUT SHM IFC: removing stale shared memory object \"%s\" (pid %"PRId32").", shm_name, pid);
+   return shm_unlink(shm_name) == 0 || errno == ENOENT;
+}
+
+/**
+ * \brief Allocate and initiate shared memory output interface.
+ * This function is called by TRAP library to initialize one output interface.
+ * \param[in,out] ctx   Pointer to the private libtrap context data (trap_ctx_init()).
+ * \param[in] params    Configuration string <name>[:size=<size>], where size is the size of the ring in MB.
+ * \param[in,out] ifc   IFC interface used for calling shm module.
+ * \param[in] idx       Index of IFC that is created.
+ * \return 0 on success (TRAP_E_OK), TRAP_E_MEMORY, TRAP_E_BADPARAMS, TRAP_E_IO_ERROR on error
+ */
+int create_shm_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_ifc_t *ifc, uint32_t idx)
+{
+   shm_sender_private_t *priv;
+   uint64_t size = SHM_DEFAULT_SIZE;
+   int fd, ret_val;
+   void *p;
+
+   /* Create structure to store private data */
+   priv = calloc(1, sizeof(shm_sender_private_t));
+   if (!priv) {
+      return trap_error(ctx, TRAP_E_MEMORY);
+   }
+   priv->ctx = ctx;
+   priv->ifc_idx = idx;
+
+   ret_val = shm_parse_params(params, &priv->name, &size);
+   if (ret_val != TRAP_E_OK) {
+      free(priv);
+      return trap_errorf(ctx, ret_val, "CREATE OUTPUT SHM IFC: expected <name>[:size=<MB>] parameters.");
+   }
+   if (asprintf(&priv->shm_name, SHM_NAME_FORMAT, priv->name) == -1) {
+      free(priv->name);
+      free(priv);
+      return trap_error(ctx, TRAP_E_MEMORY);
+   }
+   priv->map_size = sizeof(shm_ring_t) + size * 1024 * 1024;
+
+   fd = shm_open(priv->shm_name, O_RDWR | O_CREAT | O_EXCL, 0600);
+   if (fd == -1 && errno == EEXIST && shm_remove_stale(priv->shm_name)) {
+      /* object left by a crashed sender */
+      fd = shm_open(priv->shm_name, O_RDWR | O_CREAT | O_EXCL, 0600);
+   }
+   if (fd == -1) {
+      VERBOSE(CL_ERROR, "CREATE OUTPUT SHM IFC: unable to create shared memory object \"%s\" (%s).", priv->shm_name, strerror(errno));
+      goto failure;
+   }
+   if (ftruncate(fd, priv->map_size) == -1) {
+      VERBOSE(CL_ERROR, "CREATE OUTPUT SHM IFC: unable to resize shared memory object \"%s\" (%s).", priv->shm_name, strerror(errno));
+      close(fd);
+      shm_unlink(priv->shm_name);
+      goto failure;
+   }
+   p = mmap(NULL, priv->map_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+   close(fd);
+   if (p == MAP_FAILED) {
+      VERBOSE(CL_ERROR, "CREATE OUTPUT SHM IFC: unable to map shared memory object \"%s\" (%s).", priv->shm_name, strerror(errno));
+      shm_unlink(priv->shm_name);
+      goto failure;
+   }
+   priv->ring = (shm_ring_t *) p;
+   priv->ring->version = SHM_RING_VERSION;
+   priv->ring->size = size * 1024 * 1024;
+   priv->ring->sender_pid = getpid();
+   /* receiver checks magic, it must be set as the last one */
+   __atomic_store_n(&priv->ring->magic, SHM_RING_MAGIC, __ATOMIC_SEQ_CST);
+
+   /* Fills interface structure */
+   ifc->send = shm_sender_send;
+   ifc->disconn_clients = shm_sender_disconnect_clients;
+   ifc->terminate = shm_sender_terminate;
+   ifc->destroy = shm_sender_destroy;
+   ifc->get_client_count = shm_sender_get_client_count;
+   ifc->create_dump = shm_sender_create_dump;
+   ifc->priv = priv;
+   ifc->get_id = shm_sender_get_id;
+
+   return TRAP_E_OK;
+
+failure:
+   free(priv->shm_name);
+   free(priv->name);
+   free(priv);
+   return trap_errorf(ctx, TRAP_E_IO_ERROR, "unable to create shared memory object");
+}
+
+/**
+ * @}
+ *//* shm_sender */
+
+/**
+ * \addtogroup shm_receiver
+ * @{
+ */
+
+int shm_hello_read(shm_receiver_private_t *c, void *data, uint32_t size)
+{
+   if (c->hello_pos + size > c->hello_size) {
+      size = c->hello_size - c->hello_pos;
+   }
+   memcpy(data, c->hello + c->hello_pos, size);
+   c->hello_pos += size;
+   return size;
+}
+
+/**
+ * \brief Release the ring and let the sender know the receiver has gone.
+ * \param[in] c     receiver private data
+ */
+static void shm_receiver_detach(shm_receiver_private_t *c)
+{
+   int32_t pid = getpid();
+
+   if (c->ring != NULL) {
+      if (__atomic_compare_exchange_n(&c->ring->receiver_pid, &pid, 0, 0, __ATOMIC_SEQ_CST, __ATOMIC_SEQ_CST)) {
+         shm_wake(&c->ring->conn_seq);
+         shm_wake(&c->ring->tail_seq);
+      }
+      munmap(c->ring, c->map_size);
+      c->ring = NULL;
+   }
+   c->connected = 0;
+   c->neg_initialized = 0;
+   c->mismatch = 0;
+}
+
+/**
+ * \brief Try to attach to the ring created by the sender.
+ * \param[in] c     receiver private data
+ * \return TRAP_E_OK on success, TRAP_E_IO_ERROR when the ring does not exist yet or is used by another receiver.
+ */
+static int shm_receiver_attach(shm_receiver_private_t *c)
+{
+   struct stat st;
+   shm_ring_t *r;
+   int32_t pid = 0;
+   int fd;
+
+   fd = shm_open(c->shm_name, O_RDWR, 0);
+   if (fd == -1) {
+      return TRAP_E_IO_ERROR;
+   }
+   if (fstat(fd, &st) == -1 || st.st_size < sizeof(shm_ring_t)) {
+      close(fd);
+      return TRAP_E_IO_ERROR;
+   }
+   r = mmap(NULL, st.st_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+   close(fd);
+   if (r == MAP_FAILED) {
+      return TRAP_E_IO_ERROR;
+   }
+   if (__atomic_load_n(&r->magic, __ATOMIC_SEQ_CST) != SHM_RING_MAGIC || r->version != SHM_RING_VERSION ||
+       r->size == 0 || r->size % 8 != 0 || sizeof(shm_ring_t) + r->size > st.st_size || __atomic_load_n(&r->closed, __ATOMIC_SEQ_CST)) {
+      munmap(r, st.st_size);
+      return TRAP_E_IO_ERROR;
+   }
+
+   /* claim the ring, previous receiver may have crashed without detaching */
+   if (!__atomic_compare_exchange_n(&r->receiver_pid, &pid, getpid(), 0, __ATOMIC_SEQ_CST, __ATOMIC_SEQ_CST)) {
+      if (shm_pid_alive(pid) ||
+          !__atomic_compare_exchange_n(&r->receiver_pid, &pid, getpid(), 0, __ATOMIC_SEQ_CST, __ATOMIC_SEQ_CST)) {
+         VERBOSE(CL_VERBOSE_LIBRARY, "SHM IFC[%"PRIu32"]: %s is used by another receiver (pid %"PRId32").", c->ifc_idx, c->shm_name, pid);
+         munmap(r, st.st_size);
+         return TRAP_E_IO_ERROR;
+      }
+   }
+
+   c->ring = r;
+   c->map_size = st.st_size;
+   c->ring_size = r->size;
+   c->conn_gen = __atomic_add_fetch(&r->conn_gen, 1, __ATOMIC_SEQ_CST);
+   /* skip everything that was sent to the previous receiver */
+   __atomic_store_n(&r->tail, __atomic_load_n(&r->head, __ATOMIC_SEQ_CST), __ATOMIC_SEQ_CST);
+   c->connected = 1;
+   c->neg_initialized = 0;
+   c->mismatch = 0;
+   shm_wake(&r->tail_seq);
+   shm_wake(&r->conn_seq);
+   VERBOSE(CL_VERBOSE_LIBRARY, "SHM IFC[%"PRIu32"]: attached to %s.", c->ifc_idx, c->shm_name);
+   return TRAP_E_OK;
+}
+
+/**
+ * \brief Mark records up to new_tail as consumed.
+ * \param[in] c     receiver private data
+ * \param[in] new_tail  position after the last consumed record
+ */
+static inline void shm_receiver_advance(shm_receiver_private_t *c, uint64_t new_tail)
+{
+   __atomic_store_n(&c->ring->tail, new_tail, __ATOMIC_SEQ_CST);
+   shm_notify(&c->ring->tail_seq, &c->ring->send_waiting);
+}
+
+/**
+ * \brief Process hello record, negotiation data are copied out of the ring.
+ * \param[in] c     receiver private data
+ * \param[in] payload   payload of the hello record
+ * \param[in] size  size of the payload, it was checked to be within the ring
+ * \return TRAP_E_OK or TRAP_E_FORMAT_MISMATCH
+ */
+static int shm_receiver_hello(shm_receiver_private_t *c, const uint8_t *payload, uint32_t size)
+{
+   uint32_t gen;
+   char *p;
+
+   if (size < sizeof(gen)) {
+      return TRAP_E_OK;
+   }
+   memcpy(&gen, payload, sizeof(gen));
+   if (gen != c->conn_gen) {
+      /* hello for the previous receiver */
+      return TRAP_E_OK;
+   }
+
+   c->hello_size = size - sizeof(gen);
+   c->hello_pos = 0;
+   if (c->hello_size > c->hello_alloc) {
+      p = realloc(c->hello, c->hello_size);
+      if (p == NULL) {
+         return trap_error(c->ctx, TRAP_E_MEMORY);
+      }
+      c->hello = p;
+      c->hello_alloc = c->hello_size;
+   }
+   memcpy(c->hello, payload + sizeof(gen), c->hello_size);
+
+   c->mismatch = 0;
+#ifdef ENABLE_NEGOTIATION
+   switch (input_ifc_negotiation((void *) c, TRAP_IFC_TYPE_SHM)) {
+   case NEG_RES_CONT:
+   case NEG_RES_RECEIVER_FMT_SUBSET:
+   case NEG_RES_SENDER_FMT_SUBSET:
+   case NEG_RES_FMT_CHANGED:
+      VERBOSE(CL_VERBOSE_LIBRARY, "SHM input_ifc_negotiation result: success.");
+      break;
+   default:
+      VERBOSE(CL_VERBOSE_LIBRARY, "SHM input_ifc_negotiation result: failed (data format or data specifier mismatch).");
+      c->mismatch = 1;
+      c->neg_initialized = 0;
+      return TRAP_E_FORMAT_MISMATCH;
+   }
+#endif
+   c->neg_initialized = 1;
+   return TRAP_E_OK;
+}
+
+/**
+ * \brief Receive buffer from the ring.
+ * \param[in] priv  pointer to module private data
+ * \param[out] data pointer to the memory for received buffer (TRAP_IFC_MESSAGEQ_SIZE bytes)
+ * \param[out] size size of received buffer
+ * \param[in] timeout   TRAP_WAIT, TRAP_NO_WAIT or timeout in microseconds
+ * \return 0 on success (TRAP_E_OK), TRAP_E_TIMEOUT, TRAP_E_TERMINATED, TRAP_E_FORMAT_MISMATCH
+ */
+int shm_receiver_recv(void *priv, void *data, uint32_t *size, int timeout)
+{
+   shm_receiver_private_t *c = (shm_receiver_private_t *) priv;
+   shm_ring_t *r;
+   shm_rec_header_t rec;
+   uint8_t *payload;
+   uint64_t entry = shm_now(), head, tail, off, step;
+   uint32_t seq;
+   int ret_val;
+
+   while (1) {
+      if (c->is_terminated) {
+         return trap_error(c->ctx, TRAP_E_TERMINATED);
+      }
+
+      if (!c->connected && shm_receiver_attach(c) != TRAP_E_OK) {
+         step = shm_wait_step(timeout, entry);
+         if (step == 0) {
+            return TRAP_E_TIMEOUT;
+         }
+         usleep(step < SHM_ATTACH_STEP ? step : SHM_ATTACH_STEP);
+         continue;
+      }
+
+      r = c->ring;
+      tail = r->tail;
+      seq = __atomic_load_n(&r->head_seq, __ATOMIC_SEQ_CST);
+      head = __atomic_load_n(&r->head, __ATOMIC_SEQ_CST);
+      if (head == tail) {
+         if (c->mismatch) {
+            return TRAP_E_FORMAT_MISMATCH;
+         }
+         if (__atomic_load_n(&r->closed, __ATOMIC_SEQ_CST)) {
+            VERBOSE(CL_VERBOSE_LIBRARY, "SHM IFC[%"PRIu32"]: sender closed %s.", c->ifc_idx, c->shm_name);
+            shm_receiver_detach(c);
+            continue;
+         }
+         step = shm_wait_step(timeout, entry);
+         if (step == 0) {
+            return TRAP_E_TIMEOUT;
+         }
+         __atomic_store_n(&r->recv_waiting, 1, __ATOMIC_SEQ_CST);
+         if (__atomic_load_n(&r->head, __ATOMIC_SEQ_CST) != tail) {
+            continue;
+         }
+         if (shm_futex_wait(&r->head_seq, seq, step) == -1 && errno == ETIMEDOUT && !shm_pid_alive(r->sender_pid)) {
+            VERBOSE(CL_VERBOSE_LIBRARY, "SHM IFC[%"PRIu32"]: sender of %s is gone.", c->ifc_idx, c->shm_name);
+            shm_receiver_detach(c);
+         }
+         continue;
+      }
+
+      /* the header is copied, the record must be within the ring and within the published data */
+      off = tail % c->ring_size;
+      if (off % 8 != 0 || head - tail < sizeof(shm_rec_header_t) || off + sizeof(shm_rec_header_t) > c->ring_size) {
+         goto corrupted;
+      }
+      memcpy(&rec, r->data + off, sizeof(rec));
+      payload = r->data + off + sizeof(shm_rec_header_t);
+      if (rec.size > c->ring_size - off - sizeof(shm_rec_header_t) ||
+          SHM_ALIGN(sizeof(shm_rec_header_t) + rec.size) > head - tail) {
+         goto corrupted;
+      }
+      if (rec.type == SHM_REC_WRAP) {
+         shm_receiver_advance(c, tail + (c->ring_size - off));
+         continue;
+      }
+      tail += SHM_ALIGN(sizeof(shm_rec_header_t) + rec.size);
+      if (rec.type == SHM_REC_HELLO) {
+         ret_val = shm_receiver_hello(c, payload, rec.size);
+         shm_receiver_advance(c, tail);
+         if (ret_val != TRAP_E_OK) {
+            return ret_val;
+         }
+         continue;
+      }
+      if (c->neg_initialized == 0 || c->mismatch || rec.size < sizeof(trap_buffer_header_t) ||
+          rec.size - sizeof(trap_buffer_header_t) > TRAP_IFC_MESSAGEQ_SIZE) {
+         /* data for the previous receiver or data of unexpected format */
+         shm_receiver_advance(c, tail);
+         continue;
+      }
+
+      /* buffer is stored including its header, only the payload is returned */
+      *size = rec.size - sizeof(trap_buffer_header_t);
+      memcpy(data, payload + sizeof(trap_buffer_header_t), *size);
+      shm_receiver_advance(c, tail);
+      return TRAP_E_OK;
+
+corrupted:
+      VERBOSE(CL_ERROR, "SHM IFC[%"PRIu32"]: invalid record at position %"PRIu64" of %s, published data are skipped.",
+              c->ifc_idx, tail, c->shm_name);
+      shm_receiver_advance(c, head);
+   }
+}
+
+char *shm_receiver_get_id(void *priv)
+{
+   if (priv == NULL) {
+      return NULL;
+   }
+   return ((shm_receiver_private_t *) priv)->name;
+}
+
+uint8_t shm_receiver_is_conn(void *priv)
+{
+   if (priv == NULL) {
+      return 0;
+   }
+   return ((shm_receiver_private_t *) priv)->connected;
+}
+
+/**
+ * \brief Set interface state as terminated and wake the blocked recv function.
+ * \param[in] priv  pointer to module private data
+ */
+void shm_receiver_terminate(void *priv)
+{
+   shm_receiver_private_t *c = (shm_receiver_private_t *) priv;
+
+   if (c) {
+      c->is_terminated = 1;
+      if (c->ring) {
+         shm_wake(&c->ring->head_seq);
+      }
+   } else {
+      VERBOSE(CL_ERROR, "SHM IFC: attempt to terminate IFC that is probably not initialized.");
+   }
+}
+
+/**
+ * \brief Detach from the ring and free allocated memory.
+ * \param[in] priv  pointer to module private data
+ */
+void shm_receiver_destroy(void *priv)
+{
+   shm_receiver_private_t *c = (shm_receiver_private_t *) priv;
+
+   if (c) {
+      shm_receiver_detach(c);
+      free(c->hello);
+      free(c->shm_name);
+      free(c->name);
+      free(c);
+   } else {
+      VERBOSE(CL_ERROR, "SHM IFC: attempt to destroy IFC that is probably not initialized.");
+   }
+}
+
+static void shm_receiver_create_dump(void *priv, uint32_t idx, const char *path)
+{
+   shm_receiver_private_t *c = (shm_receiver_private_t *) priv;
+   shm_create_dump(c->name, c->shm_name, c->ring, 'i', idx, path);
+}
+
+/**
+ * \brief Allocate and initiate shared memory input interface.
+ * This function is called by TRAP library to initialize one input interface.
+ * The ring is attached lazily by the recv function, the sender does not need to run yet.
+ *
+ * \param[in,out] ctx   Pointer to the private libtrap context data (trap_ctx_init()).
+ * \param[in] params    Configuration string containing *name* of the shared memory object.
+ * \param[in,out] ifc   IFC interface used for calling shm module.
+ * \param[in] idx       Index of IFC that is created.
+ * \return 0 on success (TRAP_E_OK), TRAP_E_MEMORY, TRAP_E_BADPARAMS on error
+ */
+int create_shm_receiver_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_ifc_t *ifc, uint32_t idx)
+{
+   shm_receiver_private_t *priv;
+   uint64_t size = 0;
+   int ret_val;
+
+   /* Create structure to store private data */
+   priv = calloc(1, sizeof(shm_receiver_private_t));
+   if (!priv) {
+      return trap_error(ctx, TRAP_E_MEMORY);
+   }
+   priv->ctx = ctx;
+   priv->ifc_idx = idx;
+
+   ret_val = shm_parse_params(params, &priv->name, &size);
+   if (ret_val != TRAP_E_OK) {
+      free(priv);
+      return trap_errorf(ctx, ret_val, "CREATE INPUT SHM IFC: expected <name> parameter.");
+   }
+   if (asprintf(&priv->shm_name, SHM_NAME_FORMAT, priv->name) == -1) {
+      free(priv->name);
+      free(priv);
+      return trap_error(ctx, TRAP_E_MEMORY);
+   }
+
+   /* Fills interface structure */
+   ifc->recv = shm_receiver_recv;
+   ifc->terminate = shm_receiver_terminate;
+   ifc->destroy = shm_receiver_destroy;
+   ifc->create_dump = shm_receiver_create_dump;
+   ifc->priv = priv;
+   ifc->get_id = shm_receiver_get_id;
+   ifc->is_conn = shm_receiver_is_conn;
+
+   return TRAP_E_OK;
+}
+
+/**
+ * @}
+ *//* shm_receiver */
+
+/**
+ * @}
+ *//* shm_ifc module */
+
+/**
+ * @}
+ *//* ifc modules */
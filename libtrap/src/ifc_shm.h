@@ -0,0 +1,174 @@
+/**
+ * \file ifc_shm.h
+ * \brief TRAP shared memory interfaces
+ * \date 2026
+ */
+/*
+ * Copyright (C) 2026 CESNET
+ *
+ * LICENSE TERMS
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions
+ * are met:
+ * 1. Redistributions of source code must retain the above copyright
+ *    notice, this list of conditions and the following disclaimer.
+ * 2. Redistributions in binary form must reproduce the above copyright
+ *    notice, this list of conditions and the following disclaimer in
+ *    the documentation and/or other materials provided with the
+ *    distribution.
+ * 3. Neither the name of the Company nor the names of its contributors
+ *    may be used to endorse or promote products derived from this
+ *    software without specific prior written permission.
+ *
+ * ALTERNATIVELY, provided that this notice is retained in full, this
+ * product may be distributed under the terms of the GNU General Public
+ * License (GPL) version 2 or later, in which case the provisions
+ * of the GPL apply INSTEAD OF those given above.
+ *
+ * This software is provided ``as is'', and any express or implied
+ * warranties, including, but not limited to, the implied warranties of
+ * merchantability and fitness for a particular purpose are disclaimed.
+ * In no event shall the company or contributors be liable for any
+ * direct, indirect, incidental, special, exemplary, or consequential
+ * damages (including, but not limited to, procurement of substitute
+ * goods or services; loss of use, data, or profits; or business
+ * interruption) however caused and on any theory of liability, whether
+ * in contract, strict liability, or tort (including negligence or
+ * otherwise) arising in any way out of the use of this software, even
+ * if advised of the possibility of such damage.
+ *
+ */
+#ifndef _TRAP_IFC_SHM_H_
+#define _TRAP_IFC_SHM_H_
+
+#include "trap_ifc.h"
+
+/**
+ * Name of the POSIX shared memory object, %s is replaced by the identifier
+ * given as the first parameter of the interface.
+ */
+#ifndef SHM_NAME_FORMAT
+#define SHM_NAME_FORMAT "/trap-shm-%s"
+#endif
+
+/** Default size of the ring buffer in MB. */
+#define SHM_DEFAULT_SIZE 8
+
+/** Identification of the shared segment ("TRPM"). */
+#define SHM_RING_MAGIC 0x5452504d
+#define SHM_RING_VERSION 1
+
+/** Types of records stored in the ring buffer. */
+#define SHM_REC_DATA  1 ///< TRAP buffer (trap_buffer_header_t + payload)
+#define SHM_REC_HELLO 2 ///< negotiation data (hello message), starts with connection generation
+#define SHM_REC_WRAP  3 ///< padding up to the end of the ring, reader continues at offset 0
+
+/**
+ * Header of the shared memory segment, it is followed by the data area of
+ * the ring buffer.
+ *
+ * Positions (head, tail) grow monotonically, offset in the data area is
+ * computed as position modulo size.  Head is written by the sender only,
+ * tail by the receiver only.  Every *_seq member is a futex word that is
+ * incremented after the corresponding position or state is changed.
+ */
+typedef struct shm_ring_s {
+   uint32_t magic;
+   uint32_t version;
+   uint64_t size;           ///< size of the data area in bytes
+   int32_t sender_pid;
+   int32_t receiver_pid;    ///< 0 when no receiver is attached
+   uint32_t conn_gen;       ///< incremented by every receiver that attaches
+   uint32_t conn_seq;       ///< futex: receiver (dis)connected
+   uint32_t closed;         ///< set by sender before the segment is removed
+
+   /* written by sender */
+   uint64_t head __attribute__((aligned(64)));
+   uint32_t head_seq;       ///< futex: new records were published
+   uint32_t recv_waiting;   ///< receiver sleeps on head_seq
+
+   /* written by receiver */
+   uint64_t tail __attribute__((aligned(64)));
+   uint32_t tail_seq;       ///< futex: records were consumed
+   uint32_t send_waiting;   ///< sender sleeps on tail_seq
+
+   uint8_t data[0] __attribute__((aligned(64)));
+} shm_ring_t;
+
+/** Header of one record in the ring buffer, records are aligned to 8 bytes. */
+typedef struct shm_rec_header_s {
+   uint32_t size;           ///< size of the payload
+   uint32_t type;           ///< SHM_REC_*
+} shm_rec_header_t;
+
+typedef struct shm_sender_private_s {
+   trap_ctx_priv_t *ctx;
+   char *name;              ///< identifier given by user
+   char *shm_name;          ///< name of the shared memory object
+   shm_ring_t *ring;
+   size_t map_size;
+   uint32_t ifc_idx;
+   uint32_t conn_gen;       ///< generation of the receiver the hello was sent to
+   char is_terminated;
+   uint8_t neg_initialized;
+   char *hello;             ///< staging buffer filled by output_ifc_negotiation()
+   uint32_t hello_size;
+   uint32_t hello_alloc;
+} shm_sender_private_t;
+
+typedef struct shm_receiver_private_s {
+   trap_ctx_priv_t *ctx;
+   char *name;              ///< identifier given by user
+   char *shm_name;          ///< name of the shared memory object
+   shm_ring_t *ring;
+   size_t map_size;
+   uint64_t ring_size;      ///< size of the data area checked when attached, records are validated against it
+   uint32_t ifc_idx;
+   uint32_t conn_gen;       ///< generation assigned when attached to the ring
+   char is_terminated;
+   char connected;
+   char mismatch;           ///< last negotiation failed, data are skipped
+   uint8_t neg_initialized;
+   char *hello;             ///< payload of the last hello record, read by input_ifc_negotiation()
+   uint32_t hello_size;
+   uint32_t hello_pos;
+   uint32_t hello_alloc;
+} shm_receiver_private_t;
+
+/** Create shared memory output interface.
+ *  @param[in] ctx   Pointer to the private libtrap context data (#trap_ctx_init()).
+ *  @param[in] params <name>[:size=<size>] - identifier of the shared memory object
+ *                    and size of the ring buffer in MB (default #SHM_DEFAULT_SIZE).
+ *  @param[out] ifc Created interface.
+ *  @param[in] idx Index of the interface.
+ *  @return Error code (0 on success). Generated interface is returned in ifc.
+ */
+int create_shm_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_output_ifc_t *ifc, uint32_t idx);
+
+/** Create shared memory input interface.
+ *  @param[in] ctx   Pointer to the private libtrap context data (#trap_ctx_init()).
+ *  @param[in] params <name> - identifier of the shared memory object.
+ *  @param[out] ifc Created interface.
+ *  @param[in] idx Index of the interface.
+ *  @return Error code (0 on success). Generated interface is returned in ifc.
+ */
+int create_shm_receiver_ifc(trap_ctx_priv_t *ctx, const char *params, trap_input_ifc_t *ifc, uint32_t idx);
+
+/** Append negotiation data into the hello staging buffer of the sender.
+ *  @param[in] c Sender private data.
+ *  @param[in] data Data to append.
+ *  @param[in] size Size of data.
+ *  @return Number of bytes written (size on success).
+ */
+int shm_hello_write(shm_sender_private_t *c, const void *data, uint32_t size);
+
+/** Read negotiation data from the last hello record received by the receiver.
+ *  @param[in] c Receiver private data.
+ *  @param[out] data Destination buffer.
+ *  @param[in] size Number of bytes to read.
+ *  @return Number of bytes read (size on success).
+ */
+int shm_hello_read(shm_receiver_private_t *c, void *data, uint32_t size);
+
+#endif
@@ -51,11 +51,14 @@
 #include <stdlib.h>
 #include <string.h>
 #include <sys/socket.h>
+#include <sys/epoll.h>
+#include <sys/uio.h>
 #include <sys/un.h>
 #include <sys/types.h>
 #include <sys/stat.h>
 #include <unistd.h>
 #include <fcntl.h>
+#include <poll.h>
 #include <inttypes.h>
 #include <stdio.h>
 #include <pthread.h>
@@ -69,6 +72,7 @@
 #include "trap_error.h"
 #include "ifc_tcpip.h"
 #include "ifc_tcpip_internal.h"
+#include "trap_codec.h"
 
 /**
  * \addtogroup trap_ifc TRAP communication module interface
@@ -237,6 +241,48 @@ static inline uint64_t get_cur_timestamp()
    return spec_time.tv_sec * 1000000 + (spec_time.tv_nsec / 1000);
 }
 
+/**
+ * \brief Decompress received buffer from codec_buf into the buffer of libtrap.
+ *
+ * Decompression context is created when the first buffer of the codec arrives.
+ * \param[in] config  private data
+ * \param[out] data   buffer of libtrap (TRAP_IFC_MESSAGEQ_SIZE bytes)
+ * \param[in,out] size  size of compressed buffer including trap_codec_header_t, size of decompressed payload on output
+ * \return TRAP_E_OK on success, TRAP_E_IO_ERROR when data cannot be decompressed
+ */
+static int tcpip_receiver_decompress(tcpip_receiver_private_t *config, void *data, uint32_t *size)
+{
+   trap_codec_header_t *header = (trap_codec_header_t *) config->codec_buf;
+   const trap_codec_t *codec = trap_codec_by_id(header->codec);
+   uint32_t raw_length = ntohl(header->raw_length);
+
+   if ((codec == NULL) || (raw_length > TRAP_IFC_MESSAGEQ_SIZE)) {
+      VERBOSE(CL_ERROR, "Received buffer with unsupported codec %"PRIu8" or size %"PRIu32".", header->codec, raw_length);
+      return TRAP_E_IO_ERROR;
+   }
+   if (config->codec != codec) {
+      if (config->codec != NULL) {
+         config->codec->free(config->codec_state, 0);
+      }
+      config->codec = codec;
+      config->codec_state = codec->create(0, -1);
+      if (config->codec_state == NULL) {
+         VERBOSE(CL_ERROR, "Unable to initialize codec %s.", codec->name);
+         config->codec = NULL;
+         return TRAP_E_IO_ERROR;
+      }
+   }
+   if (codec->decompress(config->codec_state, config->codec_buf + sizeof(trap_codec_header_t),
+                         *size - sizeof(trap_codec_header_t), data, raw_length) != 0) {
+      VERBOSE(CL_ERROR, "Decompression of received buffer failed.");
+      return TRAP_E_IO_ERROR;
+   }
+   config->codec_bytes += *size + sizeof(trap_buffer_header_t);
+   config->codec_raw_bytes += raw_length + sizeof(trap_buffer_header_t);
+   *size = raw_length;
+   return TRAP_E_OK;
+}
+
 /**
  * \brief Receive data from interface.
  *
@@ -429,6 +475,8 @@ head_wait:
       } else {
          /* we expect to receive data */
          messageframe.data_length = ntohl(messageframe.data_length);
+         config->compressed = ((messageframe.data_length & TRAP_CODEC_COMPRESSED) != 0);
+         messageframe.data_length &= ~TRAP_CODEC_COMPRESSED;
          config->data_wait_size = messageframe.data_length;
          config->ext_buffer_size = messageframe.data_length;
 #ifdef ENABLE_CHECK_HEADER
@@ -440,6 +488,23 @@ head_wait:
          /* we got header, now we can start receiving payload */
          p = data;
          config->ext_buffer = data;
+         if (config->compressed) {
+            /* compressed payload is decompressed into data after it is received */
+            if ((messageframe.data_length <= sizeof(trap_codec_header_t)) || (messageframe.data_length > TRAP_IFC_MESSAGEQ_SIZE)) {
+               VERBOSE(CL_ERROR, "Received compressed buffer of invalid size %"PRIu32".", messageframe.data_length);
+               client_socket_disconnect(config);
+               goto discard;
+            }
+            if (config->codec_buf == NULL) {
+               config->codec_buf = (uint8_t *) malloc(TRAP_IFC_MESSAGEQ_SIZE);
+               if (config->codec_buf == NULL) {
+                  VERBOSE(CL_ERROR, "Not enough memory for compressed buffer.");
+                  client_socket_disconnect(config);
+                  goto discard;
+               }
+            }
+            p = config->codec_buf;
+         }
          goto mess_wait;
       }
 mess_wait:
@@ -450,7 +515,11 @@ mess_wait:
       if (retval == TRAP_E_OK) {
          /* Success! Data was already set by recv */
          config->data_pointer = NULL;
-         (*size) = messageframe.data_length;
+         if (config->compressed && (tcpip_receiver_decompress(config, data, &config->ext_buffer_size) != TRAP_E_OK)) {
+            client_socket_disconnect(config);
+            goto discard;
+         }
+         (*size) = config->ext_buffer_size;
          DEBUG_IFC(VERBOSE(CL_VERBOSE_LIBRARY, "recv get MESS (%p) remains: %d B", p, config->data_wait_size));
          return TRAP_E_OK;
       } else {
@@ -497,6 +566,10 @@ p = NULL; \
       if (config->connected == 1) {
          close(config->sd);
       }
+      if (config->codec != NULL) {
+         config->codec->free(config->codec_state, 0);
+      }
+      X(config->codec_buf);
       X(config->dest_addr);
       X(config->dest_port);
       X(config);
@@ -564,6 +637,23 @@ exit:
    return;
 }
 
+/**
+ * \brief Add compression counters into statistics of input IFC.
+ * \param[in] priv  pointer to module private data
+ * \param[in,out] stats  JSON object with counters of the interface
+ */
+static void tcpip_receiver_get_stats(void *priv, json_t *stats)
+{
+   tcpip_receiver_private_t *config = (tcpip_receiver_private_t *) priv;
+
+   if (config->codec == NULL) {
+      return;
+   }
+   json_object_set_new(stats, "codec", json_string(config->codec->name));
+   json_object_set_new(stats, "codec-raw-bytes", json_integer(config->codec_raw_bytes));
+   json_object_set_new(stats, "codec-bytes", json_integer(config->codec_bytes));
+}
+
 char *tcpip_recv_ifc_get_id(void *priv)
 {
    if (priv == NULL) {
@@ -690,6 +780,7 @@ int create_tcpip_receiver_ifc(trap_ctx_priv_t *ctx, char *params, trap_input_ifc
    ifc->destroy = tcpip_receiver_destroy;
    ifc->terminate = tcpip_receiver_terminate;
    ifc->create_dump = tcpip_receiver_create_dump;
+   ifc->get_stats = tcpip_receiver_get_stats;
    ifc->priv = config;
    ifc->get_id = tcpip_recv_ifc_get_id;
    ifc->is_conn = tcpip_recv_ifc_is_conn;
@@ -923,81 +1014,336 @@ static int client_socket_connect(void *priv, const char *dest_addr, const char *
  * @{
  */
 
-static void server_disconnected_client(tcpip_sender_private_t *c, int cl_id)
+/**
+ * \brief Get a shared buffer from the pool of free buffers or allocate a new one.
+ *
+ * sending_lock must be held by caller.
+ * \param[in] c  private data
+ * \return pointer to buffer with refcount set to 1, NULL on allocation failure
+ */
+static tcpip_shared_buffer_t *shared_buffer_get(tcpip_sender_private_t *c)
+{
+   tcpip_shared_buffer_t *b = c->free_buffers;
+
+   if (b != NULL) {
+      c->free_buffers = b->next;
+   } else {
+      b = (tcpip_shared_buffer_t *) malloc(sizeof(tcpip_shared_buffer_t) +
+                                           TRAP_IFC_MESSAGEQ_SIZE + sizeof(trap_buffer_header_t));
+      if (b == NULL) {
+         return NULL;
+      }
+   }
+   b->next = NULL;
+   b->refcount = 1;
+   b->size = 0;
+   return b;
+}
+
+/**
+ * \brief Drop one reference of shared buffer, the last one returns buffer into the pool.
+ *
+ * sending_lock must be held by caller.
+ * \param[in] c  private data
+ * \param[in] b  shared buffer
+ */
+static inline void shared_buffer_release(tcpip_sender_private_t *c, tcpip_shared_buffer_t *b)
+{
+   if (--b->refcount == 0) {
+      b->next = c->free_buffers;
+      c->free_buffers = b;
+   }
+}
+
+/**
+ * \brief Release all buffers in queue of client.
+ * \param[in] c  private data
+ * \param[in] cl client
+ */
+static void client_queue_release(tcpip_sender_private_t *c, struct client_s *cl)
+{
+   while (cl->queue_len > 0) {
+      shared_buffer_release(c, cl->queue[cl->queue_head]);
+      cl->queue[cl->queue_head] = NULL;
+      cl->queue_head = (cl->queue_head + 1) % c->queue_len;
+      cl->queue_len--;
+   }
+   cl->queue_head = 0;
+   cl->sent_bytes = 0;
+}
+
+/**
+ * \brief Enable or disable watching of EPOLLOUT for client.
+ * \param[in] c  private data
+ * \param[in] cl_id  index of client
+ * \param[in] want   1 to wait for writable socket, 0 otherwise
+ */
+static void client_set_want_write(tcpip_sender_private_t *c, int32_t cl_id, char want)
 {
    struct client_s *cl = &c->clients[cl_id];
-   pthread_mutex_lock(&c->lock);
+   struct epoll_event ev;
+
+   if (cl->want_write == want) {
+      return;
+   }
+   memset(&ev, 0, sizeof(ev));
+   ev.events = EPOLLIN | EPOLLRDHUP | (want != 0 ? EPOLLOUT : 0);
+   ev.data.u64 = TCPIP_CLIENT_EVENT_DATA(cl, cl_id);
+   if (epoll_ctl(c->epoll_sd, EPOLL_CTL_MOD, cl->sd, &ev) == -1) {
+      VERBOSE(CL_ERROR, "epoll_ctl() failed (%d): %s", errno, strerror(errno));
+   }
+   cl->want_write = want;
+}
+
+/**
+ * \brief Close connection of client and release its queue.
+ *
+ * sending_lock must be held by caller.
+ * \param[in] c  private data
+ * \param[in] cl_id  index of client
+ */
+static void server_disconnected_client(tcpip_sender_private_t *c, int32_t cl_id)
+{
+   struct client_s *cl = &c->clients[cl_id];
+
+   if (c->epoll_sd != -1) {
+      epoll_ctl(c->epoll_sd, EPOLL_CTL_DEL, cl->sd, NULL);
+   }
    close(cl->sd);
    cl->sd = -1;
-   cl->client_state = CURRENT_IDLE;
+   cl->want_write = 0;
+   if (cl->compress) {
+      cl->compress = 0;
+      c->codec_clients--;
+   }
+   client_queue_release(c, cl);
    c->connected_clients--;
-   pthread_mutex_unlock(&c->lock);
+   pthread_cond_broadcast(&c->queue_cond);
 }
 
 /**
- * \brief Try to send data block at once
+ * \brief Add accepted client into the array of clients.
  *
- * \param [in] c  private data
- * \param [in] sd    socket descriptor
- * \param [in,out] data pointer to beginning of data
- * \param [in,out] size size of data to send and the rest unsent size of data
- * \param [in] block       1 if blocking, 0 if non-blocking
- * \return TRAP_E_OK, TRAP_E_TIMEOUT, TRAP_E_TERMINATED, TRAP_E_IO_ERROR
+ * The array of clients is enlarged when there is no free slot.
+ * sending_lock must be held by caller.
+ * \param[in] c  private data
+ * \param[in] sd socket descriptor of the new client
+ * \return index of client, -1 when the client cannot be added
  */
-static int send_all_data(tcpip_sender_private_t *c, int sd, void **data, uint32_t *size, char block)
+static int32_t server_add_client(tcpip_sender_private_t *c, int sd)
 {
-   void *p = (*data);
-   ssize_t numbytes = (*size), sent_b;
-   int res = TRAP_E_TERMINATED;
+   struct client_s *cl = NULL, *new_clients;
+   struct epoll_event ev;
+   int32_t i, j, new_size;
 
-again:
-   if (block == 0) {
-      sent_b = send(sd, p, numbytes, MSG_NOSIGNAL | MSG_DONTWAIT);
-   } else {
-      sent_b = send(sd, p, numbytes, MSG_NOSIGNAL);
+   if ((c->max_clients != 0) && (c->connected_clients >= c->max_clients)) {
+      return -1;
    }
-   if (sent_b == -1) {
-      switch (errno) {
-      case EBADF:
-      case EPIPE:
-      case EFAULT:
-         VERBOSE(CL_VERBOSE_OFF, "Disconnected client (%i)", errno);
-         res = TRAP_E_IO_ERROR;
-         goto failure;
-      case EAGAIN:
-         if (block == 1) {
-            usleep(NONBLOCKING_MINWAIT);
-            goto again;
-         }
+   for (i = 0; i < c->clients_arr_size; ++i) {
+      if (c->clients[i].sd < 0) {
+         cl = &c->clients[i];
          break;
       }
-      if (c->is_terminated == 1) {
-         res = TRAP_E_TERMINATED;
-         goto failure;
+   }
+   if (cl == NULL) {
+      new_size = c->clients_arr_size * 2;
+      new_clients = (struct client_s *) realloc(c->clients, new_size * sizeof(struct client_s));
+      if (new_clients == NULL) {
+         VERBOSE(CL_ERROR, "Not enough memory for new client.");
+         return -1;
+      }
+      memset(&new_clients[c->clients_arr_size], 0, (new_size - c->clients_arr_size) * sizeof(struct client_s));
+      for (j = c->clients_arr_size; j < new_size; j++) {
+         new_clients[j].sd = -1;
       }
-   } else if (sent_b > 0) {
-      numbytes -= sent_b;
-      p += sent_b;
-      DEBUG_IFC(VERBOSE(CL_VERBOSE_LIBRARY, "send sent: %"PRId64" B remaining: "
-                "%"PRIu64" B from %p (errno %"PRId32")",
-                sent_b, numbytes, p, errno));
+      c->clients = new_clients;
+      i = c->clients_arr_size;
+      c->clients_arr_size = new_size;
+      cl = &c->clients[i];
    }
-   assert(numbytes>=0);
-   (*size) = numbytes;
-   if (numbytes > 0) {
-      if (block == 1) {
-         goto again;
+   if (cl->queue == NULL) {
+      cl->queue = (tcpip_shared_buffer_t **) calloc(c->queue_len, sizeof(tcpip_shared_buffer_t *));
+      if (cl->queue == NULL) {
+         VERBOSE(CL_ERROR, "Not enough memory for new client.");
+         return -1;
       }
-      (*data) = p;
-      return TRAP_E_TIMEOUT;
-   } else if (numbytes == 0) {
-      (*data) = NULL;
-      return TRAP_E_OK;
    }
-failure:
-   (*data) = NULL;
-   (*size) = 0;
-   return res;
+   cl->id = c->next_client_id++;
+   cl->queue_head = 0;
+   cl->queue_len = 0;
+   cl->sent_bytes = 0;
+   cl->want_write = 0;
+   cl->dropped_buffers = 0;
+   cl->codec_pending = (c->codec != NULL);
+   cl->compress = 0;
+
+   memset(&ev, 0, sizeof(ev));
+   ev.events = EPOLLIN | EPOLLRDHUP;
+   ev.data.u64 = TCPIP_CLIENT_EVENT_DATA(cl, i);
+   if (epoll_ctl(c->epoll_sd, EPOLL_CTL_ADD, sd, &ev) == -1) {
+      VERBOSE(CL_ERROR, "epoll_ctl() failed (%d): %s", errno, strerror(errno));
+      return -1;
+   }
+   cl->sd = sd;
+   c->connected_clients++;
+   return i;
+}
+
+/**
+ * \brief Send as much data from queue of client as possible without blocking.
+ *
+ * Buffers are sent in batches using sendmsg(), the send cursor of client
+ * is moved and completely sent buffers are released.
+ * \param[in] c  private data
+ * \param[in] cl client
+ * \return TRAP_E_OK when queue is empty, TRAP_E_TIMEOUT when socket is full, TRAP_E_IO_ERROR when client disconnected
+ */
+static int client_send_queue(tcpip_sender_private_t *c, struct client_s *cl)
+{
+   struct iovec iov[TCPIP_IOV_BATCH];
+   struct msghdr msg;
+   tcpip_shared_buffer_t *b;
+   uint32_t i, cnt, rest;
+   ssize_t sent_b;
+
+   while (cl->queue_len > 0) {
+      cnt = (cl->queue_len < TCPIP_IOV_BATCH ? cl->queue_len : TCPIP_IOV_BATCH);
+      for (i = 0; i < cnt; i++) {
+         b = cl->queue[(cl->queue_head + i) % c->queue_len];
+         iov[i].iov_base = b->data;
+         iov[i].iov_len = b->size;
+      }
+      iov[0].iov_base = (uint8_t *) iov[0].iov_base + cl->sent_bytes;
+      iov[0].iov_len -= cl->sent_bytes;
+
+      memset(&msg, 0, sizeof(msg));
+      msg.msg_iov = iov;
+      msg.msg_iovlen = cnt;
+      sent_b = sendmsg(cl->sd, &msg, MSG_NOSIGNAL | MSG_DONTWAIT);
+      if (sent_b == -1) {
+         if ((errno == EAGAIN) || (errno == EWOULDBLOCK)) {
+            return TRAP_E_TIMEOUT;
+         } else if (errno == EINTR) {
+            continue;
+         }
+         VERBOSE(CL_VERBOSE_OFF, "Disconnected client (%i)", errno);
+         return TRAP_E_IO_ERROR;
+      }
+      DEBUG_IFC(VERBOSE(CL_VERBOSE_LIBRARY, "sendmsg sent: %zd B to client %"PRIu32, sent_b, cl->id));
+
+      /* move cursor, release completely sent buffers */
+      while (sent_b > 0) {
+         b = cl->queue[cl->queue_head];
+         rest = b->size - cl->sent_bytes;
+         if (sent_b < rest) {
+            cl->sent_bytes += sent_b;
+            break;
+         }
+         sent_b -= rest;
+         cl->sent_bytes = 0;
+         cl->queue[cl->queue_head] = NULL;
+         cl->queue_head = (cl->queue_head + 1) % c->queue_len;
+         cl->queue_len--;
+         shared_buffer_release(c, b);
+      }
+   }
+   return TRAP_E_OK;
+}
+
+/**
+ * \brief Send queued data of client and update its epoll events.
+ *
+ * sending_lock must be held by caller.
+ * \param[in] c  private data
+ * \param[in] cl_id  index of client
+ */
+static void client_flush(tcpip_sender_private_t *c, int32_t cl_id)
+{
+   switch (client_send_queue(c, &c->clients[cl_id])) {
+   case TRAP_E_OK:
+      client_set_want_write(c, cl_id, 0);
+      break;
+   case TRAP_E_TIMEOUT:
+      client_set_want_write(c, cl_id, 1);
+      break;
+   default:
+      VERBOSE(CL_VERBOSE_LIBRARY, "Disconnected client.");
+      server_disconnected_client(c, cl_id);
+      break;
+   }
+}
+
+/**
+ * \brief Function for I/O thread - sends queued buffers to clients and detects disconnections.
+ *
+ * The thread waits for events of all clients using epoll, it finishes when
+ * term_pipe is closed by tcpip_sender_terminate().
+ * \param[in] arg  tcpip_sender_private_t structure (private data)
+ * \return NULL
+ */
+static void *sender_io_thread(void *arg)
+{
+   tcpip_sender_private_t *c = (tcpip_sender_private_t *) arg;
+   struct epoll_event events[TCPIP_EPOLL_EVENTS];
+   uint8_t buffer[DEFAULT_MAX_DATA_LENGTH];
+   struct client_s *cl;
+   ssize_t readbytes;
+   uint32_t cl_id;
+   int i, n;
+   char terminate = 0;
+
+   while (terminate == 0) {
+      n = epoll_wait(c->epoll_sd, events, TCPIP_EPOLL_EVENTS, -1);
+      if (n == -1) {
+         if (errno == EINTR) {
+            continue;
+         }
+         VERBOSE(CL_ERROR, "epoll_wait() failed (%d): %s", errno, strerror(errno));
+         break;
+      }
+
+      pthread_mutex_lock(&c->sending_lock);
+      for (i = 0; i < n; i++) {
+         if (events[i].data.u64 == TCPIP_TERM_EVENT_DATA) {
+            terminate = 1;
+            continue;
+         }
+         cl_id = (uint32_t) events[i].data.u64;
+         if (cl_id >= c->clients_arr_size) {
+            continue;
+         }
+         cl = &c->clients[cl_id];
+         if ((cl->sd < 0) || (TCPIP_CLIENT_EVENT_DATA(cl, cl_id) != events[i].data.u64)) {
+            /* event of client that has already been disconnected */
+            continue;
+         }
+         if (events[i].events & (EPOLLIN | EPOLLRDHUP | EPOLLHUP | EPOLLERR)) {
+            /* clients send only reply to offered compression, otherwise readable socket means disconnection */
+            readbytes = recv(cl->sd, buffer, DEFAULT_MAX_DATA_LENGTH, MSG_NOSIGNAL | MSG_DONTWAIT);
+            if ((readbytes == 0) || ((readbytes == -1) && (errno != EAGAIN) && (errno != EINTR))) {
+               VERBOSE(CL_VERBOSE_LIBRARY, "Disconnected client.");
+               server_disconnected_client(c, cl_id);
+               continue;
+            }
+            if ((readbytes > 0) && cl->codec_pending) {
+               /* hello_msg_reply_t */
+               cl->codec_pending = 0;
+               if (buffer[0] == c->codec->id) {
+                  VERBOSE(CL_VERBOSE_LIBRARY, "Client %"PRIu32" accepted compression.", cl->id);
+                  cl->compress = 1;
+                  c->codec_clients++;
+               }
+            }
+         }
+         if (events[i].events & EPOLLOUT) {
+            client_flush(c, cl_id);
+         }
+      }
+      /* queues were shortened, wake up blocked sender */
+      pthread_cond_broadcast(&c->queue_cond);
+      pthread_mutex_unlock(&c->sending_lock);
+   }
+   pthread_exit(NULL);
 }
 
 /**
@@ -1006,20 +1352,32 @@ failure:
  */
 static inline char check_connected_clients(tcpip_sender_private_t *config)
 {
-   pthread_mutex_lock(&config->lock);
+   pthread_mutex_lock(&config->sending_lock);
    if (config->connected_clients == 0) {
-      pthread_mutex_unlock(&config->lock);
+      pthread_mutex_unlock(&config->sending_lock);
       return 0;
    }
-   pthread_mutex_unlock(&config->lock);
+   pthread_mutex_unlock(&config->sending_lock);
    return 1;
 }
 
-typedef enum tcpip_sender_result {
-   EVERYBODY_PASSED,
-   EVERYBODY_TIMEDOUT,
-   SOMEBODY_TIMEDOUT
-} tcpip_sender_result_t;
+/**
+ * Check if queue of any client is full.
+ *
+ * sending_lock must be held by caller.
+ * \return non-zero if there is a client with full queue
+ */
+static inline char check_full_queues(tcpip_sender_private_t *c)
+{
+   int32_t i;
+
+   for (i = 0; i < c->clients_arr_size; ++i) {
+      if ((c->clients[i].sd >= 0) && (c->clients[i].queue_len >= c->queue_len)) {
+         return 1;
+      }
+   }
+   return 0;
+}
 
 /**
  * \brief Check if we have connected clients and wait for them.
@@ -1058,258 +1416,198 @@ static inline int tcpip_sender_conn_phase(tcpip_sender_private_t *config, struct
    return TRAP_E_OK;
 }
 
+/**
+ * \brief Compress buffer into codec_next for clients that accepted compression.
+ *
+ * It is called by sending thread without sending_lock, codec_state and
+ * codec_next are not used by other threads.
+ * \param[in] c  private data
+ * \param[in] data  buffer (trap_buffer_header_t followed by payload)
+ * \param[in] size  size of buffer
+ * \return codec_next with compressed buffer, NULL when the buffer should be sent uncompressed
+ */
+static tcpip_shared_buffer_t *tcpip_sender_compress(tcpip_sender_private_t *c, const void *data, uint32_t size)
+{
+   tcpip_shared_buffer_t *b = c->codec_next;
+   trap_codec_header_t *header;
+   uint32_t payload_size = size - sizeof(trap_buffer_header_t);
+   size_t compressed_size;
+
+   if ((b == NULL) || (size <= sizeof(trap_buffer_header_t))) {
+      return NULL;
+   }
+   if (payload_size < c->codec_min) {
+      c->codec_skipped++;
+      return NULL;
+   }
+   /* compressed buffer: length header with flag, codec header, compressed payload,
+      it is used only when it is smaller than the original one */
+   header = (trap_codec_header_t *) (b->data + sizeof(trap_buffer_header_t));
+   compressed_size = payload_size - sizeof(trap_codec_header_t) - 1;
+   c->codec_raw_bytes += size;
+   if (c->codec->compress(c->codec_state, (const uint8_t *) data + sizeof(trap_buffer_header_t), payload_size,
+                          (uint8_t *) (header + 1), &compressed_size) != 0) {
+      c->codec_bytes += size;
+      return NULL;
+   }
+   ((trap_buffer_header_t *) b->data)->data_length = htonl(TRAP_CODEC_COMPRESSED | (compressed_size + sizeof(trap_codec_header_t)));
+   header->codec = c->codec->id;
+   memset(header->reserved, 0, sizeof(header->reserved));
+   header->raw_length = htonl(payload_size);
+   b->size = sizeof(trap_buffer_header_t) + sizeof(trap_codec_header_t) + compressed_size;
+   c->codec_bytes += b->size;
+   return b;
+}
+
 /**
  * \brief Send data to all connected clients.
  *
- * All clients are in 'current' buffer or in 'backup' buffer.
- * All clients get messages from current buffer at first.
- * * When all buffer is successfully sent to all clients
- * in 'current' buffer, everything is alright.
+ * Data are copied into a shared buffer that is appended into queues of all
+ * clients.  Every client has its own send cursor, the buffer is returned
+ * into the pool when all clients have sent it.  Queues are sent immediately
+ * when possible, the rest is sent by the I/O thread.
  *
- * * When everybody fails due to timeout, everything
- * is alright, everybody stays in 'current' buffer.
+ * When queue of some client is full, the behavior depends on slow client
+ * policy:
  *
- * * When somebody fails and somebody is successful, failing clients are moved into 'backup' buffer and they have chance to receive the rest of message later. We disconnect all clients that were in 'backup' buffer before moving new ones from 'current' buffer.
+ * * block - wait until there is space in all queues (limited by timeout),
+ * * drop - the buffer is not enqueued for the slow client,
+ * * disconnect - the slow client is disconnected.
  *
- * * All successful clients from 'backup' buffer are moved back into 'current' buffer.
+ * Clients that accepted compression get compressed copy of the buffer,
+ * it is prepared before sending_lock is taken.
  *
  * \param[in] priv  pointer to module private data
  * \param[in] data  pointer to data to send
  * \param[in] size  size of data to send
  * \param[in] timeout  timeout in microseconds
- * \return 0 on success (TRAP_E_OK), TRAP_E_BAD_FPARAMS if sender was not properly initialized, TRAP_E_TERMINATED if interface was terminated.
+ * \return 0 on success (TRAP_E_OK), TRAP_E_TIMEOUT if there is no client or slow client blocks sending, TRAP_E_TERMINATED if interface was terminated.
  */
 int tcpip_sender_send(void *priv, const void *data, uint32_t size, int timeout)
 {
-   uint8_t buffer[DEFAULT_MAX_DATA_LENGTH];
-   int result = TRAP_E_TIMEOUT;
    tcpip_sender_private_t *c = (tcpip_sender_private_t *) priv;
-   /* timeout for select */
-   struct timeval tv;
    /* timeout for sem_timedwait */
    struct timespec ts = { .tv_sec = 0, .tv_nsec = 0 };
-   fd_set set, disset;
-   int maxsd = -1;
+   struct timeval tv;
+   tcpip_shared_buffer_t *b, *bz = NULL, *qb;
    struct client_s *cl;
-   uint32_t i, j, failed, passed;
-   int retval;
-   ssize_t readbytes;
-   /* first timestamp for global timeout in this function...
-    * in the RESET state, we should check the timeout given by caller
-    * with elapsed time from entry_time.
-    * Timeout is in microseconds... */
-
+   int32_t i;
+   int result;
+   char blocked = 0;
+   /* first timestamp for global timeout in this function,
+    * timeout is in microseconds... */
    uint64_t entry_time = get_cur_timestamp();
-   uint64_t curr_time = 0, elapsed_time;
-
-   char block = ((timeout == TRAP_WAIT || timeout == TRAP_HALFWAIT) ? 1 : 0);
-
-   /* pointer to timeout for select() */
-   struct timeval *tv_p = ((block != 0) ? NULL : &tv);
-   /* pointer to timeout for sem_timedwait() */
-   struct timespec *ts_p = &ts;
+   uint64_t elapsed_time, wait_time;
 
    /* correct module will pass only possitive timeout or TRAP_WAIT, TRAP_HALFWAIT */
    assert(timeout >= TRAP_HALFWAIT);
+   assert(size <= TRAP_IFC_MESSAGEQ_SIZE + sizeof(trap_buffer_header_t));
 
-   /* I. Init phase: set timeout and double-send switch */
-
-blocking_repeat:
-
+repeat:
    if (c->is_terminated) {
       return TRAP_E_TERMINATED;
    }
 
-   switch (timeout) {
-   case TRAP_WAIT:
+   /* I. Check connected clients and wait for them when blocking */
+   if (timeout == TRAP_WAIT) {
       trap_set_timeouts(1000000, &tv, &ts);
-      break;
-   case TRAP_HALFWAIT:
-      /*
-       * wait 1s in a loop for select(),
-       * do not change timeout for sem_timedwait in connphase
-       */
-      trap_set_timeouts(1000000, &tv, NULL);
-      break;
-   default:
-      /*
-       * set timeout (can be 0 - nowait or any positive number) for select(),
-       * do not change timeout for sem_timedwait in connphase
-       */
-      trap_set_timeouts(timeout, &tv, NULL);
-      break;
    }
-
-   /* Check connected clients and wait for them when blocking */
-   result = tcpip_sender_conn_phase(c, ts_p);
+   result = tcpip_sender_conn_phase(c, &ts);
    if (result != TRAP_E_OK) {
+      if ((result == TRAP_E_TIMEOUT) && (timeout == TRAP_WAIT)) {
+         goto repeat;
+      }
       /* it is useless to send when nobody receives */
-      goto exit;
+      return result;
    }
 
-   FD_ZERO(&disset);
-   FD_ZERO(&set);
-
-   /*
-    * add term_pipe for reading into the disconnect client set
-    */
-   FD_SET(c->term_pipe[0], &disset);
-   if (maxsd < c->term_pipe[0]) {
-      maxsd = c->term_pipe[0];
+   if ((bz == NULL) && (c->codec_clients > 0)) {
+      bz = tcpip_sender_compress(c, data, size);
    }
 
-   for (i = 0, j = 0; i < c->clients_arr_size; ++i) {
-      cl = &c->clients[i];
-      if (j == c->connected_clients) {
-         break;
-      }
-      if (cl->sd <= 0) {
-         /* not connected client */
-         continue;
-      }
-      j++;
-      if (maxsd < cl->sd) {
-         maxsd = cl->sd;
-      }
-      /* check if client is still connected */
-      FD_SET(cl->sd, &disset);
-      if (cl->client_state != CURRENT_COMPLETE) {
-         /* check if client is ready for message */
-         FD_SET(cl->sd, &set);
-      }
-   }
+   pthread_mutex_lock(&c->sending_lock);
 
-   retval = select(maxsd + 1, &disset, &set, NULL, tv_p);
-   if ((retval == 0) || (retval < 0 && errno == EINTR)) {
-      if (block == 0) {
-         /* non-blocking mode */
-         curr_time = get_cur_timestamp();
-         elapsed_time = (curr_time - entry_time);
+   /* II. Wait for slow clients */
+   while ((c->slow_policy == TCPIP_SLOW_BLOCK) && (check_full_queues(c) != 0)) {
+      if (blocked == 0) {
+         blocked = 1;
+         c->slow_blocked++;
+      }
+      if ((timeout == TRAP_WAIT) || (timeout == TRAP_HALFWAIT)) {
+         /* wait in 1s steps to check termination */
+         wait_time = 1000000;
+      } else {
+         elapsed_time = get_cur_timestamp() - entry_time;
          if (elapsed_time >= timeout) {
-            result = TRAP_E_TIMEOUT;
-            goto exit;
-         } else {
-            /* elapsed_time is lower than timeout,
-             * decrease timeout and repeat the call.
-             */
-            timeout -= elapsed_time;
-            goto blocking_repeat;
+            c->slow_timeouts++;
+            pthread_mutex_unlock(&c->sending_lock);
+            return TRAP_E_TIMEOUT;
          }
-      } else {
-         /* blocking mode */
-         goto blocking_repeat;
+         wait_time = timeout - elapsed_time;
       }
-   } else if (retval < 0) {
-      if (c->is_terminated != 0) {
-         goto exit;
-      } else if (errno == EBADF) {
-         assert(0);
-         result = TRAP_E_IO_ERROR;
-         goto exit;
+      clock_gettime(CLOCK_MONOTONIC, &ts);
+      ts.tv_sec += wait_time / 1000000;
+      ts.tv_nsec += (wait_time % 1000000) * 1000;
+      if (ts.tv_nsec >= 1000000000) {
+         ts.tv_sec++;
+         ts.tv_nsec -= 1000000000;
       }
+      pthread_cond_timedwait(&c->queue_cond, &c->sending_lock, &ts);
+      if (c->is_terminated) {
+         pthread_mutex_unlock(&c->sending_lock);
+         return TRAP_E_TERMINATED;
+      }
+   }
+   if (c->connected_clients == 0) {
+      /* clients disconnected meanwhile */
+      pthread_mutex_unlock(&c->sending_lock);
+      goto repeat;
    }
 
-   passed = failed = 0;
+   /* III. Enqueue data for all clients */
+   b = shared_buffer_get(c);
+   if (b == NULL) {
+      pthread_mutex_unlock(&c->sending_lock);
+      return trap_error(c->ctx, TRAP_E_MEMORY);
+   }
+   memcpy(b->data, data, size);
+   b->size = size;
 
-   pthread_mutex_lock(&c->sending_lock);
-   for (i = 0, j = 0; i < c->clients_arr_size; ++i) {
-      if (j == c->connected_clients) {
-         break;
-      }
+   for (i = 0; i < c->clients_arr_size; ++i) {
       cl = &c->clients[i];
-      if(cl->sd == -1) {
+      if (cl->sd < 0) {
          continue;
       }
-      if (FD_ISSET(cl->sd, &disset)) {
-         /* client disconnects */
-         readbytes = recv(cl->sd, buffer, DEFAULT_MAX_DATA_LENGTH, MSG_NOSIGNAL | MSG_DONTWAIT);
-         if (readbytes < 1) {
-            VERBOSE(CL_VERBOSE_LIBRARY, "Disconnected client.");
-            result = TRAP_E_IO_ERROR;
+      if (cl->queue_len >= c->queue_len) {
+         /* slow client, the block policy never gets here */
+         if (c->slow_policy == TCPIP_SLOW_DROP) {
+            cl->dropped_buffers++;
+            c->slow_dropped++;
+         } else {
+            VERBOSE(CL_VERBOSE_LIBRARY, "Disconnecting slow client %"PRIu32".", cl->id);
+            c->slow_disconnected++;
             server_disconnected_client(c, i);
-            continue;
-         }
-      }
-
-      if (FD_ISSET(cl->sd, &set)) {
-         if (j == c->connected_clients) {
-            break;
          }
-         /* we added only clients whose sending is not CURRENT_COMPLETE */
-         if ((cl->sending_pointer == NULL) || (cl->pending_bytes == 0)) {
-            cl->sending_pointer = (void *) data;
-            cl->pending_bytes = size;
-         }
-         result = send_all_data(c, cl->sd, &cl->sending_pointer, &cl->pending_bytes, block);
-         switch (result) {
-         case TRAP_E_IO_ERROR:
-            server_disconnected_client(c, i);
-            failed++;
-            break;
-         case TRAP_E_OK:
-            passed++;
-            cl->client_state = CURRENT_COMPLETE;
-            break;
-         case TRAP_E_TIMEOUT:
-            failed++;
-            break;
-         }
-         j++;
+         continue;
       }
-      if (c->connected_clients == 0) {
-         /* there is no client to send to */
-         result = TRAP_E_IO_ERROR;
-         break;
+      qb = ((cl->compress && (bz != NULL)) ? bz : b);
+      cl->queue[(cl->queue_head + cl->queue_len) % c->queue_len] = qb;
+      cl->queue_len++;
+      qb->refcount++;
+      if (cl->want_write == 0) {
+         /* socket of client was writable, do not wait for I/O thread */
+         client_flush(c, i);
       }
    }
-   pthread_mutex_unlock(&c->sending_lock);
-
-   if (FD_ISSET(c->term_pipe[0], &disset)) {
-      /* Sending was interrupted by terminate(), exit even from TRAP_WAIT function call. */
-      return TRAP_E_TERMINATED;
-   }
-
-   if (failed != 0) {
-      result = TRAP_E_TIMEOUT;
-   } else {
-      for (i = 0, passed = 0; i < c->clients_arr_size; ++i) {
-         cl = &c->clients[i];
-         if ((cl->sd > 0) && (cl->client_state == CURRENT_COMPLETE) && (cl->sending_pointer == NULL)) {
-            passed++;
-            if (passed == c->connected_clients) {
-               break;
-            }
-         }
-      }
-      if (passed == c->connected_clients) {
-         /* there is no client that failed */
-         for (i = 0, j = 0; i < c->clients_arr_size; ++i) {
-            cl = &c->clients[i];
-            if ((cl->sd > 0) && (cl->client_state == CURRENT_COMPLETE)) {
-               cl->client_state = CURRENT_IDLE;
-               j++;
-               if (j == passed) {
-                  break;
-               }
-            }
-         }
-         result = TRAP_E_OK;
-      } else {
-         if (block != 0) {
-            goto blocking_repeat;
-         }
-      }
+   shared_buffer_release(c, b);
+   if (bz != NULL) {
+      /* compressed buffer is shared by clients now, prepare the next one */
+      shared_buffer_release(c, bz);
+      c->codec_next = shared_buffer_get(c);
    }
 
-exit:
-   /*
-    * Return to blocking_repeat ONLY when the timeout is TRAP_WAIT.
-    * TRAP_HALFWAIT is handled before.
-    */
-   if ((timeout == TRAP_WAIT) && ((result != TRAP_E_OK) || (c->connected_clients == 0))) {
-      goto blocking_repeat;
-   }
-   return result;
+   pthread_mutex_unlock(&c->sending_lock);
+   return TRAP_E_OK;
 }
 
 
@@ -1322,14 +1620,56 @@ void tcpip_sender_terminate(void *priv)
    tcpip_sender_private_t *c = (tcpip_sender_private_t *) priv;
    if (c != NULL) {
       c->is_terminated = 1;
-      close(c->term_pipe[1]);
-      VERBOSE(CL_VERBOSE_LIBRARY, "Closed term_pipe, it should break select()");
+      if (c->term_pipe[1] != -1) {
+         close(c->term_pipe[1]);
+         c->term_pipe[1] = -1;
+      }
+      VERBOSE(CL_VERBOSE_LIBRARY, "Closed term_pipe, it should break epoll_wait()");
    } else {
       VERBOSE(CL_ERROR, "Destroying IFC that is probably not initialized.");
    }
    return;
 }
 
+/**
+ * \brief Try to deliver buffers that remained in queues of clients.
+ *
+ * It is called by destructor after I/O thread finished, waiting is
+ * limited by #TCPIP_DRAIN_TIMEOUT in total.
+ * \param[in] c  private data
+ */
+static void tcpip_sender_drain(tcpip_sender_private_t *c)
+{
+   uint64_t deadline = get_cur_timestamp() + TCPIP_DRAIN_TIMEOUT, now;
+   struct pollfd pfd;
+   struct client_s *cl;
+   int32_t i;
+   int res;
+
+   pthread_mutex_lock(&c->sending_lock);
+   for (i = 0; i < c->clients_arr_size; ++i) {
+      cl = &c->clients[i];
+      while ((cl->sd >= 0) && (cl->queue_len > 0)) {
+         res = client_send_queue(c, cl);
+         if (res == TRAP_E_IO_ERROR) {
+            server_disconnected_client(c, i);
+            break;
+         } else if (res == TRAP_E_OK) {
+            break;
+         }
+         now = get_cur_timestamp();
+         if (now >= deadline) {
+            VERBOSE(CL_VERBOSE_LIBRARY, "Queued data of slow clients were not delivered.");
+            goto exit;
+         }
+         pfd.fd = cl->sd;
+         pfd.events = POLLOUT;
+         poll(&pfd, 1, (deadline - now) / 1000 + 1);
+      }
+   }
+exit:
+   pthread_mutex_unlock(&c->sending_lock);
+}
 
 /**
  * \brief Destructor of TCP sender (output ifc)
@@ -1338,6 +1678,7 @@ void tcpip_sender_terminate(void *priv)
 void tcpip_sender_destroy(void *priv)
 {
    tcpip_sender_private_t *c = (tcpip_sender_private_t *) priv;
+   tcpip_shared_buffer_t *b;
    struct client_s *cl;
    char *unix_socket_path = NULL;
    void *res;
@@ -1362,31 +1703,60 @@ void tcpip_sender_destroy(void *priv)
          pthread_cancel(c->accept_thread);
          pthread_join(c->accept_thread, &res);
       }
+      if (c->io_thread_running) {
+         if (c->term_pipe[1] != -1) {
+            close(c->term_pipe[1]);
+            c->term_pipe[1] = -1;
+         }
+         pthread_join(c->io_thread, &res);
+      }
 
       /* close server socket */
       close(c->server_sd);
 
+      if (c->epoll_sd != -1) {
+         tcpip_sender_drain(c);
+      }
+
       /* disconnect all clients */
-      pthread_mutex_lock(&c->lock);
+      pthread_mutex_lock(&c->sending_lock);
       if (c->clients != NULL) {
          for (i = 0; i < c->clients_arr_size; i++) {
             cl = &c->clients[i];
-            if (cl->sd > 0) {
+            if (cl->sd >= 0) {
                close(cl->sd);
                cl->sd = -1;
                c->connected_clients--;
             }
-            X(cl->buffer);
+            client_queue_release(c, cl);
+            X(cl->queue);
          }
          free(c->clients);
          c->clients = NULL;
       }
-      pthread_mutex_unlock(&c->lock);
+      while (c->free_buffers != NULL) {
+         b = c->free_buffers;
+         c->free_buffers = b->next;
+         free(b);
+      }
+      X(c->codec_next);
+      if (c->codec_state != NULL) {
+         c->codec->free(c->codec_state, 1);
+         c->codec_state = NULL;
+      }
+      pthread_mutex_unlock(&c->sending_lock);
+
+      if (c->epoll_sd != -1) {
+         close(c->epoll_sd);
+      }
+      if (c->term_pipe[0] != -1) {
+         close(c->term_pipe[0]);
+      }
       pthread_mutex_destroy(&c->lock);
       pthread_mutex_destroy(&c->sending_lock);
+      pthread_cond_destroy(&c->queue_cond);
       sem_destroy(&c->have_clients);
 
-      X(c->backup_buffer)
       X(c)
    }
 #undef X
@@ -1400,12 +1770,45 @@ int32_t tcpip_sender_get_client_count(void *priv)
    if (c == NULL) {
       return 0;
    }
-   pthread_mutex_lock(&c->lock);
+   pthread_mutex_lock(&c->sending_lock);
    client_count = c->connected_clients;
-   pthread_mutex_unlock(&c->lock);
+   pthread_mutex_unlock(&c->sending_lock);
    return client_count;
 }
 
+/**
+ * \brief Add counters of slow client handling and compression into statistics of interface.
+ * \param[in] priv  pointer to module private data
+ * \param[in,out] stats  JSON object with counters of the interface
+ */
+static void tcpip_sender_get_stats(void *priv, json_t *stats)
+{
+   tcpip_sender_private_t *c = (tcpip_sender_private_t *) priv;
+   json_int_t queued = 0;
+   int32_t i;
+
+   pthread_mutex_lock(&c->sending_lock);
+   for (i = 0; i < c->clients_arr_size; i++) {
+      if (c->clients[i].sd >= 0) {
+         queued += c->clients[i].queue_len;
+      }
+   }
+   json_object_set_new(stats, "slow-client-policy", json_string(TCPIP_SLOW_POLICY_STR(c->slow_policy)));
+   json_object_set_new(stats, "queued-buffers", json_integer(queued));
+   json_object_set_new(stats, "slow-blocked", json_integer(c->slow_blocked));
+   json_object_set_new(stats, "slow-timeouts", json_integer(c->slow_timeouts));
+   json_object_set_new(stats, "slow-dropped-buffers", json_integer(c->slow_dropped));
+   json_object_set_new(stats, "slow-disconnected-clients", json_integer(c->slow_disconnected));
+   if (c->codec != NULL) {
+      json_object_set_new(stats, "codec", json_string(c->codec->name));
+      json_object_set_new(stats, "codec-clients", json_integer(c->codec_clients));
+      json_object_set_new(stats, "codec-raw-bytes", json_integer(c->codec_raw_bytes));
+      json_object_set_new(stats, "codec-bytes", json_integer(c->codec_bytes));
+      json_object_set_new(stats, "codec-skipped-buffers", json_integer(c->codec_skipped));
+   }
+   pthread_mutex_unlock(&c->sending_lock);
+}
+
 static void tcpip_sender_create_dump(void *priv, uint32_t idx, const char *path)
 {
    tcpip_sender_private_t *c = (tcpip_sender_private_t *) priv;
@@ -1428,26 +1831,36 @@ static void tcpip_sender_create_dump(void *priv, uint32_t idx, const char *path)
       goto exit;
    }
    f = fopen(conf_file, "w");
+   pthread_mutex_lock(&c->sending_lock);
    fprintf(f, "Server port: %s\nServer socket descriptor: %d\n"
-           "Connected clients: %d\nMax clients: %d\nBuffering layer buffer: %p\n"
+           "Connected clients: %d\nMax clients: %"PRIu32"\nBuffering layer buffer: %p\n"
            "Buffering layer buffer size: %"PRIu32"\n"
-           "Backup buffer: %p\nTerminated: %d\nInitialized: %d\nSocket type: %s\n"
+           "Queue length: %"PRIu32"\nSlow client policy: %s\n"
+           "Slow clients: blocked %"PRIu64", timeouts %"PRIu64", dropped buffers %"PRIu64", disconnected %"PRIu64"\n"
+           "Codec: %s (level %d, min %"PRIu32" B, clients %"PRId32", %"PRIu64" B -> %"PRIu64" B)\n"
+           "Terminated: %d\nInitialized: %d\nSocket type: %s\n"
            "Message size: %"PRIu32"\nTimeout: %"PRId32"us (%s)\n"
            "Clients:\n",
-           c->server_port, c->server_sd, c->connected_clients, c->clients_arr_size,
+           c->server_port, c->server_sd, c->connected_clients, c->max_clients,
            c->ctx->out_ifc_list[idx].buffer,
            c->ctx->out_ifc_list[idx].buffer_index,
-           c->backup_buffer, c->is_terminated,
+           c->queue_len, TCPIP_SLOW_POLICY_STR(c->slow_policy),
+           c->slow_blocked, c->slow_timeouts, c->slow_dropped, c->slow_disconnected,
+           (c->codec != NULL ? c->codec->name : "none"), c->codec_level, c->codec_min, c->codec_clients,
+           c->codec_raw_bytes, c->codec_bytes,
+           c->is_terminated,
            c->initialized, TCPIP_SOCKETTYPE_STR(c->socket_type),
            c->int_mess_header.data_length,
            c->ctx->out_ifc_list[idx].datatimeout,
            TRAP_TIMEOUT_STR(c->ctx->out_ifc_list[idx].datatimeout));
    for (i = 0; i < c->clients_arr_size; i++) {
       cl = &c->clients[i];
-      fprintf(f, "\t{%"PRId32", %s, %p, %"PRIu32"}\n",
-              cl->sd, TCPIP_SENDER_STATE_STR(cl->client_state),
-              cl->sending_pointer, cl->pending_bytes);
+      fprintf(f, "\t{%"PRId32", %"PRIu32", queued %"PRIu32", sent %"PRIu32" B, %s, dropped %"PRIu64"%s}\n",
+              cl->sd, cl->id, cl->queue_len, cl->sent_bytes,
+              (cl->want_write ? "WAITING" : "IDLE"), cl->dropped_buffers,
+              (cl->compress ? ", compressed" : ""));
    }
+   pthread_mutex_unlock(&c->sending_lock);
 
    fclose(f);
    f = NULL;
@@ -1488,20 +1901,18 @@ exit:
 void server_disconnect_all_clients(void *priv)
 {
    tcpip_sender_private_t *c = (tcpip_sender_private_t *) priv;
-   struct client_s *cl;
    int32_t i;
 
    pthread_mutex_lock(&c->lock);
+   pthread_mutex_lock(&c->sending_lock);
    if (c->clients != NULL) {
       for (i = 0; i < c->clients_arr_size; i++) {
-         cl = &c->clients[i];
-         if (cl->sd > 0) {
-            close(cl->sd);
-            cl->sd = -1;
-            c->connected_clients--;
+         if (c->clients[i].sd >= 0) {
+            server_disconnected_client(c, i);
          }
       }
    }
+   pthread_mutex_unlock(&c->sending_lock);
    pthread_mutex_unlock(&c->lock);
 }
 
@@ -1518,14 +1929,74 @@ char *tcpip_send_ifc_get_id(void *priv)
    return config->server_port;
 }
 
+/**
+ * \brief Parse optional parameter of output TCP/IP IFC.
+ *
+ * \param[in,out] priv  private data
+ * \param[in] param     parameter: max_clients number or key=value (slow=block|drop|disconnect, queue=N,
+ *                      compress=codec, level=N, compress_min=N)
+ * \return TRAP_E_OK on success, TRAP_E_BADPARAMS on error
+ */
+static int tcpip_sender_parse_param(tcpip_sender_private_t *priv, const char *param)
+{
+   unsigned int value;
+   int level;
+
+   if (strncmp(param, "slow=", 5) == 0) {
+      param += 5;
+      if (strcmp(param, "block") == 0) {
+         priv->slow_policy = TCPIP_SLOW_BLOCK;
+      } else if (strcmp(param, "drop") == 0) {
+         priv->slow_policy = TCPIP_SLOW_DROP;
+      } else if (strcmp(param, "disconnect") == 0) {
+         priv->slow_policy = TCPIP_SLOW_DISCONNECT;
+      } else {
+         VERBOSE(CL_ERROR, "Unknown slow client policy '%s', expected block, drop or disconnect.", param);
+         return TRAP_E_BADPARAMS;
+      }
+   } else if (strncmp(param, "queue=", 6) == 0) {
+      if ((sscanf(param + 6, "%u", &value) != 1) || (value == 0)) {
+         VERBOSE(CL_ERROR, "Length of queue '%s' must be a positive number.", param + 6);
+         return TRAP_E_BADPARAMS;
+      }
+      priv->queue_len = value;
+   } else if (strncmp(param, "compress=", 9) == 0) {
+      priv->codec = trap_codec_by_name(param + 9, strlen(param + 9));
+      if (priv->codec == NULL) {
+         VERBOSE(CL_ERROR, "Unsupported codec '%s'.", param + 9);
+         return TRAP_E_BADPARAMS;
+      }
+   } else if (strncmp(param, "level=", 6) == 0) {
+      if (sscanf(param + 6, "%d", &level) != 1) {
+         VERBOSE(CL_ERROR, "Compression level '%s' must be a number.", param + 6);
+         return TRAP_E_BADPARAMS;
+      }
+      priv->codec_level = level;
+   } else if (strncmp(param, "compress_min=", 13) == 0) {
+      if (sscanf(param + 13, "%u", &value) != 1) {
+         VERBOSE(CL_ERROR, "Minimal size of compressed buffer '%s' must be a number.", param + 13);
+         return TRAP_E_BADPARAMS;
+      }
+      priv->codec_min = value;
+   } else if (sscanf(param, "%u", &value) == 1) {
+      priv->max_clients = value;
+   } else {
+      VERBOSE(CL_ERROR, "Optional max client number given, but it is probably in wrong format.");
+   }
+   return TRAP_E_OK;
+}
+
 /**
  * \brief Constructor of output TCP/IP IFC module.
  * This function is called by TRAP library to initialize one output interface.
  *
  * \param[in,out] ctx  Pointer to the private libtrap context data (trap_ctx_init()).
- * \param[in] params   Configuration string containing space separated values of these parameters (in this exact order): *server_port* *max_clients*,
- * where dest_addr is destination address of output TCP/IP IFC module and
- * dest_port is the port where sender is listening.
+ * \param[in] params   Configuration string containing parameters separated by ':': *server_port* [*max_clients*] [slow=*policy*] [queue=*length*]
+ * [compress=*codec*] [level=*level*] [compress_min=*size*],
+ * where server_port is the port (or name of UNIX socket) where sender is listening,
+ * max_clients limits number of connected clients (0 or missing means unlimited),
+ * policy is one of block, drop, disconnect and length is the maximal number of buffers queued for one client.
+ * codec is offered to clients during negotiation, buffers with payload smaller than size are not compressed.
  * \param[in,out] ifc  IFC interface used for calling TCP/IP module.
  * \param[in] idx      Index of IFC that is created.
  * \param [in] type select the type of socket (see #tcpip_ifc_sockettype for options)
@@ -1536,10 +2007,11 @@ int create_tcpip_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_outpu
    int result = TRAP_E_OK;
    char *param_iterator = NULL;
    char *server_port = NULL;
-   char *max_clients = NULL;
+   char *param = NULL;
    tcpip_sender_private_t *priv = NULL;
-   unsigned int max_num_client = 10;
-   uint32_t i;
+   pthread_condattr_t cond_attr;
+   struct epoll_event ev;
+   int32_t i;
 
 #define X(pointer) free(pointer); \
    pointer = NULL;
@@ -1561,6 +2033,14 @@ int create_tcpip_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_outpu
    priv->ctx = ctx;
    priv->socket_type = type;
    priv->ifc_idx = idx;
+   priv->server_sd = -1;
+   priv->epoll_sd = -1;
+   priv->term_pipe[0] = -1;
+   priv->term_pipe[1] = -1;
+   priv->queue_len = TCPIP_DEFAULT_QUEUE_LEN;
+   priv->slow_policy = TCPIP_SLOW_BLOCK;
+   priv->codec_level = -1;
+   priv->codec_min = TCPIP_DEFAULT_COMPRESS_MIN;
 
    /* Parsing params */
    param_iterator = trap_get_param_by_delimiter(params, &server_port, TRAP_IFC_PARAM_DELIMITER);
@@ -1569,18 +2049,15 @@ int create_tcpip_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_outpu
       result = TRAP_E_BADPARAMS;
       goto failsafe_cleanup;
    }
-   if (param_iterator != NULL) {
+   while (param_iterator != NULL) {
       /* still having something to parse... */
-      param_iterator = trap_get_param_by_delimiter(param_iterator, &max_clients, TRAP_IFC_PARAM_DELIMITER
-);
-   }
-   if (max_clients == NULL) {
-      /* 2nd parameter became optional, set default value when missing */
-      max_num_client = TRAP_IFC_DEFAULT_MAX_CLIENTS;
-   } else {
-      if (sscanf(max_clients, "%u", &max_num_client) != 1) {
-         VERBOSE(CL_ERROR, "Optional max client number given, but it is probably in wrong format.");
-         max_num_client = TRAP_IFC_DEFAULT_MAX_CLIENTS;
+      param_iterator = trap_get_param_by_delimiter(param_iterator, &param, TRAP_IFC_PARAM_DELIMITER);
+      if (param != NULL) {
+         result = tcpip_sender_parse_param(priv, param);
+         X(param);
+         if (result != TRAP_E_OK) {
+            goto failsafe_cleanup;
+         }
       }
    }
 
@@ -1588,30 +2065,34 @@ int create_tcpip_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_outpu
    priv->int_mess_header.data_length = TRAP_IFC_MESSAGEQ_SIZE;
    /* Parsing params ended */
 
-   priv->clients_arr_size = max_num_client;
-
-   priv->clients = calloc(max_num_client, sizeof(struct client_s));
-   if (priv->clients == NULL) {
-      result = TRAP_E_MEMORY;
-      goto failsafe_cleanup;
+   if ((priv->codec != NULL) && (type != TRAP_IFC_TCPIP_SERVICE)) {
+      priv->codec_state = priv->codec->create(1, priv->codec_level);
+      priv->codec_next = shared_buffer_get(priv);
+      if ((priv->codec_state == NULL) || (priv->codec_next == NULL)) {
+         VERBOSE(CL_ERROR, "Unable to initialize codec %s.", priv->codec->name);
+         result = TRAP_E_BADPARAMS;
+         goto failsafe_cleanup;
+      }
+   } else {
+      priv->codec = NULL;
    }
 
-   /* allocate buffer according to TRAP_IFC_MESSAGEQ_SIZE with additional space for message header */
-   //priv->message_buffer = (void *) calloc(1, priv->int_mess_header.data_length +
-   //                        sizeof(trap_buffer_header_t));
-   priv->backup_buffer = (void *) calloc(1, priv->int_mess_header.data_length +
-                           sizeof(trap_buffer_header_t));
+   if (type == TRAP_IFC_TCPIP_SERVICE) {
+      /* clients of service IFC are handled directly by service thread using fixed array */
+      priv->clients_arr_size = (priv->max_clients != 0 ? priv->max_clients : TRAP_IFC_DEFAULT_MAX_CLIENTS);
+   } else {
+      priv->clients_arr_size = TCPIP_INIT_CLIENTS_ARR_SIZE;
+   }
 
+   priv->clients = calloc(priv->clients_arr_size, sizeof(struct client_s));
    if (priv->clients == NULL) {
       /* if some memory could not have been allocated, we cannot continue */
+      result = TRAP_E_MEMORY;
       goto failsafe_cleanup;
    }
-   for (i = 0; i < max_num_client; i++) {
-      /* all clients are IDLE after connection */
-      priv->clients[i].client_state = CURRENT_IDLE;
+   for (i = 0; i < priv->clients_arr_size; i++) {
       /* all clients are disconnected */
       priv->clients[i].sd = -1;
-      priv->clients[i].buffer = calloc(TRAP_IFC_MESSAGEQ_SIZE + 4, 1);
    }
 
    priv->connected_clients = 0;
@@ -1619,34 +2100,60 @@ int create_tcpip_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_outpu
    priv->is_terminated = 0;
    pthread_mutex_init(&priv->lock, NULL);
    pthread_mutex_init(&priv->sending_lock, NULL);
+   pthread_condattr_init(&cond_attr);
+   pthread_condattr_setclock(&cond_attr, CLOCK_MONOTONIC);
+   pthread_cond_init(&priv->queue_cond, &cond_attr);
+   pthread_condattr_destroy(&cond_attr);
 
-   VERBOSE(CL_VERBOSE_ADVANCED, "config:\nserver_port=\"%s\"\nmax_clients=\"%s\"\n"
-      "TDU size: %u\n(max_clients_num=\"%u\")", priv->server_port, max_clients,
-      priv->int_mess_header.data_length, priv->clients_arr_size);
-   X(max_clients);
+   VERBOSE(CL_VERBOSE_ADVANCED, "config:\nserver_port=\"%s\"\nmax_clients=\"%"PRIu32"\"\n"
+      "TDU size: %u\nqueue=%"PRIu32"\nslow=%s\ncompress=%s", priv->server_port, priv->max_clients,
+      priv->int_mess_header.data_length, priv->queue_len, TCPIP_SLOW_POLICY_STR(priv->slow_policy),
+      (priv->codec != NULL ? priv->codec->name : "none"));
 
    if (sem_init(&priv->have_clients, 0, 0) == -1) {
       VERBOSE(CL_ERROR, "Initialization of semaphore failed.");
+      result = TRAP_E_IO_ERROR;
       goto failsafe_cleanup;
    }
 
+   if (pipe(priv->term_pipe) != 0) {
+      VERBOSE(CL_ERROR, "Opening of pipe failed.");
+      priv->term_pipe[0] = -1;
+      priv->term_pipe[1] = -1;
+      result = TRAP_E_IO_ERROR;
+      goto failsafe_cleanup;
+   }
+
+   if (type != TRAP_IFC_TCPIP_SERVICE) {
+      priv->epoll_sd = epoll_create1(0);
+      if (priv->epoll_sd == -1) {
+         VERBOSE(CL_ERROR, "epoll_create1() failed (%d): %s", errno, strerror(errno));
+         result = TRAP_E_IO_ERROR;
+         goto failsafe_cleanup;
+      }
+      memset(&ev, 0, sizeof(ev));
+      ev.events = EPOLLIN;
+      ev.data.u64 = TCPIP_TERM_EVENT_DATA;
+      if (epoll_ctl(priv->epoll_sd, EPOLL_CTL_ADD, priv->term_pipe[0], &ev) == -1) {
+         VERBOSE(CL_ERROR, "epoll_ctl() failed (%d): %s", errno, strerror(errno));
+         result = TRAP_E_IO_ERROR;
+         goto failsafe_cleanup;
+      }
+   }
+
    result = server_socket_open(priv);
    if (result != TRAP_E_OK) {
       VERBOSE(CL_ERROR, "Socket could not be opened on given port '%s'.", server_port);
       goto failsafe_cleanup;
    }
 
-   if (pipe(priv->term_pipe) != 0) {
-      VERBOSE(CL_ERROR, "Opening of pipe failed. Using stdin as a fall back.");
-      priv->term_pipe[0] = 0;
-   }
-
    // Fill struct defining the interface
    ifc->disconn_clients = server_disconnect_all_clients;
    ifc->send = tcpip_sender_send;
    ifc->terminate = tcpip_sender_terminate;
    ifc->destroy = tcpip_sender_destroy;
    ifc->get_client_count = tcpip_sender_get_client_count;
+   ifc->get_stats = tcpip_sender_get_stats;
    ifc->create_dump = tcpip_sender_create_dump;
    ifc->priv = priv;
    ifc->get_id = tcpip_send_ifc_get_id;
@@ -1655,17 +2162,22 @@ int create_tcpip_sender_ifc(trap_ctx_priv_t *ctx, const char *params, trap_outpu
 
 failsafe_cleanup:
    X(server_port);
-   X(max_clients);
    if (priv != NULL) {
-      X(priv->backup_buffer);
-      if (priv->clients != NULL) {
-         for (i = 0; i < max_num_client; i++) {
-            X(priv->clients[i].buffer);
-         }
+      if (priv->epoll_sd != -1) {
+         close(priv->epoll_sd);
+      }
+      if (priv->term_pipe[0] != -1) {
+         close(priv->term_pipe[0]);
+         close(priv->term_pipe[1]);
       }
       X(priv->clients);
+      if (priv->codec_state != NULL) {
+         priv->codec->free(priv->codec_state, 1);
+      }
+      X(priv->codec_next);
       pthread_mutex_destroy(&priv->lock);
       pthread_mutex_destroy(&priv->sending_lock);
+      pthread_cond_destroy(&priv->queue_cond);
       X(priv);
    }
 #undef X
@@ -1683,12 +2195,11 @@ static void *accept_clients_thread(void *arg)
 {
    char remoteIP[INET6_ADDRSTRLEN];
    struct sockaddr_storage remoteaddr; // client address
-   struct client_s *cl;
    socklen_t addrlen;
    int newclient, fdmax;
    fd_set scset;
    tcpip_sender_private_t *c = (tcpip_sender_private_t *) arg;
-   int i;
+   int32_t cl_id;
 
    // handle new connections
    addrlen = sizeof remoteaddr;
@@ -1739,31 +2250,17 @@ static void *accept_clients_thread(void *arg)
             }
 #endif
 
-            if (c->connected_clients < c->clients_arr_size) {
-               cl = NULL;
-               for (i = 0; i < c->clients_arr_size; ++i) {
-                  if (c->clients[i].sd < 1) {
-                     cl = &c->clients[i];
-                     break;
-                  }
-               }
-               if (cl == NULL) {
-                  goto refuse_client;
-               }
-
-               cl->sd = newclient;
-               cl->client_state = CURRENT_IDLE;
-               cl->sending_pointer = NULL;
-               cl->pending_bytes = 0;
-               c->connected_clients++;
-
+            pthread_mutex_lock(&c->sending_lock);
+            cl_id = server_add_client(c, newclient);
+            pthread_mutex_unlock(&c->sending_lock);
+            if (cl_id >= 0) {
                if (sem_post(&c->have_clients) == -1) {
                   VERBOSE(CL_ERROR, "Semaphore post failed.");
                }
             } else {
 refuse_client:
-               VERBOSE(CL_VERBOSE_LIBRARY, "Shutting down client we do not have additional resources (%u/%u)",
-                     c->connected_clients, c->clients_arr_size);
+               VERBOSE(CL_VERBOSE_LIBRARY, "Shutting down client we do not have additional resources (%"PRId32"/%"PRIu32")",
+                     c->connected_clients, c->max_clients);
                shutdown(newclient, SHUT_RDWR);
                close(newclient);
             }
@@ -1850,7 +2347,7 @@ static int server_socket_open(void *priv)
    }
 
    // listen
-   if (listen(c->server_sd, c->clients_arr_size) == -1) {
+   if (listen(c->server_sd, TRAP_IFC_DEFAULT_MAX_CLIENTS) == -1) {
       //perror("listen");
       VERBOSE(CL_ERROR, "Listen failed");
       return TRAP_E_IO_ERROR;
@@ -1861,6 +2358,13 @@ static int server_socket_open(void *priv)
          VERBOSE(CL_ERROR, "Failed to create accept_thread.");
          return TRAP_E_IO_ERROR;
       }
+      if (pthread_create(&c->io_thread, NULL, sender_io_thread, priv) != 0) {
+         VERBOSE(CL_ERROR, "Failed to create io_thread.");
+         pthread_cancel(c->accept_thread);
+         pthread_join(c->accept_thread, NULL);
+         return TRAP_E_IO_ERROR;
+      }
+      c->io_thread_running = 1;
    }
    c->initialized = 1;
    return 0;
@@ -47,14 +47,34 @@
  */
 
 /**
- * How many times to try on EAGAIN for send()?
+ * Default number of buffers that can be queued for one client.
  */
-#define NONBLOCKING_ATTEMPTS     3
+#define TCPIP_DEFAULT_QUEUE_LEN  16
 
 /**
- * How long to sleep between two non-blocking attempts for send()?
+ * Initial size of the array of clients, it is doubled when needed.
  */
-#define NONBLOCKING_MINWAIT   1000
+#define TCPIP_INIT_CLIENTS_ARR_SIZE  8
+
+/**
+ * Maximal number of events processed by one epoll_wait() call.
+ */
+#define TCPIP_EPOLL_EVENTS  64
+
+/**
+ * Maximal number of buffers passed to one sendmsg() call.
+ */
+#define TCPIP_IOV_BATCH  32
+
+/**
+ * How long to try to deliver queued buffers when the IFC is destroyed (in microseconds)?
+ */
+#define TCPIP_DRAIN_TIMEOUT  1000000
+
+/**
+ * Default minimal size of buffer payload that is compressed (in bytes).
+ */
+#define TCPIP_DEFAULT_COMPRESS_MIN  1024
 
 /** \addtogroup tcpip_ifc
  * @{
@@ -65,66 +85,116 @@
  * @{
  */
 
-enum client_send_state {
-   CURRENT_IDLE, /**< waiting for a message in current buffer */
-   CURRENT_HEAD, /**< timeout in header */
-   CURRENT_PAYLOAD, /**< timeout in payload */
-   CURRENT_COMPLETE, /**< message sent */
-   BACKUP_BUFFER /**< timeout in backup buffer */
+struct trap_codec_s;
+
+/**
+ * Behavior of the sender when queue of some client is full.
+ */
+enum tcpip_slow_client_policy {
+   TCPIP_SLOW_BLOCK, /**< wait until the slow client receives data (default) */
+   TCPIP_SLOW_DROP, /**< drop the buffer for the slow client only */
+   TCPIP_SLOW_DISCONNECT /**< disconnect the slow client */
 };
 
+#define TCPIP_SLOW_POLICY_STR(p) (p == TCPIP_SLOW_BLOCK ? "block": \
+(p == TCPIP_SLOW_DROP ? "drop": "disconnect"))
+
+/**
+ * Buffer shared by all clients that have it in their queue.
+ *
+ * It is returned into the pool of free buffers when the last client
+ * has sent it.
+ */
+typedef struct tcpip_shared_buffer_s {
+   struct tcpip_shared_buffer_s *next; /**< Next free buffer in the pool */
+   uint32_t refcount; /**< Number of queues (and senders) holding the buffer */
+   uint32_t size; /**< Size of data */
+   uint8_t data[0]; /**< Data (trap_buffer_header_t followed by payload) */
+} tcpip_shared_buffer_t;
+
 struct client_s {
    int sd; /**< Socket descriptor */
-   void *sending_pointer; /**< Array of pointers into buffer */
-   void *buffer; /**< separate message buffer */
-   uint32_t pending_bytes; /**< The size of data that must be sent */
-   enum client_send_state client_state; /**< State of sending */
+   uint32_t id; /**< Client identifier (for dumps and logs) */
+   tcpip_shared_buffer_t **queue; /**< Circular queue of buffers to send */
+   uint32_t queue_head; /**< Index of the first buffer in queue */
+   uint32_t queue_len; /**< Number of buffers in queue */
+   uint32_t sent_bytes; /**< Send cursor into the first buffer in queue */
+   char want_write; /**< Waiting for EPOLLOUT */
+   uint64_t dropped_buffers; /**< Buffers dropped because of full queue */
+   char codec_pending; /**< Waiting for reply to offered compression (hello_msg_reply_t) */
+   char compress; /**< Client accepted compression, compressed buffers are queued for it */
 };
 
+/**
+ * epoll data of client event: client id in upper 32 bits, index into the
+ * array of clients in lower 32 bits (to ignore events of replaced clients).
+ */
+#define TCPIP_CLIENT_EVENT_DATA(cl, idx) ((((uint64_t) (cl)->id) << 32) | (uint32_t) (idx))
+
+/**
+ * epoll data of termination event (term_pipe).
+ */
+#define TCPIP_TERM_EVENT_DATA UINT64_MAX
+
 typedef struct tcpip_sender_private_s {
    trap_ctx_priv_t *ctx; /**< Libtrap context */
    char *server_port;
    int server_sd;
 
-   struct client_s *clients; /**< Array of clients */
+   struct client_s *clients; /**< Array of clients, free slots have sd == -1 */
 
    int32_t connected_clients;
    int32_t clients_arr_size;
+   uint32_t max_clients; /**< Limit of connected clients, 0 means unlimited */
+   uint32_t next_client_id;
    sem_t have_clients;
    enum tcpip_ifc_sockettype socket_type;
    trap_buffer_header_t int_mess_header; /**< Internal message header */
 
-   void *backup_buffer; /**< Internal backup buffer for message */
-
-   const void *ext_buffer; /**< Pointer to buffer that was passed by higher layer - this is the place we write */
-   uint32_t ext_buffer_size; /** size of content of the extbuffer */
+   uint32_t queue_len; /**< Max number of buffers in queue of one client */
+   enum tcpip_slow_client_policy slow_policy;
+   tcpip_shared_buffer_t *free_buffers; /**< Pool of free shared buffers */
+
+   uint64_t slow_blocked; /**< Number of send calls blocked by a slow client */
+   uint64_t slow_timeouts; /**< Number of send calls that timed out because of a slow client */
+   uint64_t slow_dropped; /**< Number of buffers dropped for slow clients */
+   uint64_t slow_disconnected; /**< Number of disconnected slow clients */
+
+   const struct trap_codec_s *codec; /**< Codec offered to clients, NULL - no compression */
+   int codec_level; /**< Compression level, -1 means default of the codec */
+   uint32_t codec_min; /**< Minimal size of payload to compress */
+   void *codec_state; /**< Compression context, it is used by sending thread only */
+   tcpip_shared_buffer_t *codec_next; /**< Buffer for the next compressed data, it is owned by sending thread */
+   int32_t codec_clients; /**< Number of clients that accepted compression */
+   uint64_t codec_raw_bytes; /**< Bytes of buffers passed to codec */
+   uint64_t codec_bytes; /**< Bytes of buffers produced by codec (stored uncompressed when they did not shrink) */
+   uint64_t codec_skipped; /**< Number of buffers smaller than codec_min */
 
    char is_terminated;
 
    char initialized;
 
    /**
-    * File descriptor pair for select() termination.
+    * File descriptor pair for epoll() termination.
     *
     * Using python wrapper, it is not possible to terminate module
     * when no receiver is connected to output IFC.  Therefore,
     * this file descriptor will be used to signal termination to
-    * select().
+    * the I/O thread.
     */
    int term_pipe[2];
 
-   pthread_mutex_t  lock;
-   pthread_mutex_t  sending_lock;
+   int epoll_sd; /**< epoll instance watching all clients */
+
+   pthread_mutex_t  lock; /**< Serializes accepting of clients and their disconnection */
+   pthread_mutex_t  sending_lock; /**< Protects clients and their queues */
+   pthread_cond_t   queue_cond; /**< Signaled when queues get shorter or clients disconnect */
    pthread_t        accept_thread;
+   pthread_t        io_thread; /**< Thread sending queued buffers */
+   char             io_thread_running;
    uint32_t ifc_idx;
 } tcpip_sender_private_t;
 
-#define TCPIP_SENDER_STATE_STR(st) (st == CURRENT_IDLE ? "CURRENT_IDLE": \
-(st == CURRENT_HEAD     ? "CURRENT_HEAD": \
-(st == CURRENT_PAYLOAD  ? "CURRENT_PAYLOAD": \
-(st == CURRENT_COMPLETE ? "CURRENT_COMPLETE": \
-("BACKUP_BUFFER")))))
-
 /**
  * @}
  */
@@ -147,6 +217,12 @@ typedef struct tcpip_receiver_private_s {
    uint32_t ext_buffer_size; /** size of content of the extbuffer */
    trap_buffer_header_t int_mess_header; /**< Internal message header - used for message_buffer payload size \note message_buffer size is sizeof(tcpip_tdu_header_t) + payload size */
    uint32_t ifc_idx;
+   char compressed; /**< Payload of the buffer being received is compressed */
+   const struct trap_codec_s *codec; /**< Codec of codec_state */
+   void *codec_state; /**< Decompression context */
+   uint8_t *codec_buf; /**< Compressed payload of the buffer being received */
+   uint64_t codec_raw_bytes; /**< Bytes of decompressed buffers */
+   uint64_t codec_bytes; /**< Bytes of received compressed buffers */
 } tcpip_receiver_private_t;
 
 /**
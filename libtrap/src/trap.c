@@ -72,7 +72,9 @@
 #include "ifc_dummy.h"
 #include "ifc_tcpip.h"
 #include "ifc_tcpip_internal.h"
+#include "trap_codec.h"
 #include "ifc_file.h"
+#include "ifc_shm.h"
 
 /**
  * Version of libtrap
@@ -103,6 +105,7 @@ char trap_ifc_type_supported[] = {
    TRAP_IFC_TYPE_UNIX,
    TRAP_IFC_TYPE_SERVICE,
    TRAP_IFC_TYPE_FILE,
+   TRAP_IFC_TYPE_SHM,
    0
 };
 
@@ -228,6 +231,265 @@ int trap_check_buffer_content(void *buffer, uint32_t buffer_size)
    return errors;
 }
 
+/**
+ * \brief Prefetch thread of input IFC.
+ *
+ * It receives buffers into the prefetch queue ahead of the caller of trap_recv().
+ * \param[in] arg   prefetch queue (trap_prefetch_t)
+ * \return NULL
+ */
+static void *trap_prefetch_thread(void *arg)
+{
+   trap_prefetch_t *pf = (trap_prefetch_t *) arg;
+   trap_input_ifc_t *ifc = pf->ifc;
+   trap_prefetch_slot_t *slot;
+   int result;
+
+   pthread_mutex_lock(&pf->lock);
+   while (!pf->terminate) {
+      if (pf->count == pf->slots_count) {
+         pf->full_waits++;
+         while (!pf->terminate && pf->count == pf->slots_count) {
+            pthread_cond_wait(&pf->cond, &pf->lock);
+         }
+         continue;
+      }
+      /* the slot is free until count is increased, the caller does not touch it */
+      slot = &pf->slots[(pf->head + pf->count) % pf->slots_count];
+      pthread_mutex_unlock(&pf->lock);
+
+      slot->size = 0;
+      result = ifc->recv(ifc->priv, slot->data, &slot->size, TRAP_PREFETCH_RECV_TIMEOUT);
+
+      pthread_mutex_lock(&pf->lock);
+      if (result == TRAP_E_TIMEOUT) {
+         /* receiving of the buffer continues in the next call */
+         continue;
+      }
+      slot->result = result;
+      if (pf->fmt_negotiated) {
+         /* the caller installs the format when it gets to this buffer */
+         pf->fmt_negotiated = 0;
+         slot->fmt_set = 1;
+         slot->client_state = pf->client_state;
+         slot->data_type = pf->data_type;
+         slot->data_fmt_spec = NULL;
+         if (pf->data_fmt_spec != NULL) {
+            slot->data_fmt_spec = strdup(pf->data_fmt_spec);
+            if (slot->data_fmt_spec == NULL) {
+               slot->client_state = FMT_WAITING;
+               slot->result = TRAP_E_MEMORY;
+            }
+         }
+      }
+      pf->count++;
+      pthread_cond_broadcast(&pf->cond);
+      if (result == TRAP_E_TERMINATED) {
+         pf->terminate = 1;
+      }
+   }
+   pthread_mutex_unlock(&pf->lock);
+   return NULL;
+}
+
+/**
+ * \brief Create prefetch queue of input IFC and start its thread.
+ * \param[in,out] ifc   input IFC with prefetch set
+ * \return 0 on success, -1 on error
+ */
+static int trap_prefetch_start(trap_input_ifc_t *ifc)
+{
+   trap_prefetch_t *pf;
+   uint32_t i;
+
+   pf = (trap_prefetch_t *) calloc(1, sizeof(trap_prefetch_t));
+   if (pf == NULL) {
+      return -1;
+   }
+   pf->ifc = ifc;
+   pf->client_state = ifc->client_state;
+   pf->data_type = ifc->data_type;
+   if (ifc->data_fmt_spec != NULL) {
+      pf->data_fmt_spec = strdup(ifc->data_fmt_spec);
+      if (pf->data_fmt_spec == NULL) {
+         goto failure;
+      }
+   }
+   pf->slots_count = ifc->prefetch + 1;
+   pf->slots = (trap_prefetch_slot_t *) calloc(pf->slots_count, sizeof(trap_prefetch_slot_t));
+   if (pf->slots == NULL) {
+      goto failure;
+   }
+   for (i = 0; i < pf->slots_count; i++) {
+      /* allocate extra bytes for TCPIP IFC checksum */
+      pf->slots[i].data = (char *) malloc(TRAP_IFC_MESSAGEQ_SIZE + 1);
+      if (pf->slots[i].data == NULL) {
+         goto failure;
+      }
+   }
+   if (pthread_mutex_init(&pf->lock, NULL) != 0) {
+      goto failure;
+   }
+   if (pthread_cond_init(&pf->cond, NULL) != 0) {
+      pthread_mutex_destroy(&pf->lock);
+      goto failure;
+   }
+   /* negotiation in the thread uses the queue */
+   ifc->pf = pf;
+   if (pthread_create(&pf->thread, NULL, trap_prefetch_thread, pf) != 0) {
+      ifc->pf = NULL;
+      pthread_cond_destroy(&pf->cond);
+      pthread_mutex_destroy(&pf->lock);
+      goto failure;
+   }
+   pf->running = 1;
+   return 0;
+
+failure:
+   if (pf->slots != NULL) {
+      for (i = 0; i < pf->slots_count; i++) {
+         free(pf->slots[i].data);
+      }
+      free(pf->slots);
+   }
+   free(pf->data_fmt_spec);
+   free(pf);
+   return -1;
+}
+
+/**
+ * \brief Stop prefetch thread of input IFC and free its queue.
+ *
+ * It must be called before the IFC is destroyed.
+ * \param[in,out] ifc   input IFC
+ */
+static void trap_prefetch_stop(trap_input_ifc_t *ifc)
+{
+   trap_prefetch_t *pf = ifc->pf;
+   uint32_t i;
+
+   if (pf == NULL) {
+      return;
+   }
+   pthread_mutex_lock(&pf->lock);
+   pf->terminate = 1;
+   pthread_cond_broadcast(&pf->cond);
+   pthread_mutex_unlock(&pf->lock);
+   if (pf->running) {
+      pthread_join(pf->thread, NULL);
+   }
+   pthread_cond_destroy(&pf->cond);
+   pthread_mutex_destroy(&pf->lock);
+   for (i = 0; i < pf->slots_count; i++) {
+      free(pf->slots[i].data);
+      free(pf->slots[i].data_fmt_spec);
+   }
+   free(pf->slots);
+   free(pf->data_fmt_spec);
+   free(pf);
+   ifc->pf = NULL;
+}
+
+/**
+ * \brief Take the next buffer from prefetch queue, the previous buffer is released.
+ * \param[in,out] ifc   input IFC with prefetch queue
+ * \param[out] data     pointer to payload of buffer
+ * \param[out] size     size of payload
+ * \param[in] timeout   TRAP_WAIT | TRAP_NO_WAIT | timeout (TRAP_HALFWAIT is the same as TRAP_NO_WAIT)
+ * \return Result of recv() of the IFC, TRAP_E_TIMEOUT if no buffer was received in time.
+ */
+static int trap_prefetch_get(trap_input_ifc_t *ifc, void **data, uint32_t *size, int timeout)
+{
+   trap_prefetch_t *pf = ifc->pf;
+   trap_prefetch_slot_t *slot;
+   struct timespec ts;
+   int result;
+
+   pthread_mutex_lock(&pf->lock);
+   if (pf->in_use) {
+      /* the previous buffer was read by the caller */
+      pf->in_use = 0;
+      pf->head = (pf->head + 1) % pf->slots_count;
+      pf->count--;
+      pthread_cond_broadcast(&pf->cond);
+   }
+   if (pf->count == 0 && !pf->terminate) {
+      pf->empty_waits++;
+      if (timeout == TRAP_WAIT) {
+         while (pf->count == 0 && !pf->terminate) {
+            pthread_cond_wait(&pf->cond, &pf->lock);
+         }
+      } else if (timeout > 0) {
+         clock_gettime(CLOCK_REALTIME, &ts);
+         ts.tv_sec += timeout / 1000000;
+         ts.tv_nsec += (long) (timeout % 1000000) * 1000;
+         if (ts.tv_nsec >= 1000000000) {
+            ts.tv_sec++;
+            ts.tv_nsec -= 1000000000;
+         }
+         while (pf->count == 0 && !pf->terminate) {
+            if (pthread_cond_timedwait(&pf->cond, &pf->lock, &ts) == ETIMEDOUT) {
+               break;
+            }
+         }
+      }
+   }
+   if (pf->count == 0) {
+      result = pf->terminate ? TRAP_E_TERMINATED : TRAP_E_TIMEOUT;
+      goto exit;
+   }
+
+   pf->depth_sum += pf->count;
+   pf->taken++;
+   slot = &pf->slots[pf->head];
+   if (slot->fmt_set) {
+      /* format negotiated by the thread is valid from this buffer */
+      slot->fmt_set = 0;
+      ifc->client_state = slot->client_state;
+      ifc->data_type = slot->data_type;
+      free(ifc->data_fmt_spec);
+      ifc->data_fmt_spec = slot->data_fmt_spec;
+      slot->data_fmt_spec = NULL;
+   }
+   result = slot->result;
+   if (result == TRAP_E_OK) {
+      pf->in_use = 1;
+      (*data) = slot->data;
+      (*size) = slot->size;
+   } else {
+      /* there are no data, release the slot immediately */
+      pf->head = (pf->head + 1) % pf->slots_count;
+      pf->count--;
+      pthread_cond_broadcast(&pf->cond);
+   }
+
+exit:
+   pthread_mutex_unlock(&pf->lock);
+   return result;
+}
+
+/**
+ * \brief Add statistics of prefetch queue into statistics of input IFC.
+ * \param[in] ifc   input IFC
+ * \param[in,out] stats   JSON object with statistics of the IFC
+ */
+static void trap_prefetch_get_stats(trap_input_ifc_t *ifc, json_t *stats)
+{
+   trap_prefetch_t *pf = ifc->pf;
+
+   json_object_set_new(stats, "prefetch", json_integer(ifc->prefetch));
+   if (pf == NULL) {
+      /* the queue is created by the first trap_recv() */
+      return;
+   }
+   pthread_mutex_lock(&pf->lock);
+   json_object_set_new(stats, "prefetch-depth", json_integer(pf->count - pf->in_use));
+   json_object_set_new(stats, "prefetch-depth-avg", json_real(pf->taken > 0 ? (double) pf->depth_sum / pf->taken : 0.0));
+   json_object_set_new(stats, "prefetch-empty", json_integer(pf->empty_waits));
+   json_object_set_new(stats, "prefetch-full", json_integer(pf->full_waits));
+   pthread_mutex_unlock(&pf->lock);
+}
+
 /**
  * Read data from buffer or receive data into buffer if buffer is empty
  *
@@ -249,7 +511,22 @@ static inline int trap_read_from_buffer(trap_ctx_priv_t *ctx, uint32_t ifc_idx,
    if ((ctx->in_ifc_list[ifc_idx].buffer_full == 0) || (ctx->in_ifc_list[ifc_idx].buffer_full > TRAP_IFC_MESSAGEQ_SIZE)) {
       /* get new data and store into buffer, set buffer_full size */
       ctx->in_ifc_list[ifc_idx].buffer_pointer = ctx->in_ifc_list[ifc_idx].buffer;
-      result = ctx->in_ifc_list[ifc_idx].recv(ctx->in_ifc_list[ifc_idx].priv, bp, &tempbufheader, timeout);
+      if (ctx->in_ifc_list[ifc_idx].prefetch != 0 && ctx->in_ifc_list[ifc_idx].pf == NULL) {
+         /* the thread is started here, required format is set by the module after initialization */
+         if (trap_prefetch_start(&ctx->in_ifc_list[ifc_idx]) != 0) {
+            VERBOSE(CL_ERROR, "Input IFC %"PRIu32": creation of prefetch thread failed, prefetch is disabled.", ifc_idx);
+            ctx->in_ifc_list[ifc_idx].prefetch = 0;
+         }
+      }
+      if (ctx->in_ifc_list[ifc_idx].pf != NULL) {
+         /* buffer was received by prefetch thread */
+         result = trap_prefetch_get(&ctx->in_ifc_list[ifc_idx], &bp, &tempbufheader, timeout);
+      } else if (ctx->in_ifc_list[ifc_idx].recv_buffer != NULL) {
+         /* IFC hands out its own memory, skip copying into our buffer */
+         result = ctx->in_ifc_list[ifc_idx].recv_buffer(ctx->in_ifc_list[ifc_idx].priv, &bp, &tempbufheader, timeout);
+      } else {
+         result = ctx->in_ifc_list[ifc_idx].recv(ctx->in_ifc_list[ifc_idx].priv, bp, &tempbufheader, timeout);
+      }
       if (result == TRAP_E_FORMAT_MISMATCH) {
          goto exit;
       }
@@ -262,7 +539,7 @@ static inline int trap_read_from_buffer(trap_ctx_priv_t *ctx, uint32_t ifc_idx,
          ctx->counter_recv_buffer[ifc_idx]++;
 
          ctx->in_ifc_list[ifc_idx].buffer_full = tempbufheader;
-         ctx->in_ifc_list[ifc_idx].buffer_pointer = ctx->in_ifc_list[ifc_idx].buffer;
+         ctx->in_ifc_list[ifc_idx].buffer_pointer = bp;
          DEBUG_BUF(VERBOSE(CL_VERBOSE_LIBRARY, "read received new buffer new bf %"PRIu32" %p",
                 ctx->in_ifc_list[ifc_idx].buffer_full,
                 ctx->in_ifc_list[ifc_idx].buffer_pointer));
@@ -302,6 +579,117 @@ exit:
    return result;
 }
 
+/**
+ * \brief Enable or disable adaptive buffering of output IFC, ifc_mtx of the IFC must be locked.
+ * \param[in,out] ctx   pointer to the private libtrap context data (trap_ctx_init())
+ * \param[in] ifc       index of output interface
+ * \param[in] latency   target latency in microseconds, 0 disables adaptive buffering
+ */
+static void trap_adaptive_set(trap_ctx_priv_t *ctx, unsigned int ifc, int32_t latency)
+{
+   trap_output_ifc_t *o = &ctx->out_ifc_list[ifc];
+   trap_adaptive_t *a = &o->adaptive;
+   struct timespec ts;
+   char fixed = a->latency_fixed;
+
+   memset(a, 0, sizeof(*a));
+   a->latency_fixed = fixed;
+   if (latency <= 0) {
+      o->buffer_limit = TRAP_IFC_MESSAGEQ_SIZE;
+      return;
+   }
+   a->latency = latency;
+   clock_gettime(CLOCK_MONOTONIC, &ts);
+   a->window_start = (uint64_t) ts.tv_sec * 1000000 + ts.tv_nsec / 1000;
+   a->window_messages = ctx->counter_send_message[ifc];
+   /* rate is unknown yet, messages are sent immediately */
+   o->buffer_limit = 0;
+   if (o->timeout_fixed == 0) {
+      o->timeout = latency / 2 > TRAP_ADAPTIVE_MIN_AUTOFLUSH ? latency / 2 : TRAP_ADAPTIVE_MIN_AUTOFLUSH;
+      ctx->ifc_change = 1;
+   }
+}
+
+/**
+ * \brief Update estimated rate and size of buffers of output IFC in adaptive buffering.
+ *
+ * It is called after a buffer was sent, ifc_mtx of the IFC must be locked.
+ * \param[in,out] ctx   pointer to the private libtrap context data (trap_ctx_init())
+ * \param[in] ifc       index of output interface
+ * \param[in] size      size of sent payload
+ */
+static inline void trap_adaptive_update(trap_ctx_priv_t *ctx, unsigned int ifc, uint32_t size)
+{
+   trap_output_ifc_t *o = &ctx->out_ifc_list[ifc];
+   trap_adaptive_t *a = &o->adaptive;
+   struct timespec ts;
+   uint64_t now, elapsed;
+   double rate, msg_rate, limit;
+
+   if (a->latency == 0) {
+      return;
+   }
+   a->buffers++;
+   a->bytes += size;
+   a->window_bytes += size;
+
+   clock_gettime(CLOCK_MONOTONIC, &ts);
+   now = (uint64_t) ts.tv_sec * 1000000 + ts.tv_nsec / 1000;
+   elapsed = now - a->window_start;
+   if (elapsed < TRAP_ADAPTIVE_WINDOW) {
+      return;
+   }
+   rate = (double) a->window_bytes * 1000000 / elapsed;
+   msg_rate = (double) (ctx->counter_send_message[ifc] - a->window_messages) * 1000000 / elapsed;
+   if (a->rate == 0) {
+      a->rate = rate;
+      a->msg_rate = msg_rate;
+   } else {
+      /* smooth out bursts */
+      a->rate = a->rate * 0.75 + rate * 0.25;
+      a->msg_rate = a->msg_rate * 0.75 + msg_rate * 0.25;
+   }
+   a->window_start = now;
+   a->window_bytes = 0;
+   a->window_messages = ctx->counter_send_message[ifc];
+
+   /* buffer is filled in half of the latency, autoflush covers the rest */
+   limit = a->rate * a->latency / 2000000;
+   o->buffer_limit = limit < TRAP_IFC_MESSAGEQ_SIZE ? (uint32_t) limit : TRAP_IFC_MESSAGEQ_SIZE;
+}
+
+/**
+ * \brief Send buffer of output IFC that reached its size in adaptive buffering, ifc_mtx of the IFC must be locked.
+ *
+ * The last message is already stored, buffer is kept to be sent by the next
+ * call of trap_store_into_buffer() when it was not sent.
+ * \param[in,out] ctx   pointer to the private libtrap context data (trap_ctx_init())
+ * \param[in] ifc       index of output interface
+ * \param[in] timeout   timeout of send
+ */
+static inline void trap_adaptive_send(trap_ctx_priv_t *ctx, unsigned int ifc, int timeout)
+{
+   trap_output_ifc_t *o = &ctx->out_ifc_list[ifc];
+   trap_buffer_header_t *h = (trap_buffer_header_t *) o->buffer_header;
+   uint32_t size = o->buffer_index;
+   int result;
+
+   o->buffer_occupied = 1;
+   h->data_length = htonl(size);
+   result = o->send(o->priv, o->buffer_header, size + sizeof(trap_buffer_header_t), timeout);
+   if (result == TRAP_E_OK || result == TRAP_E_IO_ERROR) {
+      /* buffer was sent or we have no client */
+      if (result == TRAP_E_OK) {
+         ctx->counter_send_buffer[ifc]++;
+         trap_adaptive_update(ctx, ifc, size);
+      }
+      o->buffer_index = 0;
+      o->buffer_occupied = 0;
+   } else if (trap_ctx_get_client_count(ctx, ifc) == 0) {
+      o->buffer_occupied = 0;
+   }
+}
+
 static void insert_into_buffer(trap_output_ifc_t *priv, const void *data, const uint16_t size)
 {
    assert(priv->buffer_index <= (TRAP_IFC_MESSAGEQ_SIZE - sizeof(trap_buffer_header_t)));
@@ -337,8 +725,8 @@ static inline int trap_store_into_buffer(trap_ctx_priv_t *ctx, unsigned int ifc,
       pthread_mutex_lock(&ctx->out_ifc_list[ifc].ifc_mtx);
    }
    /* initialization in locked section, otherwise autoflush can send buffer which has been already sent */
-   if (ctx->out_ifc_list[ifc].buffer_index <= (TRAP_IFC_MESSAGEQ_SIZE - sizeof(trap_buffer_header_t))) {
-      freespace = TRAP_IFC_MESSAGEQ_SIZE - ctx->out_ifc_list[ifc].buffer_index - sizeof(trap_buffer_header_t);
+   if (ctx->out_ifc_list[ifc].buffer_index + sizeof(trap_buffer_header_t) <= ctx->out_ifc_list[ifc].buffer_limit) {
+      freespace = ctx->out_ifc_list[ifc].buffer_limit - ctx->out_ifc_list[ifc].buffer_index - sizeof(trap_buffer_header_t);
    } else {
       freespace = 0;
    }
@@ -362,6 +750,7 @@ static inline int trap_store_into_buffer(trap_ctx_priv_t *ctx, unsigned int ifc,
 
          if (result == TRAP_E_OK) {
             ctx->counter_send_buffer[ifc]++;
+            trap_adaptive_update(ctx, ifc, ctx->out_ifc_list[ifc].buffer_index);
             ctx->out_ifc_list[ifc].buffer_index = 0;
             ctx->out_ifc_list[ifc].buffer_occupied = 0;
             DEBUG_BUF(VERBOSE(CL_VERBOSE_LIBRARY, "Sending partial buffer invoked by autoflush timeout on interface %d", ifc));
@@ -377,13 +766,21 @@ static inline int trap_store_into_buffer(trap_ctx_priv_t *ctx, unsigned int ifc,
    /* we send buffer before timeout, no need to flush it */
    ctx->out_ifc_list[ifc].bufferflush = 1;
 
-   if ((freespace >= needed_size) && (ctx->out_ifc_list[ifc].bufferswitch == 1)) {
-      /* we have enough space, buffering is enabled and size is not "flush" */
+   if (((freespace >= needed_size) ||
+        (ctx->out_ifc_list[ifc].adaptive.latency != 0 && ctx->out_ifc_list[ifc].buffer_index == 0)) &&
+       (ctx->out_ifc_list[ifc].bufferswitch == 1)) {
+      /* we have enough space (or empty buffer smaller than message in adaptive mode), buffering is enabled and size is not "flush" */
 
       insert_into_buffer(&ctx->out_ifc_list[ifc], data, size);
 
       result = TRAP_E_OK;
 
+      if ((ctx->out_ifc_list[ifc].adaptive.latency != 0) &&
+          (ctx->out_ifc_list[ifc].buffer_index + sizeof(trap_buffer_header_t) >= ctx->out_ifc_list[ifc].buffer_limit)) {
+         /* buffer reached its adapted size, do not wait for the next message */
+         trap_adaptive_send(ctx, ifc, timeout);
+      }
+
    } else {
       /* not enough space */
 
@@ -422,6 +819,7 @@ static inline int trap_store_into_buffer(trap_ctx_priv_t *ctx, unsigned int ifc,
              * it will be the first message in buffer
              */
             ctx->counter_send_buffer[ifc]++;
+            trap_adaptive_update(ctx, ifc, ctx->out_ifc_list[ifc].buffer_index);
          } else {
             /* we had no client but we can propagate either OK or TIMEOUT: */
             result = TRAP_E_TIMEOUT;
@@ -1599,6 +1997,11 @@ void trap_send_flush(uint32_t ifc)
    trap_ctx_send_flush((trap_ctx_t *) trap_glob_ctx, ifc);
 }
 
+int trap_set_module_stats(const char *json_stats)
+{
+   return trap_ctx_set_module_stats((trap_ctx_t *) trap_glob_ctx, json_stats);
+}
+
 static int compare_timeouts (const void *a, const void *b)
 {
    return ((*(struct out_ifc_timeout_s *)a).tm - (*(struct out_ifc_timeout_s *)b).tm);
@@ -1642,10 +2045,14 @@ void trap_free_ctx_t(trap_ctx_priv_t **ctx)
    c->counter_recv_buffer = NULL;
    free(c->counter_dropped_message);
    c->counter_dropped_message = NULL;
+   json_decref(c->module_stats);
+   c->module_stats = NULL;
 
    // Destroy all interfaces
    if ((c->num_ifc_in > 0) && (c->in_ifc_list != NULL)) {
       for (i = 0; i < c->num_ifc_in; i++) {
+         /* prefetch thread uses the IFC */
+         trap_prefetch_stop(&c->in_ifc_list[i]);
          if (c->in_ifc_list[i].buffer != NULL) {
             free(c->in_ifc_list[i].buffer);
             c->in_ifc_list[i].buffer = NULL;
@@ -2009,6 +2416,20 @@ static inline void handle_inifc_setters(trap_input_ifc_t *ifc, char *params)
       /* clean the parameter because it was processed */
       remove_setter_from_param(params, p);
    }
+
+   /* look for prefetch setter and set the number of buffers read ahead if found */
+   p = strstr(params, "prefetch=");
+   if (p != NULL) {
+      strval = p + sizeof("prefetch=") - 1;
+      if (sscanf(strval, "%"SCNu32, &ifc->prefetch) != 1) {
+         ifc->prefetch = 0;
+      } else if (ifc->prefetch > TRAP_PREFETCH_MAX) {
+         VERBOSE(CL_ERROR, "Parameter prefetch=%"PRIu32" is too big, %d is used.", ifc->prefetch, TRAP_PREFETCH_MAX);
+         ifc->prefetch = TRAP_PREFETCH_MAX;
+      }
+      /* clean the parameter because it was processed */
+      remove_setter_from_param(params, p);
+   }
 }
 
 /**
@@ -2050,6 +2471,12 @@ static inline int trapifc_in_construct(trap_ctx_priv_t *ctx, trap_ifc_spec_t *if
          goto error;
       }
       break;
+   case TRAP_IFC_TYPE_SHM:
+      if (create_shm_receiver_ifc(ctx, ifc_spec->params[idx], &ctx->in_ifc_list[idx], idx) != TRAP_E_OK) {
+         VERBOSE(CL_ERROR, "Initialization of SHM input interface no. %i failed.", idx);
+         goto error;
+      }
+      break;
    default:
       VERBOSE(CL_ERROR, "Unknown input interface type '%c'.", ifc_spec->types[idx]);
       goto error;
@@ -2131,6 +2558,23 @@ static inline void handle_outifc_setters(trap_output_ifc_t *ifc, char *params)
       /* clean the parameter because it was processed */
       remove_setter_from_param(params, p);
    }
+
+   /* look for adaptive setter and set the target latency if found, it is applied after construction of IFC */
+   p = strstr(params, "adaptive=");
+   if (p != NULL) {
+      strval = p + sizeof("adaptive=") - 1;
+      if (strncmp(strval, "off", 3) == 0) {
+         ifc->adaptive.latency = 0;
+         ifc->adaptive.latency_fixed = 1;
+      } else if (sscanf(strval, "%"SCNi32, &ifc->adaptive.latency) == 1 && ifc->adaptive.latency >= 0) {
+         ifc->adaptive.latency_fixed = 1;
+      } else {
+         VERBOSE(CL_ERROR, "Unknown value for setter \"adaptive\".");
+         ifc->adaptive.latency = 0;
+      }
+      /* clean the parameter because it was processed */
+      remove_setter_from_param(params, p);
+   }
 }
 
 /**
@@ -2175,6 +2619,12 @@ static inline int trapifc_out_construct(trap_ctx_priv_t *ctx, trap_ifc_spec_t *i
          goto error;
       }
       break;
+   case TRAP_IFC_TYPE_SHM:
+      if (create_shm_sender_ifc(ctx, ifc_spec->params[ctx->num_ifc_in + idx], &ctx->out_ifc_list[idx], idx) != TRAP_E_OK) {
+         VERBOSE(CL_ERROR, "Initialization of SHM output interface no. %i failed.", idx);
+         goto error;
+      }
+      break;
    default:
       VERBOSE(CL_ERROR, "Unknown output interface type '%c'.", ifc_spec->types[ctx->num_ifc_in + idx]);
       goto error;
@@ -2357,12 +2807,16 @@ trap_ctx_t *trap_ctx_init(trap_module_info_t *module_info, trap_ifc_spec_t ifc_s
       }
       ctx->out_ifc_list[i].timeout = TRAP_IFC_TIMEOUT;
       ctx->out_ifc_list[i].bufferswitch = 1;
+      ctx->out_ifc_list[i].buffer_limit = TRAP_IFC_MESSAGEQ_SIZE;
       ctx->out_ifc_list[i].ifc_type = ifc_spec.types[ctx->num_ifc_in + i];
 
       /* call output IFC constructor */
       if (trapifc_out_construct(ctx, &ifc_spec, i) == EXIT_FAILURE) {
          goto freeall_on_failed;
       }
+      if (ctx->out_ifc_list[i].adaptive.latency != 0) {
+         trap_adaptive_set(ctx, i, ctx->out_ifc_list[i].adaptive.latency);
+      }
 
    }
 
@@ -2533,6 +2987,18 @@ int trap_ctx_vifcctl(trap_ctx_t *ctx, int8_t type, uint32_t ifcidx, int32_t requ
          pthread_mutex_unlock(&c->out_ifc_list[ifcidx].ifc_mtx);
       }
       break;
+   case TRAPCTL_ADAPTIVE:
+      datatimeout = (int32_t) va_arg(ap, int32_t);
+      VERBOSE(CL_VERBOSE_BASIC, "%s ifc %d: Setting adaptive buffering with latency %d.",
+              ifcdir2str(type), (int)ifcidx, datatimeout);
+      if (type == TRAPIFC_OUTPUT && ifcidx < c->num_ifc_out) {
+         pthread_mutex_lock(&c->out_ifc_list[ifcidx].ifc_mtx);
+         if (c->out_ifc_list[ifcidx].adaptive.latency_fixed == 0) {
+            trap_adaptive_set(c, ifcidx, datatimeout);
+         }
+         pthread_mutex_unlock(&c->out_ifc_list[ifcidx].ifc_mtx);
+      }
+      break;
    case TRAPCTL_SETTIMEOUT:
       /*
        * datatimeout is used only by get_data() and send_data() in one thread,
@@ -2654,6 +3120,25 @@ int service_send_data(int sock_d, uint32_t size, void **data)
 }
 
 
+/**
+ * \brief Add state of adaptive buffering into statistics of output IFC.
+ * \param[in] ifc   output interface
+ * \param[in,out] stats   JSON object with statistics of the IFC
+ */
+static void trap_adaptive_get_stats(trap_output_ifc_t *ifc, json_t *stats)
+{
+   trap_adaptive_t *a = &ifc->adaptive;
+
+   json_object_set_new(stats, "adaptive-latency", json_integer(a->latency));
+   json_object_set_new(stats, "adaptive-buffer-size", json_integer(ifc->buffer_limit));
+   json_object_set_new(stats, "adaptive-autoflush", json_integer(ifc->timeout));
+   json_object_set_new(stats, "adaptive-rate", json_integer((json_int_t) a->rate));
+   json_object_set_new(stats, "adaptive-msg-rate", json_integer((json_int_t) a->msg_rate));
+   /* effect of the chosen values */
+   json_object_set_new(stats, "adaptive-avg-buffer", json_integer(a->buffers > 0 ? a->bytes / a->buffers : 0));
+   json_object_set_new(stats, "adaptive-fill-time", json_integer(a->rate > 0 ? (json_int_t) (ifc->buffer_limit * 1000000 / a->rate) : 0));
+}
+
 int encode_cnts_to_json(char **data, trap_ctx_priv_t *ctx)
 {
    uint32_t x = 0;
@@ -2685,6 +3170,12 @@ int encode_cnts_to_json(char **data, trap_ctx_priv_t *ctx)
          ifc_id = none_ifc_id;
       }
       in_ifc_cnts = json_pack("{sisssisIsI}", "ifc_state", ctx->in_ifc_list[x].is_conn(ctx->in_ifc_list[x].priv), "ifc_id", ifc_id, "ifc_type", (int) (ctx->in_ifc_list[x].ifc_type), "messages", ctx->counter_recv_message[x], "buffers", ctx->counter_recv_buffer[x]);
+      if ((in_ifc_cnts != NULL) && (ctx->in_ifc_list[x].get_stats != NULL)) {
+         ctx->in_ifc_list[x].get_stats(ctx->in_ifc_list[x].priv, in_ifc_cnts);
+      }
+      if ((in_ifc_cnts != NULL) && (ctx->in_ifc_list[x].prefetch != 0)) {
+         trap_prefetch_get_stats(&ctx->in_ifc_list[x], in_ifc_cnts);
+      }
       if (json_array_append_new(in_ifces_arr, in_ifc_cnts) == -1) {
          VERBOSE(CL_ERROR, "Service thread - could not append new item to out_ifces_arr while creating json string with counters..\n");
          goto clean_up;
@@ -2697,6 +3188,12 @@ int encode_cnts_to_json(char **data, trap_ctx_priv_t *ctx)
          ifc_id = none_ifc_id;
       }
       out_ifc_cnts = json_pack("{sisssisIsIsIsI}", "num_clients", ctx->out_ifc_list[x].get_client_count(ctx->out_ifc_list[x].priv), "ifc_id", ifc_id, "ifc_type", (int) (ctx->out_ifc_list[x].ifc_type), "sent-messages", ctx->counter_send_message[x], "dropped-messages", ctx->counter_dropped_message[x], "buffers", ctx->counter_send_buffer[x], "autoflushes", ctx->counter_autoflush[x]);
+      if ((out_ifc_cnts != NULL) && (ctx->out_ifc_list[x].get_stats != NULL)) {
+         ctx->out_ifc_list[x].get_stats(ctx->out_ifc_list[x].priv, out_ifc_cnts);
+      }
+      if ((out_ifc_cnts != NULL) && (ctx->out_ifc_list[x].adaptive.latency != 0)) {
+         trap_adaptive_get_stats(&ctx->out_ifc_list[x], out_ifc_cnts);
+      }
       if (json_array_append_new(out_ifces_arr, out_ifc_cnts) == -1) {
          VERBOSE(CL_ERROR, "Service thread - could not append new item to out_ifces_arr while creating json string with counters..\n");
          goto clean_up;
@@ -2709,6 +3206,14 @@ int encode_cnts_to_json(char **data, trap_ctx_priv_t *ctx)
       goto clean_up;
    }
 
+   /* module-specific statistics are copied, they can be replaced by module meanwhile */
+   if (pthread_rwlock_rdlock(&ctx->context_lock) == 0) {
+      if (ctx->module_stats != NULL) {
+         json_object_set_new(result_json, "module", json_deep_copy(ctx->module_stats));
+      }
+      pthread_rwlock_unlock(&ctx->context_lock);
+   }
+
    *data = json_dumps(result_json, 0);
    json_decref(result_json);
    if (*data == NULL) {
@@ -2941,6 +3446,36 @@ int trap_ctx_get_client_count(trap_ctx_t *ctx, uint32_t ifcidx)
    return c->out_ifc_list[ifcidx].get_client_count(c->out_ifc_list[ifcidx].priv);
 }
 
+int trap_ctx_set_module_stats(trap_ctx_t *ctx, const char *json_stats)
+{
+   trap_ctx_priv_t *c = ctx;
+   json_t *stats = NULL, *old_stats;
+   json_error_t error;
+
+   if (c == NULL) {
+      return TRAP_E_NOT_INITIALIZED;
+   }
+   if (json_stats != NULL) {
+      stats = json_loads(json_stats, 0, &error);
+      if (stats == NULL || !json_is_object(stats)) {
+         json_decref(stats);
+         return trap_errorf(c, TRAP_E_BAD_FPARAMS, "Module stats must be a JSON object.");
+      }
+   }
+
+   if (pthread_rwlock_wrlock(&c->context_lock) != 0) {
+      VERBOSE(CL_ERROR, "Locking of context failed. %s", __func__);
+      json_decref(stats);
+      return TRAP_E_NOT_INITIALIZED;
+   }
+   old_stats = c->module_stats;
+   c->module_stats = stats;
+   pthread_rwlock_unlock(&c->context_lock);
+
+   json_decref(old_stats);
+   return TRAP_E_OK;
+}
+
 /**
  * @}
  */
@@ -3267,6 +3802,7 @@ int output_ifc_negotiation(void *ifc_priv_data, char ifc_type, int sock_d)
    int compare = 0;
    file_private_t *file_ifc_priv = NULL;
    tcpip_sender_private_t *tcp_ifc_priv = NULL;
+   shm_sender_private_t *shm_ifc_priv = NULL;
    uint8_t data_type = TRAP_FMT_UNKNOWN;
    char *data_fmt_spec = NULL;
    uint32_t ifc_idx = 0;
@@ -3282,6 +3818,11 @@ int output_ifc_negotiation(void *ifc_priv_data, char ifc_type, int sock_d)
       data_type = tcp_ifc_priv->ctx->out_ifc_list[tcp_ifc_priv->ifc_idx].data_type;
       data_fmt_spec = tcp_ifc_priv->ctx->out_ifc_list[tcp_ifc_priv->ifc_idx].data_fmt_spec;
       ifc_idx = tcp_ifc_priv->ifc_idx;
+   } else if (ifc_type == TRAP_IFC_TYPE_SHM) {
+      shm_ifc_priv = (shm_sender_private_t *) ifc_priv_data;
+      data_type = shm_ifc_priv->ctx->out_ifc_list[shm_ifc_priv->ifc_idx].data_type;
+      data_fmt_spec = shm_ifc_priv->ctx->out_ifc_list[shm_ifc_priv->ifc_idx].data_fmt_spec;
+      ifc_idx = shm_ifc_priv->ifc_idx;
    } else {
       neg_result = NEG_RES_FAILED;
       goto out_neg_exit;
@@ -3292,12 +3833,12 @@ int output_ifc_negotiation(void *ifc_priv_data, char ifc_type, int sock_d)
    // Check whether the output interfaces data format and data specifier are set correctly. If not, negotiation will fail.
    if (((data_type == TRAP_FMT_UNIREC || data_type == TRAP_FMT_JSON) && data_fmt_spec == NULL) || data_type == TRAP_FMT_UNKNOWN) {
       /**
-       * In case of file output interface, return NEG_RES_FMT_UNKNOWN
+       * In case of file or shm output interface, return NEG_RES_FMT_UNKNOWN
        * In case of tcpip or unix output interface, send hello message header with format unknown value and return NEG_RES_FMT_UNKNOWN
        */
       VERBOSE(CL_VERBOSE_LIBRARY, "Output interface negotiation - the data format or specifier of the output interface %d are not set correctly.", ifc_idx);
       neg_result = NEG_RES_FMT_UNKNOWN;
-      if (ifc_type == TRAP_IFC_TYPE_FILE) {
+      if (ifc_type == TRAP_IFC_TYPE_FILE || ifc_type == TRAP_IFC_TYPE_SHM) {
          goto out_neg_exit;
       } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
          VERBOSE(CL_VERBOSE_LIBRARY, "Output interface negotiation - gonna send header with TRAP_FMT_UNKNOWN.");
@@ -3311,6 +3852,10 @@ int output_ifc_negotiation(void *ifc_priv_data, char ifc_type, int sock_d)
       } else {
          hello_msg_header->data_fmt_spec_size = strlen(data_fmt_spec);
       }
+      if (tcp_ifc_priv != NULL && tcp_ifc_priv->codec != NULL) {
+         // Offer compression, the reply is read by I/O thread of the output interface
+         hello_msg_header->codec = tcp_ifc_priv->codec->id;
+      }
    }
 
    hello_msg_header_t tmp = *hello_msg_header;
@@ -3327,6 +3872,9 @@ int output_ifc_negotiation(void *ifc_priv_data, char ifc_type, int sock_d)
    } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
       ret_val = service_send_data(sock_d, size, (void **)&p);
       compare = TRAP_E_OK;
+   } else if (ifc_type == TRAP_IFC_TYPE_SHM) {
+      ret_val = shm_hello_write(shm_ifc_priv, (void *) p, size);
+      compare = size;
    }
    if (ret_val != compare) {
       // Could not send hello message header
@@ -3360,6 +3908,9 @@ int output_ifc_negotiation(void *ifc_priv_data, char ifc_type, int sock_d)
       } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
          ret_val = service_send_data(sock_d, size, (void **)&p);
          compare = TRAP_E_OK;
+      } else if (ifc_type == TRAP_IFC_TYPE_SHM) {
+         ret_val = shm_hello_write(shm_ifc_priv, (void *) p, size);
+         compare = size;
       }
       if (ret_val != compare) {
          // Could not send output interface data specifier
@@ -3398,6 +3949,11 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
 
    file_private_t *file_ifc_priv = NULL;
    tcpip_receiver_private_t *tcp_ifc_priv = NULL;
+   shm_receiver_private_t *shm_ifc_priv = NULL;
+   trap_input_ifc_t *ifc = NULL;
+   trap_in_ifc_state_t *client_state = NULL;
+   uint8_t *data_type = NULL;
+   char **data_fmt_spec = NULL;
    uint8_t req_data_type = TRAP_FMT_UNKNOWN;
    char *req_data_fmt_spec = NULL;
    char *current_data_fmt_spec = NULL;
@@ -3406,18 +3962,31 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
    // Decide which structure can be used for interfaces private data
    if (ifc_type == TRAP_IFC_TYPE_FILE) {
       file_ifc_priv = (file_private_t *) ifc_priv_data;
-      req_data_type = file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].req_data_type;
-      req_data_fmt_spec = file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].req_data_fmt_spec;
-      current_data_fmt_spec = file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].data_fmt_spec;
+      ifc = &file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx];
    } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
       tcp_ifc_priv = (tcpip_receiver_private_t *) ifc_priv_data;
-      req_data_type = tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].req_data_type;
-      req_data_fmt_spec = tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].req_data_fmt_spec;
-      current_data_fmt_spec = tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].data_fmt_spec;
+      ifc = &tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx];
+   } else if (ifc_type == TRAP_IFC_TYPE_SHM) {
+      shm_ifc_priv = (shm_receiver_private_t *) ifc_priv_data;
+      ifc = &shm_ifc_priv->ctx->in_ifc_list[shm_ifc_priv->ifc_idx];
    } else {
-      neg_result = NEG_RES_FAILED;
-      goto in_neg_exit;
+      free(hello_msg_header);
+      return NEG_RES_FAILED;
+   }
+   if (ifc->pf != NULL) {
+      /* negotiation runs in prefetch thread, the format is installed into IFC with the next buffer */
+      ifc->pf->fmt_negotiated = 1;
+      client_state = &ifc->pf->client_state;
+      data_type = &ifc->pf->data_type;
+      data_fmt_spec = &ifc->pf->data_fmt_spec;
+   } else {
+      client_state = &ifc->client_state;
+      data_type = &ifc->data_type;
+      data_fmt_spec = &ifc->data_fmt_spec;
    }
+   req_data_type = ifc->req_data_type;
+   req_data_fmt_spec = ifc->req_data_fmt_spec;
+   current_data_fmt_spec = *data_fmt_spec;
 
 
    /** Receive hello msg header with data_type and data_fmt_spec_size */
@@ -3426,20 +3995,19 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
    p_p = (void *) hello_msg_header;
 
    if (ifc_type == TRAP_IFC_TYPE_FILE) {
-      ret_val = fread(p_p, sizeof(char), size, file_ifc_priv->fd);
+      ret_val = file_read(file_ifc_priv, p_p, size);
       compare = size;
    } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
       ret_val = service_get_data(tcp_ifc_priv->sd, size, &p_p);
       compare = TRAP_E_OK;
+   } else if (ifc_type == TRAP_IFC_TYPE_SHM) {
+      ret_val = shm_hello_read(shm_ifc_priv, p_p, size);
+      compare = size;
    }
    if (ret_val != compare) {
       // Could not receive hello message header
       VERBOSE(CL_VERBOSE_LIBRARY, "ERROR");
-      if (ifc_type == TRAP_IFC_TYPE_FILE) {
-         file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_WAITING;
-      } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-         tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_WAITING;
-      }
+      *client_state = FMT_WAITING;
       neg_result = NEG_RES_FAILED;
       goto in_neg_exit;
    } else {
@@ -3458,41 +4026,25 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
    if (hello_msg_header->data_type == TRAP_FMT_UNKNOWN) {
       // Received unknown data type in hello message header from senders interface
       VERBOSE(CL_VERBOSE_LIBRARY, "ERROR - sender's output interface has unknown data format");
-      if (ifc_type == TRAP_IFC_TYPE_FILE) {
-         file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_WAITING;
-      } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-         tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_WAITING;
-      }
+      *client_state = FMT_WAITING;
       neg_result = NEG_RES_FMT_UNKNOWN;
       goto in_neg_exit;
    } else if (hello_msg_header->data_type != req_data_type) {
       // Senders and receivers interface data types are not the same
       VERBOSE(CL_VERBOSE_LIBRARY, "ERROR - mismatch of sender's output and receiver's input interface data types");
-      if (ifc_type == TRAP_IFC_TYPE_FILE) {
-         file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_MISMATCH;
-      } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-         tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_MISMATCH;
-      }
+      *client_state = FMT_MISMATCH;
       neg_result = NEG_RES_FMT_MISMATCH;
       goto in_neg_exit;
    } else if (req_data_type == TRAP_FMT_RAW) {
       // Both interfaces (senders output and receivers input) have RAW data format -> receive message with the data right after negotiation
-      if (ifc_type == TRAP_IFC_TYPE_FILE) {
-         file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_OK;
-      } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-         tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_OK;
-      }
+      *client_state = FMT_OK;
       neg_result = NEG_RES_CONT;
    } else {
       // Both interfaces (senders output and receivers input) have UNIREC or JSON data format, that's OK
       // If type is UNIREC, check data format specifier size (JSON can have empty specifier, but UNIREC don't)
       if (hello_msg_header->data_type == TRAP_FMT_UNIREC && hello_msg_header->data_fmt_spec_size <= 0) {
          VERBOSE(CL_VERBOSE_LIBRARY, "ERROR - received zero size of UNIREC data format specifier.");
-         if (ifc_type == TRAP_IFC_TYPE_FILE) {
-            file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_MISMATCH;
-         } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-            tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_MISMATCH;
-         }
+         *client_state = FMT_MISMATCH;
          neg_result = NEG_RES_FMT_MISMATCH;
          goto in_neg_exit;
       }
@@ -3510,21 +4062,20 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
 
       if (hello_msg_header->data_fmt_spec_size > 0) {
          if (ifc_type == TRAP_IFC_TYPE_FILE) {
-            ret_val = fread(p_p, sizeof(char), size, file_ifc_priv->fd);
+            ret_val = file_read(file_ifc_priv, p_p, size);
             compare = size;
          } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
             ret_val = service_get_data(tcp_ifc_priv->sd, size, &p_p);
             compare = TRAP_E_OK;
+         } else if (ifc_type == TRAP_IFC_TYPE_SHM) {
+            ret_val = shm_hello_read(shm_ifc_priv, p_p, size);
+            compare = size;
          }
       
          if (ret_val != compare) {
             // Could not receive data formate specifier
             VERBOSE(CL_VERBOSE_LIBRARY, "ERROR");
-            if (ifc_type == TRAP_IFC_TYPE_FILE) {
-               file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_WAITING;
-            } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-               tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_WAITING;
-            }
+            *client_state = FMT_WAITING;
             neg_result = NEG_RES_FAILED;
             free(recv_data_fmt_spec);
             recv_data_fmt_spec = NULL;
@@ -3554,30 +4105,18 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
       if (ret_val == TRAP_E_FIELDS_MISMATCH) {
          // senders and receivers ifc data_fmt_specs are not same
          VERBOSE(CL_VERBOSE_LIBRARY, "ERROR");
-         if (ifc_type == TRAP_IFC_TYPE_FILE) {
-            file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_MISMATCH;
-         } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-            tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_MISMATCH;
-         }
+         *client_state = FMT_MISMATCH;
          neg_result = NEG_RES_FMT_MISMATCH;
          free(recv_data_fmt_spec);
          recv_data_fmt_spec = NULL;
          goto in_neg_exit;
       } else if (ret_val == TRAP_E_FIELDS_SUBSET) {
          VERBOSE(CL_VERBOSE_LIBRARY, "OK");
-         if (ifc_type == TRAP_IFC_TYPE_FILE) {
-            file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_CHANGED;
-         } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-            tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_CHANGED;
-         }
+         *client_state = FMT_CHANGED;
          neg_result = NEG_RES_RECEIVER_FMT_SUBSET;
       } else {
          VERBOSE(CL_VERBOSE_LIBRARY, "OK");
-         if (ifc_type == TRAP_IFC_TYPE_FILE) {
-            file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_OK;
-         } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-            tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_OK;
-         }
+         *client_state = FMT_OK;
          neg_result = NEG_RES_CONT;
          if (current_data_fmt_spec != NULL) {
             VERBOSE(CL_VERBOSE_LIBRARY, "Step 5: comparing old and new sender's data_fmt_spec (not first negotiation)...   ");
@@ -3590,11 +4129,7 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
             }
             if (ret_val != TRAP_E_OK) {
                VERBOSE(CL_VERBOSE_LIBRARY, "CHANGE");
-               if (ifc_type == TRAP_IFC_TYPE_FILE) {
-                  file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state = FMT_CHANGED;
-               } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-                  tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state = FMT_CHANGED;
-               }
+               *client_state = FMT_CHANGED;
                if (hello_msg_header->data_type == TRAP_FMT_UNIREC) {
                   neg_result = NEG_RES_SENDER_FMT_SUBSET;
                } else {
@@ -3608,26 +4143,29 @@ int input_ifc_negotiation(void *ifc_priv_data, char ifc_type)
    }
 
    /** Save senders data_type and data_fmt_spec */
-   if (ifc_type == TRAP_IFC_TYPE_FILE) {
-      file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].data_type = hello_msg_header->data_type;
-      if (file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].data_fmt_spec != NULL) {
-         free(file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].data_fmt_spec);
-      }
-      file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].data_fmt_spec = recv_data_fmt_spec;
-   } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-      tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].data_type = hello_msg_header->data_type;
-      if (tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].data_fmt_spec != NULL) {
-         free(tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].data_fmt_spec);
+   *data_type = hello_msg_header->data_type;
+   if (*data_fmt_spec != NULL) {
+      free(*data_fmt_spec);
+   }
+   *data_fmt_spec = recv_data_fmt_spec;
+
+   /** Reply to offered compression */
+   if ((ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) && hello_msg_header->codec != 0) {
+      hello_msg_reply_t reply;
+      VERBOSE(CL_VERBOSE_LIBRARY, "Step 6: replying to offered codec %"PRIu8"...   ", hello_msg_header->codec);
+      reply.codec = (trap_codec_by_id(hello_msg_header->codec) != NULL ? hello_msg_header->codec : 0);
+      p_p = (void *) &reply;
+      if (service_send_data(tcp_ifc_priv->sd, sizeof(reply), &p_p) != TRAP_E_OK) {
+         VERBOSE(CL_VERBOSE_LIBRARY, "ERROR");
+         *client_state = FMT_WAITING;
+         neg_result = NEG_RES_FAILED;
+         goto in_neg_exit;
       }
-      tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].data_fmt_spec = recv_data_fmt_spec;
+      VERBOSE(CL_VERBOSE_LIBRARY, "%s", (reply.codec != 0 ? "ACCEPTED" : "REFUSED"));
    }
 
 in_neg_exit:
-   if (ifc_type == TRAP_IFC_TYPE_FILE) {
-      VERBOSE(CL_VERBOSE_LIBRARY, "input ifc state after connecting: %d", file_ifc_priv->ctx->in_ifc_list[file_ifc_priv->ifc_idx].client_state);
-   } else if (ifc_type == TRAP_IFC_TYPE_TCPIP || ifc_type == TRAP_IFC_TYPE_UNIX) {
-      VERBOSE(CL_VERBOSE_LIBRARY, "input ifc state after connecting: %d", tcp_ifc_priv->ctx->in_ifc_list[tcp_ifc_priv->ifc_idx].client_state);
-   }
+   VERBOSE(CL_VERBOSE_LIBRARY, "input ifc state after connecting: %d", *client_state);
 
    if (hello_msg_header != NULL) {
       free(hello_msg_header);
@@ -0,0 +1,160 @@
+/**
+ * \file trap_codec.c
+ * \brief Compression of TRAP buffers shared by interfaces
+ * \date 2026
+ */
+/*
+ * Copyright (C) 2026 CESNET
+ *
+ * LICENSE TERMS
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions
+ * are met:
+ * 1. Redistributions of source code must retain the above copyright
+ *    notice, this list of conditions and the following disclaimer.
+ * 2. Redistributions in binary form must reproduce the above copyright
+ *    notice, this list of conditions and the following disclaimer in
+ *    the documentation and/or other materials provided with the
+ *    distribution.
+ * 3. Neither the name of the Company nor the names of its contributors
+ *    may be used to endorse or promote products derived from this
+ *    software without specific prior written permission.
+ *
+ * ALTERNATIVELY, provided that this notice is retained in full, this
+ * product may be distributed under the terms of the GNU General Public
+ * License (GPL) version 2 or later, in which case the provisions
+ * of the GPL apply INSTEAD OF those given above.
+ *
+ * This software is provided ``as is'', and any express or implied
+ * warranties, including, but not limited to, the implied warranties of
+ * merchantability and fitness for a particular purpose are disclaimed.
+ * In no event shall the company or contributors be liable for any
+ * direct, indirect, incidental, special, exemplary, or consequential
+ * damages (including, but not limited to, procurement of substitute
+ * goods or services; loss of use, data, or profits; or business
+ * interruption) however caused and on any theory of liability, whether
+ * in contract, strict liability, or tort (including negligence or
+ * otherwise) arising in any way out of the use of this software, even
+ * if advised of the possibility of such damage.
+ *
+ */
+#include <config.h>
+#include <stdlib.h>
+#include <string.h>
+#include "trap_codec.h"
+
+#ifdef HAVE_LIBZ
+#include <zlib.h>
+#endif
+
+/**
+ * \addtogroup trap_ifc
+ * @{
+ */
+
+#ifdef HAVE_LIBZ
+static void *trap_zlib_create(int compress, int level)
+{
+   z_stream *z = calloc(1, sizeof(z_stream));
+   int ret;
+
+   if (z == NULL) {
+      return NULL;
+   }
+   if (compress) {
+      ret = deflateInit(z, level == -1 ? Z_BEST_SPEED : level);
+   } else {
+      ret = inflateInit(z);
+   }
+   if (ret != Z_OK) {
+      free(z);
+      return NULL;
+   }
+   return z;
+}
+
+static void trap_zlib_free(void *state, int compress)
+{
+   if (compress) {
+      deflateEnd(state);
+   } else {
+      inflateEnd(state);
+   }
+   free(state);
+}
+
+static size_t trap_zlib_bound(size_t len)
+{
+   return compressBound(len);
+}
+
+static int trap_zlib_compress(void *state, const void *src, size_t src_len, void *dst, size_t *dst_len)
+{
+   z_stream *z = state;
+
+   deflateReset(z);
+   z->next_in = (Bytef *) src;
+   z->avail_in = src_len;
+   z->next_out = dst;
+   z->avail_out = *dst_len;
+   if (deflate(z, Z_FINISH) != Z_STREAM_END) {
+      return -1;
+   }
+   *dst_len = z->total_out;
+   return 0;
+}
+
+static int trap_zlib_decompress(void *state, const void *src, size_t src_len, void *dst, size_t dst_len)
+{
+   z_stream *z = state;
+
+   inflateReset(z);
+   z->next_in = (Bytef *) src;
+   z->avail_in = src_len;
+   z->next_out = dst;
+   z->avail_out = dst_len;
+   if (inflate(z, Z_FINISH) != Z_STREAM_END || z->total_out != dst_len) {
+      return -1;
+   }
+   return 0;
+}
+#endif
+
+/**
+ * Available codecs, terminated by entry with NULL name.
+ */
+static const trap_codec_t trap_codecs[] = {
+#ifdef HAVE_LIBZ
+   {"zlib", 1, trap_zlib_create, trap_zlib_free, trap_zlib_bound, trap_zlib_compress, trap_zlib_decompress},
+#endif
+   {NULL, 0, NULL, NULL, NULL, NULL, NULL}
+};
+
+const trap_codec_t *trap_codec_by_name(const char *name, size_t length)
+{
+   const trap_codec_t *codec;
+
+   for (codec = trap_codecs; codec->name != NULL; codec++) {
+      if (strlen(codec->name) == length && strncmp(codec->name, name, length) == 0) {
+         return codec;
+      }
+   }
+   return NULL;
+}
+
+const trap_codec_t *trap_codec_by_id(uint8_t id)
+{
+   const trap_codec_t *codec;
+
+   for (codec = trap_codecs; codec->name != NULL; codec++) {
+      if (codec->id == id) {
+         return codec;
+      }
+   }
+   return NULL;
+}
+
+/**
+ * @}
+ */
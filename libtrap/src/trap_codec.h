@@ -0,0 +1,109 @@
+/**
+ * \file trap_codec.h
+ * \brief Compression of TRAP buffers shared by interfaces
+ * \date 2026
+ */
+/*
+ * Copyright (C) 2026 CESNET
+ *
+ * LICENSE TERMS
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions
+ * are met:
+ * 1. Redistributions of source code must retain the above copyright
+ *    notice, this list of conditions and the following disclaimer.
+ * 2. Redistributions in binary form must reproduce the above copyright
+ *    notice, this list of conditions and the following disclaimer in
+ *    the documentation and/or other materials provided with the
+ *    distribution.
+ * 3. Neither the name of the Company nor the names of its contributors
+ *    may be used to endorse or promote products derived from this
+ *    software without specific prior written permission.
+ *
+ * ALTERNATIVELY, provided that this notice is retained in full, this
+ * product may be distributed under the terms of the GNU General Public
+ * License (GPL) version 2 or later, in which case the provisions
+ * of the GPL apply INSTEAD OF those given above.
+ *
+ * This software is provided ``as is'', and any express or implied
+ * warranties, including, but not limited to, the implied warranties of
+ * merchantability and fitness for a particular purpose are disclaimed.
+ * In no event shall the company or contributors be liable for any
+ * direct, indirect, incidental, special, exemplary, or consequential
+ * damages (including, but not limited to, procurement of substitute
+ * goods or services; loss of use, data, or profits; or business
+ * interruption) however caused and on any theory of liability, whether
+ * in contract, strict liability, or tort (including negligence or
+ * otherwise) arising in any way out of the use of this software, even
+ * if advised of the possibility of such damage.
+ *
+ */
+#ifndef _TRAP_CODEC_H_
+#define _TRAP_CODEC_H_
+
+#include <stddef.h>
+#include <stdint.h>
+
+/**
+ * \addtogroup trap_ifc
+ * @{
+ */
+
+/**
+ * Codec used to compress payload of buffers (file and TCP/UNIX interfaces).
+ *
+ * New codec is added by implementing these functions and appending
+ * an entry into the table in trap_codec.c.  Identifier of codec is stored
+ * in files and sent over network, so it must not be changed or reused.
+ */
+typedef struct trap_codec_s {
+   const char *name; /**< Name used in IFC parameter compress= */
+   uint8_t id; /**< Identifier stored in trap_codec_header_t */
+   /** Create compression (compress != 0) or decompression context, level -1 is the default of codec */
+   void *(*create)(int compress, int level);
+   /** Free context created by create() */
+   void (*free)(void *state, int compress);
+   /** Maximal size of compressed data of the given size */
+   size_t (*bound)(size_t len);
+   /** Compress src into dst, dst_len is the size of dst on input and size of compressed data on output, returns 0 on success */
+   int (*compress)(void *state, const void *src, size_t src_len, void *dst, size_t *dst_len);
+   /** Decompress src into dst that must be filled exactly (dst_len bytes), returns 0 on success */
+   int (*decompress)(void *state, const void *src, size_t src_len, void *dst, size_t dst_len);
+} trap_codec_t;
+
+/**
+ * Flag in the length header (trap_buffer_header_t) of compressed buffer.
+ * Length of compressed buffer includes trap_codec_header_t.
+ */
+#define TRAP_CODEC_COMPRESSED  0x80000000
+
+/**
+ * Header of compressed buffer, it follows the length header.
+ */
+typedef struct trap_codec_header_s {
+   uint8_t codec; /**< Identifier of codec (trap_codec_t) */
+   uint8_t reserved[3];
+   uint32_t raw_length; /**< Size of decompressed buffer (network byte order) */
+} trap_codec_header_t;
+
+/**
+ * \brief Find codec by its name.
+ * \param[in] name   name of codec (not necessarily terminated)
+ * \param[in] length   length of name
+ * \return codec or NULL if it is not available
+ */
+const trap_codec_t *trap_codec_by_name(const char *name, size_t length);
+
+/**
+ * \brief Find codec by its identifier.
+ * \param[in] id   identifier of codec
+ * \return codec or NULL if it is not available
+ */
+const trap_codec_t *trap_codec_by_id(uint8_t id);
+
+/**
+ * @}
+ */
+
+#endif
@@ -52,6 +52,7 @@
 #include <sys/time.h>
 #include <pthread.h>
 #include <semaphore.h>
+#include "../include/libtrap/jansson.h"
 
 /** \defgroup trap_ifc TRAP communication module interface
  * @{
@@ -85,6 +86,22 @@
  */
 typedef int (*ifc_recv_func_t)(void *p, void *d, uint32_t *s, int t);
 
+/**
+ * Receive one message via this IFC without copying (optional).
+ *
+ * When this function is set, it is preferred by trap_read_from_buffer()
+ * over ifc_recv_func_t.  Instead of writing into the buffer of libtrap,
+ * the IFC returns a pointer to its own memory holding the message.
+ *
+ * \param[in] p   pointer to IFC's private memory allocated by constructor
+ * \param[in,out] d  internal buffer of libtrap on input (the IFC can fill it as in
+ * ifc_recv_func_t), pointer to received message on output, it must stay valid until the next call
+ * \param[out] s  size (in bytes) of received message (must be set by this IFC)
+ * \param[in] t   timeout, see \ref trap_timeout
+ * \returns TRAP_E_OK on success
+ */
+typedef int (*ifc_recv_buffer_func_t)(void *p, void **d, uint32_t *s, int t);
+
 /**
  * Send one message via this IFC.
  *
@@ -156,19 +173,34 @@ typedef char * (*ifc_get_id_func_t)(void *priv);
  */
 typedef uint8_t (*ifc_is_conn_func_t)(void *priv);
 
+/**
+ * Add IFC-specific counters into statistics of the interface.
+ *
+ * This function is optional, it is called by service thread when
+ * counters are requested.
+ *
+ * \param[in] priv   pointer to IFC's private memory allocated by constructor
+ * \param[in,out] stats  JSON object with counters of the interface
+ */
+typedef void (*ifc_get_stats_func_t)(void *priv, json_t *stats);
+
 
 /**
  * @}
  */
 
+struct trap_prefetch_s;
+
 /** Struct to hold an instance of some input interface. */
 typedef struct trap_input_ifc_s {
    ifc_is_conn_func_t is_conn; ///< Pointer to is_connected function
    ifc_get_id_func_t get_id;       ///< Pointer to get_id function
    ifc_recv_func_t recv;           ///< Pointer to receive function
+   ifc_recv_buffer_func_t recv_buffer; ///< Pointer to zero-copy receive function (optional, can be NULL)
    ifc_terminate_func_t terminate; ///< Pointer to terminate function
    ifc_destroy_func_t destroy;     ///< Pointer to destructor function
    ifc_create_dump_func_t create_dump; ///< Pointer to function for generating of dump
+   ifc_get_stats_func_t get_stats; ///< Pointer to get_stats function (optional, can be NULL)
    void *priv;                     ///< Pointer to instance's private data
    char *buffer;                   ///< Internal pointer to buffer for messages
    char *buffer_pointer;           ///< Internal pointer to current message in buffer
@@ -215,8 +247,30 @@ typedef struct trap_input_ifc_s {
     * data_fmt_spec contains e.g. UniRec template specifier (string representation)
     */
    char *req_data_fmt_spec;
+
+   uint32_t prefetch;              ///< Number of buffers read ahead by prefetch thread (prefetch=N), 0 - disabled
+   struct trap_prefetch_s *pf;     ///< Prefetch queue, it is created by the first trap_recv() (can be NULL)
 } trap_input_ifc_t;
 
+/**
+ * State of adaptive buffering of output IFC (#TRAPCTL_ADAPTIVE).
+ *
+ * Size of sent buffers is derived from the estimated rate of data so that
+ * a buffer is filled in half of the target latency, autoflush timeout is set
+ * to the other half.
+ */
+typedef struct trap_adaptive_s {
+   int32_t latency;                ///< Target latency in microseconds, 0 - adaptive buffering is disabled
+   char latency_fixed;             ///< If 1 do not allow to change adaptive buffering by module (it was set by IFC parameter)
+   uint64_t window_start;          ///< Start of the current measurement (monotonic time in microseconds)
+   uint64_t window_bytes;          ///< Bytes of buffers sent since window_start
+   uint64_t window_messages;       ///< Value of message counter of the IFC at window_start
+   double rate;                    ///< Estimated rate in bytes per second
+   double msg_rate;                ///< Estimated rate in messages per second
+   uint64_t buffers;               ///< Number of buffers sent in adaptive mode
+   uint64_t bytes;                 ///< Bytes of buffers sent in adaptive mode
+} trap_adaptive_t;
+
 /** Struct to hold an instance of some output interface. */
 typedef struct trap_output_ifc_s {
    ifc_get_id_func_t get_id;       ///< Pointer to get_id function
@@ -226,6 +280,7 @@ typedef struct trap_output_ifc_s {
    ifc_destroy_func_t destroy;     ///< Pointer to destructor function
    ifc_create_dump_func_t create_dump; ///< Pointer to function for generating of dump
    ifc_get_client_count_func_t get_client_count;  ///< Pointer to get_client_count function
+   ifc_get_stats_func_t get_stats; ///< Pointer to get_stats function (optional, can be NULL)
    void *priv;                     ///< Pointer to instance's private data
    unsigned char *buffer;          ///< Internal pointer to buffer for messages
    unsigned char *buffer_header;   ///< Internal pointer to header of buffer followed by payload
@@ -271,6 +326,9 @@ typedef struct trap_output_ifc_s {
     * data_fmt_spec contains e.g. UniRec template specifier (string representation)
     */
    char *data_fmt_spec;
+
+   uint32_t buffer_limit;          ///< Buffer is sent when its payload reaches this size (it is changed by adaptive buffering only)
+   trap_adaptive_t adaptive;       ///< State of adaptive buffering
 } trap_output_ifc_t;
 
 /**
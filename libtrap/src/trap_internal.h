@@ -105,12 +105,26 @@ extern trap_ctx_priv_t * trap_glob_ctx;
 /**
  * Hello message header structure (used during the output and input interface negotiation).
  * Contains data format and data specifier size of the output interface which is making the negotiation.
+ *
+ * TCP/UNIX output interface offers compression of buffers by setting codec
+ * (identifier of trap_codec_t), the input interface answers by hello_msg_reply_t.
  */
 typedef struct hello_msg_header_s {
    uint8_t data_type;
+   uint8_t codec; ///< Offered codec, 0 means no compression (it was padding in older versions)
    uint32_t data_fmt_spec_size;
 } hello_msg_header_t;
 
+/**
+ * Reply of TCP/UNIX input interface to the hello message that offered compression.
+ *
+ * It is sent after successful negotiation only when codec of hello message
+ * is not 0, older output interfaces ignore it.
+ */
+typedef struct hello_msg_reply_s {
+   uint8_t codec; ///< Accepted codec, 0 means that compression was refused
+} hello_msg_reply_t;
+
 
 /*!
 \brief VERBOSE/MSG levels
@@ -204,6 +218,75 @@ struct reader_threads_s {
    sem_t sem;        /**< semaphore used when thread is ought to sleep */
 };
 
+/**
+ * Minimal time between updates of the estimated rate of output IFC in adaptive buffering (in microseconds).
+ */
+#define TRAP_ADAPTIVE_WINDOW 10000
+
+/**
+ * Minimal autoflush timeout set by adaptive buffering (in microseconds).
+ */
+#define TRAP_ADAPTIVE_MIN_AUTOFLUSH 1000
+
+/**
+ * Maximal number of buffers read ahead by prefetch thread of input IFC (prefetch=N).
+ */
+#define TRAP_PREFETCH_MAX 256
+
+/**
+ * Timeout of recv() calls of prefetch thread (in microseconds), the thread
+ * checks termination after every timeout.
+ */
+#define TRAP_PREFETCH_RECV_TIMEOUT 100000
+
+/**
+ * Buffer received by prefetch thread.
+ */
+typedef struct trap_prefetch_slot_s {
+   char *data;       /**< Payload of buffer (TRAP_IFC_MESSAGEQ_SIZE + 1 bytes allocated) */
+   uint32_t size;    /**< Size of payload */
+   int result;       /**< Result of recv() of IFC, data are valid for TRAP_E_OK only */
+   char fmt_set;     /**< Format was negotiated before this buffer, it is valid from this buffer */
+   trap_in_ifc_state_t client_state; /**< Negotiation state (fmt_set only) */
+   uint8_t data_type;   /**< Message format (fmt_set only) */
+   char *data_fmt_spec; /**< Message format specifier (fmt_set only), it is moved to IFC by the caller */
+} trap_prefetch_slot_t;
+
+/**
+ * Prefetch queue of input IFC.
+ *
+ * Prefetch thread keeps up to `prefetch` received buffers ahead of the
+ * caller of trap_recv().  The circular queue has one more slot that holds
+ * the buffer being read by the caller.
+ *
+ * Negotiation runs inside recv() of the thread, it stores the negotiated
+ * format here instead of the IFC.  The format is attached to the next
+ * received buffer and it is installed into the IFC when the caller gets to
+ * that buffer, so that fields of the IFC are accessed by the caller only.
+ */
+typedef struct trap_prefetch_s {
+   trap_input_ifc_t *ifc; /**< Input IFC the buffers are received from */
+   trap_prefetch_slot_t *slots; /**< Circular queue of prefetch + 1 buffers */
+   uint32_t slots_count; /**< Number of slots */
+   uint32_t head;        /**< Index of the oldest buffer */
+   uint32_t count;       /**< Number of buffers in queue (including the buffer in use) */
+   char in_use;          /**< Buffer at head is being read by the caller */
+   char fmt_negotiated;  /**< Format was negotiated by the thread and it was not attached to a buffer yet */
+   trap_in_ifc_state_t client_state; /**< Negotiation state as seen by the thread */
+   uint8_t data_type;    /**< Message format as seen by the thread */
+   char *data_fmt_spec;  /**< Message format specifier as seen by the thread */
+   char terminate;       /**< Thread should finish */
+   char running;         /**< Thread was started */
+   pthread_mutex_t lock; /**< Protects the queue */
+   pthread_cond_t cond;  /**< Signaled when the queue changes */
+   pthread_t thread;     /**< Prefetch thread */
+
+   uint64_t depth_sum;   /**< Sum of numbers of buffers ahead of the caller when it takes a buffer */
+   uint64_t taken;       /**< Number of buffers taken by the caller */
+   uint64_t empty_waits; /**< Number of times the caller waited for an empty queue (input-bound) */
+   uint64_t full_waits;  /**< Number of times the thread waited for a full queue (CPU-bound) */
+} trap_prefetch_t;
+
 /**
  * List of all output interfaces and their timeouts.
  *
@@ -360,6 +443,12 @@ struct trap_ctx_priv_s {
     * counter_recv_buffer is incremented within trap_read_from_buffer() after successful receiving buffer.
     */
    uint64_t *counter_recv_buffer;
+   /**
+    * Module-specific statistics (JSON object) set by trap_ctx_set_module_stats(),
+    * they are sent via service IFC together with the counters.  Access is
+    * guarded by context_lock.
+    */
+   json_t *module_stats;
    /**
     * @}
     */
@@ -0,0 +1,277 @@
+/**
+ * \file test_throughput.c
+ * \brief Test: one-way throughput of an IFC (sender and receiver mode)
+ * \date 2026
+ */
+/*
+ * Copyright (C) 2026 CESNET
+ *
+ * LICENSE TERMS
+ *
+ * Redistribution and use in source and binary forms, with or without
+ * modification, are permitted provided that the following conditions
+ * are met:
+ * 1. Redistributions of source code must retain the above copyright
+ *    notice, this list of conditions and the following disclaimer.
+ * 2. Redistributions in binary form must reproduce the above copyright
+ *    notice, this list of conditions and the following disclaimer in
+ *    the documentation and/or other materials provided with the
+ *    distribution.
+ * 3. Neither the name of the Company nor the names of its contributors
+ *    may be used to endorse or promote products derived from this
+ *    software without specific prior written permission.
+ *
+ * ALTERNATIVELY, provided that this notice is retained in full, this
+ * product may be distributed under the terms of the GNU General Public
+ * License (GPL) version 2 or later, in which case the provisions
+ * of the GPL apply INSTEAD OF those given above.
+ *
+ * This software is provided ``as is'', and any express or implied
+ * warranties, including, but not limited to, the implied warranties of
+ * merchantability and fitness for a particular purpose are disclaimed.
+ * In no event shall the company or contributors be liable for any
+ * direct, indirect, incidental, special, exemplary, or consequential
+ * damages (including, but not limited to, procurement of substitute
+ * goods or services; loss of use, data, or profits; or business
+ * interruption) however caused and on any theory of liability, whether
+ * in contract, strict liability, or tort (including negligence or
+ * otherwise) arising in any way out of the use of this software, even
+ * if advised of the possibility of such damage.
+ *
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <signal.h>
+#include <string.h>
+#include <time.h>
+#include <getopt.h>
+#include <unistd.h>
+#include <stdint.h>
+#include <inttypes.h>
+#include <libtrap/trap.h>
+
+#define ERRARG -1
+
+// Struct with information about module
+trap_module_info_t module_info = {
+   "Throughput test module", // Module name
+   // Module description
+   "\n",
+   0, // Number of input interfaces
+   0, // Number of output interfaces
+};
+
+static char stop = 0;
+trap_ctx_t *ctx = NULL;
+
+void signal_handler(int signal)
+{
+   if ((signal == SIGTERM) || (signal == SIGINT)) {
+      stop = 1;
+      trap_ctx_terminate(ctx);
+   }
+}
+
+void help(const char *progname)
+{
+   printf("%s -i ifcspec [-hs] [-c count] [-n size] [-w clients] [-d delay] [-f changes]\n"
+          "\t-i\tlibtrap IFC spec (1 output IFC with -s, 1 input IFC otherwise)\n"
+          "\t-s\tsender mode, receiver is started by default\n"
+          "\t-c\tnumber of messages to send (1000000 by default)\n"
+          "\t-n\tsize of one message in bytes (64 by default)\n"
+          "\t-w\tsender waits for the given number of clients before sending\n"
+          "\t-d\tsleep delay microseconds after every message (slow sender or slow client)\n"
+          "\t-f\tsender changes JSON format \"fmtK\" of messages the given number of times,\n"
+          "\t\treceiver checks that every message has the format reported by libtrap\n", progname);
+}
+
+static double now(void)
+{
+   struct timespec ts;
+   clock_gettime(CLOCK_MONOTONIC, &ts);
+   return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+int main(int argc, char **argv)
+{
+   int ret;
+   signed char opt;
+   char sender = 0;
+   uint64_t count = 1000000, i, expected = 0, errors = 0, lost = 0, bytes = 0, id;
+   unsigned int delay = 0, clients = 0, changes = 0;
+   uint64_t fmt = 0;
+   uint8_t data_type;
+   const char *spec;
+   uint16_t payload_size = 64;
+   char *payload = NULL;
+   const void *recv_payload;
+   uint16_t recv_payload_size;
+   double start = 0, duration;
+
+   /* mode is needed before the context is created to set the number of IFCs */
+   for (i = 1; i < argc; i++) {
+      if (strcmp(argv[i], "-s") == 0) {
+         sender = 1;
+      }
+   }
+   if (sender) {
+      module_info.num_ifc_out = 1;
+   } else {
+      module_info.num_ifc_in = 1;
+   }
+
+   trap_ifc_spec_t ifc_spec;
+   ret = trap_parse_params(&argc, argv, &ifc_spec);
+   if (ret != TRAP_E_OK) {
+      if (ret == TRAP_E_HELP) { // "-h" was found
+         help(argv[0]);
+         return 0;
+      }
+      fprintf(stderr, "ERROR in parsing of parameters for TRAP: %s\n", trap_last_error_msg);
+      return 1;
+   }
+
+   while ((opt = getopt(argc, argv, "hsc:n:w:d:f:")) != ERRARG) {
+      switch (opt) {
+      case 's':
+         break;
+      case 'c':
+         sscanf(optarg, "%"SCNu64, &count);
+         break;
+      case 'n':
+         sscanf(optarg, "%hu", &payload_size);
+         break;
+      case 'w':
+         sscanf(optarg, "%u", &clients);
+         break;
+      case 'd':
+         sscanf(optarg, "%u", &delay);
+         break;
+      case 'f':
+         sscanf(optarg, "%u", &changes);
+         break;
+      case 'h':
+      default:
+         help(argv[0]);
+         return 0;
+      }
+   }
+   if (payload_size < 2 * sizeof(uint64_t)) {
+      /* message ID and index of format */
+      payload_size = 2 * sizeof(uint64_t);
+   }
+
+   // Initialize TRAP library (create and init all interfaces)
+   ctx = trap_ctx_init(&module_info, ifc_spec);
+   if (ctx == NULL || trap_ctx_get_last_error(ctx) != TRAP_E_OK) {
+      fprintf(stderr, "Trap_ctx_init failed.\n");
+      return 1;
+   }
+   trap_free_ifc_spec(ifc_spec);
+
+   signal(SIGTERM, signal_handler);
+   signal(SIGINT, signal_handler);
+
+   if (sender) {
+      if (changes > 0) {
+         trap_ctx_set_data_fmt(ctx, 0, TRAP_FMT_JSON, "fmt0");
+      } else {
+         trap_ctx_set_data_fmt(ctx, 0, TRAP_FMT_RAW);
+      }
+      trap_ctx_ifcctl(ctx, TRAPIFC_OUTPUT, 0, TRAPCTL_SETTIMEOUT, TRAP_WAIT);
+      payload = (char *) calloc(1, payload_size);
+      if (payload == NULL) {
+         fprintf(stderr, "Allocation of payload buffer failed.\n");
+         return 1;
+      }
+      while (!stop && trap_ctx_get_client_count(ctx, 0) < clients) {
+         usleep(10000);
+      }
+      start = now();
+      for (i = 0; i < count && !stop; i++) {
+         if (changes > 0 && i == (fmt + 1) * count / (changes + 1)) {
+            char new_spec[32];
+            fmt++;
+            snprintf(new_spec, sizeof(new_spec), "fmt%"PRIu64, fmt);
+            /* buffered messages are sent in the previous format */
+            trap_ctx_send_flush(ctx, 0);
+            trap_ctx_set_data_fmt(ctx, 0, TRAP_FMT_JSON, new_spec);
+         }
+         ((uint64_t *) payload)[0] = i;
+         ((uint64_t *) payload)[1] = fmt;
+         ret = trap_ctx_send(ctx, 0, payload, payload_size);
+         if (ret != TRAP_E_OK) {
+            fprintf(stderr, "ERROR in sending data. %d\n", ret);
+            errors++;
+            break;
+         }
+         bytes += payload_size;
+         if (delay != 0) {
+            usleep(delay);
+         }
+      }
+      /* termination message */
+      trap_ctx_send(ctx, 0, payload, 1);
+      trap_ctx_send_flush(ctx, 0);
+      expected = i;
+   } else {
+      if (changes > 0) {
+         trap_ctx_set_required_fmt(ctx, 0, TRAP_FMT_JSON, "");
+      } else {
+         trap_ctx_set_required_fmt(ctx, 0, TRAP_FMT_RAW);
+      }
+      while (!stop) {
+         ret = trap_ctx_recv(ctx, 0, &recv_payload, &recv_payload_size);
+         if (changes > 0 && (ret == TRAP_E_FORMAT_CHANGED || (ret == TRAP_E_OK && expected == 0))) {
+            /* the message is the first one of the new format */
+            if (trap_ctx_get_data_fmt(ctx, TRAPIFC_INPUT, 0, &data_type, &spec) != TRAP_E_OK ||
+                sscanf(spec, "fmt%"SCNu64, &fmt) != 1) {
+               fprintf(stderr, "ERROR in getting format of data.\n");
+               errors++;
+               break;
+            }
+            ret = TRAP_E_OK;
+         }
+         if (ret != TRAP_E_OK) {
+            fprintf(stderr, "ERROR in receiving data. %d\n", ret);
+            errors++;
+            break;
+         }
+         if (recv_payload_size <= 1) {
+            break;
+         }
+         if (expected == 0) {
+            start = now();
+         }
+         id = ((uint64_t *) recv_payload)[0];
+         if (changes > 0 && ((uint64_t *) recv_payload)[1] != fmt) {
+            /* format change was reported at another message */
+            errors++;
+         }
+         if (id < expected) {
+            errors++;
+         } else if (id > expected) {
+            /* messages dropped by sender (slow client policy) */
+            lost += id - expected;
+            expected = id;
+         }
+         expected++;
+         bytes += recv_payload_size;
+         if (delay != 0) {
+            usleep(delay);
+         }
+      }
+   }
+   duration = now() - start;
+
+   printf("%s: messages: %"PRIu64" bytes: %"PRIu64" errors: %"PRIu64" lost: %"PRIu64" time: %.3fs rate: %.0f msg/s %.1f MB/s\n",
+          sender ? "sender" : "receiver", expected - lost, bytes, errors, lost, duration,
+          duration > 0 ? expected / duration : 0, duration > 0 ? bytes / duration / 1e6 : 0);
+
+   // Do all necessary cleanup before exiting
+   // (close interfaces and free allocated memory)
+   trap_ctx_finalize(&ctx);
+   free(payload);
+
+   return (errors == 0 ? 0 : 1);
+}
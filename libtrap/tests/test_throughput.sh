@@ -0,0 +1,18 @@
+#!/bin/bash
+#
+# Compare throughput of UNIX socket and shared memory IFCs.
+# usage: ./test_throughput.sh [count] [sizes...]
+
+count=${1:-2000000}
+shift
+sizes=${@:-64 512 4096}
+
+for size in $sizes; do
+   for ifc in u m; do
+      ./test_throughput -i "$ifc:throughput" -s -c $count -n $size > /dev/null &
+      sender=$!
+      echo -n "$ifc size $size: "
+      ./test_throughput -i "$ifc:throughput"
+      wait $sender
+   done
+done
@@ -309,6 +309,28 @@ int decode_cnts_from_json(char **data)
 
       printf("\tID: %s, TYPE: %c, NUM_CLI: %d, SM: %" PRIu64 ", DM: %" PRIu64 ", SB: %" PRIu64 ", AF: %" PRIu64 "\n", ifc_id, ifc_type, num_clients, ifc_cnts[msg_idx], ifc_cnts[dropped_msg_idx], ifc_cnts[buffers_idx], ifc_cnts[af_idx]);
       memset(ifc_cnts, 0, 4 * sizeof(uint64_t));
+
+      // Counters of slow clients are optional (TCP and UNIX socket IFCs)
+      cnt = json_object_get(out_ifc_cnts, "slow-client-policy");
+      if (cnt != NULL) {
+         printf("\t\tSLOW: %s, QB: %" JSON_INTEGER_FORMAT ", BLOCKED: %" JSON_INTEGER_FORMAT ", TIMEOUTS: %" JSON_INTEGER_FORMAT ", DB: %" JSON_INTEGER_FORMAT ", DC: %" JSON_INTEGER_FORMAT "\n",
+                json_string_value(cnt),
+                json_integer_value(json_object_get(out_ifc_cnts, "queued-buffers")),
+                json_integer_value(json_object_get(out_ifc_cnts, "slow-blocked")),
+                json_integer_value(json_object_get(out_ifc_cnts, "slow-timeouts")),
+                json_integer_value(json_object_get(out_ifc_cnts, "slow-dropped-buffers")),
+                json_integer_value(json_object_get(out_ifc_cnts, "slow-disconnected-clients")));
+      }
+   }
+
+   // Module-specific statistics are optional, they are printed as they are
+   cnt = json_object_get(json_struct, "module");
+   if (cnt != NULL) {
+      char *module_stats = json_dumps(cnt, JSON_INDENT(2) | JSON_SORT_KEYS);
+      if (module_stats != NULL) {
+         printf("Module statistics:\n%s\n", module_stats);
+         free(module_stats);
+      }
    }
 
    json_decref(json_struct);
@@ -441,6 +463,12 @@ int main (int argc, char **argv)
              "\tDM (dropped messages)\n"
              "\tSB (sent buffers)\n"
              "\tAF (autoflushes counter)\n"
+             "\tSLOW (slow client policy)\n"
+             "\tQB (queued buffers)\n"
+             "\tBLOCKED (sending blocked by slow client)\n"
+             "\tTIMEOUTS (sending timed out because of slow client)\n"
+             "\tDB (buffers dropped for slow clients)\n"
+             "\tDC (disconnected slow clients)\n"
              "- - - - - - - - - - - - - - - - - - -\n");
    }
 
@@ -1,8 +1,20 @@
 import sys, os.path
 import argparse
 import json
+import signal
+import traceback
+import multiprocessing
 import pytrap
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 from time import time, gmtime
+try:
+    from time import perf_counter as clock
+except ImportError:
+    # Python 2
+    from time import time as clock
 from uuid import uuid4
 from datetime import datetime
 
@@ -61,6 +73,309 @@ Description:
 
 DEFAULT_NODE_NAME = "undefined"
 
+# Maximal number of batches that may be processed by worker processes at once
+# (per worker), the main process waits for results when it is reached.
+WORKER_MAX_PENDING = 64
+
+# Interval (in seconds) of checks that worker processes are alive while the
+# main process waits for results, a batch of a dead worker is never finished.
+WORKER_CHECK_INTERVAL = 1.0
+
+# Receive timeout (in microseconds) used when worker processes or statistics
+# are enabled, the main loop needs to wake up regularly to pass finished results
+# to outputs and to store statistics.
+RECV_TIMEOUT = 100000
+
+
+class LatencyHistogram(object):
+    """Histogram of latencies in microseconds.
+
+    Values are counted in log-linear buckets (like in HdrHistogram): every
+    power of 2 is split into 2^SUB_BITS linear sub-buckets. The relative error
+    of percentiles is therefore below 1/2^SUB_BITS and the memory is bounded
+    by the number of used buckets."""
+
+    SUB_BITS = 4
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0
+
+    @classmethod
+    def bucketIndex(cls, value):
+        """Return index of bucket for value (integer)."""
+        if value < (1 << cls.SUB_BITS):
+            return value
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        return ((shift + 1) << cls.SUB_BITS) + (value >> shift) - (1 << cls.SUB_BITS)
+
+    @classmethod
+    def bucketValue(cls, index):
+        """Return the lowest value that belongs to bucket with index."""
+        if index < (1 << cls.SUB_BITS):
+            return index
+        shift = (index >> cls.SUB_BITS) - 1
+        return ((index & ((1 << cls.SUB_BITS) - 1)) + (1 << cls.SUB_BITS)) << shift
+
+    def record(self, value):
+        """Add value (latency in microseconds) into the histogram."""
+        value = int(value)
+        idx = self.bucketIndex(value)
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Return approximate p-th percentile (0-100) of stored values."""
+        if self.count == 0:
+            return 0
+        limit = self.count * p / 100.0
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= limit:
+                return min(max(self.bucketValue(idx), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """Return dict with number of samples, min/mean/max and percentiles."""
+        return {
+            "samples": self.count,
+            "min_us": self.min or 0,
+            "mean_us": round(self.total / self.count, 1) if self.count else 0,
+            "max_us": self.max,
+            "p50_us": self.percentile(50),
+            "p90_us": self.percentile(90),
+            "p99_us": self.percentile(99),
+            "p999_us": self.percentile(99.9),
+        }
+
+
+class Stats(object):
+    """Counters and sampled latencies of processing stages of Run().
+
+    Counters are updated for every record. Latencies are measured only for
+    every sample-th received record and every sample-th result of worker
+    processes (see timed()) to keep the overhead low."""
+
+    def __init__(self, sample=64):
+        self.sample = max(1, sample)
+        self.records = 0
+        self.results = 0
+        self.counters = {}
+        self.histograms = {}
+        self.start = time()
+        self.dump_requested = False
+
+    def count(self, name, n=1):
+        """Increment counter name by n."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, result=False):
+        """Return True if latencies of the current received record (or of the
+        current result of worker processes if result is True) should be
+        measured. It must be called once per record (result)."""
+        if result:
+            self.results += 1
+            return self.results % self.sample == 0
+        self.records += 1
+        return self.records % self.sample == 0
+
+    def latency(self, stage, start):
+        """Record latency of stage that started at start (clock() value).
+        Return current clock() so that it can be used as start of next stage."""
+        now = clock()
+        hist = self.histograms.get(stage)
+        if hist is None:
+            hist = self.histograms[stage] = LatencyHistogram()
+        hist.record((now - start) * 1000000)
+        return now
+
+    def toDict(self):
+        """Return statistics as dict that can be stored as JSON."""
+        return {
+            "time": getIDEAtime(),
+            "uptime": round(time() - self.start, 3),
+            "sample": self.sample,
+            "counters": dict(self.counters),
+            "latency": dict((stage, hist.summary()) for stage, hist in self.histograms.items()),
+        }
+
+
+def convertRecord(rec, args, conv_func):
+    """Convert input record into IDEA message (dict) using conv_func.
+    Node name and test category are set according to args.
+    Return None if the record can't be converted."""
+    idea = conv_func(rec, args)
+    if idea is None:
+        return None
+
+    if args.name is not None:
+        idea['Node'][0]['Name'] = args.name
+
+    if args.test:
+        idea['Category'].append('Test')
+
+    return idea
+
+
+# State of a worker process, it is set by _workerInit() after fork.
+_worker = {}
+
+def _workerInit(conv_func, args, req_type):
+    # Interruption is handled by the main process, which closes the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker['conv_func'] = conv_func
+    _worker['args'] = args
+    _worker['req_type'] = req_type
+    _worker['templates'] = {}
+
+def _workerConvert(seq, fmtspec, batch):
+    """Convert batch of received messages, return (seq, list of IDEA messages in JSON,
+    number of skipped messages, error)."""
+    try:
+        req_type = _worker['req_type']
+        if req_type == pytrap.FMT_UNIREC:
+            rec = _worker['templates'].get(fmtspec)
+            if rec is None:
+                rec = _worker['templates'][fmtspec] = pytrap.UnirecTemplate(fmtspec)
+
+        result = []
+        skipped = 0
+        for data in batch:
+            if req_type == pytrap.FMT_UNIREC:
+                rec.setData(data)
+            elif req_type == pytrap.FMT_JSON:
+                rec = json.loads(data)
+            else: # TRAP_FMT_RAW
+                rec = data
+
+            idea = convertRecord(rec, _worker['args'], _worker['conv_func'])
+            if idea is None:
+                skipped += 1
+            else:
+                result.append(json.dumps(idea))
+        return (seq, result, skipped, None)
+    except Exception:
+        return (seq, None, 0, traceback.format_exc())
+
+
+class WorkerPool(object):
+    """Pool of processes that convert received messages into IDEA messages.
+
+    Messages are collected into batches by add(), every batch gets a sequence
+    number and it is converted by one of the worker processes. Converted
+    IDEA messages (JSON strings) are returned by results(). If keep_order is
+    True, results are merged by the sequence numbers so that the order of
+    the input messages is kept, otherwise results are returned as soon as
+    they are finished.
+
+    Worker processes are forked, conv_func and args are inherited by them and
+    they don't need to be picklable. Therefore, the pool should be created
+    before TRAP is initialized."""
+
+    def __init__(self, workers, conv_func, args, req_type, keep_order=False,
+                 batch_size=1, max_pending=None, stats=None):
+        try:
+            mp = multiprocessing.get_context("fork")
+        except AttributeError:
+            # Python 2 always uses fork
+            mp = multiprocessing
+        self.pool = mp.Pool(workers, _workerInit, (conv_func, args, req_type))
+        # Pool replaces dead workers, a change of PIDs means a batch was lost
+        self.worker_pids = self.workerPids()
+        self.keep_order = keep_order
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max_pending or workers * WORKER_MAX_PENDING
+        self.done = queue.Queue()
+        self.batch = []
+        self.batch_fmt = None
+        self.next_seq = 0
+        self.out_seq = 0
+        self.finished = {}
+        # Latency of batches (from submission to result) is stored into stats
+        self.stats = stats
+        self.submitted = {}
+
+    def workerPids(self):
+        """Return set of PIDs of worker processes that are running."""
+        return set(p.pid for p in self.pool._pool if p.exitcode is None)
+
+    def checkWorkers(self):
+        """Raise RuntimeError if some worker process has died."""
+        if self.workerPids() != self.worker_pids:
+            raise RuntimeError("Worker process died, %d batches will not be converted." % self.pending())
+
+    def pending(self):
+        """Return number of submitted batches whose results were not returned yet."""
+        return self.next_seq - self.out_seq
+
+    def add(self, fmtspec, data):
+        """Add received message (data) of the given format into the current batch."""
+        if self.batch and fmtspec != self.batch_fmt:
+            self.flush()
+        self.batch_fmt = fmtspec
+        self.batch.append(bytes(data))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Pass the current (even incomplete) batch to worker processes."""
+        if not self.batch:
+            return
+        if self.stats:
+            self.submitted[self.next_seq] = clock()
+        self.pool.apply_async(_workerConvert, (self.next_seq, self.batch_fmt, self.batch),
+                              callback=self.done.put)
+        self.next_seq += 1
+        self.batch = []
+
+    def results(self, wait=False):
+        """Generator of converted IDEA messages (JSON strings).
+
+        It waits for results if the limit of pending batches is reached or if
+        wait is True, in the latter case, it returns after all submitted
+        batches are finished."""
+        while self.pending() > 0:
+            block = wait or self.pending() >= self.max_pending
+            try:
+                (seq, ideas, skipped, error) = self.done.get(block, WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                if not block:
+                    return
+                self.checkWorkers()
+                continue
+            if error is not None:
+                raise RuntimeError("Conversion failed in worker process:\n" + error)
+            if self.stats:
+                self.stats.latency("workers", self.submitted.pop(seq))
+                self.stats.count("converted", len(ideas))
+                if skipped:
+                    self.stats.count("skipped", skipped)
+            if not self.keep_order:
+                self.out_seq += 1
+                for idea in ideas:
+                    yield idea
+                continue
+            self.finished[seq] = ideas
+            while self.out_seq in self.finished:
+                ideas = self.finished.pop(self.out_seq)
+                self.out_seq += 1
+                for idea in ideas:
+                    yield idea
+
+    def close(self):
+        """Stop worker processes, unfinished batches are dropped."""
+        self.pool.terminate()
+        self.pool.join()
+
 def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser = None):
     """ TODO doc
     """
@@ -113,6 +428,18 @@ def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser =
                             help="File with addresses/subnets in format: <ip address>/<mask>,<data>\\n \n where /<mask>,<data> is optional, <data> is a user-specific optional content. Whitelist is applied to SRC_IP field. If SRC_IP from the alert is on whitelist, the alert IS NOT reported.")
     arg_parser.add_argument('--dstwhitelist-file', metavar="FILE", type=str,
                             help="File with addresses/subnets, whitelist is applied on DST_IP, see --srcwhitelist-file help.")
+    arg_parser.add_argument('--workers', metavar="N", type=int, default=0,
+                            help='Convert records to IDEA in N worker processes (default: 0, conversion is done in the main process). Receiving and outputs are always handled by the main process.')
+    arg_parser.add_argument('--worker-batch', metavar="N", type=int, default=1,
+                            help='Number of records passed to a worker process at once (default: 1).')
+    arg_parser.add_argument('--keep-order', action='store_true',
+                            help='Keep order of input records in outputs when --workers is used.')
+    arg_parser.add_argument('--stats-file', metavar="FILE", type=str,
+                            help='Enable per-stage counters and latency histograms, store them in JSON format into FILE every --stats-interval seconds and on SIGUSR1. The statistics are also published via TRAP service interface.')
+    arg_parser.add_argument('--stats-interval', metavar="SEC", type=float, default=10,
+                            help='Interval of storing statistics into --stats-file, 0 stores them only on SIGUSR1 and at exit (default: 10).')
+    arg_parser.add_argument('--stats-sample', metavar="N", type=int, default=64,
+                            help='Measure latencies of every N-th record (default: 64).')
     # TRAP parameters
     trap_args = arg_parser.add_argument_group('Common TRAP parameters')
     trap_args.add_argument('-i', metavar="IFC_SPEC", required=True,
@@ -133,6 +460,23 @@ def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser =
         else:
             sys.stderr.write(module_name+": Warning: Node name is not specified.\n")
 
+    stats = None
+    if args.stats_file:
+        stats = Stats(args.stats_sample)
+
+    # *** Start worker processes ***
+    # Workers must be forked before TRAP is initialized (TRAP starts threads).
+    workers = None
+    if args.workers > 0:
+        workers = WorkerPool(args.workers, conv_func, args, req_type,
+                             keep_order=args.keep_order, batch_size=args.worker_batch,
+                             stats=stats)
+
+    if stats:
+        def requestStatsDump(signum, frame):
+            stats.dump_requested = True
+        signal.signal(signal.SIGUSR1, requestStatsDump)
+
     # *** Initialize TRAP ***
     trap = pytrap.TrapCtx()
     trap.init(["-i", args.i], 1, 1 if args.trap else 0)
@@ -146,6 +490,10 @@ def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser =
     if args.trap:
         trap.setDataFmt(0, pytrap.FMT_JSON, "IDEA")
 
+    # Wake up regularly to pass results of workers to outputs and to store statistics
+    if workers or stats:
+        trap.ifcctl(0, True, pytrap.CTL_TIMEOUT, RECV_TIMEOUT)
+
     # *** Create output handles/clients/etc ***
     filehandle = None
     mongoclient = None
@@ -188,17 +536,127 @@ def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser =
         dstwhitelist = None
 
 
+    def writeStats():
+        """Store statistics into the file and publish them via service IFC."""
+        stats.dump_requested = False
+        stats_json = json.dumps(stats.toDict(), sort_keys=True)
+        tmpname = args.stats_file + ".tmp"
+        with open(tmpname, "w") as f:
+            f.write(stats_json + "\n")
+        os.rename(tmpname, args.stats_file)
+        if hasattr(trap, "setModuleStats"):
+            trap.setModuleStats(stats_json)
+
+    def sendToOutputs(idea=None, idea_json=None, timed=False):
+        """Send IDEA message to all enabled outputs.
+        The message is given as dict (idea) or JSON string (idea_json).
+        If timed is True, latencies of outputs are stored into stats.
+        Return True if the module should stop."""
+        stop = False
+        if timed:
+            t = clock()
+
+        if idea is None and (mongocoll or wardenclient or args.file_indent is not None):
+            idea = json.loads(idea_json)
+        if idea_json is None and (filehandle or args.trap):
+            idea_json = json.dumps(idea)
+        if timed:
+            t = stats.latency("json", t)
+
+        # File output
+        if filehandle:
+            if args.file_indent is not None:
+                filehandle.write(json.dumps(idea, indent=args.file_indent)+'\n')
+            else:
+                filehandle.write(idea_json+'\n')
+            if stats:
+                stats.count("output_file")
+            if timed:
+                t = stats.latency("output_file", t)
+
+        # TRAP output
+        if args.trap:
+            try:
+                trap.send(idea_json, 0)
+                if stats:
+                    stats.count("output_trap")
+            except pytrap.TimeoutError:
+                # skip this message
+                if stats:
+                    stats.count("output_trap_dropped")
+            except pytrap.Terminated:
+                # don't exit immediately, first finish sending to other outputs
+                stop = True
+            if timed:
+                t = stats.latency("output_trap", t)
+
+        # MongoDB output
+        if mongocoll:
+            # We need to change IDEA message here, but we may need it unchanged
+            # later -> copy it (shallow copy is sufficient)
+            idea2 = idea.copy()
+            # Convert timestamps from string to Date format
+            idea2['DetectTime'] = datetime.strptime(idea2['DetectTime'], "%Y-%m-%dT%H:%M:%SZ")
+            for i in [ 'CreateTime', 'EventTime', 'CeaseTime' ]:
+                if i in idea2:
+                    idea2[i] = datetime.strptime(idea2[i], "%Y-%m-%dT%H:%M:%SZ")
+
+            try:
+                mongocoll.insert(idea2)
+                if stats:
+                    stats.count("output_mongodb")
+            except pymongo.errors.AutoReconnect:
+                sys.stderr.write(module_name+": Error: MongoDB connection failure.\n")
+                stop = True
+            if timed:
+                t = stats.latency("output_mongodb", t)
+
+        # Warden output
+        if wardenclient:
+            wardenclient.sendEvents([idea])
+            if stats:
+                stats.count("output_warden")
+            if timed:
+                t = stats.latency("output_warden", t)
+
+        return stop
+
     # *** Main loop ***
     URInputTmplt = None
+    fmtspec = req_format
     if req_type == pytrap.FMT_UNIREC and req_format != "":
         URInputTmplt = pytrap.UnirecTemplate(req_format) # TRAP expects us to have predefined template for required set of fields
         rec = URInputTmplt
 
     stop = False
+    eos = False
+    timed = False
+    if stats:
+        next_stats = time() + args.stats_interval
     while not stop:
+        # *** Store statistics ***
+        if stats:
+            if stats.dump_requested or (args.stats_interval > 0 and time() >= next_stats):
+                writeStats()
+                next_stats = time() + args.stats_interval
+
+        # *** Pass finished results of workers to outputs ***
+        if workers:
+            for idea_json in workers.results():
+                if sendToOutputs(idea_json=idea_json, timed=stats is not None and stats.timed(result=True)):
+                    stop = True
+                    break
+            if stop:
+                break
+
         # *** Read data from input interface ***
         try:
             data = trap.recv()
+        except pytrap.TimeoutError:
+            # Timeout is set only when workers or stats are used
+            if workers:
+                workers.flush()
+            continue
         except pytrap.FormatMismatch:
             sys.stderr.write(module_name+": Error: input data format mismatch\n")#Required: "+str((req_type,req_format))+"\nReceived: "+str(trap.get_data_fmt(trap.IFC_INPUT, 0))+"\n")
             break
@@ -218,11 +676,17 @@ def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser =
 
         # Check for "end-of-stream" record
         if len(data) <= 1:
-            # If we have output, send "end-of-stream" record and exit
-            if args.trap:
-                trap.send(0, b"0")
+            eos = True
             break
 
+        # Latencies are sampled on received records only, time spent in
+        # recv() is mostly waiting for input, so it is not measured
+        if stats:
+            stats.count("received")
+            timed = stats.timed()
+            if timed:
+                t = clock()
+
         # Assert that if UniRec input is required, input template is set
         assert(req_type != pytrap.FMT_UNIREC or URInputTmplt is not None)
 
@@ -236,63 +700,58 @@ def Run(module_name, module_desc, req_type, req_format, conv_func, arg_parser =
 
         # Check whitelists
         if srcwhitelist and srcwhitelist.ip_search(rec.SRC_IP):
-             continue
+            if stats:
+                stats.count("whitelisted_src")
+            continue
 
         if dstwhitelist and dstwhitelist.ip_search(rec.DST_IP):
-             continue
+            if stats:
+                stats.count("whitelisted_dst")
+            continue
+
+        if timed:
+            t = stats.latency("whitelist", t)
 
         # *** Convert input record to IDEA ***
 
+        if workers:
+            # Conversion is done by worker processes, results are sent to
+            # outputs at the beginning of the loop
+            workers.add(fmtspec, data)
+            continue
+
         # Pass the input record to conversion function to create IDEA message
-        idea = conv_func(rec, args)
+        idea = convertRecord(rec, args, conv_func)
+
+        if timed:
+            stats.latency("conversion", t)
 
         if idea is None:
+            if stats:
+                stats.count("skipped")
             continue # Record can't be converted - skip it (notice should be printed by the conv function)
 
-        if args.name is not None:
-            idea['Node'][0]['Name'] = args.name
-
-        if args.test:
-            idea['Category'].append('Test')
+        if stats:
+            stats.count("converted")
 
         # *** Send IDEA to outputs ***
-
-        # File output
-        if filehandle:
-            filehandle.write(json.dumps(idea, indent=args.file_indent)+'\n')
-
-        # TRAP output
-        if args.trap:
-            try:
-                trap.send(json.dumps(idea), 0)
-            except pytrap.TimeoutError:
-                # skip this message
-                pass
-            except pytrap.Terminated:
-                # don't exit immediately, first finish sending to other outputs
-                stop = True
-
-        # MongoDB output
-        if mongocoll:
-            # We need to change IDEA message here, but we may need it unchanged
-            # later -> copy it (shallow copy is sufficient)
-            idea2 = idea.copy()
-            # Convert timestamps from string to Date format
-            idea2['DetectTime'] = datetime.strptime(idea2['DetectTime'], "%Y-%m-%dT%H:%M:%SZ")
-            for i in [ 'CreateTime', 'EventTime', 'CeaseTime' ]:
-                if i in idea2:
-                    idea2[i] = datetime.strptime(idea2[i], "%Y-%m-%dT%H:%M:%SZ")
-
-            try:
-                mongocoll.insert(idea2)
-            except pymongo.errors.AutoReconnect:
-                sys.stderr.write(module_name+": Error: MongoDB connection failure.\n")
-                stop = True
-
-        # Warden output
-        if wardenclient:
-            wardenclient.sendEvents([idea])
-
+        stop = sendToOutputs(idea, timed=timed)
+
+    # Wait for the remaining results of workers
+    if workers:
+        if not stop:
+            workers.flush()
+            for idea_json in workers.results(wait=True):
+                if sendToOutputs(idea_json=idea_json):
+                    break
+        workers.close()
+
+    if stats:
+        writeStats()
+
+    # If we have output, send "end-of-stream" record and exit
+    if eos and args.trap:
+        trap.send(0, b"0")
 
     # *** Cleanup ***
     if filehandle and filehandle != sys.stdout:
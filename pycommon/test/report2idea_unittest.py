@@ -0,0 +1,138 @@
+import unittest
+import argparse
+import json
+import random
+import time
+
+
+def delayedConv(rec, args):
+    """Conversion function with random delay to shuffle finishing of batches."""
+    time.sleep(random.random() * 0.005)
+    if rec == b"skip":
+        return None
+    return {"ID": rec.decode(), "Node": [{}], "Category": []}
+
+def failingConv(rec, args):
+    raise ValueError("conversion error")
+
+def crashingConv(rec, args):
+    import os
+    os._exit(1)
+
+
+class WorkerPoolKeepOrder(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        import report2idea
+        args = argparse.Namespace(name="test.node", test=True)
+        stats = report2idea.Stats()
+        pool = report2idea.WorkerPool(4, delayedConv, args, pytrap.FMT_RAW,
+                                      keep_order=True, batch_size=3, stats=stats)
+        try:
+            for i in range(200):
+                pool.add("", b"skip" if i % 10 == 5 else str(i).encode())
+            pool.flush()
+            result = [json.loads(i) for i in pool.results(wait=True)]
+        finally:
+            pool.close()
+
+        self.assertEqual([i["ID"] for i in result],
+                         [str(i) for i in range(200) if i % 10 != 5])
+        self.assertEqual(result[0]["Node"][0]["Name"], "test.node")
+        self.assertEqual(result[0]["Category"], ["Test"])
+        self.assertEqual(pool.pending(), 0)
+        self.assertEqual(stats.counters, {"converted": 180, "skipped": 20})
+
+
+class WorkerPoolUnordered(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        import report2idea
+        args = argparse.Namespace(name=None, test=False)
+        pool = report2idea.WorkerPool(3, delayedConv, args, pytrap.FMT_RAW,
+                                      max_pending=4)
+        result = []
+        try:
+            for i in range(50):
+                pool.add("", str(i).encode())
+                result.extend(pool.results())
+                self.assertTrue(pool.pending() < 4)
+            pool.flush()
+            result.extend(pool.results(wait=True))
+        finally:
+            pool.close()
+
+        self.assertEqual(sorted(int(json.loads(i)["ID"]) for i in result), list(range(50)))
+
+
+class WorkerPoolError(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        import report2idea
+        args = argparse.Namespace(name=None, test=False)
+        pool = report2idea.WorkerPool(2, failingConv, args, pytrap.FMT_RAW)
+        try:
+            pool.add("", b"1")
+            with self.assertRaises(RuntimeError):
+                list(pool.results(wait=True))
+        finally:
+            pool.close()
+
+
+class WorkerPoolCrash(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        import report2idea
+        args = argparse.Namespace(name=None, test=False)
+        pool = report2idea.WorkerPool(2, crashingConv, args, pytrap.FMT_RAW)
+        try:
+            pool.add("", b"1")
+            pool.flush()
+            with self.assertRaises(RuntimeError):
+                list(pool.results(wait=True))
+        finally:
+            pool.close()
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def runTest(self):
+        import report2idea
+        h = report2idea.LatencyHistogram
+        # buckets are contiguous and every value belongs to its bucket
+        for v in range(0, 100000, 7):
+            idx = h.bucketIndex(v)
+            self.assertTrue(h.bucketValue(idx) <= v < h.bucketValue(idx + 1))
+            # relative error is bounded by the number of sub-buckets
+            self.assertTrue(v - h.bucketValue(idx) <= v / 16.0)
+
+        hist = h()
+        self.assertEqual(hist.percentile(50), 0)
+        for v in range(1, 1001):
+            hist.record(v)
+        s = hist.summary()
+        self.assertEqual(s["samples"], 1000)
+        self.assertEqual(s["min_us"], 1)
+        self.assertEqual(s["max_us"], 1000)
+        self.assertAlmostEqual(s["mean_us"], 500.5)
+        self.assertTrue(abs(s["p50_us"] - 500) <= 500 / 16.0)
+        self.assertTrue(abs(s["p99_us"] - 990) <= 990 / 16.0)
+        self.assertTrue(s["p999_us"] <= 1000)
+
+
+class StatsTest(unittest.TestCase):
+    def runTest(self):
+        import report2idea
+        stats = report2idea.Stats(sample=4)
+        timed = [stats.timed() for i in range(12)]
+        self.assertEqual(timed.count(True), 3)
+        # results of workers are sampled independently of received records
+        self.assertEqual([stats.timed(result=True) for i in range(4)], [False, False, False, True])
+        self.assertFalse(stats.timed())
+        stats.count("received")
+        stats.count("received", 2)
+        t = report2idea.clock()
+        self.assertTrue(stats.latency("recv", t) >= t)
+        d = json.loads(json.dumps(stats.toDict()))
+        self.assertEqual(d["counters"], {"received": 3})
+        self.assertEqual(d["latency"]["recv"]["samples"], 1)
+        self.assertEqual(d["sample"], 4)
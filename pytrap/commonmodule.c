@@ -0,0 +1,3275 @@
+#include <Python.h>
+#include <structmember.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#ifdef HAVE_NEMEA_COMMON
+#include <nemea-common/fast_hash_table.h>
+#include <nemea-common/fast_hash_filter.h>
+#include <nemea-common/b_plus_tree.h>
+#include <nemea-common/prefix_tree.h>
+#endif
+#include <unirec/unirec.h>
+
+/* UnirecIPAddr helpers (unirecmodule.c) */
+PyObject *UnirecIPAddr_FromIP(const ip_addr_t *ip);
+int UnirecIPAddr_AsIP(PyObject *obj, ip_addr_t *ip);
+int UnirecIPAddrRange_AsIPs(PyObject *obj, ip_addr_t *start, ip_addr_t *end);
+
+/*
+ * Bindings of nemea-common are built only when pytrap is linked with
+ * libnemea-common (HAVE_NEMEA_COMMON is defined by setup.py), BloomFilter
+ * is implemented here and it is always available.
+ */
+
+#ifdef HAVE_NEMEA_COMMON
+
+/*
+ * Data structures of nemea-common library with fixed-size keys and values.
+ *
+ * Keys are bytes-like objects of the configured size (e.g. built by
+ * UnirecTemplate.getFieldsBytes()), values are packed by the struct module
+ * according to the configured format, so that the structures keep only raw
+ * bytes instead of Python objects.
+ */
+
+/**
+ * \brief Get buffer of a key and check its size.
+ *
+ * \param [in] key    bytes-like object
+ * \param [out] view  buffer of the key, it must be released by PyBuffer_Release() on success
+ * \param [in] size   expected size of the key
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+common_get_key(PyObject *key, Py_buffer *view, Py_ssize_t size)
+{
+    if (PyObject_GetBuffer(key, view, PyBUF_SIMPLE) != 0) {
+        return -1;
+    }
+    if (view->len != size) {
+        PyErr_Format(PyExc_ValueError, "Size of key must be %zd bytes.", size);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    return 0;
+}
+
+/**
+ * \brief Create struct.Struct object for the given format.
+ *
+ * \param [in] fmt    format of values (see struct module)
+ * \param [out] size  size of packed values
+ * \return New reference to the Struct object, NULL with exception set on error.
+ */
+static PyObject *
+common_struct_new(PyObject *fmt, Py_ssize_t *size)
+{
+    PyObject *module, *st, *obj;
+
+    module = PyImport_ImportModule("struct");
+    if (module == NULL) {
+        return NULL;
+    }
+    st = PyObject_CallMethod(module, "Struct", "O", fmt);
+    Py_DECREF(module);
+    if (st == NULL) {
+        return NULL;
+    }
+    obj = PyObject_GetAttrString(st, "size");
+    if (obj == NULL) {
+        Py_DECREF(st);
+        return NULL;
+    }
+    *size = PyLong_AsSsize_t(obj);
+    Py_DECREF(obj);
+    if (*size <= 0) {
+        Py_DECREF(st);
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(PyExc_ValueError, "Format of values must not be empty.");
+        }
+        return NULL;
+    }
+    return st;
+}
+
+/**
+ * \brief Get interned name of a method.
+ *
+ * Values are packed and unpacked on every access, calling methods by interned
+ * names avoids building of the name and arguments on each call.
+ *
+ * \param [in,out] name  cache of the name, it is created on the first call
+ * \param [in] str       name of the method
+ * \return Borrowed reference to the name, NULL with exception set on error.
+ */
+static PyObject *
+common_intern(PyObject **name, const char *str)
+{
+    if (*name == NULL) {
+#if PY_MAJOR_VERSION >= 3
+        *name = PyUnicode_InternFromString(str);
+#else
+        *name = PyString_InternFromString(str);
+#endif
+    }
+    return *name;
+}
+
+/**
+ * \brief Pack value into memory of the structure.
+ *
+ * \param [in] st     struct.Struct object of values
+ * \param [in] value  tuple of values, single value or bytes-like object of the packed size
+ * \param [out] dst   destination of the packed value
+ * \param [in] size   size of the packed value
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+common_pack_value(PyObject *st, PyObject *value, void *dst, Py_ssize_t size)
+{
+    static PyObject *pack_name = NULL;
+    PyObject *packed;
+    Py_buffer view;
+
+    if (common_intern(&pack_name, "pack") == NULL) {
+        return -1;
+    }
+    if (PyObject_CheckBuffer(value) && !PyUnicode_Check(value)) {
+        if (PyObject_GetBuffer(value, &view, PyBUF_SIMPLE) != 0) {
+            return -1;
+        }
+        if (view.len != size) {
+            PyErr_Format(PyExc_ValueError, "Size of packed value must be %zd bytes.", size);
+            PyBuffer_Release(&view);
+            return -1;
+        }
+        memcpy(dst, view.buf, size);
+        PyBuffer_Release(&view);
+        return 0;
+    }
+
+    if (PyTuple_Check(value)) {
+        /* pack() needs values as separate arguments */
+        PyObject *pack = PyObject_GetAttr(st, pack_name);
+        if (pack == NULL) {
+            return -1;
+        }
+        packed = PyObject_Call(pack, value, NULL);
+        Py_DECREF(pack);
+    } else {
+        packed = PyObject_CallMethodObjArgs(st, pack_name, value, NULL);
+    }
+    if (packed == NULL) {
+        return -1;
+    }
+    memcpy(dst, PyBytes_AS_STRING(packed), size);
+    Py_DECREF(packed);
+    return 0;
+}
+
+/**
+ * \brief Unpack value stored in the structure.
+ *
+ * \param [in] st     struct.Struct object of values
+ * \param [in] src    packed value
+ * \param [in] size   size of the packed value
+ * \return New reference to tuple of values, NULL with exception set on error.
+ */
+static PyObject *
+common_unpack_value(PyObject *st, const void *src, Py_ssize_t size)
+{
+    static PyObject *unpack_name = NULL;
+    PyObject *packed, *result;
+
+    if (common_intern(&unpack_name, "unpack") == NULL) {
+        return NULL;
+    }
+    packed = PyBytes_FromStringAndSize((const char *) src, size);
+    if (packed == NULL) {
+        return NULL;
+    }
+    result = PyObject_CallMethodObjArgs(st, unpack_name, packed, NULL);
+    Py_DECREF(packed);
+    return result;
+}
+
+/*********************/
+/*  FastHashTable    */
+/*********************/
+
+typedef struct {
+    PyObject_HEAD
+    fht_table_t *table;
+    PyObject *value_struct;
+    PyObject *value_fmt;
+    Py_ssize_t key_size;
+    Py_ssize_t value_size;
+    Py_ssize_t count;
+    Py_ssize_t evicted;
+    uint8_t *data_new;
+    uint8_t *key_lost;
+    uint8_t *data_lost;
+} pytrap_fasthashtable;
+
+static void
+FastHashTable_dealloc(pytrap_fasthashtable *self)
+{
+    if (self->table != NULL) {
+        fht_destroy(self->table);
+    }
+    PyMem_Free(self->data_new);
+    PyMem_Free(self->key_lost);
+    PyMem_Free(self->data_lost);
+    Py_XDECREF(self->value_struct);
+    Py_XDECREF(self->value_fmt);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+FastHashTable_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_fasthashtable *self;
+    unsigned int rows, key_size, stash_size = 0;
+    PyObject *value_fmt;
+
+    static char *kwlist[] = {"rows", "key_size", "value_fmt", "stash_size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "IIO|I", kwlist, &rows, &key_size, &value_fmt, &stash_size)) {
+        return NULL;
+    }
+    if (rows == 0 || (rows & (rows - 1)) != 0 || (stash_size & (stash_size - 1)) != 0) {
+        PyErr_SetString(PyExc_ValueError, "Number of rows must be a non-zero power of two, size of stash must be a power of two.");
+        return NULL;
+    }
+    if (key_size == 0) {
+        PyErr_SetString(PyExc_ValueError, "Size of key must be non-zero.");
+        return NULL;
+    }
+
+    self = (pytrap_fasthashtable *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->key_size = key_size;
+    self->value_struct = common_struct_new(value_fmt, &self->value_size);
+    if (self->value_struct == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    Py_INCREF(value_fmt);
+    self->value_fmt = value_fmt;
+
+    self->data_new = PyMem_Malloc(self->value_size);
+    self->key_lost = PyMem_Malloc(self->key_size);
+    self->data_lost = PyMem_Malloc(self->value_size);
+    self->table = fht_init(rows, key_size, self->value_size, stash_size);
+    if (self->data_new == NULL || self->key_lost == NULL || self->data_lost == NULL || self->table == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return (PyObject *) self;
+}
+
+/**
+ * \brief Find value of the key (it becomes the newest item of its row).
+ *
+ * \return Pointer to the stored value or NULL.
+ */
+static inline void *
+FastHashTable_find(pytrap_fasthashtable *self, const void *key)
+{
+    if (self->table->stash_size > 0) {
+        return fht_get_data_with_stash(self->table, key);
+    }
+    return fht_get_data(self->table, key);
+}
+
+static PyObject *
+FastHashTable_get(pytrap_fasthashtable *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *key, *def = Py_None;
+    Py_buffer view;
+    void *data;
+
+    static char *kwlist[] = {"key", "default", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &key, &def)) {
+        return NULL;
+    }
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return NULL;
+    }
+    data = FastHashTable_find(self, view.buf);
+    PyBuffer_Release(&view);
+
+    if (data == NULL) {
+        Py_INCREF(def);
+        return def;
+    }
+    return common_unpack_value(self->value_struct, data, self->value_size);
+}
+
+static PyObject *
+FastHashTable_getitem(pytrap_fasthashtable *self, PyObject *key)
+{
+    Py_buffer view;
+    void *data;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return NULL;
+    }
+    data = FastHashTable_find(self, view.buf);
+    PyBuffer_Release(&view);
+
+    if (data == NULL) {
+        PyErr_SetObject(PyExc_KeyError, key);
+        return NULL;
+    }
+    return common_unpack_value(self->value_struct, data, self->value_size);
+}
+
+/**
+ * \brief Store value of the key, evicted item is left in key_lost and data_lost.
+ *
+ * \return 1 if an item was evicted, 0 if not, -1 with exception set on error.
+ */
+static int
+FastHashTable_store(pytrap_fasthashtable *self, PyObject *key, PyObject *value)
+{
+    Py_buffer view;
+    void *data;
+    int ret;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return -1;
+    }
+    data = FastHashTable_find(self, view.buf);
+    if (data != NULL) {
+        /* existing item, its value is replaced in place */
+        ret = common_pack_value(self->value_struct, value, data, self->value_size);
+        PyBuffer_Release(&view);
+        return ret;
+    }
+
+    /* pack first to keep the table untouched on error */
+    if (common_pack_value(self->value_struct, value, self->data_new, self->value_size) != 0) {
+        PyBuffer_Release(&view);
+        return -1;
+    }
+    if (self->table->stash_size > 0) {
+        ret = fht_insert_with_stash(self->table, view.buf, self->data_new, self->key_lost, self->data_lost);
+    } else {
+        ret = fht_insert(self->table, view.buf, self->data_new, self->key_lost, self->data_lost);
+    }
+    PyBuffer_Release(&view);
+    switch (ret) {
+    case FHT_INSERT_OK:
+    case FHT_INSERT_STASH_OK:
+        self->count++;
+        return 0;
+    case FHT_INSERT_LOST:
+    case FHT_INSERT_STASH_LOST:
+        self->evicted++;
+        return 1;
+    default:
+        PyErr_SetString(PyExc_RuntimeError, "Insertion into the table failed.");
+        return -1;
+    }
+}
+
+static PyObject *
+FastHashTable_set(pytrap_fasthashtable *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *key, *value, *lost_key, *lost_value, *result;
+    int ret;
+
+    static char *kwlist[] = {"key", "value", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OO", kwlist, &key, &value)) {
+        return NULL;
+    }
+    ret = FastHashTable_store(self, key, value);
+    if (ret < 0) {
+        return NULL;
+    } else if (ret == 0) {
+        Py_RETURN_NONE;
+    }
+
+    lost_key = PyBytes_FromStringAndSize((const char *) self->key_lost, self->key_size);
+    lost_value = common_unpack_value(self->value_struct, self->data_lost, self->value_size);
+    if (lost_key == NULL || lost_value == NULL) {
+        Py_XDECREF(lost_key);
+        Py_XDECREF(lost_value);
+        return NULL;
+    }
+    result = PyTuple_Pack(2, lost_key, lost_value);
+    Py_DECREF(lost_key);
+    Py_DECREF(lost_value);
+    return result;
+}
+
+static int
+FastHashTable_remove_key(pytrap_fasthashtable *self, PyObject *key)
+{
+    Py_buffer view;
+    int ret;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return -1;
+    }
+    if (self->table->stash_size > 0) {
+        ret = fht_remove_with_stash(self->table, view.buf);
+    } else {
+        ret = fht_remove(self->table, view.buf);
+    }
+    PyBuffer_Release(&view);
+    if (ret == 0) {
+        self->count--;
+        return 1;
+    }
+    return 0;
+}
+
+static int
+FastHashTable_setitem(pytrap_fasthashtable *self, PyObject *key, PyObject *value)
+{
+    int ret;
+
+    if (value == NULL) {
+        ret = FastHashTable_remove_key(self, key);
+        if (ret == 0) {
+            PyErr_SetObject(PyExc_KeyError, key);
+            return -1;
+        }
+        return ret < 0 ? -1 : 0;
+    }
+    return FastHashTable_store(self, key, value) < 0 ? -1 : 0;
+}
+
+static PyObject *
+FastHashTable_remove(pytrap_fasthashtable *self, PyObject *key)
+{
+    int ret = FastHashTable_remove_key(self, key);
+
+    if (ret < 0) {
+        return NULL;
+    }
+    return PyBool_FromLong(ret);
+}
+
+static int
+FastHashTable_contains(pytrap_fasthashtable *self, PyObject *key)
+{
+    Py_buffer view;
+    void *data;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return -1;
+    }
+    data = FastHashTable_find(self, view.buf);
+    PyBuffer_Release(&view);
+    return data != NULL;
+}
+
+static Py_ssize_t
+FastHashTable_len(pytrap_fasthashtable *self)
+{
+    return self->count;
+}
+
+static PyObject *
+FastHashTable_items(pytrap_fasthashtable *self)
+{
+    PyObject *result, *key, *value, *item;
+    fht_iter_t *iter;
+    int ret = 0;
+
+    result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+    iter = fht_init_iter(self->table);
+    if (iter == NULL) {
+        Py_DECREF(result);
+        return PyErr_NoMemory();
+    }
+    while (fht_get_next_iter(iter) == FHT_ITER_RET_OK) {
+        key = PyBytes_FromStringAndSize((const char *) iter->key_ptr, self->key_size);
+        value = common_unpack_value(self->value_struct, iter->data_ptr, self->value_size);
+        item = (key != NULL && value != NULL) ? PyTuple_Pack(2, key, value) : NULL;
+        Py_XDECREF(key);
+        Py_XDECREF(value);
+        if (item == NULL || PyList_Append(result, item) != 0) {
+            Py_XDECREF(item);
+            ret = -1;
+            break;
+        }
+        Py_DECREF(item);
+    }
+    /* iterator keeps the current row locked until it reaches the end */
+    while (ret != 0 && fht_get_next_iter(iter) == FHT_ITER_RET_OK) {
+    }
+    fht_destroy_iter(iter);
+    if (ret != 0) {
+        Py_DECREF(result);
+        return NULL;
+    }
+    return result;
+}
+
+static PyObject *
+FastHashTable_clear(pytrap_fasthashtable *self)
+{
+    fht_clear(self->table);
+    self->count = 0;
+    Py_RETURN_NONE;
+}
+
+static PyMemberDef FastHashTable_members[] = {
+    {"key_size", T_PYSSIZET, offsetof(pytrap_fasthashtable, key_size), READONLY,
+        "Size of keys in bytes."},
+    {"value_fmt", T_OBJECT_EX, offsetof(pytrap_fasthashtable, value_fmt), READONLY,
+        "Format of values (see struct module)."},
+    {"evicted", T_PYSSIZET, offsetof(pytrap_fasthashtable, evicted), READONLY,
+        "Number of items removed from the table to make space for new items."},
+    {NULL}  /* Sentinel */
+};
+
+static PyMethodDef FastHashTable_methods[] = {
+    {"get", (PyCFunction) FastHashTable_get, METH_VARARGS | METH_KEYWORDS,
+        "Get value of the key, the item becomes the newest one in its row.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n"
+        "    default (Optional[object]): Value returned when the key is not found (default: None).\n\n"
+        "Returns:\n"
+        "    tuple: Unpacked value or default.\n"
+        },
+
+    {"set", (PyCFunction) FastHashTable_set, METH_VARARGS | METH_KEYWORDS,
+        "Set value of the key.\n\n"
+        "When the row of the key is full (and the stash as well), the oldest item\n"
+        "is removed from the table and returned so that it can be exported.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n"
+        "    value (tuple, object or bytes): Values packed by value_fmt, a single value or already packed bytes.\n\n"
+        "Returns:\n"
+        "    Optional[tuple(bytes, tuple)]: Evicted (key, value) or None.\n\n"
+        "Raises:\n"
+        "    ValueError: Bad size of key or packed value.\n"
+        "    struct.error: Value does not match value_fmt.\n"
+        },
+
+    {"remove", (PyCFunction) FastHashTable_remove, METH_O,
+        "Remove the key from the table.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n\n"
+        "Returns:\n"
+        "    bool: True if the key was found and removed.\n"
+        },
+
+    {"items", (PyCFunction) FastHashTable_items, METH_NOARGS,
+        "Get all items stored in the table (including stash).\n\n"
+        "Returns:\n"
+        "    list(tuple(bytes, tuple)): List of (key, value).\n"
+        },
+
+    {"clear", (PyCFunction) FastHashTable_clear, METH_NOARGS,
+        "Remove all items from the table.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PySequenceMethods FastHashTable_seq = {
+    0,                                      /* sq_length */
+    0,                                      /* sq_concat */
+    0,                                      /* sq_repeat */
+    0,                                      /* sq_item */
+    0,                                      /* sq_slice */
+    0,                                      /* sq_ass_item */
+    0,                                      /* sq_ass_slice */
+    (objobjproc) FastHashTable_contains,    /* sq_contains */
+};
+
+static PyMappingMethods FastHashTable_mapping = {
+    (lenfunc) FastHashTable_len,            /* mp_length */
+    (binaryfunc) FastHashTable_getitem,     /* mp_subscript */
+    (objobjargproc) FastHashTable_setitem,  /* mp_ass_subscript */
+};
+
+static PyTypeObject pytrap_FastHashTable = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.FastHashTable",    /* tp_name */
+    sizeof(pytrap_fasthashtable), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) FastHashTable_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    &FastHashTable_seq,        /* tp_as_sequence */
+    &FastHashTable_mapping,    /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "FastHashTable(rows, key_size, value_fmt, stash_size=0)\n\n"
+    "Fixed-size 4-way hash table with LRU replacement (fast_hash_table of nemea-common).\n"
+    "It stores at most 4 * rows + stash_size items, the oldest item of a full row\n"
+    "is moved into the stash or evicted.  It is intended e.g. for per-flow state:\n\n"
+    "    t = FastHashTable(2**16, 34, \"QQ\")\n"
+    "    key = tmpl.getFieldsBytes([\"SRC_IP\", \"DST_IP\", \"SRC_PORT\"])\n"
+    "    state = t.get(key, (0, 0))\n"
+    "    evicted = t.set(key, (state[0] + tmpl.PACKETS, state[1] + tmpl.BYTES))\n\n"
+    "Args:\n"
+    "    rows (int): Number of rows, it must be a power of two.\n"
+    "    key_size (int): Size of keys in bytes.\n"
+    "    value_fmt (str): Format of values (see struct module).\n"
+    "    stash_size (Optional[int]): Size of stash, it must be a power of two or 0 (default: 0).\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    FastHashTable_methods,     /* tp_methods */
+    FastHashTable_members,     /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    FastHashTable_new,         /* tp_new */
+};
+
+/*********************/
+/*  FastHashFilter   */
+/*********************/
+
+/*
+ * Python calls are serialized by the GIL, so the single writer and the
+ * readers of the table never run concurrently and lookups can use the
+ * lock-free fhf_get_data().  Views of stored values must not outlive the
+ * item they point to: removing, clearing and resizing invalidate all views
+ * (generation is incremented) and they are refused while some view is
+ * exported through the buffer protocol.
+ */
+
+typedef struct {
+    PyObject_HEAD
+    fhf_table_t *table;
+    PyObject *value_struct;
+    PyObject *value_fmt;
+    Py_ssize_t key_size;
+    Py_ssize_t value_size;
+    Py_ssize_t count;
+    uint64_t generation;
+    Py_ssize_t exports;
+    uint8_t *data_new;
+} pytrap_fasthashfilter;
+
+typedef struct {
+    PyObject_HEAD
+    pytrap_fasthashfilter *filter;
+    uint8_t *data;
+    uint64_t generation;
+} pytrap_fasthashfilterview;
+
+typedef struct {
+    PyObject_HEAD
+    pytrap_fasthashfilter *filter;
+    uint64_t pos;
+    uint64_t generation;
+} pytrap_fasthashfilteriter;
+
+static PyTypeObject pytrap_FastHashFilterView;
+static PyTypeObject pytrap_FastHashFilterIter;
+
+static void
+FastHashFilter_dealloc(pytrap_fasthashfilter *self)
+{
+    if (self->table != NULL) {
+        fhf_destroy(self->table);
+    }
+    PyMem_Free(self->data_new);
+    Py_XDECREF(self->value_struct);
+    Py_XDECREF(self->value_fmt);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+FastHashFilter_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_fasthashfilter *self;
+    unsigned long long rows;
+    unsigned int key_size;
+    PyObject *value_fmt;
+
+    static char *kwlist[] = {"rows", "key_size", "value_fmt", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "KIO", kwlist, &rows, &key_size, &value_fmt)) {
+        return NULL;
+    }
+    if (rows == 0 || (rows & (rows - 1)) != 0) {
+        PyErr_SetString(PyExc_ValueError, "Number of rows must be a non-zero power of two.");
+        return NULL;
+    }
+    if (key_size == 0) {
+        PyErr_SetString(PyExc_ValueError, "Size of key must be non-zero.");
+        return NULL;
+    }
+
+    self = (pytrap_fasthashfilter *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->key_size = key_size;
+    self->value_struct = common_struct_new(value_fmt, &self->value_size);
+    if (self->value_struct == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    Py_INCREF(value_fmt);
+    self->value_fmt = value_fmt;
+
+    self->data_new = PyMem_Malloc(self->value_size);
+    self->table = fhf_init(rows, key_size, self->value_size);
+    if (self->data_new == NULL || self->table == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return (PyObject *) self;
+}
+
+/**
+ * \brief Find value of the key.
+ *
+ * \return Pointer to the stored value or NULL.
+ */
+static inline uint8_t *
+FastHashFilter_find(pytrap_fasthashfilter *self, const void *key)
+{
+    const void *data;
+
+    if (fhf_get_data(self->table, key, &data) == FHF_FOUND) {
+        return (uint8_t *) data;
+    }
+    return NULL;
+}
+
+/**
+ * \brief Check that stored items can be moved or removed.
+ *
+ * \return 0 if there is no exported view, -1 with BufferError set otherwise.
+ */
+static int
+FastHashFilter_check_exports(pytrap_fasthashfilter *self)
+{
+    if (self->exports > 0) {
+        PyErr_SetString(PyExc_BufferError, "Existing exports of stored values: items cannot be moved or removed.");
+        return -1;
+    }
+    return 0;
+}
+
+/**
+ * \brief Double the number of rows (until all items fit into the new table).
+ *
+ * \return 0 on success, -1 with exception set otherwise.
+ */
+static int
+FastHashFilter_grow(pytrap_fasthashfilter *self)
+{
+    int ret;
+
+    if (FastHashFilter_check_exports(self) != 0) {
+        return -1;
+    }
+    ret = fhf_resize(&self->table);
+    if (ret != FHF_RESIZE_OK) {
+        if (ret == FHF_RESIZE_FAILED_ALLOC) {
+            PyErr_NoMemory();
+        } else {
+            PyErr_SetString(PyExc_RuntimeError, "Resizing of the table failed.");
+        }
+        return -1;
+    }
+    /* there are no concurrent readers of the old table, free it right now */
+    fhf_destroy(self->table->old_table);
+    self->table->old_table = NULL;
+    self->generation++;
+    return 0;
+}
+
+static PyObject *
+FastHashFilter_get(pytrap_fasthashfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *key, *def = Py_None;
+    Py_buffer view;
+    uint8_t *data;
+
+    static char *kwlist[] = {"key", "default", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &key, &def)) {
+        return NULL;
+    }
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return NULL;
+    }
+    data = FastHashFilter_find(self, view.buf);
+    PyBuffer_Release(&view);
+
+    if (data == NULL) {
+        Py_INCREF(def);
+        return def;
+    }
+    return common_unpack_value(self->value_struct, data, self->value_size);
+}
+
+static PyObject *
+FastHashFilter_getitem(pytrap_fasthashfilter *self, PyObject *key)
+{
+    Py_buffer view;
+    uint8_t *data;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return NULL;
+    }
+    data = FastHashFilter_find(self, view.buf);
+    PyBuffer_Release(&view);
+
+    if (data == NULL) {
+        PyErr_SetObject(PyExc_KeyError, key);
+        return NULL;
+    }
+    return common_unpack_value(self->value_struct, data, self->value_size);
+}
+
+/**
+ * \brief Store value of the key.
+ *
+ * \param [in] resize   grow the table when the row of the key is full
+ * \return 1 if the value was stored, 0 if the row is full, -1 with exception set on error.
+ */
+static int
+FastHashFilter_store(pytrap_fasthashfilter *self, PyObject *key, PyObject *value, int resize)
+{
+    Py_buffer view;
+    uint8_t *data;
+    int ret;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return -1;
+    }
+    data = FastHashFilter_find(self, view.buf);
+    if (data != NULL) {
+        /* existing item, its value is replaced in place */
+        ret = common_pack_value(self->value_struct, value, data, self->value_size);
+        PyBuffer_Release(&view);
+        return ret < 0 ? -1 : 1;
+    }
+
+    /* pack first to keep the table untouched on error */
+    if (common_pack_value(self->value_struct, value, self->data_new, self->value_size) != 0) {
+        PyBuffer_Release(&view);
+        return -1;
+    }
+    while ((ret = fhf_insert(self->table, view.buf, self->data_new)) == FHF_INSERT_FULL && resize) {
+        if (FastHashFilter_grow(self) != 0) {
+            PyBuffer_Release(&view);
+            return -1;
+        }
+    }
+    PyBuffer_Release(&view);
+    if (ret == FHF_INSERT_OK) {
+        self->count++;
+        return 1;
+    }
+    return 0;
+}
+
+static PyObject *
+FastHashFilter_set(pytrap_fasthashfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *key, *value, *resize = Py_True;
+    int ret;
+
+    static char *kwlist[] = {"key", "value", "resize", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "OO|O", kwlist, &key, &value, &resize)) {
+        return NULL;
+    }
+    ret = FastHashFilter_store(self, key, value, PyObject_IsTrue(resize));
+    if (ret < 0) {
+        return NULL;
+    }
+    return PyBool_FromLong(ret);
+}
+
+static int
+FastHashFilter_remove_key(pytrap_fasthashfilter *self, PyObject *key)
+{
+    Py_buffer view;
+    int ret;
+
+    if (FastHashFilter_check_exports(self) != 0) {
+        return -1;
+    }
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return -1;
+    }
+    ret = fhf_remove(self->table, view.buf);
+    PyBuffer_Release(&view);
+    if (ret == FHF_REMOVED) {
+        self->count--;
+        self->generation++;
+        return 1;
+    }
+    return 0;
+}
+
+static int
+FastHashFilter_setitem(pytrap_fasthashfilter *self, PyObject *key, PyObject *value)
+{
+    int ret;
+
+    if (value == NULL) {
+        ret = FastHashFilter_remove_key(self, key);
+        if (ret == 0) {
+            PyErr_SetObject(PyExc_KeyError, key);
+            return -1;
+        }
+        return ret < 0 ? -1 : 0;
+    }
+    return FastHashFilter_store(self, key, value, 1) < 0 ? -1 : 0;
+}
+
+static PyObject *
+FastHashFilter_remove(pytrap_fasthashfilter *self, PyObject *key)
+{
+    int ret = FastHashFilter_remove_key(self, key);
+
+    if (ret < 0) {
+        return NULL;
+    }
+    return PyBool_FromLong(ret);
+}
+
+static int
+FastHashFilter_contains(pytrap_fasthashfilter *self, PyObject *key)
+{
+    Py_buffer view;
+    uint8_t *data;
+
+    if (common_get_key(key, &view, self->key_size) != 0) {
+        return -1;
+    }
+    data = FastHashFilter_find(self, view.buf);
+    PyBuffer_Release(&view);
+    return data != NULL;
+}
+
+static Py_ssize_t
+FastHashFilter_len(pytrap_fasthashfilter *self)
+{
+    return self->count;
+}
+
+/**
+ * \brief Find the first occupied slot of the table starting at pos.
+ *
+ * Slots are numbered row * FHF_TABLE_COLS + column.
+ *
+ * \return Index of the occupied slot, number of slots if there is none.
+ */
+static uint64_t
+FastHashFilter_next_slot(fhf_table_t *table, uint64_t pos)
+{
+    uint64_t slots = table->table_rows * FHF_TABLE_COLS;
+    uint8_t flags;
+
+    while (pos < slots) {
+        flags = table->free_flag_field[pos / FHF_TABLE_COLS] >> (pos % FHF_TABLE_COLS);
+        if (flags == 0) {
+            /* skip the rest of the row */
+            pos = (pos / FHF_TABLE_COLS + 1) * FHF_TABLE_COLS;
+        } else if (flags & 1) {
+            return pos;
+        } else {
+            pos++;
+        }
+    }
+    return slots;
+}
+
+static PyObject *
+FastHashFilter_items(pytrap_fasthashfilter *self)
+{
+    PyObject *result, *key, *value, *item;
+    fhf_table_t *table = self->table;
+    uint64_t pos, slots = table->table_rows * FHF_TABLE_COLS;
+
+    result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+    for (pos = FastHashFilter_next_slot(table, 0); pos < slots; pos = FastHashFilter_next_slot(table, pos + 1)) {
+        key = PyBytes_FromStringAndSize((const char *) &table->key_field[pos * table->key_size], self->key_size);
+        value = common_unpack_value(self->value_struct, &table->data_field[pos * table->data_size], self->value_size);
+        item = (key != NULL && value != NULL) ? PyTuple_Pack(2, key, value) : NULL;
+        Py_XDECREF(key);
+        Py_XDECREF(value);
+        if (item == NULL || PyList_Append(result, item) != 0) {
+            Py_XDECREF(item);
+            Py_DECREF(result);
+            return NULL;
+        }
+        Py_DECREF(item);
+    }
+    return result;
+}
+
+static PyObject *
+FastHashFilter_iter(pytrap_fasthashfilter *self)
+{
+    pytrap_fasthashfilteriter *it;
+
+    it = PyObject_New(pytrap_fasthashfilteriter, &pytrap_FastHashFilterIter);
+    if (it == NULL) {
+        return NULL;
+    }
+    Py_INCREF(self);
+    it->filter = self;
+    it->pos = 0;
+    it->generation = self->generation;
+    return (PyObject *) it;
+}
+
+static PyObject *
+FastHashFilter_view(pytrap_fasthashfilter *self)
+{
+    pytrap_fasthashfilterview *view;
+
+    view = PyObject_New(pytrap_fasthashfilterview, &pytrap_FastHashFilterView);
+    if (view == NULL) {
+        return NULL;
+    }
+    Py_INCREF(self);
+    view->filter = self;
+    view->data = NULL;
+    view->generation = self->generation;
+    return (PyObject *) view;
+}
+
+static PyObject *
+FastHashFilter_resize(pytrap_fasthashfilter *self)
+{
+    if (FastHashFilter_grow(self) != 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+FastHashFilter_clear(pytrap_fasthashfilter *self)
+{
+    if (FastHashFilter_check_exports(self) != 0) {
+        return NULL;
+    }
+    fhf_clear(self->table);
+    self->count = 0;
+    self->generation++;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+FastHashFilter_getRows(pytrap_fasthashfilter *self, void *closure)
+{
+    return PyLong_FromUnsignedLongLong(self->table->table_rows);
+}
+
+static PyMemberDef FastHashFilter_members[] = {
+    {"key_size", T_PYSSIZET, offsetof(pytrap_fasthashfilter, key_size), READONLY,
+        "Size of keys in bytes."},
+    {"value_fmt", T_OBJECT_EX, offsetof(pytrap_fasthashfilter, value_fmt), READONLY,
+        "Format of values (see struct module)."},
+    {"value_size", T_PYSSIZET, offsetof(pytrap_fasthashfilter, value_size), READONLY,
+        "Size of packed values in bytes."},
+    {NULL}  /* Sentinel */
+};
+
+static PyGetSetDef FastHashFilter_getset[] = {
+    {"rows", (getter) FastHashFilter_getRows, NULL, "Current number of rows of the table.", NULL},
+    {NULL}  /* Sentinel */
+};
+
+static PyMethodDef FastHashFilter_methods[] = {
+    {"get", (PyCFunction) FastHashFilter_get, METH_VARARGS | METH_KEYWORDS,
+        "Get value of the key.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n"
+        "    default (Optional[object]): Value returned when the key is not found (default: None).\n\n"
+        "Returns:\n"
+        "    tuple: Unpacked value or default.\n"
+        },
+
+    {"set", (PyCFunction) FastHashFilter_set, METH_VARARGS | METH_KEYWORDS,
+        "Set value of the key.\n\n"
+        "Items are never evicted.  When the row of a new key is full, the table\n"
+        "is resized (unless resize is False) and the key is inserted again.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n"
+        "    value (tuple, object or bytes): Values packed by value_fmt, a single value or already packed bytes.\n"
+        "    resize (Optional[bool]): Grow the table when the row is full (default: True).\n\n"
+        "Returns:\n"
+        "    bool: False if the row is full and the value was not stored.\n\n"
+        "Raises:\n"
+        "    ValueError: Bad size of key or packed value.\n"
+        "    struct.error: Value does not match value_fmt.\n"
+        "    BufferError: The table needs to be resized while some view is exported.\n"
+        },
+
+    {"remove", (PyCFunction) FastHashFilter_remove, METH_O,
+        "Remove the key from the table.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n\n"
+        "Returns:\n"
+        "    bool: True if the key was found and removed.\n\n"
+        "Raises:\n"
+        "    BufferError: Some view is exported.\n"
+        },
+
+    {"view", (PyCFunction) FastHashFilter_view, METH_NOARGS,
+        "Create a reusable view of stored values.\n\n"
+        "The view is bound to a value by FastHashFilterView.find(), the value\n"
+        "can be then read without copying via the buffer protocol, e.g.:\n\n"
+        "    v = f.view()\n"
+        "    if v.find(key):\n"
+        "        score, = struct.unpack_from(\"I\", v)\n\n"
+        "Returns:\n"
+        "    FastHashFilterView: New unbound view.\n"
+        },
+
+    {"resize", (PyCFunction) FastHashFilter_resize, METH_NOARGS,
+        "Double the number of rows of the table (more if the items do not fit).\n\n"
+        "All views are invalidated.\n\n"
+        "Raises:\n"
+        "    BufferError: Some view is exported.\n"
+        },
+
+    {"items", (PyCFunction) FastHashFilter_items, METH_NOARGS,
+        "Get all items stored in the table.\n\n"
+        "Returns:\n"
+        "    list(tuple(bytes, tuple)): List of (key, value).\n"
+        },
+
+    {"clear", (PyCFunction) FastHashFilter_clear, METH_NOARGS,
+        "Remove all items from the table, all views are invalidated.\n\n"
+        "Raises:\n"
+        "    BufferError: Some view is exported.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PySequenceMethods FastHashFilter_seq = {
+    0,                                      /* sq_length */
+    0,                                      /* sq_concat */
+    0,                                      /* sq_repeat */
+    0,                                      /* sq_item */
+    0,                                      /* sq_slice */
+    0,                                      /* sq_ass_item */
+    0,                                      /* sq_ass_slice */
+    (objobjproc) FastHashFilter_contains,   /* sq_contains */
+};
+
+static PyMappingMethods FastHashFilter_mapping = {
+    (lenfunc) FastHashFilter_len,           /* mp_length */
+    (binaryfunc) FastHashFilter_getitem,    /* mp_subscript */
+    (objobjargproc) FastHashFilter_setitem, /* mp_ass_subscript */
+};
+
+static PyTypeObject pytrap_FastHashFilter = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.FastHashFilter",   /* tp_name */
+    sizeof(pytrap_fasthashfilter), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) FastHashFilter_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    &FastHashFilter_seq,       /* tp_as_sequence */
+    &FastHashFilter_mapping,   /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "FastHashFilter(rows, key_size, value_fmt)\n\n"
+    "Resizable 8-way hash table (fast_hash_filter of nemea-common).\n"
+    "Unlike FastHashTable, items are never evicted, the table grows instead.\n"
+    "It is intended for large lookup tables (e.g. reputation of addresses)\n"
+    "that are filled by one thread and queried by others:\n\n"
+    "    f = FastHashFilter(2**20, 16, \"I\")\n"
+    "    f[ip.key()] = 42\n"
+    "    score, = f.get(ip.key(), (0,))\n\n"
+    "Iteration over the table yields keys; the iteration fails when items\n"
+    "are removed or the table is resized meanwhile.\n\n"
+    "Args:\n"
+    "    rows (int): Initial number of rows, it must be a power of two.\n"
+    "    key_size (int): Size of keys in bytes.\n"
+    "    value_fmt (str): Format of values (see struct module).\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    (getiterfunc) FastHashFilter_iter, /* tp_iter */
+    0,                         /* tp_iternext */
+    FastHashFilter_methods,    /* tp_methods */
+    FastHashFilter_members,    /* tp_members */
+    FastHashFilter_getset,     /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    FastHashFilter_new,        /* tp_new */
+};
+
+/* FastHashFilterIter */
+
+static void
+FastHashFilterIter_dealloc(pytrap_fasthashfilteriter *self)
+{
+    Py_DECREF(self->filter);
+    PyObject_Del(self);
+}
+
+static PyObject *
+FastHashFilterIter_next(pytrap_fasthashfilteriter *self)
+{
+    fhf_table_t *table = self->filter->table;
+
+    if (self->generation != self->filter->generation) {
+        PyErr_SetString(PyExc_RuntimeError, "FastHashFilter changed during iteration.");
+        return NULL;
+    }
+    self->pos = FastHashFilter_next_slot(table, self->pos);
+    if (self->pos >= table->table_rows * FHF_TABLE_COLS) {
+        return NULL;
+    }
+    return PyBytes_FromStringAndSize((const char *) &table->key_field[self->pos++ * table->key_size],
+                                     self->filter->key_size);
+}
+
+static PyTypeObject pytrap_FastHashFilterIter = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.FastHashFilterIter", /* tp_name */
+    sizeof(pytrap_fasthashfilteriter), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) FastHashFilterIter_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    0,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "Iterator over keys of FastHashFilter.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    PyObject_SelfIter,         /* tp_iter */
+    (iternextfunc) FastHashFilterIter_next, /* tp_iternext */
+};
+
+/* FastHashFilterView */
+
+static void
+FastHashFilterView_dealloc(pytrap_fasthashfilterview *self)
+{
+    Py_DECREF(self->filter);
+    PyObject_Del(self);
+}
+
+/**
+ * \brief Get the value the view is bound to.
+ *
+ * \return Pointer to the stored value, NULL with exception set if the view is not bound.
+ */
+static uint8_t *
+FastHashFilterView_data(pytrap_fasthashfilterview *self)
+{
+    if (self->data == NULL || self->generation != self->filter->generation) {
+        PyErr_SetString(PyExc_BufferError, "View is not bound to a stored value, use find().");
+        return NULL;
+    }
+    return self->data;
+}
+
+static PyObject *
+FastHashFilterView_find(pytrap_fasthashfilterview *self, PyObject *key)
+{
+    pytrap_fasthashfilter *filter = self->filter;
+    Py_buffer view;
+
+    if (common_get_key(key, &view, filter->key_size) != 0) {
+        return NULL;
+    }
+    self->data = FastHashFilter_find(filter, view.buf);
+    self->generation = filter->generation;
+    PyBuffer_Release(&view);
+    return PyBool_FromLong(self->data != NULL);
+}
+
+static PyObject *
+FastHashFilterView_unpack(pytrap_fasthashfilterview *self)
+{
+    uint8_t *data = FastHashFilterView_data(self);
+
+    if (data == NULL) {
+        return NULL;
+    }
+    return common_unpack_value(self->filter->value_struct, data, self->filter->value_size);
+}
+
+static int
+FastHashFilterView_getbuffer(pytrap_fasthashfilterview *self, Py_buffer *view, int flags)
+{
+    uint8_t *data = FastHashFilterView_data(self);
+
+    if (data == NULL) {
+        view->obj = NULL;
+        return -1;
+    }
+    if (PyBuffer_FillInfo(view, (PyObject *) self, data, self->filter->value_size, 0, flags) != 0) {
+        return -1;
+    }
+    self->filter->exports++;
+    return 0;
+}
+
+static void
+FastHashFilterView_releasebuffer(pytrap_fasthashfilterview *self, Py_buffer *view)
+{
+    self->filter->exports--;
+}
+
+static PyBufferProcs FastHashFilterView_buffer = {
+#if PY_MAJOR_VERSION < 3
+    0,                                          /* bf_getreadbuffer */
+    0,                                          /* bf_getwritebuffer */
+    0,                                          /* bf_getsegcount */
+    0,                                          /* bf_getcharbuffer */
+#endif
+    (getbufferproc) FastHashFilterView_getbuffer,         /* bf_getbuffer */
+    (releasebufferproc) FastHashFilterView_releasebuffer, /* bf_releasebuffer */
+};
+
+static PyMethodDef FastHashFilterView_methods[] = {
+    {"find", (PyCFunction) FastHashFilterView_find, METH_O,
+        "Bind the view to the value of the key.\n\n"
+        "Args:\n"
+        "    key (bytes): Key of key_size bytes.\n\n"
+        "Returns:\n"
+        "    bool: True if the key was found.\n"
+        },
+
+    {"unpack", (PyCFunction) FastHashFilterView_unpack, METH_NOARGS,
+        "Get the value the view is bound to.\n\n"
+        "Returns:\n"
+        "    tuple: Unpacked value.\n\n"
+        "Raises:\n"
+        "    BufferError: The view is not bound to a stored value.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PyTypeObject pytrap_FastHashFilterView = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.FastHashFilterView", /* tp_name */
+    sizeof(pytrap_fasthashfilterview), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) FastHashFilterView_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    0,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    &FastHashFilterView_buffer, /* tp_as_buffer */
+#if PY_MAJOR_VERSION < 3
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_NEWBUFFER, /* tp_flags */
+#else
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+#endif
+    "View of a value stored in FastHashFilter (see FastHashFilter.view()).\n\n"
+    "The view exposes the packed value via the buffer protocol without copying,\n"
+    "it is writable so that the value can be updated in place.  The view is\n"
+    "invalidated when items are removed or the table is resized.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    FastHashFilterView_methods, /* tp_methods */
+};
+
+/*********************/
+/*  BPlusTree        */
+/*********************/
+
+/*
+ * Keys of the tree are IP addresses compared by ip_cmp() (i.e. in the order
+ * of UnirecIPAddr), leaves of the tree are linked so that items of a range
+ * of addresses are found in O(log n + k).
+ */
+
+typedef struct {
+    PyObject_HEAD
+    bpt_t *tree;
+    PyObject *value_struct;
+    PyObject *value_fmt;
+    Py_ssize_t value_size;
+    int node_size;
+    uint64_t generation;
+    uint8_t *data_new;
+} pytrap_bplustree;
+
+enum bplustree_iter_kind {
+    BPLUSTREE_ITER_KEYS,
+    BPLUSTREE_ITER_ITEMS
+};
+
+typedef struct {
+    PyObject_HEAD
+    pytrap_bplustree *tree;
+    bpt_list_item_t *item;
+    ip_addr_t hi;
+    uint64_t generation;
+    enum bplustree_iter_kind kind;
+    char has_item; /* item points to the next result */
+} pytrap_bplustreeiter;
+
+static PyTypeObject pytrap_BPlusTreeIter;
+
+static int
+BPlusTree_compare(void *a, void *b)
+{
+    return ip_cmp((const ip_addr_t *) a, (const ip_addr_t *) b);
+}
+
+static void
+BPlusTree_dealloc(pytrap_bplustree *self)
+{
+    if (self->tree != NULL) {
+        bpt_clean(self->tree);
+    }
+    PyMem_Free(self->data_new);
+    Py_XDECREF(self->value_struct);
+    Py_XDECREF(self->value_fmt);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+BPlusTree_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_bplustree *self;
+    PyObject *value_fmt;
+    int node_size = 32;
+
+    static char *kwlist[] = {"value_fmt", "node_size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|i", kwlist, &value_fmt, &node_size)) {
+        return NULL;
+    }
+    if (node_size < 3) {
+        PyErr_SetString(PyExc_ValueError, "Size of node must be at least 3.");
+        return NULL;
+    }
+
+    self = (pytrap_bplustree *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->node_size = node_size;
+    self->value_struct = common_struct_new(value_fmt, &self->value_size);
+    if (self->value_struct == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    Py_INCREF(value_fmt);
+    self->value_fmt = value_fmt;
+
+    self->data_new = PyMem_Malloc(self->value_size);
+    self->tree = bpt_init(node_size, BPlusTree_compare, self->value_size, sizeof(ip_addr_t));
+    if (self->data_new == NULL || self->tree == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return (PyObject *) self;
+}
+
+/**
+ * \brief Find value of the key.
+ *
+ * \return Pointer to the stored value, NULL if it is not found or on error (with exception set).
+ */
+static void *
+BPlusTree_find(pytrap_bplustree *self, PyObject *key)
+{
+    ip_addr_t ip;
+
+    if (UnirecIPAddr_AsIP(key, &ip) != 0) {
+        return NULL;
+    }
+    return bpt_search(self->tree, &ip);
+}
+
+static PyObject *
+BPlusTree_get(pytrap_bplustree *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *key, *def = Py_None;
+    void *data;
+
+    static char *kwlist[] = {"key", "default", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &key, &def)) {
+        return NULL;
+    }
+    data = BPlusTree_find(self, key);
+    if (data == NULL) {
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+        Py_INCREF(def);
+        return def;
+    }
+    return common_unpack_value(self->value_struct, data, self->value_size);
+}
+
+static PyObject *
+BPlusTree_getitem(pytrap_bplustree *self, PyObject *key)
+{
+    void *data = BPlusTree_find(self, key);
+
+    if (data == NULL) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetObject(PyExc_KeyError, key);
+        }
+        return NULL;
+    }
+    return common_unpack_value(self->value_struct, data, self->value_size);
+}
+
+static int
+BPlusTree_setitem(pytrap_bplustree *self, PyObject *key, PyObject *value)
+{
+    unsigned long int count;
+    ip_addr_t ip;
+    void *data;
+
+    if (UnirecIPAddr_AsIP(key, &ip) != 0) {
+        return -1;
+    }
+    if (value == NULL) {
+        if (bpt_item_del(self->tree, &ip) != 1) {
+            PyErr_SetObject(PyExc_KeyError, key);
+            return -1;
+        }
+        self->generation++;
+        return 0;
+    }
+
+    /* pack first to keep the tree untouched on error */
+    if (common_pack_value(self->value_struct, value, self->data_new, self->value_size) != 0) {
+        return -1;
+    }
+    count = bpt_item_cnt(self->tree);
+    data = bpt_search_or_insert(self->tree, &ip);
+    if (data == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    if (bpt_item_cnt(self->tree) != count) {
+        /* new item, leaves may have been split */
+        self->generation++;
+    }
+    memcpy(data, self->data_new, self->value_size);
+    return 0;
+}
+
+static int
+BPlusTree_contains(pytrap_bplustree *self, PyObject *key)
+{
+    void *data = BPlusTree_find(self, key);
+
+    if (data == NULL) {
+        return PyErr_Occurred() ? -1 : 0;
+    }
+    return 1;
+}
+
+static Py_ssize_t
+BPlusTree_len(pytrap_bplustree *self)
+{
+    return bpt_item_cnt(self->tree);
+}
+
+/**
+ * \brief Create iterator over keys in [lo, hi].
+ *
+ * \param [in] lo     the first key, UnirecIPAddrRange, or NULL/None (from the beginning)
+ * \param [in] hi     the last key or NULL/None (to the end)
+ * \param [in] kind   type of returned objects
+ * \return New reference to the iterator, NULL with exception set on error.
+ */
+static PyObject *
+BPlusTree_iter_range(pytrap_bplustree *self, PyObject *lo, PyObject *hi, enum bplustree_iter_kind kind)
+{
+    pytrap_bplustreeiter *it;
+    ip_addr_t lo_ip;
+
+    it = PyObject_New(pytrap_bplustreeiter, &pytrap_BPlusTreeIter);
+    if (it == NULL) {
+        return NULL;
+    }
+    Py_INCREF(self);
+    it->tree = self;
+    it->kind = kind;
+    it->generation = self->generation;
+    it->has_item = 0;
+    memset(&it->hi, 0xff, sizeof(it->hi));
+    it->item = bpt_list_init(self->tree);
+    if (it->item == NULL) {
+        Py_DECREF(it);
+        return PyErr_NoMemory();
+    }
+
+    if (lo != NULL && lo != Py_None && UnirecIPAddrRange_AsIPs(lo, &lo_ip, &it->hi)) {
+        if (hi != NULL && hi != Py_None) {
+            PyErr_SetString(PyExc_TypeError, "The last key must not be set with UnirecIPAddrRange.");
+            Py_DECREF(it);
+            return NULL;
+        }
+        it->has_item = bpt_list_start_at(self->tree, it->item, &lo_ip);
+    } else if (lo != NULL && lo != Py_None) {
+        if (UnirecIPAddr_AsIP(lo, &lo_ip) != 0) {
+            Py_DECREF(it);
+            return NULL;
+        }
+        it->has_item = bpt_list_start_at(self->tree, it->item, &lo_ip);
+    } else {
+        it->has_item = bpt_list_start(self->tree, it->item);
+    }
+    if (hi != NULL && hi != Py_None && UnirecIPAddr_AsIP(hi, &it->hi) != 0) {
+        Py_DECREF(it);
+        return NULL;
+    }
+    return (PyObject *) it;
+}
+
+static PyObject *
+BPlusTree_iter(pytrap_bplustree *self)
+{
+    return BPlusTree_iter_range(self, NULL, NULL, BPLUSTREE_ITER_KEYS);
+}
+
+static PyObject *
+BPlusTree_keys(pytrap_bplustree *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *lo = NULL, *hi = NULL;
+
+    static char *kwlist[] = {"lo", "hi", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OO", kwlist, &lo, &hi)) {
+        return NULL;
+    }
+    return BPlusTree_iter_range(self, lo, hi, BPLUSTREE_ITER_KEYS);
+}
+
+static PyObject *
+BPlusTree_items(pytrap_bplustree *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *lo = NULL, *hi = NULL;
+
+    static char *kwlist[] = {"lo", "hi", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OO", kwlist, &lo, &hi)) {
+        return NULL;
+    }
+    return BPlusTree_iter_range(self, lo, hi, BPLUSTREE_ITER_ITEMS);
+}
+
+static PyObject *
+BPlusTree_clear(pytrap_bplustree *self)
+{
+    bpt_t *tree;
+
+    tree = bpt_init(self->node_size, BPlusTree_compare, self->value_size, sizeof(ip_addr_t));
+    if (tree == NULL) {
+        return PyErr_NoMemory();
+    }
+    bpt_clean(self->tree);
+    self->tree = tree;
+    self->generation++;
+    Py_RETURN_NONE;
+}
+
+static PyMemberDef BPlusTree_members[] = {
+    {"value_fmt", T_OBJECT_EX, offsetof(pytrap_bplustree, value_fmt), READONLY,
+        "Format of values (see struct module)."},
+    {"node_size", T_INT, offsetof(pytrap_bplustree, node_size), READONLY,
+        "Number of items in one node of the tree."},
+    {NULL}  /* Sentinel */
+};
+
+static PyMethodDef BPlusTree_methods[] = {
+    {"get", (PyCFunction) BPlusTree_get, METH_VARARGS | METH_KEYWORDS,
+        "Get value of the key.\n\n"
+        "Args:\n"
+        "    key (UnirecIPAddr): IP address.\n"
+        "    default (Optional[object]): Value returned when the key is not found (default: None).\n\n"
+        "Returns:\n"
+        "    tuple: Unpacked value or default.\n"
+        },
+
+    {"items", (PyCFunction) BPlusTree_items, METH_VARARGS | METH_KEYWORDS,
+        "Iterate over items with keys in the range [lo, hi] in ascending order.\n\n"
+        "Args:\n"
+        "    lo (Optional[UnirecIPAddr or UnirecIPAddrRange]): The first key (default: None - from the beginning).\n"
+        "        When it is UnirecIPAddrRange, items of the range are returned and hi must not be set.\n"
+        "    hi (Optional[UnirecIPAddr]): The last key (default: None - to the end).\n\n"
+        "Returns:\n"
+        "    iterator: (UnirecIPAddr, tuple) pairs.\n"
+        },
+
+    {"keys", (PyCFunction) BPlusTree_keys, METH_VARARGS | METH_KEYWORDS,
+        "Iterate over keys in the range [lo, hi] in ascending order.\n\n"
+        "Args:\n"
+        "    lo (Optional[UnirecIPAddr or UnirecIPAddrRange]): The first key (default: None - from the beginning).\n"
+        "    hi (Optional[UnirecIPAddr]): The last key (default: None - to the end).\n\n"
+        "Returns:\n"
+        "    iterator: UnirecIPAddr keys.\n"
+        },
+
+    {"clear", (PyCFunction) BPlusTree_clear, METH_NOARGS,
+        "Remove all items from the tree.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PySequenceMethods BPlusTree_seq = {
+    0,                                      /* sq_length */
+    0,                                      /* sq_concat */
+    0,                                      /* sq_repeat */
+    0,                                      /* sq_item */
+    0,                                      /* sq_slice */
+    0,                                      /* sq_ass_item */
+    0,                                      /* sq_ass_slice */
+    (objobjproc) BPlusTree_contains,        /* sq_contains */
+};
+
+static PyMappingMethods BPlusTree_mapping = {
+    (lenfunc) BPlusTree_len,                /* mp_length */
+    (binaryfunc) BPlusTree_getitem,         /* mp_subscript */
+    (objobjargproc) BPlusTree_setitem,      /* mp_ass_subscript */
+};
+
+static PyTypeObject pytrap_BPlusTree = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.BPlusTree",        /* tp_name */
+    sizeof(pytrap_bplustree),  /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) BPlusTree_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    &BPlusTree_seq,            /* tp_as_sequence */
+    &BPlusTree_mapping,        /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "BPlusTree(value_fmt, node_size=32)\n\n"
+    "Ordered mapping of UnirecIPAddr keys to fixed-size values (b_plus_tree of nemea-common).\n"
+    "Keys are sorted like UnirecIPAddr objects, so items of a network are found\n"
+    "without scanning the whole mapping:\n\n"
+    "    t = BPlusTree(\"QQ\")\n"
+    "    t[tmpl.SRC_IP] = (flows + 1, packets + tmpl.PACKETS)\n"
+    "    for ip, (flows, packets) in t.items(UnirecIPAddrRange(\"10.0.0.0/8\")):\n"
+    "        ...\n\n"
+    "Iteration over the tree yields keys in ascending order; the iteration fails\n"
+    "when keys are inserted or removed meanwhile.\n\n"
+    "Args:\n"
+    "    value_fmt (str): Format of values (see struct module).\n"
+    "    node_size (Optional[int]): Number of items in one node (default: 32).\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    (getiterfunc) BPlusTree_iter, /* tp_iter */
+    0,                         /* tp_iternext */
+    BPlusTree_methods,         /* tp_methods */
+    BPlusTree_members,         /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    BPlusTree_new,             /* tp_new */
+};
+
+/* BPlusTreeIter */
+
+static void
+BPlusTreeIter_dealloc(pytrap_bplustreeiter *self)
+{
+    bpt_list_clean(self->item);
+    Py_DECREF(self->tree);
+    PyObject_Del(self);
+}
+
+static PyObject *
+BPlusTreeIter_next(pytrap_bplustreeiter *self)
+{
+    PyObject *key, *value, *result;
+    pytrap_bplustree *tree = self->tree;
+
+    if (self->generation != tree->generation) {
+        PyErr_SetString(PyExc_RuntimeError, "BPlusTree changed during iteration.");
+        return NULL;
+    }
+    if (!self->has_item || ip_cmp((const ip_addr_t *) self->item->key, &self->hi) > 0) {
+        self->has_item = 0;
+        return NULL;
+    }
+
+    key = UnirecIPAddr_FromIP((const ip_addr_t *) self->item->key);
+    if (key == NULL) {
+        return NULL;
+    }
+    if (self->kind == BPLUSTREE_ITER_KEYS) {
+        result = key;
+    } else {
+        value = common_unpack_value(tree->value_struct, self->item->value, tree->value_size);
+        result = (value != NULL) ? PyTuple_Pack(2, key, value) : NULL;
+        Py_DECREF(key);
+        Py_XDECREF(value);
+    }
+    self->has_item = bpt_list_item_next(tree->tree, self->item);
+    return result;
+}
+
+static PyTypeObject pytrap_BPlusTreeIter = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.BPlusTreeIter",    /* tp_name */
+    sizeof(pytrap_bplustreeiter), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) BPlusTreeIter_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    0,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "Iterator over a range of keys of BPlusTree.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    PyObject_SelfIter,         /* tp_iter */
+    (iternextfunc) BPlusTreeIter_next, /* tp_iternext */
+};
+
+/*********************/
+/*  PrefixTree       */
+/*********************/
+
+/*
+ * Value of every domain node starts with a flag of listed domains (added
+ * by add()/load()), the rest is the packed value.  Nodes of parent domains
+ * and of names counted by insert() are not listed.
+ */
+
+#define PREFIXTREE_LISTED 1
+
+typedef struct {
+    PyObject_HEAD
+    prefix_tree_t *tree;
+    PyObject *value_struct;
+    PyObject *value_fmt;
+    Py_ssize_t value_size;
+    Py_ssize_t count;
+    char separator;
+    int suffix;
+    char ignore_case;
+    char *fold;
+    Py_ssize_t fold_size;
+} pytrap_prefixtree;
+
+/**
+ * \brief Convert ASCII letters of the string to lower case in place.
+ */
+static void
+PrefixTree_fold(char *str, Py_ssize_t len)
+{
+    Py_ssize_t i;
+
+    for (i = 0; i < len; i++) {
+        if (str[i] >= 'A' && str[i] <= 'Z') {
+            str[i] += 'a' - 'A';
+        }
+    }
+}
+
+/**
+ * \brief Get string of a domain name (str is encoded in UTF-8).
+ *
+ * The trailing separator of fully qualified names in suffix tree is ignored.
+ * With ignore_case, the string is copied into the folding buffer of the tree
+ * and ASCII letters are converted to lower case.
+ *
+ * \param [in] obj    str or bytes object
+ * \param [out] str   pointer to the string, it is valid while obj exists
+ *                    and until the next call
+ * \param [out] len   length of the string
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+PrefixTree_get_string(pytrap_prefixtree *self, PyObject *obj, const char **str, Py_ssize_t *len)
+{
+    char *buf;
+
+    if (PyBytes_Check(obj)) {
+        if (PyBytes_AsStringAndSize(obj, &buf, len) != 0) {
+            return -1;
+        }
+        *str = buf;
+#if PY_MAJOR_VERSION >= 3
+    } else if (PyUnicode_Check(obj)) {
+        *str = PyUnicode_AsUTF8AndSize(obj, len);
+        if (*str == NULL) {
+            return -1;
+        }
+#endif
+    } else {
+        PyErr_SetString(PyExc_TypeError, "Domain must be str or bytes.");
+        return -1;
+    }
+    if (self->suffix && *len > 0 && (*str)[*len - 1] == self->separator) {
+        (*len)--;
+    }
+    if (self->ignore_case) {
+        if (*len > self->fold_size) {
+            buf = PyMem_Realloc(self->fold, *len);
+            if (buf == NULL) {
+                PyErr_NoMemory();
+                return -1;
+            }
+            self->fold = buf;
+            self->fold_size = *len;
+        }
+        memcpy(self->fold, *str, *len);
+        PrefixTree_fold(self->fold, *len);
+        *str = self->fold;
+    }
+    return 0;
+}
+
+/**
+ * \brief Get string of a domain name that is going to be stored.
+ *
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+PrefixTree_get_new_string(pytrap_prefixtree *self, PyObject *obj, const char **str, Py_ssize_t *len)
+{
+    if (PrefixTree_get_string(self, obj, str, len) != 0) {
+        return -1;
+    }
+    if (*len == 0 || *len >= MAX_SIZE_OF_DOMAIN) {
+        PyErr_Format(PyExc_ValueError, "Length of domain must be 1-%d.", MAX_SIZE_OF_DOMAIN - 1);
+        return -1;
+    }
+    return 0;
+}
+
+static void
+PrefixTree_dealloc(pytrap_prefixtree *self)
+{
+    if (self->tree != NULL) {
+        prefix_tree_destroy(self->tree);
+    }
+    Py_XDECREF(self->value_struct);
+    Py_XDECREF(self->value_fmt);
+    PyMem_Free(self->fold);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+PrefixTree_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_prefixtree *self;
+    PyObject *value_fmt = Py_None, *suffix = Py_True, *ignore_case = Py_True;
+    char separator = '.';
+
+    static char *kwlist[] = {"value_fmt", "suffix", "separator", "ignore_case", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OOcO", kwlist, &value_fmt, &suffix, &separator, &ignore_case)) {
+        return NULL;
+    }
+
+    self = (pytrap_prefixtree *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->separator = separator;
+    self->suffix = PyObject_IsTrue(suffix);
+    self->ignore_case = PyObject_IsTrue(ignore_case) == 1;
+    if (value_fmt != Py_None) {
+        self->value_struct = common_struct_new(value_fmt, &self->value_size);
+        if (self->value_struct == NULL) {
+            Py_DECREF(self);
+            return NULL;
+        }
+    }
+    Py_INCREF(value_fmt);
+    self->value_fmt = value_fmt;
+
+    self->tree = prefix_tree_initialize(self->suffix ? SUFFIX : PREFIX, 1 + self->value_size, separator,
+                                        DOMAIN_EXTENSION_NO, RELAXATION_AFTER_DELETE_NO);
+    if (self->tree == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return (PyObject *) self;
+}
+
+/**
+ * \brief Get value of a listed domain.
+ *
+ * \return New reference to tuple of values (None without value_fmt), NULL with exception set on error.
+ */
+static PyObject *
+PrefixTree_value(pytrap_prefixtree *self, prefix_tree_domain_t *domain)
+{
+    if (self->value_struct == NULL) {
+        Py_RETURN_NONE;
+    }
+    return common_unpack_value(self->value_struct, (uint8_t *) domain->value + 1, self->value_size);
+}
+
+/**
+ * \brief Find the listed domain.
+ *
+ * \return Domain node, NULL if it is not found or on error (with exception set).
+ */
+static prefix_tree_domain_t *
+PrefixTree_find(pytrap_prefixtree *self, PyObject *key)
+{
+    prefix_tree_domain_t *domain;
+    const char *str;
+    Py_ssize_t len;
+
+    if (PrefixTree_get_string(self, key, &str, &len) != 0 || len == 0) {
+        return NULL;
+    }
+    domain = prefix_tree_search(self->tree, str, len);
+    if (domain != NULL && (*(uint8_t *) domain->value & PREFIXTREE_LISTED)) {
+        return domain;
+    }
+    return NULL;
+}
+
+/**
+ * \brief Add the domain into the list, set its value.
+ *
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+PrefixTree_store(pytrap_prefixtree *self, const char *str, Py_ssize_t len, const uint8_t *value)
+{
+    prefix_tree_domain_t *domain;
+    uint8_t *data;
+
+    if (self->suffix) {
+        domain = prefix_tree_add_domain_recursive_suffix(self->tree->root, self->tree->root->domain, str, len, self->tree);
+    } else {
+        domain = prefix_tree_add_domain_recursive_prefix(self->tree->root, self->tree->root->domain, str, len, self->tree);
+    }
+    if (domain == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    data = (uint8_t *) domain->value;
+    if (!(data[0] & PREFIXTREE_LISTED)) {
+        data[0] |= PREFIXTREE_LISTED;
+        self->count++;
+    }
+    if (self->value_size > 0) {
+        memcpy(data + 1, value, self->value_size);
+    }
+    return 0;
+}
+
+/**
+ * \brief Pack value of listed domains.
+ *
+ * \param [out] buf   buffer of value_size bytes
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+PrefixTree_pack(pytrap_prefixtree *self, PyObject *value, uint8_t *buf)
+{
+    if (self->value_struct == NULL) {
+        if (value != Py_None) {
+            PyErr_SetString(PyExc_ValueError, "The tree has no values (value_fmt is None).");
+            return -1;
+        }
+        return 0;
+    }
+    if (value == Py_None) {
+        PyErr_SetString(PyExc_ValueError, "Value must be set.");
+        return -1;
+    }
+    return common_pack_value(self->value_struct, value, buf, self->value_size);
+}
+
+static PyObject *
+PrefixTree_add(pytrap_prefixtree *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *key, *value = Py_None;
+    const char *str;
+    Py_ssize_t len;
+    uint8_t *buf;
+    int ret;
+
+    static char *kwlist[] = {"domain", "value", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &key, &value)) {
+        return NULL;
+    }
+    if (PrefixTree_get_new_string(self, key, &str, &len) != 0) {
+        return NULL;
+    }
+    buf = PyMem_Malloc(self->value_size + 1);
+    if (buf == NULL) {
+        return PyErr_NoMemory();
+    }
+    ret = PrefixTree_pack(self, value, buf);
+    if (ret == 0) {
+        ret = PrefixTree_store(self, str, len, buf);
+    }
+    PyMem_Free(buf);
+    if (ret != 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+PrefixTree_load(pytrap_prefixtree *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *path, *value = Py_None;
+    const char *filename;
+    char *line = NULL, *str;
+    size_t line_size = 0;
+    Py_ssize_t len, loaded = 0;
+    uint8_t *buf;
+    FILE *f;
+    int ret = 0;
+
+    static char *kwlist[] = {"path", "value", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &path, &value)) {
+        return NULL;
+    }
+#if PY_MAJOR_VERSION >= 3
+    filename = PyUnicode_Check(path) ? PyUnicode_AsUTF8(path) : NULL;
+#else
+    filename = PyString_Check(path) ? PyString_AsString(path) : NULL;
+#endif
+    if (filename == NULL) {
+        PyErr_SetString(PyExc_TypeError, "Argument path must be str.");
+        return NULL;
+    }
+    buf = PyMem_Malloc(self->value_size + 1);
+    if (buf == NULL) {
+        return PyErr_NoMemory();
+    }
+    if (PrefixTree_pack(self, value, buf) != 0) {
+        PyMem_Free(buf);
+        return NULL;
+    }
+    f = fopen(filename, "r");
+    if (f == NULL) {
+        PyMem_Free(buf);
+        return PyErr_SetFromErrnoWithFilename(PyExc_IOError, filename);
+    }
+
+    /* the first word of each line, empty lines and comments (#) are skipped */
+    while (ret == 0 && getline(&line, &line_size, f) != -1) {
+        str = line + strspn(line, " \t\r\n");
+        len = strcspn(str, " \t\r\n#");
+        if (len == 0) {
+            continue;
+        }
+        if (self->suffix && str[len - 1] == self->separator) {
+            len--;
+        }
+        if (len == 0 || len >= MAX_SIZE_OF_DOMAIN) {
+            PyErr_Format(PyExc_ValueError, "Bad domain \"%.*s\" in %s.", (int) len, str, filename);
+            ret = -1;
+            break;
+        }
+        if (self->ignore_case) {
+            PrefixTree_fold(str, len);
+        }
+        ret = PrefixTree_store(self, str, len, buf);
+        loaded++;
+    }
+    free(line);
+    fclose(f);
+    PyMem_Free(buf);
+    if (ret != 0) {
+        return NULL;
+    }
+    return PyLong_FromSsize_t(loaded);
+}
+
+static PyObject *
+PrefixTree_getitem(pytrap_prefixtree *self, PyObject *key)
+{
+    prefix_tree_domain_t *domain = PrefixTree_find(self, key);
+
+    if (domain == NULL) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetObject(PyExc_KeyError, key);
+        }
+        return NULL;
+    }
+    return PrefixTree_value(self, domain);
+}
+
+static int
+PrefixTree_setitem(pytrap_prefixtree *self, PyObject *key, PyObject *value)
+{
+    prefix_tree_domain_t *domain;
+    const char *str;
+    Py_ssize_t len;
+    uint8_t *buf;
+    int ret;
+
+    if (value == NULL) {
+        domain = PrefixTree_find(self, key);
+        if (domain == NULL) {
+            if (!PyErr_Occurred()) {
+                PyErr_SetObject(PyExc_KeyError, key);
+            }
+            return -1;
+        }
+        /* node of the domain is kept in the tree with its counters */
+        *(uint8_t *) domain->value &= ~PREFIXTREE_LISTED;
+        self->count--;
+        return 0;
+    }
+
+    if (PrefixTree_get_new_string(self, key, &str, &len) != 0) {
+        return -1;
+    }
+    buf = PyMem_Malloc(self->value_size + 1);
+    if (buf == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    ret = PrefixTree_pack(self, value, buf);
+    if (ret == 0) {
+        ret = PrefixTree_store(self, str, len, buf);
+    }
+    PyMem_Free(buf);
+    return ret;
+}
+
+static int
+PrefixTree_contains(pytrap_prefixtree *self, PyObject *key)
+{
+    if (PrefixTree_find(self, key) == NULL) {
+        return PyErr_Occurred() ? -1 : 0;
+    }
+    return 1;
+}
+
+static Py_ssize_t
+PrefixTree_len(pytrap_prefixtree *self)
+{
+    return self->count;
+}
+
+static PyObject *
+PrefixTree_match(pytrap_prefixtree *self, PyObject *key)
+{
+    prefix_tree_domain_t *domain;
+    PyObject *name, *value, *result;
+    const char *str;
+    Py_ssize_t len, start, end;
+    int labels;
+
+    if (PrefixTree_get_string(self, key, &str, &len) != 0) {
+        return NULL;
+    }
+    domain = len > 0 ? prefix_tree_search_longest(self->tree, str, len) : NULL;
+    while (domain != NULL && domain->parent != NULL && !(*(uint8_t *) domain->value & PREFIXTREE_LISTED)) {
+        domain = domain->parent_domain;
+    }
+    if (domain == NULL || domain->parent == NULL) {
+        Py_RETURN_NONE;
+    }
+
+    /* the domain consists of the last (first in prefix tree) "degree" labels of the string */
+    labels = domain->degree;
+    if (self->suffix) {
+        for (start = len; start > 0 && (str[start - 1] != self->separator || --labels > 0); start--) {
+        }
+        end = len;
+    } else {
+        for (end = 0; end < len && (str[end] != self->separator || --labels > 0); end++) {
+        }
+        start = 0;
+    }
+    if (PyBytes_Check(key)) {
+        name = PyBytes_FromStringAndSize(str + start, end - start);
+    } else {
+        name = PyUnicode_DecodeUTF8(str + start, end - start, NULL);
+    }
+    value = PrefixTree_value(self, domain);
+    result = (name != NULL && value != NULL) ? PyTuple_Pack(2, name, value) : NULL;
+    Py_XDECREF(name);
+    Py_XDECREF(value);
+    return result;
+}
+
+static PyObject *
+PrefixTree_insert(pytrap_prefixtree *self, PyObject *key)
+{
+    prefix_tree_domain_t *domain;
+    const char *str;
+    Py_ssize_t len;
+
+    if (PrefixTree_get_new_string(self, key, &str, &len) != 0) {
+        return NULL;
+    }
+    domain = prefix_tree_insert(self->tree, str, len);
+    if (domain == NULL) {
+        return PyErr_NoMemory();
+    }
+    return PyLong_FromUnsignedLong(domain->count_of_insert);
+}
+
+static PyObject *
+PrefixTree_counters(pytrap_prefixtree *self, PyObject *key)
+{
+    prefix_tree_domain_t *domain;
+    const char *str;
+    Py_ssize_t len;
+
+    if (PrefixTree_get_string(self, key, &str, &len) != 0) {
+        return NULL;
+    }
+    domain = len > 0 ? prefix_tree_search(self->tree, str, len) : NULL;
+    if (domain == NULL) {
+        Py_RETURN_NONE;
+    }
+    return Py_BuildValue("(II)", domain->count_of_insert, domain->count_of_different_subdomains);
+}
+
+static PyObject *
+PrefixTree_getInserts(pytrap_prefixtree *self, void *closure)
+{
+    return PyLong_FromUnsignedLong(self->tree->count_of_inserting);
+}
+
+static PyMemberDef PrefixTree_members[] = {
+    {"value_fmt", T_OBJECT_EX, offsetof(pytrap_prefixtree, value_fmt), READONLY,
+        "Format of values (see struct module) or None."},
+    {"separator", T_CHAR, offsetof(pytrap_prefixtree, separator), READONLY,
+        "Separator of domains."},
+    {"ignore_case", T_BOOL, offsetof(pytrap_prefixtree, ignore_case), READONLY,
+        "ASCII letters of names are converted to lower case."},
+    {NULL}  /* Sentinel */
+};
+
+static PyGetSetDef PrefixTree_getset[] = {
+    {"inserts", (getter) PrefixTree_getInserts, NULL, "Number of names counted by insert().", NULL},
+    {NULL}  /* Sentinel */
+};
+
+static PyMethodDef PrefixTree_methods[] = {
+    {"add", (PyCFunction) PrefixTree_add, METH_VARARGS | METH_KEYWORDS,
+        "Add the domain into the list (same as tree[domain] = value).\n\n"
+        "Args:\n"
+        "    domain (str or bytes): Domain name.\n"
+        "    value (Optional[tuple or object]): Value packed by value_fmt, it must be set iff value_fmt is set.\n\n"
+        "Raises:\n"
+        "    ValueError: Empty or too long domain, missing value.\n"
+        },
+
+    {"load", (PyCFunction) PrefixTree_load, METH_VARARGS | METH_KEYWORDS,
+        "Add domains from a file into the list.\n\n"
+        "The first word of each line is a domain, empty lines and comments\n"
+        "starting with # are skipped.\n\n"
+        "Args:\n"
+        "    path (str): Path to the file.\n"
+        "    value (Optional[tuple or object]): Value of all loaded domains.\n\n"
+        "Returns:\n"
+        "    int: Number of loaded domains.\n\n"
+        "Raises:\n"
+        "    IOError: The file cannot be read.\n"
+        "    ValueError: Bad domain in the file, missing value.\n"
+        },
+
+    {"match", (PyCFunction) PrefixTree_match, METH_O,
+        "Find the most specific listed domain of the name.\n\n"
+        "In suffix tree, the name matches its listed parent domains, e.g.\n"
+        "\"a.evil.example.com\" matches \"evil.example.com\" and \"example.com\".\n\n"
+        "Args:\n"
+        "    name (str or bytes): Domain name.\n\n"
+        "Returns:\n"
+        "    Optional[tuple(str, tuple)]: Matching (domain, value) or None, the domain is in lower case\n"
+        "        with ignore_case.\n"
+        },
+
+    {"insert", (PyCFunction) PrefixTree_insert, METH_O,
+        "Count an occurrence of the name (e.g. queried domain).\n\n"
+        "Counters of subdomains of its parent domains are updated when the name\n"
+        "is new.  Inserted names are not listed.\n\n"
+        "Args:\n"
+        "    name (str or bytes): Domain name.\n\n"
+        "Returns:\n"
+        "    int: Number of occurrences of the name.\n"
+        },
+
+    {"counters", (PyCFunction) PrefixTree_counters, METH_O,
+        "Get counters of the domain.\n\n"
+        "Large number of different subdomains of one domain is typical for\n"
+        "DGA or DNS tunnelling.\n\n"
+        "Args:\n"
+        "    domain (str or bytes): Domain name.\n\n"
+        "Returns:\n"
+        "    Optional[tuple(int, int)]: Number of occurrences counted by insert() and number of\n"
+        "        different subdomains stored in the tree, None if the domain is not in the tree.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PySequenceMethods PrefixTree_seq = {
+    0,                                      /* sq_length */
+    0,                                      /* sq_concat */
+    0,                                      /* sq_repeat */
+    0,                                      /* sq_item */
+    0,                                      /* sq_slice */
+    0,                                      /* sq_ass_item */
+    0,                                      /* sq_ass_slice */
+    (objobjproc) PrefixTree_contains,       /* sq_contains */
+};
+
+static PyMappingMethods PrefixTree_mapping = {
+    (lenfunc) PrefixTree_len,               /* mp_length */
+    (binaryfunc) PrefixTree_getitem,        /* mp_subscript */
+    (objobjargproc) PrefixTree_setitem,     /* mp_ass_subscript */
+};
+
+static PyTypeObject pytrap_PrefixTree = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.PrefixTree",       /* tp_name */
+    sizeof(pytrap_prefixtree), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) PrefixTree_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    &PrefixTree_seq,           /* tp_as_sequence */
+    &PrefixTree_mapping,       /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "PrefixTree(value_fmt=None, suffix=True, separator='.', ignore_case=True)\n\n"
+    "Tree of domain names (prefix_tree of nemea-common).\n"
+    "It maps listed domains to values and matches names against them, e.g.\n"
+    "a blacklist of domains with their scores:\n\n"
+    "    t = PrefixTree(\"I\")\n"
+    "    t.load(\"blacklist.txt\", 100)\n"
+    "    t[\"evil.example.com\"] = 50\n"
+    "    m = t.match(\"www.evil.example.com\")  # (\"evil.example.com\", (50,))\n\n"
+    "Besides, it counts occurrences of names and different subdomains of each\n"
+    "domain (see insert() and counters()).  Names are compared case-insensitively\n"
+    "(ASCII letters only) unless ignore_case is False.\n\n"
+    "Args:\n"
+    "    value_fmt (Optional[str]): Format of values (see struct module), None for no values (default: None).\n"
+    "    suffix (Optional[bool]): Names are matched by suffix (domains), otherwise by prefix (default: True).\n"
+    "    separator (Optional[bytes]): Separator of domains (default: '.').\n"
+    "    ignore_case (Optional[bool]): Convert ASCII letters of names to lower case (default: True).\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    PrefixTree_methods,        /* tp_methods */
+    PrefixTree_members,        /* tp_members */
+    PrefixTree_getset,         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    PrefixTree_new,            /* tp_new */
+};
+
+#endif /* HAVE_NEMEA_COMMON */
+
+/*********************/
+/*  BloomFilter      */
+/*********************/
+
+/*
+ * BloomFilter.hpp of nemea-common is a C++ template library, it cannot be
+ * used from this C extension.  The filter is implemented here with the same
+ * computation of optimal parameters, but with a 64-bit hash and double
+ * hashing (one hash computation per key instead of one per hash function)
+ * and with a file format that can be mapped into memory.
+ */
+
+#define BLOOM_MAGIC "NEMEABF1"
+#define BLOOM_MAX_HASHES 32
+
+/**
+ * Header of the file of the filter, the bit table follows.  Numbers are
+ * stored in the host byte order.
+ */
+typedef struct {
+    char magic[8];
+    uint32_t hashes;
+    uint32_t reserved;
+    uint64_t bits;
+    uint64_t count;
+    uint64_t capacity;
+    double fpp;
+    uint8_t padding[16];
+} bloom_header_t;
+
+typedef struct {
+    PyObject_HEAD
+    bloom_header_t hdr;
+    uint8_t *table;
+    void *map;
+    size_t map_size;
+} pytrap_bloomfilter;
+
+#define BLOOM_ROTL64(x, r) (((x) << (r)) | ((x) >> (64 - (r))))
+
+static inline uint64_t
+bloom_fmix64(uint64_t h)
+{
+    h ^= h >> 33;
+    h *= 0xff51afd7ed558ccdULL;
+    h ^= h >> 33;
+    h *= 0xc4ceb9fe1a85ec53ULL;
+    h ^= h >> 33;
+    return h;
+}
+
+/**
+ * \brief Hash of a key (based on MurmurHash3).
+ */
+static inline uint64_t
+bloom_hash(const uint8_t *key, size_t len)
+{
+    const uint64_t c1 = 0x87c37b91114253d5ULL, c2 = 0x4cf5ad432745937fULL;
+    uint64_t h = 0x9e3779b97f4a7c15ULL ^ len, w;
+
+    for (; len >= 8; key += 8, len -= 8) {
+        memcpy(&w, key, 8);
+        w *= c1;
+        w = BLOOM_ROTL64(w, 31);
+        w *= c2;
+        h ^= w;
+        h = BLOOM_ROTL64(h, 27) * 5 + 0x52dce729;
+    }
+    if (len > 0) {
+        w = 0;
+        memcpy(&w, key, len);
+        w *= c1;
+        w = BLOOM_ROTL64(w, 31);
+        w *= c2;
+        h ^= w;
+    }
+    return bloom_fmix64(h);
+}
+
+/**
+ * \brief Set bits of the key.
+ *
+ * \return 1 if some bit was not set before (the key is new), 0 otherwise
+ */
+static inline int
+bloom_insert(pytrap_bloomfilter *self, const uint8_t *key, size_t len)
+{
+    uint64_t h = bloom_hash(key, len);
+    uint64_t bits = self->hdr.bits;
+    uint64_t idx = h % bits, step = bloom_fmix64(h + 0x9e3779b97f4a7c15ULL) % bits;
+    uint32_t i;
+    uint8_t mask;
+    int new = 0;
+
+    for (i = 0; i < self->hdr.hashes; i++) {
+        mask = 1 << (idx & 7);
+        if (!(self->table[idx >> 3] & mask)) {
+            self->table[idx >> 3] |= mask;
+            new = 1;
+        }
+        idx += step;
+        if (idx >= bits) {
+            idx -= bits;
+        }
+    }
+    self->hdr.count += new;
+    return new;
+}
+
+static inline int
+bloom_contains(pytrap_bloomfilter *self, const uint8_t *key, size_t len)
+{
+    uint64_t h = bloom_hash(key, len);
+    uint64_t bits = self->hdr.bits;
+    uint64_t idx = h % bits, step = bloom_fmix64(h + 0x9e3779b97f4a7c15ULL) % bits;
+    uint32_t i;
+
+    for (i = 0; i < self->hdr.hashes; i++) {
+        if (!(self->table[idx >> 3] & (1 << (idx & 7)))) {
+            return 0;
+        }
+        idx += step;
+        if (idx >= bits) {
+            idx -= bits;
+        }
+    }
+    return 1;
+}
+
+/**
+ * \brief Get data of a key.
+ *
+ * Keys are bytes-like objects, str (encoded in UTF-8) or UnirecIPAddr (its
+ * 16 bytes, i.e. the same as raw IP address from UniRec record).
+ *
+ * \param [in] key    key object
+ * \param [out] view  buffer of the key, it must be released by PyBuffer_Release() on success
+ * \param [out] ip    storage of IP address
+ * \param [out] data  pointer to the data of the key
+ * \param [out] len   length of the data
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+BloomFilter_get_key(PyObject *key, Py_buffer *view, ip_addr_t *ip, const uint8_t **data, Py_ssize_t *len)
+{
+    view->obj = NULL;
+#if PY_MAJOR_VERSION >= 3
+    if (PyUnicode_Check(key)) {
+        *data = (const uint8_t *) PyUnicode_AsUTF8AndSize(key, len);
+        return *data == NULL ? -1 : 0;
+    }
+#endif
+    if (PyObject_CheckBuffer(key)) {
+        if (PyObject_GetBuffer(key, view, PyBUF_SIMPLE) != 0) {
+            return -1;
+        }
+        *data = view->buf;
+        *len = view->len;
+        return 0;
+    }
+    if (UnirecIPAddr_AsIP(key, ip) != 0) {
+        PyErr_SetString(PyExc_TypeError, "Key must be bytes-like object, str or UnirecIPAddr.");
+        return -1;
+    }
+    *data = (const uint8_t *) ip;
+    *len = sizeof(*ip);
+    return 0;
+}
+
+/**
+ * \brief Release the key got by BloomFilter_get_key().
+ */
+static inline void
+BloomFilter_release_key(Py_buffer *view)
+{
+    if (view->obj != NULL) {
+        PyBuffer_Release(view);
+    }
+}
+
+/**
+ * \brief Get buffer of a batch of keys.
+ *
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+BloomFilter_get_batch(PyObject *data, Py_ssize_t key_size, Py_buffer *view)
+{
+    if (key_size <= 0) {
+        PyErr_SetString(PyExc_ValueError, "key_size must be positive.");
+        return -1;
+    }
+    if (PyObject_GetBuffer(data, view, PyBUF_SIMPLE) != 0) {
+        return -1;
+    }
+    if (view->len % key_size != 0) {
+        PyErr_Format(PyExc_ValueError, "Size of data must be multiple of key_size (%zd bytes).", key_size);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    return 0;
+}
+
+static void
+BloomFilter_release_table(pytrap_bloomfilter *self)
+{
+    if (self->map != NULL) {
+        munmap(self->map, self->map_size);
+    } else {
+        free(self->table);
+    }
+    self->map = NULL;
+    self->table = NULL;
+}
+
+static void
+BloomFilter_dealloc(pytrap_bloomfilter *self)
+{
+    BloomFilter_release_table(self);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+BloomFilter_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_bloomfilter *self;
+    unsigned long long capacity;
+    double fpp = 0.001, bits;
+    int hashes;
+
+    static char *kwlist[] = {"capacity", "fpp", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "K|d", kwlist, &capacity, &fpp)) {
+        return NULL;
+    }
+    if (capacity == 0) {
+        PyErr_SetString(PyExc_ValueError, "capacity must be positive.");
+        return NULL;
+    }
+    if (!(fpp > 0.0 && fpp < 1.0)) {
+        PyErr_SetString(PyExc_ValueError, "fpp must be in range (0, 1).");
+        return NULL;
+    }
+
+    /* optimal number of bits and hash functions */
+    bits = ceil(-(double) capacity * log(fpp) / (M_LN2 * M_LN2));
+    hashes = (int) round(bits / capacity * M_LN2);
+    if (hashes < 1) {
+        hashes = 1;
+    } else if (hashes > BLOOM_MAX_HASHES) {
+        hashes = BLOOM_MAX_HASHES;
+    }
+    if (bits > (double) (PY_SSIZE_T_MAX / 2) * 8) {
+        PyErr_SetString(PyExc_ValueError, "Bloom filter is too large.");
+        return NULL;
+    }
+
+    self = (pytrap_bloomfilter *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    memcpy(self->hdr.magic, BLOOM_MAGIC, sizeof(self->hdr.magic));
+    self->hdr.hashes = hashes;
+    /* whole 64-bit words */
+    self->hdr.bits = (((uint64_t) bits + 63) / 64) * 64;
+    self->hdr.capacity = capacity;
+    self->hdr.fpp = fpp;
+    self->table = calloc(self->hdr.bits / 8, 1);
+    if (self->table == NULL) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+    return (PyObject *) self;
+}
+
+static PyObject *
+BloomFilter_add(pytrap_bloomfilter *self, PyObject *key)
+{
+    Py_buffer view;
+    ip_addr_t ip;
+    const uint8_t *data;
+    Py_ssize_t len;
+    int new;
+
+    if (BloomFilter_get_key(key, &view, &ip, &data, &len) != 0) {
+        return NULL;
+    }
+    new = bloom_insert(self, data, len);
+    BloomFilter_release_key(&view);
+    return PyBool_FromLong(new);
+}
+
+static PyObject *
+BloomFilter_update(pytrap_bloomfilter *self, PyObject *keys)
+{
+    PyObject *it, *key;
+    Py_buffer view;
+    ip_addr_t ip;
+    const uint8_t *data;
+    Py_ssize_t len;
+
+    it = PyObject_GetIter(keys);
+    if (it == NULL) {
+        return NULL;
+    }
+    while ((key = PyIter_Next(it)) != NULL) {
+        if (BloomFilter_get_key(key, &view, &ip, &data, &len) != 0) {
+            Py_DECREF(key);
+            break;
+        }
+        bloom_insert(self, data, len);
+        BloomFilter_release_key(&view);
+        Py_DECREF(key);
+    }
+    Py_DECREF(it);
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+BloomFilter_addMany(pytrap_bloomfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *data;
+    Py_ssize_t key_size = 16, i;
+    Py_buffer view;
+
+    static char *kwlist[] = {"data", "key_size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|n", kwlist, &data, &key_size)) {
+        return NULL;
+    }
+    if (BloomFilter_get_batch(data, key_size, &view) != 0) {
+        return NULL;
+    }
+    for (i = 0; i < view.len; i += key_size) {
+        bloom_insert(self, (const uint8_t *) view.buf + i, key_size);
+    }
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+BloomFilter_containsMany(pytrap_bloomfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *data, *result, *index;
+    Py_ssize_t key_size = 16, i;
+    Py_buffer view;
+
+    static char *kwlist[] = {"data", "key_size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|n", kwlist, &data, &key_size)) {
+        return NULL;
+    }
+    if (BloomFilter_get_batch(data, key_size, &view) != 0) {
+        return NULL;
+    }
+    result = PyList_New(0);
+    for (i = 0; result != NULL && i < view.len; i += key_size) {
+        if (bloom_contains(self, (const uint8_t *) view.buf + i, key_size)) {
+            index = PyLong_FromSsize_t(i / key_size);
+            if (index == NULL || PyList_Append(result, index) != 0) {
+                Py_XDECREF(index);
+                Py_CLEAR(result);
+                break;
+            }
+            Py_DECREF(index);
+        }
+    }
+    PyBuffer_Release(&view);
+    return result;
+}
+
+static int
+BloomFilter_contains(pytrap_bloomfilter *self, PyObject *key)
+{
+    Py_buffer view;
+    ip_addr_t ip;
+    const uint8_t *data;
+    Py_ssize_t len;
+    int found;
+
+    if (BloomFilter_get_key(key, &view, &ip, &data, &len) != 0) {
+        return -1;
+    }
+    found = bloom_contains(self, data, len);
+    BloomFilter_release_key(&view);
+    return found;
+}
+
+static Py_ssize_t
+BloomFilter_len(pytrap_bloomfilter *self)
+{
+    return (Py_ssize_t) self->hdr.count;
+}
+
+static PyObject *
+BloomFilter_clear(pytrap_bloomfilter *self)
+{
+    memset(self->table, 0, self->hdr.bits / 8);
+    self->hdr.count = 0;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+BloomFilter_falsePositiveRate(pytrap_bloomfilter *self)
+{
+    double k = self->hdr.hashes;
+
+    return PyFloat_FromDouble(pow(1.0 - exp(-k * self->hdr.count / self->hdr.bits), k));
+}
+
+static PyObject *
+BloomFilter_save(pytrap_bloomfilter *self, PyObject *args)
+{
+    const char *path;
+    FILE *f;
+    int ok;
+
+    if (!PyArg_ParseTuple(args, "s", &path)) {
+        return NULL;
+    }
+    f = fopen(path, "wb");
+    if (f == NULL) {
+        return PyErr_SetFromErrnoWithFilename(PyExc_IOError, path);
+    }
+    Py_BEGIN_ALLOW_THREADS
+    ok = fwrite(&self->hdr, sizeof(self->hdr), 1, f) == 1 &&
+         fwrite(self->table, self->hdr.bits / 8, 1, f) == 1;
+    ok = (fclose(f) == 0) && ok;
+    Py_END_ALLOW_THREADS
+    if (!ok) {
+        return PyErr_SetFromErrnoWithFilename(PyExc_IOError, path);
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+BloomFilter_load(PyObject *cls, PyObject *args)
+{
+    pytrap_bloomfilter *self;
+    const char *path;
+    struct stat st;
+    void *map;
+    bloom_header_t *hdr;
+    int fd;
+
+    if (!PyArg_ParseTuple(args, "s", &path)) {
+        return NULL;
+    }
+    fd = open(path, O_RDONLY);
+    if (fd == -1) {
+        return PyErr_SetFromErrnoWithFilename(PyExc_IOError, path);
+    }
+    if (fstat(fd, &st) != 0) {
+        PyErr_SetFromErrnoWithFilename(PyExc_IOError, path);
+        close(fd);
+        return NULL;
+    }
+    if ((size_t) st.st_size < sizeof(bloom_header_t)) {
+        close(fd);
+        PyErr_Format(PyExc_ValueError, "%s is not a Bloom filter.", path);
+        return NULL;
+    }
+    /* private mapping, added keys are not written into the file */
+    map = mmap(NULL, st.st_size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (map == MAP_FAILED) {
+        return PyErr_SetFromErrnoWithFilename(PyExc_IOError, path);
+    }
+    hdr = map;
+    if (memcmp(hdr->magic, BLOOM_MAGIC, sizeof(hdr->magic)) != 0 || hdr->hashes < 1 ||
+        hdr->hashes > BLOOM_MAX_HASHES || hdr->bits == 0 || hdr->bits % 64 != 0 ||
+        hdr->bits / 8 != st.st_size - sizeof(bloom_header_t)) {
+        munmap(map, st.st_size);
+        PyErr_Format(PyExc_ValueError, "%s is not a Bloom filter.", path);
+        return NULL;
+    }
+
+    self = (pytrap_bloomfilter *) ((PyTypeObject *) cls)->tp_alloc((PyTypeObject *) cls, 0);
+    if (self == NULL) {
+        munmap(map, st.st_size);
+        return NULL;
+    }
+    self->hdr = *hdr;
+    self->map = map;
+    self->map_size = st.st_size;
+    self->table = (uint8_t *) map + sizeof(bloom_header_t);
+    return (PyObject *) self;
+}
+
+static PyMemberDef BloomFilter_members[] = {
+    {"bits", T_ULONGLONG, offsetof(pytrap_bloomfilter, hdr.bits), READONLY,
+        "Size of the filter in bits."},
+    {"hashes", T_UINT, offsetof(pytrap_bloomfilter, hdr.hashes), READONLY,
+        "Number of hash functions."},
+    {"capacity", T_ULONGLONG, offsetof(pytrap_bloomfilter, hdr.capacity), READONLY,
+        "Expected number of keys."},
+    {"fpp", T_DOUBLE, offsetof(pytrap_bloomfilter, hdr.fpp), READONLY,
+        "Expected false positive probability at capacity."},
+    {NULL}  /* Sentinel */
+};
+
+static PyMethodDef BloomFilter_methods[] = {
+    {"add", (PyCFunction) BloomFilter_add, METH_O,
+        "Add the key into the filter.\n\n"
+        "Args:\n"
+        "    key (bytes-like, str or UnirecIPAddr): Key.\n\n"
+        "Returns:\n"
+        "    bool: False if the key was (probably) added before.\n"
+        },
+
+    {"update", (PyCFunction) BloomFilter_update, METH_O,
+        "Add keys into the filter.\n\n"
+        "Args:\n"
+        "    keys (iterable): Keys (bytes-like, str or UnirecIPAddr).\n"
+        },
+
+    {"addMany", (PyCFunction) BloomFilter_addMany, METH_VARARGS | METH_KEYWORDS,
+        "Add a batch of keys of the same size into the filter.\n\n"
+        "Args:\n"
+        "    data (bytes-like): Concatenated keys, e.g. raw IP addresses.\n"
+        "    key_size (Optional[int]): Size of keys (default: 16, size of IP address).\n\n"
+        "Raises:\n"
+        "    ValueError: Size of data is not a multiple of key_size.\n"
+        },
+
+    {"containsMany", (PyCFunction) BloomFilter_containsMany, METH_VARARGS | METH_KEYWORDS,
+        "Check a batch of keys of the same size.\n\n"
+        "Args:\n"
+        "    data (bytes-like): Concatenated keys, e.g. raw IP addresses.\n"
+        "    key_size (Optional[int]): Size of keys (default: 16, size of IP address).\n\n"
+        "Returns:\n"
+        "    list(int): Indexes of keys that are (probably) in the filter.\n\n"
+        "Raises:\n"
+        "    ValueError: Size of data is not a multiple of key_size.\n"
+        },
+
+    {"clear", (PyCFunction) BloomFilter_clear, METH_NOARGS,
+        "Remove all keys from the filter.\n"
+        },
+
+    {"falsePositiveRate", (PyCFunction) BloomFilter_falsePositiveRate, METH_NOARGS,
+        "Estimate false positive probability for the current number of keys.\n\n"
+        "Returns:\n"
+        "    float: Probability.\n"
+        },
+
+    {"save", (PyCFunction) BloomFilter_save, METH_VARARGS,
+        "Save the filter into a file (see load()).\n\n"
+        "Args:\n"
+        "    path (str): Path to the file.\n\n"
+        "Raises:\n"
+        "    IOError: The file cannot be written.\n"
+        },
+
+    {"load", (PyCFunction) BloomFilter_load, METH_VARARGS | METH_CLASS,
+        "Load the filter saved by save().\n\n"
+        "The file is mapped into memory, so that its pages are read on demand\n"
+        "and shared by all processes that load it.  Keys added afterwards are\n"
+        "not written into the file.  The file is not portable to machines of\n"
+        "different byte order.\n\n"
+        "Args:\n"
+        "    path (str): Path to the file.\n\n"
+        "Returns:\n"
+        "    BloomFilter: Loaded filter.\n\n"
+        "Raises:\n"
+        "    IOError: The file cannot be read.\n"
+        "    ValueError: The file is not a Bloom filter.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PySequenceMethods BloomFilter_seq = {
+    (lenfunc) BloomFilter_len,              /* sq_length */
+    0,                                      /* sq_concat */
+    0,                                      /* sq_repeat */
+    0,                                      /* sq_item */
+    0,                                      /* sq_slice */
+    0,                                      /* sq_ass_item */
+    0,                                      /* sq_ass_slice */
+    (objobjproc) BloomFilter_contains,      /* sq_contains */
+};
+
+static PyTypeObject pytrap_BloomFilter = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.BloomFilter",      /* tp_name */
+    sizeof(pytrap_bloomfilter), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) BloomFilter_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    &BloomFilter_seq,          /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE, /* tp_flags */
+    "BloomFilter(capacity, fpp=0.001)\n\n"
+    "Bloom filter, set of keys with false positives and without false negatives.\n"
+    "It is a small pre-filter of large blacklists, keys found by the filter\n"
+    "are checked in an exact structure afterwards:\n\n"
+    "    bf = BloomFilter(len(blacklist), 0.001)\n"
+    "    bf.update(blacklist)\n"
+    "    for i in bf.containsMany(ips):  # concatenated 16-byte IP addresses\n"
+    "        ...\n\n"
+    "Keys are bytes-like objects, str (encoded in UTF-8) or UnirecIPAddr\n"
+    "(the same as its 16 raw bytes, e.g. from UnirecTemplate.getFieldsBytes()).\n"
+    "len() is the approximate number of different keys in the filter.\n\n"
+    "Args:\n"
+    "    capacity (int): Expected number of keys.\n"
+    "    fpp (Optional[float]): False positive probability at capacity (default: 0.001).\n\n"
+    "Raises:\n"
+    "    ValueError: Bad capacity or fpp.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    BloomFilter_methods,       /* tp_methods */
+    BloomFilter_members,       /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    BloomFilter_new,           /* tp_new */
+};
+
+/**
+ * \brief Initialize classes of nemea-common data structures and add them to pytrap module.
+ *
+ * \param [in,out] m    pointer to the module Object
+ * \return EXIT_SUCCESS or EXIT_FAILURE
+ */
+int
+init_common(PyObject *m)
+{
+#ifdef HAVE_NEMEA_COMMON
+    /* Add FastHashTable */
+    if (PyType_Ready(&pytrap_FastHashTable) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_FastHashTable);
+    PyModule_AddObject(m, "FastHashTable", (PyObject *) &pytrap_FastHashTable);
+
+    /* Add FastHashFilter */
+    if (PyType_Ready(&pytrap_FastHashFilter) < 0 || PyType_Ready(&pytrap_FastHashFilterView) < 0 ||
+        PyType_Ready(&pytrap_FastHashFilterIter) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_FastHashFilter);
+    PyModule_AddObject(m, "FastHashFilter", (PyObject *) &pytrap_FastHashFilter);
+    Py_INCREF(&pytrap_FastHashFilterView);
+    PyModule_AddObject(m, "FastHashFilterView", (PyObject *) &pytrap_FastHashFilterView);
+
+    /* Add BPlusTree */
+    if (PyType_Ready(&pytrap_BPlusTree) < 0 || PyType_Ready(&pytrap_BPlusTreeIter) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_BPlusTree);
+    PyModule_AddObject(m, "BPlusTree", (PyObject *) &pytrap_BPlusTree);
+
+    /* Add PrefixTree */
+    if (PyType_Ready(&pytrap_PrefixTree) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_PrefixTree);
+    PyModule_AddObject(m, "PrefixTree", (PyObject *) &pytrap_PrefixTree);
+#endif
+
+    /* Add BloomFilter */
+    if (PyType_Ready(&pytrap_BloomFilter) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_BloomFilter);
+    PyModule_AddObject(m, "BloomFilter", (PyObject *) &pytrap_BloomFilter);
+
+    return EXIT_SUCCESS;
+}
@@ -25,6 +25,8 @@ BuildRequires:  python2-devel
 BuildRequires:  python%{python3_pkgversion}-setuptools
 BuildRequires:  python%{python3_pkgversion}-devel
 
+BuildRequires:  nemea-common-devel
+
 %description
 The pytrap module is a native Python extension that allows for writing
 NEMEA
@@ -32,6 +34,7 @@ modules in Python.
 
 %package -n     python2-%{pypi_name}
 Summary:        Python extension of the NEMEA project
+Requires:       nemea-common
 %{?python_provide:%python_provide python2-%{pypi_name}}
 
 %description -n python2-%{pypi_name}
@@ -41,6 +44,7 @@ modules in Python.
 
 %package -n     python%{python3_pkgversion}-%{pypi_name}
 Summary:        Python extension of the NEMEA project
+Requires:       nemea-common
 %{?python_provide:%python_provide python%{python3_pkgversion}-%{pypi_name}}
 
 %description -n python%{python3_pkgversion}-%{pypi_name}
@@ -55,6 +59,8 @@ modules in Python.
 rm -rf %{pypi_name}.egg-info
 
 %build
+# bindings of nemea-common are part of the package
+export PYTRAP_NEMEA_COMMON=yes
 %py2_build
 %py3_build
 
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Benchmark of Aggregator compared to the dict approach of
+# examples/python/protocol_aggr.py (sum of PACKETS per PROTOCOL).
+#
+# Usage: pytrap-bench-aggregator.py [count]
+#
+# Records are prepared in memory in advance, so that only the processing of
+# received messages is measured.  Buffers for addBuffer() have the layout of
+# FileReader.readBuffer() payload.
+
+import random
+import struct
+import sys
+import timeit
+import pytrap
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+repeat = 3
+random.seed(0)
+
+inputspec = "ipaddr DST_IP,ipaddr SRC_IP,uint64 BYTES,uint64 LINK_BIT_FIELD,time TIME_FIRST,time TIME_LAST,uint32 PACKETS,uint16 DST_PORT,uint16 SRC_PORT,uint8 DIR_BIT_FIELD,uint8 PROTOCOL,uint8 TCP_FLAGS,uint8 TOS,uint8 TTL"
+rec = pytrap.UnirecTemplate(inputspec)
+rec.createMessage()
+records = []
+for i in range(count):
+    rec.PROTOCOL = random.choice((1, 6, 6, 6, 17, 17, 47, 50))
+    rec.PACKETS = random.randint(1, 1000)
+    rec.DST_PORT = random.randint(0, 65535)
+    rec.TIME_FIRST = pytrap.UnirecTime(1500000000 + i * 300 // count)
+    records.append(bytes(rec.getData()))
+
+buffers = []
+for i in range(0, count, 1000):
+    buffers.append(b"".join(struct.pack("!H", len(r)) + r for r in records[i:i + 1000]))
+
+def dict_aggr():
+    protoDict = {}
+    for data in records:
+        rec.setData(data)
+        proto = rec.PROTOCOL
+        if proto in protoDict:
+            protoDict[proto] += rec.PACKETS
+        else:
+            protoDict[proto] = rec.PACKETS
+    return protoDict
+
+def aggr_add():
+    a = pytrap.Aggregator(rec, ["PROTOCOL"], {"SUM_PACKETS": ("sum", "PACKETS")})
+    for data in records:
+        a.add(data)
+    return a.flush()
+
+def aggr_many():
+    a = pytrap.Aggregator(rec, ["PROTOCOL"], {"SUM_PACKETS": ("sum", "PACKETS")})
+    a.addMany(records)
+    return a.flush()
+
+def aggr_buffer():
+    a = pytrap.Aggregator(rec, ["PROTOCOL"], {"SUM_PACKETS": ("sum", "PACKETS")})
+    for b in buffers:
+        a.addBuffer(b)
+    return a.flush()
+
+def aggr_window():
+    a = pytrap.Aggregator(rec, ["PROTOCOL"], {"SUM_PACKETS": ("sum", "PACKETS")}, window=60, step=10)
+    for b in buffers:
+        a.addBuffer(b)
+    return a.results() + a.flush()
+
+def dict_ports():
+    d = {}
+    for data in records:
+        rec.setData(data)
+        key = (rec.PROTOCOL, rec.DST_PORT)
+        if key in d:
+            d[key] += rec.PACKETS
+        else:
+            d[key] = rec.PACKETS
+    return d
+
+def aggr_ports():
+    a = pytrap.Aggregator(rec, ["PROTOCOL", "DST_PORT"], {"SUM_PACKETS": ("sum", "PACKETS")})
+    for b in buffers:
+        a.addBuffer(b)
+    return a.flush()
+
+# the results must be the same
+expected = dict_aggr()
+out = pytrap.UnirecTemplate(pytrap.Aggregator(rec, ["PROTOCOL"], {"SUM_PACKETS": ("sum", "PACKETS")}).fmtspec)
+for f in (aggr_add, aggr_many, aggr_buffer):
+    result = {}
+    for data in f()[0][2]:
+        out.setData(data)
+        result[out.PROTOCOL] = out.SUM_PACKETS
+    assert result == expected
+
+print("%-32s %10s %10s" % ("method", "time[s]", "Mrec/s"))
+for name, f in [("dict (protocol_aggr.py)", dict_aggr), ("Aggregator.add", aggr_add),
+                ("Aggregator.addMany", aggr_many), ("Aggregator.addBuffer", aggr_buffer),
+                ("Aggregator.addBuffer 60/10s", aggr_window), ("dict PROTOCOL,DST_PORT", dict_ports),
+                ("Aggregator PROTOCOL,DST_PORT", aggr_ports)]:
+    t = min(timeit.repeat(f, number=1, repeat=repeat))
+    print("%-32s %10.3f %10.2f" % (name, t, count / t / 1e6))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# Benchmark of FastHashFilter compared to dict as a lookup table
+# (e.g. reputation of IPv6 addresses: 16B keys, 32b values).
+#
+# Usage: pytrap-bench-hashfilter.py [count]
+#
+# Memory of dict is measured as the growth of RSS (Linux only), the size of
+# key and value objects it references is added since they are created in
+# advance.  Memory of FastHashFilter is computed from its layout (keys and
+# values of 8 columns, free flags and locks of each row) because freed
+# tables are reused by the allocator and RSS does not grow reliably.
+
+import os
+import random
+import struct
+import sys
+import timeit
+import pytrap
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+repeat = 3
+random.seed(0)
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+keys = [random.getrandbits(128).to_bytes(16, "big") for i in range(count)]
+values = [random.getrandbits(32) for i in range(count)]
+lookup = list(keys)
+random.shuffle(lookup)
+
+def fhf_memory(f):
+    return f.rows * (8 * (f.key_size + f.value_size) + 2)
+
+def bench(name, create, find, memory):
+    before = rss()
+    t_insert = timeit.default_timer()
+    table = create()
+    t_insert = timeit.default_timer() - t_insert
+    mem = memory(table, rss() - before)
+    t_lookup = min(timeit.repeat(lambda: find(table), number=1, repeat=repeat))
+    print("%-22s %10.3f %12.3f %10.1f %12.1f" % (name, t_insert, t_lookup, count / t_lookup / 1e6, mem / 2.0**20))
+    return table
+
+def dict_create():
+    d = {}
+    for k, v in zip(keys, values):
+        d[k] = v
+    return d
+
+def dict_find(d):
+    get = d.get
+    for k in lookup:
+        get(k)
+
+def fhf_create():
+    f = pytrap.FastHashFilter(1 << 16, 16, "I")
+    for k, v in zip(keys, values):
+        f[k] = v
+    return f
+
+def fhf_fixed_create():
+    # 8-way rows overflow long before the table is full, with resize=False
+    # keys of full rows are dropped instead of growing the table
+    rows = 1
+    while rows * 4 < count:
+        rows *= 2
+    f = pytrap.FastHashFilter(rows, 16, "I")
+    for k, v in zip(keys, values):
+        f.set(k, v, resize=False)
+    return f
+
+def fhf_get(f):
+    get = f.get
+    for k in lookup:
+        get(k)
+
+def fhf_contains(f):
+    for k in lookup:
+        k in f
+
+def fhf_view(f):
+    v = f.view()
+    find = v.find
+    unpack_from = struct.Struct("I").unpack_from
+    for k in lookup:
+        if find(k):
+            unpack_from(v)
+
+print("%-22s %10s %12s %10s %12s" % ("table", "insert[s]", "lookup[s]", "Mlookup/s", "memory[MiB]"))
+objects = sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in zip(keys, values))
+d = bench("dict", dict_create, dict_find, lambda d, grown: grown + objects)
+del d
+f = bench("FastHashFilter.get", fhf_create, fhf_get, lambda f, grown: fhf_memory(f))
+bench("FastHashFilter in", lambda: f, fhf_contains, lambda f, grown: 0)
+bench("FastHashFilterView", lambda: f, fhf_view, lambda f, grown: 0)
+print("FastHashFilter rows: %d, load: %.2f" % (f.rows, len(f) / (f.rows * 8.0)))
+del f
+f = bench("FastHashFilter fixed", fhf_fixed_create, fhf_get, lambda f, grown: fhf_memory(f))
+print("FastHashFilter fixed rows: %d, load: %.2f, dropped: %d" % (f.rows, len(f) / (f.rows * 8.0), count - len(f)))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+# Benchmark of dict insert/lookup with UnirecIPAddr keys.
+#
+# Usage: pytrap-bench-ipaddr.py [count]
+#
+# Distributions:
+#   ipv4-net16   random hosts from a single /16
+#   ipv4-seq     consecutive addresses (e.g. scan of a network)
+#   ipv6-net64   random interface IDs in a single /64
+#   ipv6-prefix  different /48 prefixes with ::1 host part
+
+import random
+import sys
+import timeit
+import pytrap
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+repeat = 5
+random.seed(0)
+
+def ipv4_net16(n):
+    return ["147.32.%d.%d" % (random.randint(0, 255), random.randint(0, 255)) for i in range(n)]
+
+def ipv4_seq(n):
+    return [str(pytrap.UnirecIPAddr.fromInt(0x0a000000 + i)) for i in range(n)]
+
+def ipv6_net64(n):
+    return ["2001:718:1::%x:%x:%x:%x" % tuple(random.getrandbits(16) for j in range(4)) for i in range(n)]
+
+def ipv6_prefix(n):
+    return ["2001:%x:%x::1" % (i >> 16, i & 0xffff) for i in range(n)]
+
+def bench(name, addrs):
+    ips = [pytrap.UnirecIPAddr(a) for a in addrs]
+    lookup = list(ips)
+    random.shuffle(lookup)
+
+    def insert():
+        d = {}
+        for ip in ips:
+            d[ip] = d.get(ip, 0) + 1
+        return d
+    d = insert()
+
+    def find():
+        for ip in lookup:
+            d[ip]
+
+    # older pytrap without UnirecIPAddr.key() can be benchmarked as well
+    keys = [ip.key() for ip in ips] if hasattr(pytrap.UnirecIPAddr, "key") else []
+    t_insert = min(timeit.repeat(insert, number=1, repeat=repeat))
+    t_lookup = min(timeit.repeat(find, number=1, repeat=repeat))
+    t_sort = min(timeit.repeat(lambda: sorted(ips), number=1, repeat=repeat))
+    t_sort_key = min(timeit.repeat(lambda: sorted(keys), number=1, repeat=repeat))
+    print("%-12s %9d %10.3f %10.3f %10.3f %10.3f" % (name, len(d), t_insert, t_lookup, t_sort, t_sort_key))
+
+print("%-12s %9s %10s %10s %10s %10s" % ("distribution", "unique", "insert[s]", "lookup[s]", "sort[s]", "sortkey[s]"))
+for name, gen in [("ipv4-net16", ipv4_net16), ("ipv4-seq", ipv4_seq),
+                  ("ipv6-net64", ipv6_net64), ("ipv6-prefix", ipv6_prefix)]:
+    bench(name, gen(count))
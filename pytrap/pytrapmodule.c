@@ -9,6 +9,9 @@
 #include <signal.h>
 
 int init_unirectemplate(PyObject *m);
+int init_common(PyObject *m);
+PyObject *pytrap_parseIPs(PyObject *self, PyObject *args);
+PyObject *pytrap_compileFilter(PyObject *self, PyObject *args, PyObject *kwds);
 
 static trap_module_info_t *module_info = NULL;
 static ur_template_t *in_tmplt = NULL;
@@ -390,6 +393,27 @@ pytrap_getInIFCState(PyObject *self, PyObject *args)
     return PyLong_FromLong(state);
 }
 
+static PyObject *
+pytrap_setModuleStats(PyObject *self, PyObject *args)
+{
+    const char *stats = NULL;
+
+    if (!PyArg_ParseTuple(args, "z", &stats))
+        return NULL;
+
+    if (trap_glob_ctx == NULL) {
+        PyErr_SetString(TrapError, "TrapCtx is not initialized.");
+        return NULL;
+    }
+
+    if (trap_set_module_stats(stats) != TRAP_E_OK) {
+        PyErr_SetString(PyExc_ValueError, "Statistics must be a JSON object.");
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
 static PyMethodDef pytrap_TrapContext_methods[] = {
     {"init",        (PyCFunction) pytrap_init, METH_VARARGS | METH_KEYWORDS,
         "Initialization of TRAP.\n\n"
@@ -398,7 +422,10 @@ static PyMethodDef pytrap_TrapContext_methods[] = {
         "    ifcin (Optional[int]): `ifcin` is a number of input IFC (default: 1).\n"
         "    ifcout (Optional[int]): `ifcout` is a number of output IFC (default: 0).\n\n"
         "Raises:\n"
-        "    TrapError: Initialization failed.\n"},
+        "    TrapError: Initialization failed.\n\n"
+        "Example of replaying one hour of files stored with index (\"f:data.trapcap:index\"),\n"
+        "start and end are in seconds since epoch (e.g. UnirecTime.getTimeAsFloat()):\n\n"
+        "    c.init([\"-i\", \"f:data.trapcap*:start=%f:end=%f\" % (start, end)])\n"},
 
     {"recv",        (PyCFunction) pytrap_recv, METH_VARARGS | METH_KEYWORDS,
         "Receive data via TRAP interface.\n\n"
@@ -429,8 +456,8 @@ static PyMethodDef pytrap_TrapContext_methods[] = {
         "Args:\n"
         "    ifcidx (int): Index of IFC.\n"
         "    dir_in (bool): If True, input IFC will be modified, output IFC otherwise.\n"
-        "    request (int): Type of request given by a module's constant (CTL_AUTOFLUSH, CTL_BUFFERSWITCH, CTL_TIMEOUT).\n"
-        "    value (int): Parameter value of the chosen `request`.\n"},
+        "    request (int): Type of request given by a module's constant (CTL_AUTOFLUSH, CTL_BUFFERSWITCH, CTL_TIMEOUT, CTL_ADAPTIVE).\n"
+        "    value (int): Parameter value of the chosen `request`, target latency in microseconds for CTL_ADAPTIVE (0 disables it).\n"},
 
     {"setRequiredFmt",  (PyCFunction) pytrap_setRequiredFmt, METH_VARARGS | METH_KEYWORDS,
         "Set required data format for input IFC.\n\n"
@@ -489,6 +516,17 @@ static PyMethodDef pytrap_TrapContext_methods[] = {
         "    TrapError: Bad index is passed or TRAP is not initialized.\n"
         },
 
+    {"setModuleStats",  pytrap_setModuleStats, METH_VARARGS,
+        "Set module-specific statistics that are sent via service IFC\n"
+        "(e.g. to supervisor) together with IFC counters.\n\n"
+        "Args:\n"
+        "    stats (str): JSON object with statistics (e.g. result of json.dumps(dict)),\n"
+        "        None removes the statistics.\n\n"
+        "Raises:\n"
+        "    ValueError: stats is not a JSON object.\n"
+        "    TrapError: TRAP is not initialized.\n"
+        },
+
     {NULL, NULL, 0, NULL}
 };
 
@@ -534,6 +572,31 @@ static PyTypeObject pytrap_TrapContext = {
 };
 
 static PyMethodDef pytrap_methods[] = {
+    {"parseIPs", (PyCFunction) pytrap_parseIPs, METH_VARARGS,
+        "Parse IP addresses into a packed array.\n\n"
+        "The result contains one 16B UniRec ip_addr_t per address, it can be\n"
+        "stored or passed to C code without creating UnirecIPAddr objects.\n"
+        "Use UnirecIPAddr.fromBytes() on a 16B slice to get a single address.\n\n"
+        "Args:\n"
+        "    ips (list): List of IPv4 or IPv6 addresses as str.\n\n"
+        "Returns:\n"
+        "    bytearray: Packed addresses (len(ips) * 16 bytes).\n\n"
+        "Raises:\n"
+        "    TrapError: An address could not be parsed.\n"
+        },
+    {"compileFilter", (PyCFunction) pytrap_compileFilter, METH_VARARGS | METH_KEYWORDS,
+        "Compile a filter of UniRec records (see UnirecFilter).\n\n"
+        "Args:\n"
+        "    template (UnirecTemplate): Template of filtered records.\n"
+        "    expression (str): Filter expression, e.g.\n"
+        "        'PROTOCOL == 6 && DST_PORT in {22, 2222} && SRC_IP in 10.0.0.0/8'.\n\n"
+        "Returns:\n"
+        "    UnirecFilter: Compiled filter.\n\n"
+        "Raises:\n"
+        "    ValueError: Syntax error or invalid constant in expression.\n"
+        "    TypeError: Constant does not match type of field.\n"
+        "    TrapError: Field was not found in the template.\n"
+        },
     {NULL, NULL, 0, NULL}
 };
 
@@ -658,6 +721,11 @@ initpytrap(void)
         INITERROR;
     }
 
+    /* Initialize data structures of nemea-common */
+    if (init_common(m) == EXIT_FAILURE) {
+        INITERROR;
+    }
+
     /* Add constants into pytrap module */
     PyModule_AddIntConstant(m, "FMT_RAW", TRAP_FMT_RAW);
     PyModule_AddIntConstant(m, "FMT_UNIREC", TRAP_FMT_UNIREC);
@@ -671,6 +739,7 @@ initpytrap(void)
     PyModule_AddIntConstant(m, "CTL_AUTOFLUSH", TRAPCTL_AUTOFLUSH_TIMEOUT);
     PyModule_AddIntConstant(m, "CTL_BUFFERSWITCH", TRAPCTL_BUFFERSWITCH);
     PyModule_AddIntConstant(m, "CTL_TIMEOUT", TRAPCTL_SETTIMEOUT);
+    PyModule_AddIntConstant(m, "CTL_ADAPTIVE", TRAPCTL_ADAPTIVE);
 
     PyModule_AddIntConstant(m, "TIMEOUT_WAIT", TRAP_WAIT);
     PyModule_AddIntConstant(m, "TIMEOUT_NOWAIT", TRAP_NO_WAIT);
@@ -1,8 +1,55 @@
+import os
+import shutil
+import tempfile
 from setuptools import setup, Extension
+from distutils.ccompiler import new_compiler
+from distutils.errors import CCompilerError
+from distutils.sysconfig import customize_compiler
+
+def have_nemea_common():
+    """Check whether libnemea-common can be used.
+
+    Data structures of nemea-common (FastHashTable, FastHashFilter, BPlusTree
+    and PrefixTree) are built only when the library is found.  The check can be
+    overridden by PYTRAP_NEMEA_COMMON=yes|no."""
+    env = os.environ.get('PYTRAP_NEMEA_COMMON')
+    if env:
+        return env.lower() in ('1', 'yes', 'true')
+
+    tmpdir = tempfile.mkdtemp()
+    stderr = os.dup(2)
+    try:
+        src = os.path.join(tmpdir, 'probe.c')
+        with open(src, 'w') as f:
+            f.write('#include <nemea-common/fast_hash_table.h>\n'
+                    'void probe(void) { fht_destroy(fht_init(1, 1, 1, 1)); }\n')
+        compiler = new_compiler()
+        customize_compiler(compiler)
+        # hide errors of the compiler, missing library is not an error
+        with open(os.devnull, 'w') as devnull:
+            os.dup2(devnull.fileno(), 2)
+        objs = compiler.compile([src], output_dir=tmpdir)
+        compiler.link_shared_object(objs, os.path.join(tmpdir, 'probe.so'), libraries=['nemea-common'])
+        return True
+    except CCompilerError:
+        return False
+    finally:
+        os.dup2(stderr, 2)
+        os.close(stderr)
+        shutil.rmtree(tmpdir)
+
+libraries = ['trap', 'unirec', 'm']
+define_macros = []
+if have_nemea_common():
+    libraries.insert(2, 'nemea-common')
+    define_macros.append(('HAVE_NEMEA_COMMON', '1'))
+else:
+    print('pytrap is built without bindings of libnemea-common')
 
 pytrapmodule = Extension('pytrap',
-                    sources = ['pytrapmodule.c', 'unirecmodule.c', 'fields.c'],
-                    libraries = ['trap', 'unirec'])
+                    sources = ['pytrapmodule.c', 'unirecmodule.c', 'fields.c', 'commonmodule.c'],
+                    libraries = libraries,
+                    define_macros = define_macros)
 
 setup(name = 'nemea-pytrap',
        version = '0.9.9',
@@ -0,0 +1,410 @@
+import unittest
+import struct
+import random
+import os
+import tempfile
+
+class NemeaCommonTestCase(unittest.TestCase):
+    """Bindings of nemea-common are missing when pytrap is built without it."""
+    def setUp(self):
+        import pytrap
+        if not hasattr(pytrap, "FastHashTable"):
+            self.skipTest("pytrap is built without libnemea-common")
+
+class FastHashTableTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        self.assertRaises(ValueError, pytrap.FastHashTable, 3, 8, "Q")
+        self.assertRaises(ValueError, pytrap.FastHashTable, 4, 0, "Q")
+        self.assertRaises(struct.error, pytrap.FastHashTable, 4, 8, "X?")
+
+        t = pytrap.FastHashTable(4, 8, "QI")
+        self.assertEqual(t.key_size, 8)
+        self.assertEqual(len(t), 0)
+        key = lambda i: struct.pack("Q", i)
+
+        evicted = []
+        for i in range(100):
+            ev = t.set(key(i), (i, i * 2))
+            if ev:
+                evicted.append(ev)
+        # capacity of the table is bounded
+        self.assertEqual(len(t), 100 - len(evicted))
+        self.assertTrue(len(t) <= 16)
+        self.assertEqual(t.evicted, len(evicted))
+        for k, v in evicted:
+            i = struct.unpack("Q", k)[0]
+            self.assertEqual(v, (i, i * 2))
+            self.assertFalse(k in t)
+        items = dict(t.items())
+        self.assertEqual(len(items), len(t))
+        for k, v in items.items():
+            self.assertEqual(t[k], v)
+            self.assertEqual(t.get(k), v)
+
+        # the last item is always stored
+        self.assertEqual(t[key(99)], (99, 198))
+        # update in place
+        t[key(99)] = (1, 2)
+        self.assertEqual(t.get(key(99)), (1, 2))
+        t.set(key(99), struct.pack("QI", 3, 4))
+        self.assertEqual(t.get(key(99)), (3, 4))
+        self.assertEqual(len(t), len(items))
+
+        self.assertEqual(t.get(key(1000)), None)
+        self.assertEqual(t.get(key(1000), (0, 0)), (0, 0))
+        self.assertRaises(KeyError, t.__getitem__, key(1000))
+        self.assertRaises(ValueError, t.get, b"short")
+        self.assertRaises(struct.error, t.set, key(1000), (1,))
+        self.assertFalse(key(1000) in t)
+
+        self.assertTrue(t.remove(key(99)))
+        self.assertFalse(t.remove(key(99)))
+        self.assertEqual(len(t), len(items) - 1)
+        del t[list(items)[0]]
+        self.assertEqual(len(t), len(items) - 2)
+        t.clear()
+        self.assertEqual(len(t), 0)
+        self.assertEqual(t.items(), [])
+
+class FastHashTableStashTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        t = pytrap.FastHashTable(4, 4, "I", stash_size=4)
+        evicted = 0
+        for i in range(100):
+            if t.set(struct.pack("I", i), i) is not None:
+                evicted += 1
+        self.assertEqual(len(t), 20)
+        self.assertEqual(evicted, 80)
+        self.assertEqual(sorted(v[0] for k, v in t.items()), sorted(struct.unpack("I", k)[0] for k, v in t.items()))
+
+class FastHashTableRecordKeyTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        a = pytrap.UnirecTemplate("ipaddr SRC_IP,ipaddr DST_IP,uint16 SRC_PORT,uint16 DST_PORT,uint32 PACKETS")
+        a.createMessage()
+        fields = ["SRC_IP", "DST_IP", "SRC_PORT", "DST_PORT"]
+        t = pytrap.FastHashTable(1024, 36, "QQ")
+        for i in range(10):
+            a.SRC_IP = pytrap.UnirecIPAddr("10.0.0.%d" % (i % 3))
+            a.DST_IP = pytrap.UnirecIPAddr("192.168.0.1")
+            a.SRC_PORT = 1000
+            a.DST_PORT = 80
+            a.PACKETS = i
+            key = a.getFieldsBytes(fields)
+            flows, packets = t.get(key, (0, 0))
+            t[key] = (flows + 1, packets + a.PACKETS)
+        self.assertEqual(len(t), 3)
+        self.assertEqual(sorted(v for k, v in t.items()), [(3, 12), (3, 15), (4, 18)])
+
+class FastHashFilterTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        self.assertRaises(ValueError, pytrap.FastHashFilter, 3, 8, "I")
+        self.assertRaises(ValueError, pytrap.FastHashFilter, 4, 0, "I")
+
+        f = pytrap.FastHashFilter(4, 8, "IH")
+        self.assertEqual(f.rows, 4)
+        self.assertEqual(f.value_size, 6)
+        key = lambda i: struct.pack("Q", i)
+
+        # 4 rows of 8 columns cannot hold 100 items, the table grows
+        for i in range(100):
+            self.assertTrue(f.set(key(i), (i, i % 7)))
+        self.assertEqual(len(f), 100)
+        self.assertTrue(f.rows >= 16)
+        for i in range(100):
+            self.assertEqual(f[key(i)], (i, i % 7))
+        self.assertEqual(sorted(f), [key(i) for i in sorted(range(100), key=key)])
+        self.assertEqual(sorted(f.items()), sorted((key(i), (i, i % 7)) for i in range(100)))
+
+        f[key(5)] = (1, 1)
+        self.assertEqual(f.get(key(5)), (1, 1))
+        self.assertEqual(len(f), 100)
+        self.assertEqual(f.get(key(1000)), None)
+        self.assertEqual(f.get(key(1000), (0, 0)), (0, 0))
+        self.assertRaises(KeyError, f.__getitem__, key(1000))
+        self.assertRaises(ValueError, f.get, b"short")
+        self.assertFalse(key(1000) in f)
+        self.assertTrue(key(1) in f)
+
+        rows = f.rows
+        f.resize()
+        self.assertTrue(f.rows >= 2 * rows)
+        self.assertEqual(len(f), 100)
+        self.assertEqual(f[key(99)], (99, 1))
+
+        self.assertTrue(f.remove(key(99)))
+        self.assertFalse(f.remove(key(99)))
+        del f[key(98)]
+        self.assertRaises(KeyError, f.__delitem__, key(98))
+        self.assertEqual(len(f), 98)
+
+        it = iter(f)
+        next(it)
+        f[key(200)] = (0, 0)
+        next(it)
+        f.remove(key(200))
+        self.assertRaises(RuntimeError, next, it)
+
+        f.clear()
+        self.assertEqual(len(f), 0)
+        self.assertEqual(list(f), [])
+
+class FastHashFilterFullRowTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        f = pytrap.FastHashFilter(1, 4, "B")
+        for i in range(8):
+            self.assertTrue(f.set(struct.pack("I", i), i, resize=False))
+        self.assertFalse(f.set(struct.pack("I", 8), 8, resize=False))
+        self.assertEqual(len(f), 8)
+        self.assertEqual(f.rows, 1)
+        self.assertTrue(f.set(struct.pack("I", 8), 8))
+        self.assertEqual(len(f), 9)
+
+class FastHashFilterViewTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        f = pytrap.FastHashFilter(16, 4, "I")
+        for i in range(10):
+            f[struct.pack("I", i)] = i * 10
+
+        v = f.view()
+        self.assertRaises(BufferError, memoryview, v)
+        self.assertRaises(BufferError, v.unpack)
+        self.assertFalse(v.find(struct.pack("I", 100)))
+        self.assertRaises(BufferError, v.unpack)
+
+        self.assertTrue(v.find(struct.pack("I", 3)))
+        self.assertEqual(struct.unpack_from("I", v), (30,))
+        self.assertEqual(v.unpack(), (30,))
+        self.assertEqual(bytes(v), struct.pack("I", 30))
+
+        # value is updated in place
+        m = memoryview(v)
+        struct.pack_into("I", m, 0, 31)
+        self.assertEqual(f[struct.pack("I", 3)], (31,))
+        # items cannot be removed while the value is exported
+        self.assertRaises(BufferError, f.remove, struct.pack("I", 4))
+        self.assertRaises(BufferError, f.resize)
+        self.assertRaises(BufferError, f.clear)
+        m.release()
+
+        self.assertTrue(f.remove(struct.pack("I", 4)))
+        # removal invalidates views
+        self.assertRaises(BufferError, v.unpack)
+        self.assertTrue(v.find(struct.pack("I", 3)))
+        f.resize()
+        self.assertRaises(BufferError, memoryview, v)
+        self.assertTrue(v.find(struct.pack("I", 3)))
+        self.assertEqual(v.unpack(), (31,))
+
+class BPlusTreeTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        self.assertRaises(ValueError, pytrap.BPlusTree, "I", 2)
+        IP = pytrap.UnirecIPAddr
+
+        t = pytrap.BPlusTree("II", node_size=4)
+        self.assertEqual(len(t), 0)
+        self.assertEqual(list(t), [])
+        self.assertEqual(list(t.items(IP("10.0.0.0"))), [])
+
+        addrs = [IP("10.%d.%d.1" % (i // 256, i % 256)) for i in range(1000)]
+        addrs += [IP("192.168.0.%d" % i) for i in range(100)]
+        addrs += [IP("2001:db8::%x" % i) for i in range(100)]
+        shuffled = list(enumerate(addrs))
+        random.seed(1)
+        random.shuffle(shuffled)
+        for i, ip in shuffled:
+            t[ip] = (i, 1)
+        self.assertEqual(len(t), 1200)
+        self.assertEqual(list(t), sorted(addrs))
+        self.assertEqual(t[IP("10.0.5.1")], (5, 1))
+        self.assertEqual(t.get(IP("10.0.5.2")), None)
+        self.assertEqual(t.get(IP("10.0.5.2"), (0, 0)), (0, 0))
+        self.assertRaises(KeyError, t.__getitem__, IP("10.0.5.2"))
+        self.assertRaises(TypeError, t.__getitem__, "10.0.5.1")
+        self.assertRaises(TypeError, t.__setitem__, 1, (1, 1))
+        self.assertTrue(IP("192.168.0.1") in t)
+        self.assertFalse(IP("192.168.1.1") in t)
+
+        # inclusive range of keys, bounds need not be stored
+        r = list(t.items(IP("10.0.254.0"), IP("10.1.1.1")))
+        self.assertEqual([ip for ip, v in r], [IP("10.0.254.1"), IP("10.0.255.1"),
+                                                IP("10.1.0.1"), IP("10.1.1.1")])
+        self.assertEqual(r[0][1], (254, 1))
+        self.assertEqual(len(list(t.keys(IP("192.168.0.0")))), 200)
+        self.assertEqual(len(list(t.keys(hi=IP("10.255.255.255")))), 1000)
+        self.assertEqual(list(t.keys(IP("10.3.232.2"), IP("11.0.0.0"))), [])
+        self.assertEqual(list(t.keys(IP("2001:db8::63"))), [IP("2001:db8::63")])
+        # ranges of networks
+        self.assertEqual(len(list(t.items(pytrap.UnirecIPAddrRange("10.2.0.0/16")))), 256)
+        self.assertEqual(len(list(t.keys(pytrap.UnirecIPAddrRange("192.168.0.0/24")))), 100)
+        self.assertEqual(len(list(t.keys(pytrap.UnirecIPAddrRange("2001:db8::/32")))), 100)
+        self.assertRaises(TypeError, t.items, pytrap.UnirecIPAddrRange("10.0.0.0/8"), IP("10.0.0.1"))
+
+        # update in place does not break iteration, insertion does
+        it = t.items(IP("192.168.0.0"))
+        ip, v = next(it)
+        t[ip] = (v[0], v[1] + 1)
+        self.assertEqual(t[ip], (v[0], 2))
+        next(it)
+        t[IP("192.168.0.200")] = (0, 0)
+        self.assertRaises(RuntimeError, next, it)
+
+        for ip in addrs[::2]:
+            del t[ip]
+        self.assertRaises(KeyError, t.__delitem__, addrs[0])
+        self.assertEqual(len(t), 601)
+        self.assertEqual(list(t.keys(hi=IP("10.0.0.255"))), [])
+        self.assertEqual(list(t.keys(hi=IP("10.0.1.1"))), [IP("10.0.1.1")])
+        t.clear()
+        self.assertEqual(len(t), 0)
+        self.assertEqual(list(t), [])
+
+class PrefixTreeTest(NemeaCommonTestCase):
+    def runTest(self):
+        import pytrap
+        self.assertRaises(TypeError, pytrap.PrefixTree, "I", True, "..")
+
+        t = pytrap.PrefixTree("H")
+        t["example.com"] = 1
+        t.add("evil.example.com", 2)
+        t.add(b"tracker.net.", (3, ))
+        self.assertEqual(len(t), 3)
+        self.assertEqual(t["evil.example.com"], (2, ))
+        self.assertEqual(t["tracker.net"], (3, ))
+        self.assertTrue("example.com" in t)
+        self.assertFalse("com" in t)
+        self.assertRaises(KeyError, t.__getitem__, "com")
+        self.assertRaises(ValueError, t.add, "a.com")
+        self.assertRaises(ValueError, t.add, "", 1)
+        self.assertRaises(ValueError, t.add, "a" * 300, 1)
+        self.assertRaises(TypeError, t.add, 1, 1)
+
+        # the most specific listed domain
+        self.assertEqual(t.match("www.evil.example.com"), ("evil.example.com", (2, )))
+        self.assertEqual(t.match("a.b.example.com."), ("example.com", (1, )))
+        self.assertEqual(t.match("example.com"), ("example.com", (1, )))
+        self.assertEqual(t.match(b"x.tracker.net"), (b"tracker.net", (3, )))
+        self.assertEqual(t.match("evilexample.com"), None)
+        self.assertEqual(t.match("example.org"), None)
+        self.assertEqual(t.match(""), None)
+        del t["evil.example.com"]
+        self.assertRaises(KeyError, t.__delitem__, "evil.example.com")
+        self.assertEqual(len(t), 2)
+        self.assertEqual(t.match("www.evil.example.com"), ("example.com", (1, )))
+
+        # bulk load
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("# blacklist\n\nbad.org\n  worse.bad.org  # comment\nMalware.IO 1.2.3.4\n")
+            self.assertEqual(t.load(path, 7), 3)
+        finally:
+            os.unlink(path)
+        self.assertEqual(len(t), 5)
+        self.assertEqual(t.match("x.worse.bad.org"), ("worse.bad.org", (7, )))
+
+        # ASCII letters are folded by default
+        self.assertTrue(t.ignore_case)
+        t["Phish.Example.COM"] = 4
+        self.assertEqual(t["phish.example.com"], (4, ))
+        self.assertTrue("MALWARE.io" in t)
+        self.assertEqual(t.match("WWW.Phish.example.com"), ("phish.example.com", (4, )))
+        self.assertEqual(t.match(b"X.Worse.BAD.org"), (b"worse.bad.org", (7, )))
+        del t["PHISH.example.com"]
+        c = pytrap.PrefixTree(ignore_case=False)
+        c.add("Example.com")
+        self.assertFalse("example.com" in c)
+        self.assertEqual(c.match("www.Example.com"), ("Example.com", None))
+        self.assertRaises(IOError, t.load, path, 7)
+        self.assertRaises(TypeError, t.load, 1)
+
+        # counters of names and their subdomains
+        self.assertEqual(t.insert("a.tunnel.example.com"), 1)
+        self.assertEqual(t.insert("a.tunnel.example.com"), 2)
+        t.insert("b.tunnel.example.com")
+        t.insert("c.tunnel.example.com")
+        self.assertEqual(t.inserts, 4)
+        self.assertEqual(t.counters("a.tunnel.example.com"), (2, 0))
+        self.assertEqual(t.counters("tunnel.example.com"), (0, 3))
+        self.assertEqual(t.counters("unknown.com"), None)
+        # inserted names are not listed
+        self.assertFalse("a.tunnel.example.com" in t)
+        self.assertEqual(t.match("a.tunnel.example.com"), ("example.com", (1, )))
+
+        # prefix tree without values
+        p = pytrap.PrefixTree(suffix=False, separator=b"@")
+        p.add("user")
+        self.assertEqual(p["user"], None)
+        self.assertRaises(ValueError, p.add, "admin", 1)
+        self.assertEqual(p.match("user@example.com"), ("user", None))
+        self.assertEqual(p.match("users@example.com"), None)
+
+class BloomFilterTest(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        self.assertRaises(ValueError, pytrap.BloomFilter, 0)
+        self.assertRaises(ValueError, pytrap.BloomFilter, 100, 1.0)
+        self.assertRaises(ValueError, pytrap.BloomFilter, 100, 0)
+
+        bf = pytrap.BloomFilter(10000, 0.01)
+        self.assertEqual(bf.capacity, 10000)
+        self.assertEqual(bf.hashes, 7)
+        self.assertEqual(bf.bits % 64, 0)
+        self.assertTrue(95000 < bf.bits < 97000)
+
+        ips = [pytrap.UnirecIPAddr("10.{}.{}.1".format(i // 256, i % 256)) for i in range(5000)]
+        bf.update(ips)
+        self.assertTrue(4950 <= len(bf) <= 5000)
+        self.assertTrue(all(ip in bf for ip in ips))
+        self.assertTrue(bf.add("example.com"))
+        self.assertFalse(bf.add(b"example.com"))
+        self.assertTrue("example.com" in bf)
+        self.assertTrue(bytearray(b"example.com") in bf)
+        self.assertRaises(TypeError, bf.add, 1)
+        self.assertRaises(TypeError, bf.__contains__, None)
+
+        # raw IP addresses (as in UniRec records) are the same keys as UnirecIPAddr
+        other = [pytrap.UnirecIPAddr("11.{}.{}.1".format(i // 256, i % 256)) for i in range(10000)]
+        batch = b"".join(ip.key() for ip in ips[:100] + other)
+        found = bf.containsMany(batch)
+        self.assertEqual(found[:100], list(range(100)))
+        self.assertTrue(len(found) - 100 < 300)
+        self.assertEqual(bf.containsMany(b""), [])
+        self.assertRaises(ValueError, bf.containsMany, b"x" * 17)
+        self.assertRaises(ValueError, bf.containsMany, b"x" * 16, 0)
+        self.assertTrue(bf.falsePositiveRate() < 0.01)
+
+        # bulk insert and mmapped file
+        bf2 = pytrap.BloomFilter(20000, 0.001)
+        bf2.addMany(batch)
+        bf2.addMany(b"abcdefgh" * 3, key_size=8)
+        self.assertEqual(len(bf2), 10101)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            bf2.save(path)
+            loaded = pytrap.BloomFilter.load(path)
+            self.assertEqual((loaded.bits, loaded.hashes, loaded.capacity, loaded.fpp, len(loaded)),
+                             (bf2.bits, bf2.hashes, bf2.capacity, bf2.fpp, len(bf2)))
+            self.assertEqual(loaded.containsMany(batch), list(range(10100)))
+            self.assertTrue(b"abcdefgh" in loaded)
+            # changes are not written into the file
+            loaded.add("new")
+            self.assertTrue("new" in loaded)
+            self.assertFalse("new" in pytrap.BloomFilter.load(path))
+            del loaded
+            with open(path, "r+b") as f:
+                f.write(b"X")
+            self.assertRaises(ValueError, pytrap.BloomFilter.load, path)
+        finally:
+            os.unlink(path)
+        self.assertRaises(IOError, pytrap.BloomFilter.load, path)
+        bf2.clear()
+        self.assertEqual(len(bf2), 0)
+        self.assertEqual(bf2.containsMany(batch), [])
@@ -126,3 +126,216 @@ class TrapCtxNotInitTestRecv(unittest.TestCase):
         except:
             pass
 
+
+class TrapCtxFileTimeRangeTest(unittest.TestCase):
+    def sendBatch(self, c, fmt, first):
+        import pytrap
+        t = pytrap.UnirecTemplate(fmt)
+        t.createMessage()
+        for i in range(first, first + 100):
+            t.FOO = i
+            c.send(t.getData())
+        c.sendFlush()
+
+    def readAll(self, spec):
+        import pytrap
+        c = pytrap.TrapCtx()
+        c.init(["-i", spec], 1, 0)
+        c.setRequiredFmt(0, pytrap.FMT_UNIREC, "")
+        t = None
+        result = []
+        while True:
+            try:
+                data = c.recv()
+            except pytrap.FormatChanged as e:
+                t = pytrap.UnirecTemplate(c.getDataFmt(0)[1])
+                data = e.data
+            if len(data) <= 1:
+                break
+            t.setData(data)
+            result.append(t.FOO)
+        c.finalize()
+        return result
+
+    def runTest(self):
+        import os
+        import shutil
+        import tempfile
+        import time
+        import pytrap
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, "data.trapcap")
+            c = pytrap.TrapCtx()
+            c.init(["-i", "f:%s:w:index" % path], 0, 1)
+            c.setDataFmt(0, pytrap.FMT_UNIREC, "uint32 FOO")
+            self.sendBatch(c, "uint32 FOO", 0)
+            time.sleep(0.1)
+            t1 = time.time()
+            time.sleep(0.1)
+            self.sendBatch(c, "uint32 FOO", 100)
+            time.sleep(0.1)
+            t2 = time.time()
+            time.sleep(0.1)
+            # format change creates the second file data.trapcap.0
+            c.setDataFmt(0, pytrap.FMT_UNIREC, "uint32 FOO,uint32 BAR")
+            self.sendBatch(c, "uint32 FOO,uint32 BAR", 200)
+            c.finalize()
+            self.assertTrue(os.path.exists(path + ".idx"))
+            self.assertTrue(os.path.exists(path + ".0.idx"))
+
+            files = "%s %s.0" % (path, path)
+            self.assertEqual(self.readAll("f:" + files), list(range(300)))
+            # format change is reported at the right message when buffers are prefetched
+            self.assertEqual(self.readAll("f:%s:prefetch=2" % files), list(range(300)))
+            # the first file is skipped, its data are older than start, index files are not matched
+            self.assertEqual(self.readAll("f:%s*:start=%f" % (path, t2)), list(range(200, 300)))
+            # buffers that might contain data from the range are returned
+            self.assertEqual(self.readAll("f:%s:end=%f" % (files, t1)), list(range(200)))
+            self.assertEqual(self.readAll("f:%s:start=%f:end=%f:read=mmap" % (files, t1, t1)), list(range(100, 200)))
+        finally:
+            shutil.rmtree(d)
+
+class TrapCtxProjectionTest(unittest.TestCase):
+    def runTest(self):
+        import os
+        import shutil
+        import tempfile
+        import pytrap
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, "data.trapcap")
+            c = pytrap.TrapCtx()
+            c.init(["-i", "f:%s:w" % path], 0, 1)
+            # the sender sends a superset of the format required by the receiver
+            fmts = ["ipaddr SRC_IP,uint64 BYTES,uint32 PACKETS,string URL",
+                    "ipaddr DST_IP,ipaddr SRC_IP,uint16 DST_PORT,uint64 BYTES,bytes PAYLOAD"]
+            for fmt in fmts:
+                c.setDataFmt(0, pytrap.FMT_UNIREC, fmt)
+                t = pytrap.UnirecTemplate(fmt)
+                t.createMessage(100)
+                for i in range(10):
+                    t.SRC_IP = pytrap.UnirecIPAddr("10.0.0.%d" % i)
+                    t.BYTES = i * 1000
+                    c.send(t.getData())
+                c.sendFlush()
+            c.finalize()
+
+            c = pytrap.TrapCtx()
+            c.init(["-i", "f:%s %s.0" % (path, path)], 1, 0)
+            c.setRequiredFmt(0, pytrap.FMT_UNIREC, "ipaddr SRC_IP,uint64 BYTES")
+            p = pytrap.UnirecTemplate("ipaddr SRC_IP,uint64 BYTES").project(["SRC_IP", "BYTES"])
+            result = []
+            changes = 0
+            while True:
+                try:
+                    data = c.recv()
+                except pytrap.FormatChanged as e:
+                    # the same projection is reused, only offsets are updated
+                    p.setFormat(c.getDataFmt(0)[1])
+                    changes += 1
+                    data = e.data
+                if len(data) <= 1:
+                    break
+                p.setData(data)
+                result.append((str(p.SRC_IP), p.BYTES))
+            c.finalize()
+            self.assertEqual(changes, 2)
+            expected = [("10.0.0.%d" % i, i * 1000) for i in range(10)]
+            self.assertEqual(result, expected * 2)
+        finally:
+            shutil.rmtree(d)
+
+class FileReaderTest(unittest.TestCase):
+    def writeFile(self, spec, count, batch=100):
+        import pytrap
+        c = pytrap.TrapCtx()
+        c.init(["-i", "f:" + spec], 0, 1)
+        c.setDataFmt(0, pytrap.FMT_UNIREC, "uint32 FOO,string NOTE")
+        t = pytrap.UnirecTemplate("uint32 FOO,string NOTE")
+        t.createMessage(100)
+        for i in range(count):
+            t.FOO = i
+            t.NOTE = "x" * (i % 10)
+            c.send(t.getData())
+            if i % batch == batch - 1:
+                c.sendFlush()
+        c.finalize()
+
+    def readFoo(self, reader):
+        import pytrap
+        t = pytrap.UnirecTemplate(reader.fmtspec)
+        result = []
+        for data in reader:
+            t.setData(data)
+            result.append(t.FOO)
+        return result
+
+    def runTest(self):
+        import array
+        import os
+        import shutil
+        import struct
+        import tempfile
+        import pytrap
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, "data.trapcap")
+            zpath = os.path.join(d, "data-zlib.trapcap")
+            self.writeFile(path, 500)
+            try:
+                self.writeFile(zpath + ":w:compress=zlib", 500)
+            except pytrap.TrapError:
+                # libtrap without zlib
+                zpath = None
+
+            r = pytrap.FileReader(path)
+            self.assertEqual(r.fmttype, pytrap.FMT_UNIREC)
+            self.assertEqual(r.fmtspec, "uint32 FOO,string NOTE")
+            self.assertEqual(self.readFoo(r), list(range(500)))
+            r.close()
+            with self.assertRaises(pytrap.TrapError):
+                r.readBuffer()
+
+            with pytrap.FileReader(path, mmap=False) as r:
+                buffers = []
+                while True:
+                    b = r.readBuffer()
+                    if b is None:
+                        break
+                    buffers.append(b)
+                self.assertEqual(len(buffers), 5)
+
+            for p in [path, zpath] if zpath else [path]:
+                for use_mmap in [True, False]:
+                    with pytrap.FileReader(p, mmap=use_mmap) as r:
+                        t = pytrap.UnirecTemplate(r.fmtspec)
+                        cols = r.columns(t)
+                    self.assertEqual(list(array.array("I", bytes(cols["FOO"]))), list(range(500)))
+                    self.assertEqual(cols["NOTE"][:3], [b"", b"x", b"xx"])
+
+            with pytrap.FileReader(path) as r:
+                t = pytrap.UnirecTemplate(r.fmtspec)
+                self.assertEqual(list(r.columns(t, ["NOTE"]).keys()), ["NOTE"])
+                with self.assertRaises(pytrap.TrapError):
+                    r.columns(t, ["UNKNOWN"])
+
+            files = [path, zpath] if zpath else [path, path]
+            chunks = pytrap.FileReader.chunks(files, 4)
+            self.assertTrue(4 <= len(chunks) <= 5)
+            result = []
+            for chunk in chunks:
+                with pytrap.FileReader(*chunk) as r:
+                    result.extend(self.readFoo(r))
+            self.assertEqual(sorted(result), sorted(list(range(500)) * 2))
+
+            with self.assertRaises(pytrap.TrapError):
+                pytrap.FileReader(__file__)
+            # hello with a format specifier that is not valid UTF-8
+            bad = os.path.join(d, "bad.trapcap")
+            with open(bad, "wb") as f:
+                f.write(struct.pack("!BxxxI", pytrap.FMT_UNIREC, 4) + b"\xff\xfe\xfd\xfc")
+            with self.assertRaises(pytrap.TrapError):
+                pytrap.FileReader(bad)
+        finally:
+            shutil.rmtree(d)
@@ -73,6 +73,70 @@ class DataTypesIPAddr(unittest.TestCase):
         self.assertFalse(i.isNull())
         self.assertTrue(i)
 
+class DataTypesIPAddrConstruct(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        import socket
+        self.assertEqual(pytrap.UnirecIPAddr.fromBytes(b"\x0a\x00\x00\x01"), pytrap.UnirecIPAddr("10.0.0.1"))
+        self.assertTrue(pytrap.UnirecIPAddr.fromBytes(bytearray([10, 0, 0, 1])).isIPv4())
+        ip6 = socket.inet_pton(socket.AF_INET6, "fd7c:e770:9b8a::465")
+        self.assertEqual(pytrap.UnirecIPAddr.fromBytes(ip6), pytrap.UnirecIPAddr("fd7c:e770:9b8a::465"))
+        with self.assertRaises(ValueError):
+            pytrap.UnirecIPAddr.fromBytes(b"\x00\x00")
+        if sys.version_info > (3,):
+            # text is not an address in network byte order
+            with self.assertRaises(TypeError):
+                pytrap.UnirecIPAddr.fromBytes("1234")
+
+        self.assertEqual(pytrap.UnirecIPAddr.fromInt(0x0a000001), pytrap.UnirecIPAddr("10.0.0.1"))
+        self.assertEqual(pytrap.UnirecIPAddr.fromInt(1, ipv6=True), pytrap.UnirecIPAddr("::1"))
+        self.assertEqual(pytrap.UnirecIPAddr.fromInt(0xfd7ce7709b8a << 80 | 0x465, True),
+                         pytrap.UnirecIPAddr("fd7c:e770:9b8a::465"))
+        with self.assertRaises(OverflowError):
+            pytrap.UnirecIPAddr.fromInt(1 << 32)
+        with self.assertRaises(OverflowError):
+            pytrap.UnirecIPAddr.fromInt(1 << 128, ipv6=True)
+        with self.assertRaises(OverflowError):
+            pytrap.UnirecIPAddr.fromInt(-1)
+
+        # objects reused from the free-list must not keep old values
+        ips = [pytrap.UnirecIPAddr("fd7c:e770:9b8a::%x" % i) for i in range(100)]
+        del ips
+        self.assertTrue(pytrap.UnirecIPAddr.fromInt(0).isNull())
+        self.assertEqual(str(pytrap.UnirecIPAddr("1.2.3.4").inc()), "1.2.3.5")
+
+class DataTypesIPAddrHashOrder(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        ips = [pytrap.UnirecIPAddr("10.0.%d.%d" % (i >> 8, i & 255)) for i in range(4096)]
+        ips += [pytrap.UnirecIPAddr("2001:db8::%x" % i) for i in range(4096)]
+        # low bits of the hash (used by dict) must be well distributed
+        self.assertTrue(len(set(hash(i) & 0xfff for i in ips)) > 3000)
+        self.assertEqual(len(set(hash(i) for i in ips)), len(ips))
+        self.assertEqual(hash(pytrap.UnirecIPAddr("10.0.0.1")), hash(pytrap.UnirecIPAddr("10.0.0.1")))
+
+        ip = pytrap.UnirecIPAddr("10.0.0.1")
+        self.assertEqual(len(ip.key()), 16)
+        self.assertEqual(pytrap.UnirecIPAddr.fromBytes(ip.key()), ip)
+        self.assertEqual(sorted(reversed(ips), key=pytrap.UnirecIPAddr.key), sorted(ips))
+
+class ParseIPs(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        strs = ["10.0.0.1", "::1", "fd7c:e770:9b8a::465", "255.255.255.255"]
+        packed = pytrap.parseIPs(strs)
+        self.assertEqual(len(packed), 16 * len(strs))
+        for i, s in enumerate(strs):
+            ip = pytrap.UnirecIPAddr.fromBytes(packed[i * 16:(i + 1) * 16])
+            self.assertEqual(ip, pytrap.UnirecIPAddr(s))
+            self.assertEqual(ip.isIPv4(), "." in s)
+        self.assertEqual(pytrap.parseIPs([]), bytearray())
+        self.assertEqual(pytrap.parseIPs(iter(strs)), packed)
+        with self.assertRaises(pytrap.TrapError):
+            pytrap.parseIPs(["10.0.0.1", "foo"])
+        with self.assertRaises(TypeError):
+            pytrap.parseIPs([1])
+
 
 def timedelta_total_seconds(timedelta):
     return (
@@ -125,6 +189,57 @@ class DataTypesTime(unittest.TestCase):
         now = pytrap.UnirecTime.fromDatetime(now2)
         self.assertTrue(abs(now.getSeconds() - int(now2.strftime("%s")) <= 1))
 
+# TIME_LAST is a new field, the name of the class keeps the test after Template2Test
+# which checks IDs of fields
+class UnirecTimeArrayTest(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        a = pytrap.UnirecTemplate("ipaddr SRC_IP,time TIME_FIRST,time TIME_LAST,string TEXT")
+        records = []
+        for i in range(20):
+            a.createMessage(10)
+            a.TIME_FIRST = pytrap.UnirecTime(1466701316 + i, 100 * (i % 10))
+            a.TIME_LAST = a.TIME_FIRST + pytrap.UnirecTime(i, 5)
+            a.TEXT = "x" * (i % 10)
+            records.append(bytes(a.getData()))
+
+        first = a.getColumn(records, "TIME_FIRST")
+        last = a.getColumn(records, "TIME_LAST")
+        self.assertEqual(len(first), 20 * 8)
+        with self.assertRaises(TypeError):
+            a.getColumn(records, "TEXT")
+        with self.assertRaises(pytrap.TrapError):
+            a.getColumn(records, "UNKNOWN")
+        with self.assertRaises(pytrap.TrapError):
+            a.getColumn([b"\x00"], "TIME_FIRST")
+
+        times = [a.get(r, "TIME_FIRST") for r in records]
+        floats = memoryview(pytrap.UnirecTime.arrayAsFloat(first)).cast("d")
+        self.assertEqual(list(floats), [t.getTimeAsFloat() for t in times])
+        msecs = memoryview(pytrap.UnirecTime.arrayAsMiliSeconds(first)).cast("Q")
+        self.assertEqual(list(msecs), [t.getSeconds() * 1000 + t.getMiliSeconds() for t in times])
+
+        dur = memoryview(pytrap.UnirecTime.arrayDuration(first, last, ms=True)).cast("q")
+        self.assertEqual(list(dur), [i * 1000 + 5 for i in range(20)])
+        dur = memoryview(pytrap.UnirecTime.arrayDuration(first, last)).cast("d")
+        self.assertEqual(list(dur), [i + 0.005 for i in range(20)])
+        dur = memoryview(pytrap.UnirecTime.arrayDuration(last, first, True)).cast("q")
+        self.assertEqual(dur[1], -1005)
+        with self.assertRaises(ValueError):
+            pytrap.UnirecTime.arrayDuration(first, last[:8])
+
+        win = pytrap.UnirecTime.arrayWindow(first, 5)
+        self.assertEqual(len(win), len(first))
+        wins = list(memoryview(pytrap.UnirecTime.arrayAsMiliSeconds(win)).cast("Q"))
+        self.assertEqual(wins, [(1466701316 + i) // 5 * 5000 for i in range(20)])
+        wins = list(memoryview(pytrap.UnirecTime.arrayAsMiliSeconds(pytrap.UnirecTime.arrayWindow(first, 0.25, offset=0.1))).cast("Q"))
+        self.assertEqual(wins, [((1466701316 + i) * 1000 + 100 * (i % 10) - 100) // 250 * 250 + 100 for i in range(20)])
+        with self.assertRaises(ValueError):
+            pytrap.UnirecTime.arrayWindow(first, 0)
+        with self.assertRaises(ValueError):
+            pytrap.UnirecTime.arrayAsFloat(b"\x00" * 7)
+        self.assertEqual(pytrap.UnirecTime.arrayAsFloat(b""), bytearray())
+
 
 class DataAccessGetTest(unittest.TestCase):
     def runTest(self):
@@ -366,6 +481,295 @@ class TemplateSizeTest(unittest.TestCase):
         self.assertEqual(a.recFixlenSize(), 4)
         self.assertEqual(a.recVarlenSize(), 65531)
 
+class TemplateFieldsBytesTest(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        import struct
+        a = pytrap.UnirecTemplate("ipaddr SRC_IP,uint16 SRC_PORT,uint8 PROTOCOL,string TEXT")
+        self.assertRaises(pytrap.TrapError, a.getFieldsBytes, ["SRC_IP"])
+        a.createMessage(10)
+        a.SRC_IP = pytrap.UnirecIPAddr("10.0.0.1")
+        a.SRC_PORT = 443
+        a.PROTOCOL = 6
+        key = a.getFieldsBytes(["SRC_IP", "SRC_PORT", "PROTOCOL"])
+        self.assertEqual(key, pytrap.UnirecIPAddr("10.0.0.1").key() + struct.pack("=HB", 443, 6))
+        self.assertEqual(a.getFieldsBytes(("PROTOCOL",), a.getData()), b"\x06")
+        self.assertEqual(a.getFieldsBytes([]), b"")
+        self.assertRaises(TypeError, a.getFieldsBytes, ["TEXT"])
+        self.assertRaises(pytrap.TrapError, a.getFieldsBytes, ["DST_IP"])
+
+class TemplateCopyPlanTest(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        a = pytrap.UnirecTemplate("ipaddr SRC_IP,ipaddr DST_IP,uint16 SRC_PORT,uint16 DST_PORT,uint8 PROTOCOL,uint64 BYTES,string URL,bytes PAYLOAD")
+        b = pytrap.UnirecTemplate("ipaddr SRC_IP,uint64 BYTES,uint8 PROTOCOL,string URL,double SCORE")
+        c = pytrap.UnirecTemplate("ipaddr SRC_IP,string URL,string CATEGORY")
+
+        data = a.createMessage(100)
+        a.SRC_IP = pytrap.UnirecIPAddr("10.0.0.1")
+        a.DST_IP = pytrap.UnirecIPAddr("10.0.0.2")
+        a.PROTOCOL = 6
+        a.BYTES = 12345
+        a.PAYLOAD = b"\x00\x01"
+        a.URL = "http://example.com/"
+
+        plan = a.copyPlan(b)
+        self.assertEqual((plan.src, plan.dst), (a, b))
+        out = b.createMessage(100)
+        self.assertEqual(plan.apply(data, out), b.recFixlenSize() + 19)
+        b.setData(out)
+        self.assertEqual((b.SRC_IP, b.BYTES, b.PROTOCOL, b.URL, b.SCORE),
+                         (a.SRC_IP, 12345, 6, "http://example.com/", 0.0))
+
+        # fields that are not in the source keep their values
+        out = c.createMessage(100)
+        c.setData(out)
+        c.CATEGORY = "news"
+        a.copyPlan(c).apply(bytes(data), out)
+        self.assertEqual((c.SRC_IP, c.URL, c.CATEGORY), (a.SRC_IP, "http://example.com/", "news"))
+        self.assertRaises(ValueError, a.copyPlan(c).apply, data, c.createMessage(10))
+        self.assertRaises(ValueError, plan.apply, data[:20], out)
+        self.assertRaises(BufferError, plan.apply, data, bytes(100))
+        self.assertRaises(TypeError, a.copyPlan, "uint8 PROTOCOL")
+
+        records = []
+        for i in range(10):
+            a.BYTES = i
+            a.URL = "x" * i
+            records.append(bytes(a.getData()[:a.recSize()]))
+        out = plan.applyMany(records)
+        self.assertEqual([len(r) for r in out], [b.recFixlenSize() + i for i in range(10)])
+        for i, r in enumerate(out):
+            b.setData(r)
+            self.assertEqual((b.BYTES, b.URL, b.SRC_IP), (i, "x" * i, a.SRC_IP))
+        out = plan.applyMany(records[:1], dyn_size=8)
+        self.assertEqual(len(out[0]), b.recFixlenSize() + 8)
+        b.setData(out[0])
+        b.URL = "12345678"
+        self.assertEqual(b.URL, "12345678")
+        self.assertRaises(ValueError, plan.applyMany, [b"x"])
+
+        # the same template copies whole records
+        self.assertEqual(a.copyPlan(a).applyMany(records[3:4]), [bytearray(records[3])])
+
+class TemplateProjectionTest(unittest.TestCase):
+    def runTest(self):
+        import pytrap
+        t = pytrap.UnirecTemplate("ipaddr SRC_IP,ipaddr DST_IP,uint64 BYTES,uint32 PACKETS,string URL")
+        t.createMessage(100)
+        t.SRC_IP = pytrap.UnirecIPAddr("10.0.0.1")
+        t.BYTES = 1234
+        t.URL = "http://example.com/"
+        data = t.getData()
+
+        p = t.project(["URL", "BYTES", "SRC_IP"])
+        self.assertEqual(len(p), 3)
+        self.assertEqual(p.fields, ("URL", "BYTES", "SRC_IP"))
+        self.assertEqual(p.getValues(data), ("http://example.com/", 1234, pytrap.UnirecIPAddr("10.0.0.1")))
+        with self.assertRaises(pytrap.TrapError):
+            p.getValues()
+        p.setData(data)
+        self.assertEqual(p.BYTES, 1234)
+        self.assertEqual(p.URL, "http://example.com/")
+        with self.assertRaises(AttributeError):
+            p.PACKETS
+
+        # a different order of fields in the format
+        t2 = pytrap.UnirecTemplate("string URL,uint64 BYTES,ipaddr SRC_IP,uint16 DST_PORT")
+        t2.createMessage(100)
+        t2.BYTES = 4321
+        t2.URL = "abc"
+        p.setFormat("string URL,uint64 BYTES,ipaddr SRC_IP,uint16 DST_PORT")
+        self.assertEqual(p.getValues(t2.getData())[:2], ("abc", 4321))
+        # offsets are kept when a field is missing
+        with self.assertRaises(pytrap.TrapError):
+            p.setFormat("uint64 BYTES,ipaddr SRC_IP")
+        self.assertEqual(p.getValues(t2.getData())[:2], ("abc", 4321))
+
+        with self.assertRaises(pytrap.TrapError):
+            t.project(["SRC_IP", "DST_PORT"])
+        with self.assertRaises(TypeError):
+            p.getValues(1)
+        with self.assertRaises(ValueError):
+            p.getValues(bytearray(3))
+
+        # data of the previous format are not read with new offsets
+        p.setData(t2.getData())
+        p.setFormat("ipaddr SRC_IP,uint64 BYTES,string URL")
+        with self.assertRaises(pytrap.TrapError):
+            p.BYTES
+        # variable-length field out of the data
+        bad = bytearray(28)
+        bad[-4:] = b"\xff\xff\xff\xff"
+        with self.assertRaises(ValueError):
+            p.getValues(bad)
+        with self.assertRaises(ValueError):
+            p.setData(bad)
+        data = bytearray(data)
+        p.setFormat("ipaddr SRC_IP,ipaddr DST_IP,uint64 BYTES,uint32 PACKETS,string URL")
+        p.setData(data)
+        self.assertEqual(p.URL, "http://example.com/")
+        # length of URL in the header of the variable-length field
+        data[46:48] = b"\xff\xff"
+        with self.assertRaises(ValueError):
+            p.URL
+
+class TemplateFilterTest(unittest.TestCase):
+    def runTest(self):
+        import struct
+        import pytrap
+        t = pytrap.UnirecTemplate("ipaddr SRC_IP,uint16 DST_PORT,uint8 PROTOCOL,int32 DIFF,double SCORE,time TIME_FIRST,string URL")
+
+        def record(src, port, proto, diff=0, url=""):
+            t.createMessage(100)
+            t.SRC_IP = pytrap.UnirecIPAddr(src)
+            t.DST_PORT = port
+            t.PROTOCOL = proto
+            t.DIFF = diff
+            t.SCORE = 0.5
+            t.TIME_FIRST = pytrap.UnirecTime(1500000000)
+            t.URL = url
+            return bytes(t.getData())
+
+        records = [record("10.1.2.3", 22, 6), record("10.1.2.3", 2222, 17),
+                   record("192.168.0.1", 2222, 6, -5, "abc"), record("2001:db8::1", 22, 6)]
+
+        def matches(expression):
+            f = pytrap.compileFilter(t, expression)
+            return [f.match(r) for r in records]
+
+        f = pytrap.compileFilter(t, "PROTOCOL == 6 && DST_PORT in {22, 2222} && SRC_IP in 10.0.0.0/8")
+        self.assertIsInstance(f, pytrap.UnirecFilter)
+        self.assertEqual(f.filter(records), records[:1])
+        self.assertIs(f.filter(records)[0], records[0])
+        self.assertEqual(matches("PROTOCOL == 6 and DST_PORT in {22, 2222} and SRC_IP in 10.0.0.0/8"), [True, False, False, False])
+        self.assertEqual(matches("SRC_IP in {10.0.0.0/8, 2001:db8::/32}"), [True, True, False, True])
+        self.assertEqual(matches("SRC_IP not in 10.0.0.0/8"), [False, False, True, True])
+        self.assertEqual(matches("!(SRC_IP == 10.0.0.0/8) || PROTOCOL != 6"), [False, True, True, True])
+        self.assertEqual(matches("SRC_IP == 192.168.0.1"), [False, False, True, False])
+        self.assertEqual(matches("DIFF < 0 or URL == 'abc'"), [False, False, True, False])
+        self.assertEqual(matches("URL in {\"\", 'x'} && DST_PORT > 100 && DST_PORT <= 0x8ae"), [False, True, False, False])
+        self.assertEqual(matches("SCORE > 0.25 && TIME_FIRST >= 1500000000 && TIME_FIRST < 1500000000.5"), [True] * 4)
+        self.assertEqual(matches("DST_PORT in {}"), [False] * 4)
+        self.assertEqual(matches("PROTOCOL <= 255 && DST_PORT < 65535 && DIFF >= -2147483648"), [True] * 4)
+        self.assertEqual(matches(" || ".join("DST_PORT == %d" % i for i in range(100, 10000))), [False, True, True, False])
+        self.assertEqual(matches("(" * 128 + "!" * 128 + "DIFF < 0" + ")" * 128), [False, False, True, False])
+
+        buf = b"".join(struct.pack("!H", len(r)) + r for r in records) + struct.pack("!H", 1) + b"\x00"
+        self.assertEqual(f.filterBuffer(buf), records[:1])
+        with self.assertRaises(pytrap.TrapError):
+            f.filterBuffer(buf[:-4])
+        with self.assertRaises(pytrap.TrapError):
+            f.match(b"\x00")
+
+        with self.assertRaises(pytrap.TrapError):
+            pytrap.compileFilter(t, "BYTES > 0")
+        for expression in ["PROTOCOL ==", "(PROTOCOL == 6", "PROTOCOL = 6", "PROTOCOL == -1",
+                           "PROTOCOL > -1", "PROTOCOL == 300", "PROTOCOL < 300", "DST_PORT in {22, 65536}",
+                           "DIFF > 2147483648", "DIFF < -2147483649",
+                           "SRC_IP == 10.0.0.0/33", "URL < 'abc'", "URL == 'abc",
+                           "(" * 100000 + "PROTOCOL == 6" + ")" * 100000, "!" * 100000 + "PROTOCOL == 6",
+                           "(" * 257 + "PROTOCOL == 6" + ")" * 257]:
+            with self.assertRaises(ValueError):
+                pytrap.compileFilter(t, expression)
+        with self.assertRaises(TypeError):
+            pytrap.compileFilter(t, "PROTOCOL == '6'")
+
+class TemplateAggregatorTest(unittest.TestCase):
+    def runTest(self):
+        import struct
+        import pytrap
+        t = pytrap.UnirecTemplate("ipaddr SRC_IP,time TIME_FIRST,uint32 PACKETS,uint8 PROTOCOL,int32 DIFF,string URL")
+        t.createMessage(0)
+        records = []
+        # (time, protocol, packets, diff)
+        rows = [(0, 6, 10, -1), (1, 17, 5, 3), (4, 6, 20, 2), (12, 6, 1, 0), (9, 17, 7, -4), (25, 1, 3, 0), (3, 6, 100, 0)]
+        for sec, proto, packets, diff in rows:
+            t.TIME_FIRST = pytrap.UnirecTime(1000 + sec)
+            t.PROTOCOL = proto
+            t.PACKETS = packets
+            t.DIFF = diff
+            records.append(bytes(t.getData()))
+
+        def decode(aggr, windows):
+            o = pytrap.UnirecTemplate(aggr.fmtspec)
+            result = []
+            for start, end, messages in windows:
+                groups = {}
+                for m in messages:
+                    o.setData(m)
+                    groups[o.PROTOCOL] = (o.SUM_PACKETS, o.FLOWS, o.MIN_DIFF, o.AVG)
+                if start is not None:
+                    start, end = start.getSeconds() - 1000, end.getSeconds() - 1000
+                result.append((start, end, groups))
+            return result
+
+        aggs = {"SUM_PACKETS": ("sum", "PACKETS"), "FLOWS": "count", "MIN_DIFF": ("min", "DIFF"), "AVG": ("avg", "PACKETS")}
+        a = pytrap.Aggregator(t, ["PROTOCOL"], aggs)
+        self.assertIn("uint64 SUM_PACKETS", a.fmtspec)
+        self.assertIn("uint64 FLOWS", a.fmtspec)
+        self.assertIn("int32 MIN_DIFF", a.fmtspec)
+        self.assertIn("double AVG", a.fmtspec)
+        a.addMany(records)
+        self.assertEqual(a.results(), [])
+        self.assertEqual(decode(a, a.flush()), [(None, None, {6: (131, 4, -1, 32.75), 17: (12, 2, -4, 6.0), 1: (3, 1, 0, 3.0)})])
+        self.assertEqual(a.flush(), [])
+
+        # tumbling windows, records at 9 s and 3 s are late
+        a = pytrap.Aggregator(t, ["PROTOCOL"], aggs, window=10)
+        for r in records:
+            a.add(r)
+        self.assertEqual(decode(a, a.results()), [(0, 10, {6: (30, 2, -1, 15.0), 17: (5, 1, 3, 5.0)}),
+                                                   (10, 20, {6: (1, 1, 0, 1.0)})])
+        self.assertEqual(decode(a, a.flush()), [(20, 30, {1: (3, 1, 0, 3.0)})])
+        self.assertEqual(a.late, 2)
+
+        # records delayed less than 10 s are accepted, the record at 3 s comes after 25 s
+        a = pytrap.Aggregator(t, ["PROTOCOL"], aggs, window=10, delay=10)
+        buf = b"".join(struct.pack("!H", len(r)) + r for r in records) + b"\x00\x01\x00"
+        a.addBuffer(buf)
+        self.assertEqual(a.late, 1)
+        self.assertEqual(decode(a, a.results()), [(0, 10, {6: (30, 2, -1, 15.0), 17: (12, 2, -4, 6.0)})])
+
+        # sliding windows
+        a = pytrap.Aggregator(t, [], {"SUM_PACKETS": ("sum", "PACKETS")}, window=10, step=5, delay=30, columns=True)
+        a.addMany(records)
+        windows = a.flush()
+        self.assertEqual([(s.getSeconds() - 1000, e.getSeconds() - 1000) for s, e, c in windows],
+                         [(-5, 5), (0, 10), (5, 15), (10, 20), (20, 30), (25, 35)])
+        self.assertEqual([struct.unpack("Q", bytes(c["SUM_PACKETS"]))[0] for s, e, c in windows],
+                         [135, 142, 8, 1, 3, 3])
+        self.assertEqual((a.late, a.partial_late), (0, 0))
+        # without delay, the record at 9 s misses the closed window 0-10 s, the record at 3 s is late
+        a = pytrap.Aggregator(t, [], {"SUM_PACKETS": ("sum", "PACKETS")}, window=10, step=5, columns=True)
+        a.addMany(records)
+        windows = a.flush()
+        self.assertEqual((a.late, a.partial_late), (1, 1))
+        self.assertEqual([(s.getSeconds() - 1000, e.getSeconds() - 1000, struct.unpack("Q", bytes(c["SUM_PACKETS"]))[0])
+                          for s, e, c in windows][:3], [(-5, 5, 35), (0, 10, 35), (5, 15, 8)])
+
+        with self.assertRaises(pytrap.TrapError):
+            pytrap.Aggregator(t, ["DST_PORT"], {})
+        with self.assertRaises(pytrap.TrapError):
+            a.add(b"\x00")
+        with self.assertRaises(TypeError):
+            pytrap.Aggregator(t, ["URL"], {})
+        with self.assertRaises(TypeError):
+            pytrap.Aggregator(t, ["PROTOCOL"], {"X": ("sum", "SRC_IP")})
+        # sum of uint32 would be truncated in PACKETS
+        with self.assertRaises(TypeError):
+            pytrap.Aggregator(t, ["PROTOCOL"], {"PACKETS": "sum"})
+        t.PACKETS = 3000000000
+        a = pytrap.Aggregator(t, [], {"SUM_PACKETS": ("sum", "PACKETS"), "MAX_PACKETS": ("max", "PACKETS")}, columns=True)
+        a.addMany([bytes(t.getData())] * 2)
+        c = a.flush()[0][2]
+        self.assertEqual(struct.unpack("Q", bytes(c["SUM_PACKETS"]))[0], 6000000000)
+        self.assertEqual(struct.unpack("I", bytes(c["MAX_PACKETS"]))[0], 3000000000)
+        with self.assertRaises(ValueError):
+            pytrap.Aggregator(t, ["PROTOCOL"], {"X": ("median", "PACKETS")})
+        with self.assertRaises(ValueError):
+            pytrap.Aggregator(t, ["PROTOCOL"], {"SUM_PACKETS": ("sum", "PACKETS")}, window=10, step=3)
+
 class DataTypesIPAddrRange(unittest.TestCase):
     def runTest(self):
         import pytrap
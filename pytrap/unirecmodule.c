@@ -8,6 +8,13 @@
 #include <unirec/unirec.h>
 #include <unistd.h>
 #include <getopt.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <arpa/inet.h>
+#include <ctype.h>
+#include <math.h>
 #include <stdio.h>
 #include <stdlib.h>
 
@@ -189,6 +196,177 @@ UnirecTime_format(pytrap_unirectime *self, PyObject *args)
     return result;
 }
 
+/*
+ * Bulk helpers working on packed arrays of ur_time_t (8B per timestamp
+ * in host byte order, e.g. array.array('Q') or result of
+ * UnirecTemplate.getColumn()).  Results are packed into a new bytearray.
+ */
+static int
+UnirecTime_get_array(PyObject *obj, Py_buffer *view)
+{
+    if (PyObject_GetBuffer(obj, view, PyBUF_SIMPLE) != 0) {
+        return -1;
+    }
+    if (view->len % sizeof(ur_time_t) != 0) {
+        PyBuffer_Release(view);
+        PyErr_SetString(PyExc_ValueError, "Length of packed timestamps must be a multiple of 8 bytes.");
+        return -1;
+    }
+    return 0;
+}
+
+static inline ur_time_t
+UnirecTime_array_item(const Py_buffer *view, Py_ssize_t i)
+{
+    ur_time_t t;
+    /* buffer does not have to be aligned (e.g. slice of bytes) */
+    memcpy(&t, (const char *) view->buf + i * sizeof(ur_time_t), sizeof(t));
+    return t;
+}
+
+static inline uint64_t
+UnirecTime_to_msec(ur_time_t t)
+{
+    return (uint64_t) ur_time_get_sec(t) * 1000 + ur_time_get_msec(t);
+}
+
+static PyObject *
+UnirecTime_arrayAsFloat(PyObject *self, PyObject *args)
+{
+    PyObject *timesObj, *result;
+    Py_buffer times;
+    Py_ssize_t i, count;
+    double *out;
+
+    if (!PyArg_ParseTuple(args, "O", &timesObj) || UnirecTime_get_array(timesObj, &times) != 0) {
+        return NULL;
+    }
+    count = times.len / sizeof(ur_time_t);
+
+    result = PyByteArray_FromStringAndSize(NULL, count * sizeof(double));
+    if (result != NULL) {
+        out = (double *) PyByteArray_AS_STRING(result);
+        for (i = 0; i < count; i++) {
+            ur_time_t t = UnirecTime_array_item(&times, i);
+            out[i] = (double) ur_time_get_sec(t) + (double) ur_time_get_msec(t) / 1000;
+        }
+    }
+    PyBuffer_Release(&times);
+    return result;
+}
+
+static PyObject *
+UnirecTime_arrayAsMiliSeconds(PyObject *self, PyObject *args)
+{
+    PyObject *timesObj, *result;
+    Py_buffer times;
+    Py_ssize_t i, count;
+    uint64_t *out;
+
+    if (!PyArg_ParseTuple(args, "O", &timesObj) || UnirecTime_get_array(timesObj, &times) != 0) {
+        return NULL;
+    }
+    count = times.len / sizeof(ur_time_t);
+
+    result = PyByteArray_FromStringAndSize(NULL, count * sizeof(uint64_t));
+    if (result != NULL) {
+        out = (uint64_t *) PyByteArray_AS_STRING(result);
+        for (i = 0; i < count; i++) {
+            out[i] = UnirecTime_to_msec(UnirecTime_array_item(&times, i));
+        }
+    }
+    PyBuffer_Release(&times);
+    return result;
+}
+
+static PyObject *
+UnirecTime_arrayDuration(PyObject *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *firstObj, *lastObj, *result = NULL;
+    Py_buffer first, last;
+    Py_ssize_t i, count;
+    int ms = 0;
+
+    static char *kwlist[] = {"first", "last", "ms", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "OO|i", kwlist, &firstObj, &lastObj, &ms)) {
+        return NULL;
+    }
+    if (UnirecTime_get_array(firstObj, &first) != 0) {
+        return NULL;
+    }
+    if (UnirecTime_get_array(lastObj, &last) != 0) {
+        PyBuffer_Release(&first);
+        return NULL;
+    }
+    if (first.len != last.len) {
+        PyErr_SetString(PyExc_ValueError, "Arrays of timestamps must have the same length.");
+        goto exit;
+    }
+    count = first.len / sizeof(ur_time_t);
+
+    /* int64_t and double have the same size */
+    result = PyByteArray_FromStringAndSize(NULL, count * sizeof(int64_t));
+    if (result == NULL) {
+        goto exit;
+    }
+    for (i = 0; i < count; i++) {
+        int64_t d = (int64_t) (UnirecTime_to_msec(UnirecTime_array_item(&last, i)) -
+                               UnirecTime_to_msec(UnirecTime_array_item(&first, i)));
+        if (ms) {
+            ((int64_t *) PyByteArray_AS_STRING(result))[i] = d;
+        } else {
+            ((double *) PyByteArray_AS_STRING(result))[i] = (double) d / 1000;
+        }
+    }
+
+exit:
+    PyBuffer_Release(&first);
+    PyBuffer_Release(&last);
+    return result;
+}
+
+static PyObject *
+UnirecTime_arrayWindow(PyObject *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *timesObj, *result;
+    Py_buffer times;
+    Py_ssize_t i, count;
+    double window, offset = 0;
+    int64_t win_ms, off_ms;
+    ur_time_t *out;
+
+    static char *kwlist[] = {"times", "window", "offset", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "Od|d", kwlist, &timesObj, &window, &offset)) {
+        return NULL;
+    }
+    win_ms = (int64_t) (window * 1000 + 0.5);
+    off_ms = (int64_t) (offset * 1000 + (offset < 0 ? -0.5 : 0.5));
+    if (win_ms <= 0) {
+        PyErr_SetString(PyExc_ValueError, "Window must be at least 1 ms.");
+        return NULL;
+    }
+    if (UnirecTime_get_array(timesObj, &times) != 0) {
+        return NULL;
+    }
+    count = times.len / sizeof(ur_time_t);
+
+    result = PyByteArray_FromStringAndSize(NULL, count * sizeof(ur_time_t));
+    if (result != NULL) {
+        out = (ur_time_t *) PyByteArray_AS_STRING(result);
+        for (i = 0; i < count; i++) {
+            int64_t t = (int64_t) UnirecTime_to_msec(UnirecTime_array_item(&times, i)) - off_ms;
+            int64_t start = t - t % win_ms;
+            if (t < 0 && start != t) {
+                start -= win_ms;
+            }
+            start += off_ms;
+            out[i] = ur_time_from_sec_msec(start / 1000, start % 1000);
+        }
+    }
+    PyBuffer_Release(&times);
+    return result;
+}
+
 static PyMethodDef pytrap_unirectime_methods[] = {
     {"fromDatetime", (PyCFunction) UnirecTime_fromDatetime, METH_STATIC | METH_VARARGS,
         "Get UnirecTime from a datetime object.\n\n"
@@ -227,6 +405,46 @@ static PyMethodDef pytrap_unirectime_methods[] = {
         "Returns:\n"
         "    (UnirecTime): Current date and time.\n"
     },
+    {"arrayAsFloat", (PyCFunction) UnirecTime_arrayAsFloat, METH_STATIC | METH_VARARGS,
+        "Convert packed timestamps into seconds, see getTimeAsFloat().\n\n"
+        "Args:\n"
+        "    times (bytes-like): Packed ur_time_t values (8B each, e.g. result of UnirecTemplate.getColumn()).\n\n"
+        "Returns:\n"
+        "    (bytearray): Packed doubles, use memoryview(result).cast(\"d\") to access them.\n\n"
+        "Raises:\n"
+        "    ValueError: Length of times is not a multiple of 8.\n"
+    },
+    {"arrayAsMiliSeconds", (PyCFunction) UnirecTime_arrayAsMiliSeconds, METH_STATIC | METH_VARARGS,
+        "Convert packed timestamps into milliseconds since the epoch.\n\n"
+        "Args:\n"
+        "    times (bytes-like): Packed ur_time_t values (8B each).\n\n"
+        "Returns:\n"
+        "    (bytearray): Packed uint64 values, use memoryview(result).cast(\"Q\") to access them.\n\n"
+        "Raises:\n"
+        "    ValueError: Length of times is not a multiple of 8.\n"
+    },
+    {"arrayDuration", (PyCFunction) UnirecTime_arrayDuration, METH_STATIC | METH_VARARGS | METH_KEYWORDS,
+        "Compute durations (last - first) of packed timestamps, e.g. TIME_LAST - TIME_FIRST.\n\n"
+        "Args:\n"
+        "    first (bytes-like): Packed ur_time_t values (8B each).\n"
+        "    last (bytes-like): Packed ur_time_t values of the same length as first.\n"
+        "    ms (Optional[bool]): Return milliseconds as int64 instead of seconds as double (default: False).\n\n"
+        "Returns:\n"
+        "    (bytearray): Packed doubles (\"d\") or int64 values (\"q\").\n\n"
+        "Raises:\n"
+        "    ValueError: Bad length of arrays.\n"
+    },
+    {"arrayWindow", (PyCFunction) UnirecTime_arrayWindow, METH_STATIC | METH_VARARGS | METH_KEYWORDS,
+        "Assign packed timestamps into fixed (tumbling) time windows.\n\n"
+        "Args:\n"
+        "    times (bytes-like): Packed ur_time_t values (8B each).\n"
+        "    window (float): Size of window in seconds (millisecond precision).\n"
+        "    offset (Optional[float]): Start of some window in seconds since the epoch (default: 0).\n\n"
+        "Returns:\n"
+        "    (bytearray): Packed ur_time_t values of the start of the window of each timestamp.\n\n"
+        "Raises:\n"
+        "    ValueError: Length of times is not a multiple of 8 or window is shorter than 1 ms.\n"
+    },
 
     {NULL, NULL, 0, NULL}
 };
@@ -458,13 +676,96 @@ typedef struct {
     ip_addr_t ip;
 } pytrap_unirecipaddr;
 
+/*
+ * Deallocated UnirecIPAddr objects are kept in a free-list and reused
+ * by the next allocation.  Reading IP fields from a stream of records
+ * therefore does not go through the memory allocator for every value.
+ * The link to the next free object is stored in the ip member.
+ */
+#define UNIRECIPADDR_FREELIST_MAX 1024
+
+static pytrap_unirecipaddr *UnirecIPAddr_freelist = NULL;
+static int UnirecIPAddr_freelist_size = 0;
+
+static PyObject *
+UnirecIPAddr_alloc(PyTypeObject *type, Py_ssize_t nitems)
+{
+    pytrap_unirecipaddr *o;
+
+    if (type != &pytrap_UnirecIPAddr || UnirecIPAddr_freelist == NULL) {
+        return PyType_GenericAlloc(type, nitems);
+    }
+
+    o = UnirecIPAddr_freelist;
+    memcpy(&UnirecIPAddr_freelist, &o->ip, sizeof(UnirecIPAddr_freelist));
+    UnirecIPAddr_freelist_size--;
+
+    memset(&o->ip, 0, sizeof(o->ip));
+    PyObject_Init((PyObject *) o, type);
+    return (PyObject *) o;
+}
+
+static void
+UnirecIPAddr_dealloc(pytrap_unirecipaddr *self)
+{
+    if (Py_TYPE(self) == &pytrap_UnirecIPAddr &&
+            UnirecIPAddr_freelist_size < UNIRECIPADDR_FREELIST_MAX) {
+        memcpy(&self->ip, &UnirecIPAddr_freelist, sizeof(UnirecIPAddr_freelist));
+        UnirecIPAddr_freelist = self;
+        UnirecIPAddr_freelist_size++;
+        return;
+    }
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static inline PyObject *
+UnirecIPAddr_from_ip(const ip_addr_t *ip)
+{
+    pytrap_unirecipaddr *new_ip = (pytrap_unirecipaddr *) pytrap_UnirecIPAddr.tp_alloc(&pytrap_UnirecIPAddr, 0);
+    if (new_ip == NULL) {
+        return NULL;
+    }
+    memcpy(&new_ip->ip, ip, sizeof(ip_addr_t));
+    return (PyObject *) new_ip;
+}
+
+/**
+ * \brief Create UnirecIPAddr object (used by other parts of pytrap).
+ *
+ * \param [in] ip    IP address
+ * \return New reference to UnirecIPAddr, NULL with exception set on error.
+ */
+PyObject *
+UnirecIPAddr_FromIP(const ip_addr_t *ip)
+{
+    return UnirecIPAddr_from_ip(ip);
+}
+
+/**
+ * \brief Get IP address of UnirecIPAddr object (used by other parts of pytrap).
+ *
+ * \param [in] obj   UnirecIPAddr object
+ * \param [out] ip   IP address
+ * \return 0 on success, -1 with TypeError set if obj is not UnirecIPAddr.
+ */
+int
+UnirecIPAddr_AsIP(PyObject *obj, ip_addr_t *ip)
+{
+    if (!PyObject_TypeCheck(obj, &pytrap_UnirecIPAddr)) {
+        PyErr_SetString(PyExc_TypeError, "UnirecIPAddr object expected.");
+        return -1;
+    }
+    memcpy(ip, &((pytrap_unirecipaddr *) obj)->ip, sizeof(ip_addr_t));
+    return 0;
+}
+
 static PyObject *
 UnirecIPAddr_compare(PyObject *a, PyObject *b, int op)
 {
     PyObject *result;
 
-    if (!PyObject_IsInstance(a, (PyObject *) &pytrap_UnirecIPAddr) ||
-             !PyObject_IsInstance(b, (PyObject *) &pytrap_UnirecIPAddr)) {
+    if (!PyObject_TypeCheck(a, &pytrap_UnirecIPAddr) ||
+             !PyObject_TypeCheck(b, &pytrap_UnirecIPAddr)) {
         result = Py_NotImplemented;
         goto out;
     }
@@ -595,7 +896,136 @@ UnirecIPAddr_dec(pytrap_unirecipaddr *self)
     return (PyObject *) ip_dec;
 }
 
+static PyObject *
+UnirecIPAddr_key(pytrap_unirecipaddr *self)
+{
+    return PyBytes_FromStringAndSize((const char *) &self->ip, sizeof(ip_addr_t));
+}
+
+static PyObject *
+UnirecIPAddr_fromBytes(PyObject *self, PyObject *args)
+{
+    Py_buffer buf;
+    ip_addr_t ip;
+
+#if PY_MAJOR_VERSION >= 3
+    if (!PyArg_ParseTuple(args, "y*", &buf)) {
+#else
+    if (!PyArg_ParseTuple(args, "s*", &buf)) {
+#endif
+        return NULL;
+    }
+
+    if (buf.len == 4) {
+        ip = ip_from_4_bytes_be((char *) buf.buf);
+    } else if (buf.len == 16) {
+        ip = ip_from_16_bytes_be((char *) buf.buf);
+    } else {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "Length of IP address must be 4 or 16 bytes.");
+        return NULL;
+    }
+    PyBuffer_Release(&buf);
+
+    return UnirecIPAddr_from_ip(&ip);
+}
+
+static PyObject *
+UnirecIPAddr_fromInt(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *value;
+    PyObject *ipv6 = NULL;
+    ip_addr_t ip;
+
+    static char *kwlist[] = {"value", "ipv6", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &value, &ipv6)) {
+        return NULL;
+    }
+    if (!PyLong_Check(value)
+#if PY_MAJOR_VERSION < 3
+            && !PyInt_Check(value)
+#endif
+       ) {
+        PyErr_SetString(PyExc_TypeError, "Argument value must be int.");
+        return NULL;
+    }
+
+    if (ipv6 == NULL || !PyObject_IsTrue(ipv6)) {
+        unsigned long long i = PyLong_AsUnsignedLongLong(value);
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+        if (i > 0xffffffffULL) {
+            PyErr_SetString(PyExc_OverflowError, "Value is too big for IPv4 address.");
+            return NULL;
+        }
+        ip = ip_from_int((uint32_t) i);
+    } else {
+        PyObject *shift, *high_obj;
+        unsigned long long high, low;
+
+        shift = PyLong_FromLong(64);
+        if (shift == NULL) {
+            return NULL;
+        }
+        high_obj = PyNumber_Rshift(value, shift);
+        Py_DECREF(shift);
+        if (high_obj == NULL) {
+            return NULL;
+        }
+        high = PyLong_AsUnsignedLongLong(high_obj);
+        Py_DECREF(high_obj);
+        if (PyErr_Occurred()) {
+            if (PyErr_ExceptionMatches(PyExc_OverflowError)) {
+                PyErr_SetString(PyExc_OverflowError, "Value is not a valid IPv6 address.");
+            }
+            return NULL;
+        }
+        low = PyLong_AsUnsignedLongLongMask(value);
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+        ip.ui32[0] = htonl((uint32_t) (high >> 32));
+        ip.ui32[1] = htonl((uint32_t) high);
+        ip.ui32[2] = htonl((uint32_t) (low >> 32));
+        ip.ui32[3] = htonl((uint32_t) low);
+    }
+
+    return UnirecIPAddr_from_ip(&ip);
+}
+
 static PyMethodDef pytrap_unirecipaddr_methods[] = {
+    {"fromBytes", (PyCFunction) UnirecIPAddr_fromBytes, METH_STATIC | METH_VARARGS,
+        "Create UnirecIPAddr from packed address in network byte order.\n\n"
+        "Args:\n"
+        "    data (bytes): 4 bytes of IPv4 or 16 bytes of IPv6 address (any object supporting buffer protocol, e.g. an item of parseIPs() result).\n\n"
+        "Returns:\n"
+        "    UnirecIPAddr: New IP address.\n\n"
+        "Raises:\n"
+        "    ValueError: Bad length of data.\n"
+        },
+
+    {"fromInt", (PyCFunction) UnirecIPAddr_fromInt, METH_STATIC | METH_VARARGS | METH_KEYWORDS,
+        "Create UnirecIPAddr from integer.\n\n"
+        "Args:\n"
+        "    value (int): Address as a number in host byte order.\n"
+        "    ipv6 (Optional[bool]): Interpret value as IPv6 address (default: False).\n\n"
+        "Returns:\n"
+        "    UnirecIPAddr: New IP address.\n\n"
+        "Raises:\n"
+        "    OverflowError: Value does not fit into the address.\n"
+        },
+
+    {"key", (PyCFunction) UnirecIPAddr_key, METH_NOARGS,
+        "Get the address as bytes with the same ordering as UnirecIPAddr.\n\n"
+        "Comparison of the keys is done by memcmp() so it is cheaper than\n"
+        "comparison of UnirecIPAddr objects, use it e.g. as\n"
+        "sorted(ips, key=pytrap.UnirecIPAddr.key) or as a key of sorted containers.\n"
+        "UnirecIPAddr.fromBytes(key) returns the original address.\n\n"
+        "Returns:\n"
+        "    bytes: 16B internal representation of the address.\n"
+        },
+
     {"isIPv4", (PyCFunction) UnirecIPAddr_isIPv4, METH_NOARGS,
         "Check if the address is IPv4.\n\n"
         "Returns:\n"
@@ -680,14 +1110,92 @@ UnirecIPAddr_str(pytrap_unirecipaddr *self)
 #endif
 }
 
+/*
+ * Final mixing step of MurmurHash3, every input bit affects every output bit.
+ */
+static inline uint64_t
+UnirecIPAddr_fmix64(uint64_t k)
+{
+    k ^= k >> 33;
+    k *= 0xff51afd7ed558ccdULL;
+    k ^= k >> 33;
+    k *= 0xc4ceb9fe1a85ec53ULL;
+    k ^= k >> 33;
+    return k;
+}
+
 long
 UnirecIPAddr_hash(pytrap_unirecipaddr *o)
 {
-    if (ip_is4(&o->ip)) {
-        return (long) o->ip.ui32[2];
-    } else {
-        return (long) (o->ip.ui64[0] ^ o->ip.ui64[1]);
+    /*
+     * Python dict uses the lowest bits of the hash as an index, the raw
+     * address bytes (the first octet in case of IPv4, the prefix in case
+     * of IPv6 from a single network) must be mixed into them.
+     * Both steps are bijective so distinct IPv4 addresses never collide.
+     */
+    uint64_t h = UnirecIPAddr_fmix64(o->ip.ui64[1] ^ (o->ip.ui64[0] * 0x9e3779b97f4a7c15ULL));
+    long res = (long) h;
+
+    /* -1 is reserved for errors */
+    if (res == -1) {
+        res = -2;
+    }
+    return res;
+}
+
+PyObject *
+pytrap_parseIPs(PyObject *self, PyObject *args)
+{
+    PyObject *list, *seq, *result;
+    Py_ssize_t i, count;
+    ip_addr_t *ips;
+
+    if (!PyArg_ParseTuple(args, "O", &list)) {
+        return NULL;
+    }
+    seq = PySequence_Fast(list, "Argument must be an iterable of str.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PySequence_Fast_GET_SIZE(seq);
+
+    result = PyByteArray_FromStringAndSize(NULL, count * sizeof(ip_addr_t));
+    if (result == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    ips = (ip_addr_t *) PyByteArray_AS_STRING(result);
+
+    for (i = 0; i < count; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
+        const char *ip_str;
+#if PY_MAJOR_VERSION >= 3
+        if (PyUnicode_Check(item)) {
+            ip_str = PyUnicode_AsUTF8(item);
+        } else
+#endif
+        if (PyBytes_Check(item)) {
+            ip_str = PyBytes_AS_STRING(item);
+        } else {
+            PyErr_Format(PyExc_TypeError, "Item %zd is not a string.", i);
+            goto failure;
+        }
+        if (ip_str == NULL) {
+            goto failure;
+        }
+        if (ip_from_str(ip_str, &ips[i]) != 1) {
+            PyErr_Format(TrapError, "Could not parse IP address '%s' (item %zd).", ip_str, i);
+            goto failure;
+        }
     }
+
+    Py_DECREF(seq);
+    return result;
+
+failure:
+    Py_DECREF(seq);
+    Py_DECREF(result);
+    return NULL;
 }
 
 static PyTypeObject pytrap_UnirecIPAddr = {
@@ -695,7 +1203,7 @@ static PyTypeObject pytrap_UnirecIPAddr = {
     "pytrap.UnirecIPAddr",          /* tp_name */
     sizeof(pytrap_unirecipaddr),    /* tp_basicsize */
     0,                         /* tp_itemsize */
-    0,                         /* tp_dealloc */
+    (destructor) UnirecIPAddr_dealloc, /* tp_dealloc */
     0,                         /* tp_print */
     0,                         /* tp_getattr */
     0,                         /* tp_setattr */
@@ -728,7 +1236,7 @@ static PyTypeObject pytrap_UnirecIPAddr = {
     0,                         /* tp_descr_set */
     0,                         /* tp_dictoffset */
     (initproc) UnirecIPAddr_init,                         /* tp_init */
-    0,                         /* tp_alloc */
+    UnirecIPAddr_alloc,        /* tp_alloc */
     PyType_GenericNew,         /* tp_new */
 };
 
@@ -752,13 +1260,13 @@ typedef struct {
 } pytrap_unirectemplate;
 
 static inline PyObject *
-UnirecTemplate_get_local(pytrap_unirectemplate *self, char *data, int32_t field_id)
+UnirecTemplate_get_value(const ur_template_t *tmplt, char *data, int32_t field_id)
 {
     if (data == NULL) {
         PyErr_SetString(TrapError, "Data was not set yet.");
         return NULL;
     }
-    void *value = ur_get_ptr_by_id(self->urtmplt, data, field_id);
+    void *value = ur_get_ptr_by_id(tmplt, data, field_id);
 
     switch (ur_get_type(field_id)) {
     case UR_TYPE_UINT8:
@@ -796,9 +1304,7 @@ UnirecTemplate_get_local(pytrap_unirectemplate *self, char *data, int32_t field_
         break;
     case UR_TYPE_IP:
         {
-            pytrap_unirecipaddr *new_ip = (pytrap_unirecipaddr *) pytrap_UnirecIPAddr.tp_alloc(&pytrap_UnirecIPAddr, 0);
-            memcpy(&new_ip->ip, value, sizeof(ip_addr_t));
-            return (PyObject *) new_ip;
+            return UnirecIPAddr_from_ip((ip_addr_t *) value);
         }
     case UR_TYPE_TIME:
         {
@@ -808,7 +1314,7 @@ UnirecTemplate_get_local(pytrap_unirectemplate *self, char *data, int32_t field_
         }
     case UR_TYPE_STRING:
         {
-            Py_ssize_t value_size = ur_get_var_len(self->urtmplt, data, field_id);
+            Py_ssize_t value_size = ur_get_var_len(tmplt, data, field_id);
 #if PY_MAJOR_VERSION >= 3
             return PyUnicode_FromStringAndSize(value, value_size);
 #else
@@ -818,7 +1324,7 @@ UnirecTemplate_get_local(pytrap_unirectemplate *self, char *data, int32_t field_
         break;
     case UR_TYPE_BYTES:
         {
-            Py_ssize_t value_size = ur_get_var_len(self->urtmplt, data, field_id);
+            Py_ssize_t value_size = ur_get_var_len(tmplt, data, field_id);
             return PyByteArray_FromStringAndSize(value, value_size);
         }
         break;
@@ -829,6 +1335,12 @@ UnirecTemplate_get_local(pytrap_unirectemplate *self, char *data, int32_t field_
     Py_RETURN_NONE;
 }
 
+static inline PyObject *
+UnirecTemplate_get_local(pytrap_unirectemplate *self, char *data, int32_t field_id)
+{
+    return UnirecTemplate_get_value(self->urtmplt, data, field_id);
+}
+
 static PyObject *
 UnirecTemplate_getByID(pytrap_unirectemplate *self, PyObject *args, PyObject *keywds)
 {
@@ -910,22 +1422,91 @@ UnirecTemplate_getByName(pytrap_unirectemplate *self, PyObject *args, PyObject *
     return UnirecTemplate_get_local(self, data, field_id);
 }
 
-static inline PyObject *
-UnirecTemplate_set_local(pytrap_unirectemplate *self, char *data, int32_t field_id, PyObject *valueObj)
+static PyObject *
+UnirecTemplate_getColumn(pytrap_unirectemplate *self, PyObject *args, PyObject *keywds)
 {
-    if (data == NULL) {
-        PyErr_SetString(TrapError, "Data was not set yet.");
+    int32_t field_id;
+    PyObject *records, *field_name, *seq, *result;
+    Py_ssize_t i, count, size, min_size;
+    char *out;
+
+    static char *kwlist[] = {"records", "field_name", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "OO", kwlist, &records, &field_name)) {
         return NULL;
     }
-    PY_LONG_LONG longval;
-    double floatval;
-    void *value = ur_get_ptr_by_id(self->urtmplt, data, field_id);
 
-    switch (ur_get_type(field_id)) {
-    case UR_TYPE_UINT8:
-        longval = PyLong_AsLong(valueObj);
-        if (PyErr_Occurred() == NULL) {
-            *((uint8_t *) value) = (uint8_t) longval;
+    field_id = UnirecTemplate_get_field_id(self, field_name);
+    if (field_id == UR_ITER_END) {
+        PyErr_SetString(TrapError, "Field was not found.");
+        return NULL;
+    }
+    if (ur_is_varlen(field_id)) {
+        PyErr_SetString(PyExc_TypeError, "Only fields with fixed length are supported.");
+        return NULL;
+    }
+    size = ur_get_size(field_id);
+    min_size = ur_rec_fixlen_size(self->urtmplt);
+
+    seq = PySequence_Fast(records, "Argument records must be an iterable of bytes or bytearray.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PySequence_Fast_GET_SIZE(seq);
+
+    result = PyByteArray_FromStringAndSize(NULL, count * size);
+    if (result == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    out = PyByteArray_AS_STRING(result);
+
+    for (i = 0; i < count; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
+        char *data;
+        Py_ssize_t data_size;
+
+        if (PyByteArray_Check(item)) {
+            data = PyByteArray_AS_STRING(item);
+            data_size = PyByteArray_GET_SIZE(item);
+        } else if (PyBytes_Check(item)) {
+            data = PyBytes_AS_STRING(item);
+            data_size = PyBytes_GET_SIZE(item);
+        } else {
+            PyErr_SetString(PyExc_TypeError, "Argument records must be an iterable of bytes or bytearray.");
+            goto failure;
+        }
+        if (data_size < min_size) {
+            PyErr_Format(TrapError, "Record %zd is shorter than the template.", i);
+            goto failure;
+        }
+        memcpy(out + i * size, ur_get_ptr_by_id(self->urtmplt, data, field_id), size);
+    }
+
+    Py_DECREF(seq);
+    return result;
+
+failure:
+    Py_DECREF(seq);
+    Py_DECREF(result);
+    return NULL;
+}
+
+static inline PyObject *
+UnirecTemplate_set_local(pytrap_unirectemplate *self, char *data, int32_t field_id, PyObject *valueObj)
+{
+    if (data == NULL) {
+        PyErr_SetString(TrapError, "Data was not set yet.");
+        return NULL;
+    }
+    PY_LONG_LONG longval;
+    double floatval;
+    void *value = ur_get_ptr_by_id(self->urtmplt, data, field_id);
+
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_UINT8:
+        longval = PyLong_AsLong(valueObj);
+        if (PyErr_Occurred() == NULL) {
+            *((uint8_t *) value) = (uint8_t) longval;
         }
         break;
     case UR_TYPE_UINT16:
@@ -1056,6 +1637,69 @@ UnirecTemplate_set_local(pytrap_unirectemplate *self, char *data, int32_t field_
     Py_RETURN_NONE;
 }
 
+static PyObject *
+UnirecTemplate_getFieldsBytes(pytrap_unirectemplate *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *fields, *dataObj = NULL, *seq, *result;
+    char *data = self->data, *p;
+    Py_ssize_t data_size, i, n, size = 0;
+    uint16_t field_size;
+    int32_t field_id;
+
+    static char *kwlist[] = {"fields", "data", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "O|O", kwlist, &fields, &dataObj)) {
+        return NULL;
+    }
+
+    if (dataObj != NULL) {
+        if (PyByteArray_Check(dataObj)) {
+            data = PyByteArray_AsString(dataObj);
+        } else if (PyBytes_Check(dataObj)) {
+            PyBytes_AsStringAndSize(dataObj, &data, &data_size);
+        } else {
+            PyErr_SetString(PyExc_TypeError, "Argument data must be of bytes or bytearray type.");
+            return NULL;
+        }
+    }
+    if (data == NULL) {
+        PyErr_SetString(TrapError, "Data was not set yet.");
+        return NULL;
+    }
+
+    seq = PySequence_Fast(fields, "Argument fields must be a sequence of field names.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    n = PySequence_Fast_GET_SIZE(seq);
+    for (i = 0; i < n; i++) {
+        field_id = UnirecTemplate_get_field_id(self, PySequence_Fast_GET_ITEM(seq, i));
+        if (field_id == UR_ITER_END || !ur_is_present(self->urtmplt, field_id)) {
+            Py_DECREF(seq);
+            PyErr_SetString(TrapError, "Field was not found.");
+            return NULL;
+        }
+        if (ur_is_varlen(field_id)) {
+            Py_DECREF(seq);
+            PyErr_SetString(PyExc_TypeError, "Only fields of fixed size can be used.");
+            return NULL;
+        }
+        size += ur_get_size(field_id);
+    }
+
+    result = PyBytes_FromStringAndSize(NULL, size);
+    if (result != NULL) {
+        p = PyBytes_AS_STRING(result);
+        for (i = 0; i < n; i++) {
+            field_id = UnirecTemplate_get_field_id(self, PySequence_Fast_GET_ITEM(seq, i));
+            field_size = ur_get_size(field_id);
+            memcpy(p, ur_get_ptr_by_id(self->urtmplt, data, field_id), field_size);
+            p += field_size;
+        }
+    }
+    Py_DECREF(seq);
+    return result;
+}
+
 static PyObject *
 UnirecTemplate_getData(pytrap_unirectemplate *self)
 {
@@ -1429,297 +2073,572 @@ UnirecTemplate_recSize(pytrap_unirectemplate *self, PyObject *args, PyObject *ke
     return Py_BuildValue("H", rec_size);
 }
 
-static PyMethodDef pytrap_unirectemplate_methods[] = {
-        {"getFieldType", (PyCFunction) UnirecTemplate_getFieldType, METH_VARARGS,
-            "Get type of given field.\n\n"
-            "Args:\n"
-            "    field_name (str): Field name.\n\n"
-            "Returns:\n"
-            "    type: Type object (e.g. int, str or pytrap.UnirecIPAddr).\n"
-        },
+/*********************/
+/*  UnirecCopyPlan   */
+/*********************/
 
-        {"getByID", (PyCFunction) UnirecTemplate_getByID, METH_VARARGS | METH_KEYWORDS,
-            "Get value of the field from the UniRec message.\n\n"
-            "Args:\n"
-            "    data (bytearray or bytes): Data - UniRec message.\n"
-            "    field_id (int): Field ID (use getFieldsDict()).\n"
-            "Returns:\n"
-            "    (object): Retrieved value of the field (depends on UniRec template).\n\n"
-            "Raises:\n"
-            "    TypeError: Data argument must be bytearray or bytes.\n"
-        },
+typedef struct {
+    PyObject_HEAD
+    ur_copy_plan_t *plan;
+    PyObject *src; // Source UnirecTemplate, it keeps the template of the plan
+    PyObject *dst; // Destination UnirecTemplate
+} pytrap_unireccopyplan;
 
-        {"get", (PyCFunction) UnirecTemplate_getByName, METH_VARARGS | METH_KEYWORDS,
-            "Get value of the field from the UniRec message.\n\n"
-            "Args:\n"
-            "    data (bytearray or bytes): Data - UniRec message.\n"
-            "    field_name (str): Field name.\n"
-            "Returns:\n"
-            "    (object): Retrieved value of the field (depends on UniRec template).\n\n"
-            "Raises:\n"
-            "    TypeError: Data argument must be bytearray or bytes.\n"
-            "    TrapError: Field name was not found.\n"
-        },
+static PyTypeObject pytrap_UnirecCopyPlan;
 
-        {"setByID", (PyCFunction) UnirecTemplate_setByID, METH_VARARGS | METH_KEYWORDS,
-            "Set value of the field in the UniRec message.\n\n"
-            "Args:\n"
-            "    data (bytearray or bytes): Data - UniRec message.\n"
-            "    field_id (int): Field ID.\n"
-            "    value (object): New value of the field (depends on UniRec template).\n\n"
-            "Raises:\n"
-            "    TypeError: Bad object type of value was given.\n"
-            "    TrapError: Field was not found.\n"
-        },
+static void
+UnirecCopyPlan_dealloc(pytrap_unireccopyplan *self)
+{
+    ur_free_copy_plan(self->plan);
+    Py_XDECREF(self->src);
+    Py_XDECREF(self->dst);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
 
-        {"set", (PyCFunction) UnirecTemplate_set, METH_VARARGS | METH_KEYWORDS,
-            "Set value of the field in the UniRec message.\n\n"
-            "Args:\n"
-            "    data (bytearray or bytes): Data - UniRec message.\n"
-            "    field_name (str): Field name.\n"
-            "    value (object): New value of the field (depends on UniRec template).\n\n"
-            "Raises:\n"
-            "    TypeError: Bad object type of value was given.\n"
-            "    TrapError: Field was not found.\n"
-        },
+/**
+ * \brief Check that the source record lies in its buffer.
+ *
+ * \return 0 on success, -1 with exception set otherwise
+ */
+static int
+UnirecCopyPlan_check_src(pytrap_unireccopyplan *self, const Py_buffer *src)
+{
+    const ur_template_t *tmplt = self->plan->src_tmplt;
+    int i;
 
-        {"getData", (PyCFunction) UnirecTemplate_getData, METH_NOARGS,
-            "Get data that was already set using setData.\n\n"
-            "Returns:\n"
-            "    bytearray: Data - UniRec message.\n"
-        },
+    if (src->len < tmplt->static_size) {
+        PyErr_SetString(PyExc_ValueError, "Source data is too short.");
+        return -1;
+    }
+    for (i = 0; i < self->plan->var_count; i++) {
+        ur_field_id_t id = self->plan->var_ids[i];
+        if (tmplt->static_size + ur_get_var_offset(tmplt, src->buf, id) + ur_get_var_len(tmplt, src->buf, id) > src->len) {
+            PyErr_SetString(PyExc_ValueError, "Source data is too short.");
+            return -1;
+        }
+    }
+    return 0;
+}
 
-        {"setData", (PyCFunction) UnirecTemplate_setData, METH_VARARGS | METH_KEYWORDS,
-            "Set data for attribute access.\n\n"
-            "Args:\n"
-            "    data (bytearray or bytes): Data - UniRec message.\n"
-        },
+/**
+ * \brief Copy fields of the source record into the destination buffer.
+ *
+ * \return Size of destination record, -1 with exception set on error.
+ */
+static Py_ssize_t
+UnirecCopyPlan_copy(pytrap_unireccopyplan *self, const Py_buffer *src, Py_buffer *dst)
+{
+    const ur_template_t *tmplt = self->plan->dst_tmplt;
+    uint32_t size;
 
-        {"getFieldsDict", (PyCFunction) UnirecTemplate_getFieldsDict, METH_NOARGS,
-            "Get set of fields of the template.\n\n"
-            "Returns:\n"
-            "    Dict(str,int): Dictionary of field_id with field name as a key.\n"
-        },
+    if (UnirecCopyPlan_check_src(self, src) != 0) {
+        return -1;
+    }
+    if (dst->len < tmplt->static_size ||
+        (!self->plan->var_all && ur_rec_size(tmplt, dst->buf) > dst->len)) {
+        PyErr_SetString(PyExc_ValueError, "Destination data is too short.");
+        return -1;
+    }
+    size = ur_copy_plan_dst_size(self->plan, dst->buf, src->buf);
+    if (size > dst->len || size > UR_MAX_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "Destination data is too short for the copied fields.");
+        return -1;
+    }
+    ur_copy_fields_by_plan(self->plan, dst->buf, src->buf);
+    return size;
+}
 
-        {"createMessage", (PyCFunction) UnirecTemplate_createMessage, METH_VARARGS | METH_KEYWORDS,
-            "Create a message that can be filled in with values according to the template.\n\n"
-            "Args:\n"
-            "    dyn_size (Optional[int]): Maximal size of variable data (in total) (default: 0).\n\n"
-            "Returns:\n"
-            "    bytearray: Allocated memory that can be filled in using set().\n"
-        },
+static PyObject *
+UnirecCopyPlan_apply(pytrap_unireccopyplan *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *srcObj, *dstObj;
+    Py_buffer src, dst;
+    Py_ssize_t size;
 
-        {"copy", (PyCFunction) UnirecTemplate_copy, METH_NOARGS,
-            "Create a new instance with the same format specifier without data.\n\n"
-            "Returns:\n"
-            "    UnirecTemplate: New copy of object (not just reference).\n"
-        },
+    static char *kwlist[] = {"src", "dst", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "OO", kwlist, &srcObj, &dstObj)) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(srcObj, &src, PyBUF_SIMPLE) != 0) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(dstObj, &dst, PyBUF_WRITABLE) != 0) {
+        PyBuffer_Release(&src);
+        return NULL;
+    }
+    size = UnirecCopyPlan_copy(self, &src, &dst);
+    PyBuffer_Release(&dst);
+    PyBuffer_Release(&src);
+    if (size < 0) {
+        return NULL;
+    }
+    return PyLong_FromSsize_t(size);
+}
 
-        {"strRecord", (PyCFunction) UnirecTemplate_strRecord, METH_NOARGS,
-            "Get values of record in readable format.\n\n"
-            "Returns:\n"
-            "    str: String in key=value format.\n"
-        },
+static PyObject *
+UnirecCopyPlan_applyMany(pytrap_unireccopyplan *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *records, *seq, *result, *rec;
+    Py_buffer src, dst;
+    Py_ssize_t i, n, size, dyn_size = 0;
+    const ur_template_t *dst_tmplt = self->plan->dst_tmplt;
 
-        {"recSize", (PyCFunction) UnirecTemplate_recSize, METH_VARARGS | METH_KEYWORDS,
-            "Get size of UniRec record.\n\n"
-            "Return total size of valid record data, i.e. number of bytes occupied by all fields."
-            "This may be less than allocated size of 'data'.\n"
-            "Args:\n"
-            "    data (Optional[bytearray or bytes]): Data of UniRec message (optional if previously set by setData)"
-            "Returns:\n"
-            "    int: Size of record data in bytes\n"
-        },
+    static char *kwlist[] = {"records", "dyn_size", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "O|n", kwlist, &records, &dyn_size)) {
+        return NULL;
+    }
+    if (dyn_size < 0) {
+        PyErr_SetString(PyExc_ValueError, "dyn_size must not be negative.");
+        return NULL;
+    }
+    seq = PySequence_Fast(records, "Argument records must be a sequence of UniRec messages.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    n = PySequence_Fast_GET_SIZE(seq);
+    result = PyList_New(n);
+    for (i = 0; result != NULL && i < n; i++) {
+        if (PyObject_GetBuffer(PySequence_Fast_GET_ITEM(seq, i), &src, PyBUF_SIMPLE) != 0) {
+            Py_CLEAR(result);
+            break;
+        }
+        if (src.len < self->plan->src_tmplt->static_size) {
+            PyErr_SetString(PyExc_ValueError, "Source data is too short.");
+            PyBuffer_Release(&src);
+            Py_CLEAR(result);
+            break;
+        }
+        /* the source variable-length data is the upper bound of the copied data */
+        rec = PyByteArray_FromStringAndSize(NULL, dst_tmplt->static_size + (src.len - self->plan->src_tmplt->static_size));
+        if (rec == NULL || PyObject_GetBuffer(rec, &dst, PyBUF_WRITABLE) != 0) {
+            Py_XDECREF(rec);
+            PyBuffer_Release(&src);
+            Py_CLEAR(result);
+            break;
+        }
+        memset(dst.buf, 0, dst.len);
+        size = UnirecCopyPlan_copy(self, &src, &dst);
+        PyBuffer_Release(&dst);
+        PyBuffer_Release(&src);
+        if (size < 0) {
+            Py_DECREF(rec);
+            Py_CLEAR(result);
+            break;
+        }
+        if (PyByteArray_Resize(rec, size + dyn_size) != 0) {
+            Py_DECREF(rec);
+            Py_CLEAR(result);
+            break;
+        }
+        if (dyn_size > 0) {
+            memset(PyByteArray_AS_STRING(rec) + size, 0, dyn_size);
+        }
+        PyList_SET_ITEM(result, i, rec);
+    }
+    Py_DECREF(seq);
+    return result;
+}
 
-        {"recFixlenSize", (PyCFunction) UnirecTemplate_recFixlenSize, METH_NOARGS,
-            "Get size of fixed part of UniRec record.\n\n"
-            "This is the minimal size of a record with given template,"
-            "i.e. the size with all variable-length fields empty.\n"
-            "Returns:\n"
-            "    int: Size of fixed part of template in bytes\n"
+static PyMethodDef UnirecCopyPlan_methods[] = {
+    {"apply", (PyCFunction) UnirecCopyPlan_apply, METH_VARARGS | METH_KEYWORDS,
+        "Copy fields of a source record into a destination record.\n\n"
+        "Fields of the destination record that are not in the source template keep their values.\n\n"
+        "Args:\n"
+        "    src (bytes or bytearray): Source UniRec message.\n"
+        "    dst (bytearray): Destination UniRec message (e.g. from createMessage()).\n\n"
+        "Returns:\n"
+        "    int: Size of the destination record.\n\n"
+        "Raises:\n"
+        "    ValueError: Source data is too short or destination data has no space for copied fields.\n"
         },
 
-
-        {"recVarlenSize", (PyCFunction) UnirecTemplate_recVarlenSize, METH_VARARGS | METH_KEYWORDS,
-            "Get size of variable-length part of UniRec record.\n\n"
-            "Return total size of all variable-length fields.\n"
-            "Args:\n"
-            "    data (Optional[bytearray or bytes]): Data of UniRec message (optional if previously set by setData)"
-            "Returns:\n"
-            "    int: Total size of variable-length fields in bytes\n"
+    {"applyMany", (PyCFunction) UnirecCopyPlan_applyMany, METH_VARARGS | METH_KEYWORDS,
+        "Create destination records with fields of source records.\n\n"
+        "Fields that are not in the source template are zero (empty).\n\n"
+        "Args:\n"
+        "    records (sequence): Source UniRec messages (e.g. from recvBulk()).\n"
+        "    dyn_size (Optional[int]): Space for variable-length data set afterwards (default: 0).\n\n"
+        "Returns:\n"
+        "    list(bytearray): Destination UniRec messages.\n\n"
+        "Raises:\n"
+        "    ValueError: Source data is too short.\n"
         },
 
-        {NULL, NULL, 0, NULL}
+    {NULL, NULL, 0, NULL}
 };
 
-static PyObject *
-UnirecTemplate_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
-{
-    pytrap_unirectemplate *self;
-    const char *spec;
-    // TODO return error string of failure during unirec template init
-    //char *errstring;
+static PyMemberDef UnirecCopyPlan_members[] = {
+    {"src", T_OBJECT_EX, offsetof(pytrap_unireccopyplan, src), READONLY, "Source UnirecTemplate."},
+    {"dst", T_OBJECT_EX, offsetof(pytrap_unireccopyplan, dst), READONLY, "Destination UnirecTemplate."},
+    {NULL}  /* Sentinel */
+};
 
-    self = (pytrap_unirectemplate *) type->tp_alloc(type, 0);
-    if (self != NULL) {
-        static char *kwlist[] = {"spec", NULL};
-        if (!PyArg_ParseTupleAndKeywords(args, kwds, "s", kwlist, &spec)) {
-            Py_DECREF(self);
-            return NULL;
-        }
-        self->urtmplt = NULL;
-        int ret;
-        if ((ret = ur_define_set_of_fields(spec)) != UR_OK) {
-            PyErr_SetString(TrapError, "ur_define_set_of_fields() failed.");
-            Py_DECREF(self);
-            return NULL;
-        }
-        /* XXX errstring */
-        //self->urtmplt = ur_create_template(spec, &errstring);
-        self->urtmplt = ur_create_template_from_ifc_spec(spec);
-        if (self->urtmplt == NULL) {
-            //PyErr_SetString(TrapError, errstring);
-            PyErr_SetString(TrapError, "Creation of UniRec template failed.");
-            //free(errstring);
-            Py_DECREF(self);
-            return NULL;
-        }
-        self = UnirecTemplate_init(self);
+static PyTypeObject pytrap_UnirecCopyPlan = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.UnirecCopyPlan",   /* tp_name */
+    sizeof(pytrap_unireccopyplan), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) UnirecCopyPlan_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    0,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "Precomputed copying of fields between records of two templates.\n\n"
+    "It is created by UnirecTemplate.copyPlan(), adjacent fields of fixed size\n"
+    "are copied at once and variable-length fields are copied after them.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    UnirecCopyPlan_methods,    /* tp_methods */
+    UnirecCopyPlan_members,    /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    0,                         /* tp_new */
+};
+
+static PyObject *
+UnirecTemplate_copyPlan(pytrap_unirectemplate *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *other;
+    pytrap_unireccopyplan *plan;
+
+    static char *kwlist[] = {"other", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "O!", kwlist, &pytrap_UnirecTemplate, &other)) {
+        return NULL;
+    }
+    plan = (pytrap_unireccopyplan *) pytrap_UnirecCopyPlan.tp_alloc(&pytrap_UnirecCopyPlan, 0);
+    if (plan == NULL) {
+        return NULL;
+    }
+    plan->plan = ur_create_copy_plan(((pytrap_unirectemplate *) other)->urtmplt, self->urtmplt);
+    if (plan->plan == NULL) {
+        Py_DECREF(plan);
+        return PyErr_NoMemory();
     }
+    Py_INCREF(self);
+    plan->src = (PyObject *) self;
+    Py_INCREF(other);
+    plan->dst = other;
+    return (PyObject *) plan;
+}
 
-    return (PyObject *) self;
+/*********************/
+/* UnirecProjection  */
+/*********************/
+
+/*
+ * Read-only view of selected fields of UniRec records.  It keeps offsets of
+ * the selected fields only (in a sparse ur_template_t), so that its size and
+ * the cost of access do not depend on the number of fields in the format.
+ */
+typedef struct {
+    PyObject_HEAD
+    ur_template_t tmplt; // offset table covers IDs of the selected fields only
+    PyObject *fields; // Tuple of names of the selected fields
+    char *data;
+    Py_ssize_t data_size;
+    PyObject *data_obj; // Pointer to object containing the data we are pointing to
+} pytrap_unirecprojection;
+
+static PyTypeObject pytrap_UnirecProjection;
+
+static void
+UnirecProjection_dealloc(pytrap_unirecprojection *self)
+{
+    free(self->tmplt.offset);
+    free(self->tmplt.ids);
+    Py_XDECREF(self->fields);
+    Py_XDECREF(self->data_obj);
+    Py_TYPE(self)->tp_free((PyObject *) self);
 }
 
-static void UnirecTemplate_dealloc(pytrap_unirectemplate *self)
+/**
+ * \brief Take offsets of the selected fields from the template.
+ *
+ * \return 0 on success, -1 with exception set if some field is missing
+ */
+static int
+UnirecProjection_set_template(pytrap_unirecprojection *self, const ur_template_t *tmplt)
 {
-    if (self->urdict) {
-        Py_DECREF(self->urdict);
+    int i;
+
+    for (i = 0; i < self->tmplt.count; i++) {
+        if (!ur_is_present(tmplt, self->tmplt.ids[i])) {
+            PyErr_Format(TrapError, "Field %s was not found.", ur_get_name(self->tmplt.ids[i]));
+            return -1;
+        }
     }
-    if (self->urtmplt) {
-        ur_free_template(self->urtmplt);
+    for (i = 0; i < self->tmplt.count; i++) {
+        self->tmplt.offset[self->tmplt.ids[i]] = tmplt->offset[self->tmplt.ids[i]];
     }
-    Py_XDECREF(self->data_obj); // Allow to free the original data object
-    Py_TYPE(self)->tp_free((PyObject *) self);
+    self->tmplt.static_size = tmplt->static_size;
+    return 0;
 }
 
-PyObject *
-UnirecTemplate_str(pytrap_unirectemplate *self)
+/**
+ * \brief Get data of a record (the given object or the data set by setData()).
+ *
+ * The fixed part of the record and the selected variable-length fields must
+ * be within the data.
+ * \return Pointer to the data, NULL with exception set on error.
+ */
+static char *
+UnirecProjection_get_data(pytrap_unirecprojection *self, PyObject *dataObj, Py_ssize_t *size)
 {
-    char *s = ur_template_string_delimiter(self->urtmplt, ',');
-    PyObject *result;
-#if PY_MAJOR_VERSION >= 3
-    result = PyUnicode_FromFormat("(%s)", s);
-#else
-    result = PyString_FromFormat("(%s)", s);
-#endif
-    free(s);
-    return result;
+    char *data;
+    Py_ssize_t data_size;
+    int i;
+
+    if (dataObj == NULL) {
+        if (self->data_obj == NULL) {
+            PyErr_SetString(TrapError, "Data was not set yet.");
+            return NULL;
+        }
+        /* bytearray might have been modified since setData() */
+        dataObj = self->data_obj;
+    }
+    if (PyByteArray_Check(dataObj)) {
+        data_size = PyByteArray_Size(dataObj);
+        data = PyByteArray_AsString(dataObj);
+    } else if (PyBytes_Check(dataObj)) {
+        PyBytes_AsStringAndSize(dataObj, &data, &data_size);
+    } else {
+        PyErr_SetString(PyExc_TypeError, "Argument data must be of bytes or bytearray type.");
+        return NULL;
+    }
+    if (data_size < self->tmplt.static_size) {
+        PyErr_SetString(PyExc_ValueError, "Data is shorter than the fixed part of the record.");
+        return NULL;
+    }
+    for (i = 0; i < self->tmplt.count; i++) {
+        int16_t id = self->tmplt.ids[i];
+        if (!ur_is_static(id) &&
+            self->tmplt.static_size + ur_get_var_offset((&self->tmplt), data, id) + ur_get_var_len((&self->tmplt), data, id) > data_size) {
+            PyErr_SetString(PyExc_ValueError, "Data is too short.");
+            return NULL;
+        }
+    }
+    if (size != NULL) {
+        *size = data_size;
+    }
+    return data;
 }
 
 static PyObject *
-UnirecTemplate_getAttr(pytrap_unirectemplate *self, PyObject *attr)
+UnirecProjection_setData(pytrap_unirecprojection *self, PyObject *args, PyObject *kwds)
 {
-    int32_t field_id = UnirecTemplate_get_field_id(self, attr);
+    PyObject *dataObj;
+    char *data;
+    Py_ssize_t data_size;
 
-    if (field_id == UR_ITER_END) {
-        return PyObject_GenericGetAttr((PyObject *) self, attr);
+    static char *kwlist[] = {"data", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &dataObj)) {
+        return NULL;
+    }
+    data = UnirecProjection_get_data(self, dataObj, &data_size);
+    if (data == NULL) {
+        return NULL;
     }
 
-    return UnirecTemplate_get_local(self, self->data, field_id);
+    Py_XDECREF(self->data_obj);
+    self->data = data;
+    self->data_size = data_size;
+    Py_INCREF(dataObj);
+    self->data_obj = dataObj;
+    Py_RETURN_NONE;
 }
 
-static int
-UnirecTemplate_setAttr(pytrap_unirectemplate *self, PyObject *attr, PyObject *value)
+static PyObject *
+UnirecProjection_getValues(pytrap_unirecprojection *self, PyObject *args, PyObject *kwds)
 {
-    PyObject *v = PyDict_GetItem((PyObject *) self->urdict, attr);
-    if (v == NULL) {
-        return PyObject_GenericSetAttr((PyObject *) self, attr, value);
-    }
-    int32_t field_id;
-    field_id = (int32_t) PyLong_AsLong(v);
+    PyObject *dataObj = NULL, *result, *value;
+    char *data;
+    int i;
 
-    if (UnirecTemplate_set_local(self, self->data, field_id, value) == NULL) {
-        return EXIT_FAILURE;
-    } else {
-        return EXIT_SUCCESS;
+    static char *kwlist[] = {"data", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|O", kwlist, &dataObj)) {
+        return NULL;
+    }
+    data = UnirecProjection_get_data(self, dataObj, NULL);
+    if (data == NULL) {
+        return NULL;
+    }
+    result = PyTuple_New(self->tmplt.count);
+    if (result == NULL) {
+        return NULL;
     }
+    for (i = 0; i < self->tmplt.count; i++) {
+        value = UnirecTemplate_get_value(&self->tmplt, data, self->tmplt.ids[i]);
+        if (value == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(result, i, value);
+    }
+    return result;
 }
 
-Py_ssize_t UnirecTemplate_len(pytrap_unirectemplate *o)
+static PyObject *
+UnirecProjection_setFormat(pytrap_unirecprojection *self, PyObject *args, PyObject *kwds)
 {
-   return o->field_count;
+    const char *spec;
+    ur_template_t *tmplt;
+    int ret;
+
+    static char *kwlist[] = {"spec", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s", kwlist, &spec)) {
+        return NULL;
+    }
+    if (ur_define_set_of_fields(spec) != UR_OK) {
+        PyErr_SetString(TrapError, "ur_define_set_of_fields() failed.");
+        return NULL;
+    }
+    tmplt = ur_create_template_from_ifc_spec(spec);
+    if (tmplt == NULL) {
+        PyErr_SetString(TrapError, "Creation of UniRec template failed.");
+        return NULL;
+    }
+    ret = UnirecProjection_set_template(self, tmplt);
+    ur_free_template(tmplt);
+    if (ret != 0) {
+        return NULL;
+    }
+    /* data of the previous format do not match the new offsets */
+    Py_CLEAR(self->data_obj);
+    self->data = NULL;
+    self->data_size = 0;
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-UnirecTemplate_next(pytrap_unirectemplate *self)
+UnirecProjection_getAttr(pytrap_unirecprojection *self, PyObject *attr)
 {
-    PyObject *name;
-    PyObject *value;
-    PyObject *result;
+    char *data;
+    int i;
 
-    if (self->iter_index < self->field_count) {
-#if PY_MAJOR_VERSION >= 3
-        name = PyUnicode_FromString(ur_get_name(self->urtmplt->ids[self->iter_index]));
-#else
-        name = PyString_FromString(ur_get_name(self->urtmplt->ids[self->iter_index]));
-#endif
-        value = UnirecTemplate_get_local(self, self->data, self->urtmplt->ids[self->iter_index]);
-        self->iter_index++;
-        result = Py_BuildValue("(OO)", name, value);
-        Py_DECREF(name);
-        Py_DECREF(value);
-        return result;
+    /* names are usually interned, compare identity first */
+    for (i = 0; i < self->tmplt.count; i++) {
+        if (PyTuple_GET_ITEM(self->fields, i) == attr) {
+            break;
+        }
+    }
+    if (i == self->tmplt.count) {
+        for (i = 0; i < self->tmplt.count; i++) {
+            int cmp = PyObject_RichCompareBool(PyTuple_GET_ITEM(self->fields, i), attr, Py_EQ);
+            if (cmp == -1) {
+                return NULL;
+            } else if (cmp == 1) {
+                break;
+            }
+        }
+    }
+    if (i < self->tmplt.count) {
+        data = UnirecProjection_get_data(self, NULL, NULL);
+        if (data == NULL) {
+            return NULL;
+        }
+        return UnirecTemplate_get_value(&self->tmplt, data, self->tmplt.ids[i]);
     }
+    return PyObject_GenericGetAttr((PyObject *) self, attr);
+}
 
-    self->iter_index = 0;
-    PyErr_SetNone(PyExc_StopIteration);
-    return NULL;
+static Py_ssize_t
+UnirecProjection_len(pytrap_unirecprojection *self)
+{
+    return self->tmplt.count;
 }
 
-static PySequenceMethods UnirecTemplate_seqmethods = {
-    (lenfunc) UnirecTemplate_len, /* lenfunc sq_length; */
-    0, /* binaryfunc sq_concat; */
-    0, /* ssizeargfunc sq_repeat; */
-    0, /* ssizeargfunc sq_item; */
-    0, /* void *was_sq_slice; */
-    0, /* ssizeobjargproc sq_ass_item; */
-    0, /* void *was_sq_ass_slice; */
-    0, /* objobjproc sq_contains; */
-    0, /* binaryfunc sq_inplace_concat; */
-    0 /* ssizeargfunc sq_inplace_repeat; */
+static PyMethodDef UnirecProjection_methods[] = {
+    {"setData", (PyCFunction) UnirecProjection_setData, METH_VARARGS | METH_KEYWORDS,
+        "Set data for attribute access.\n\n"
+        "Args:\n"
+        "    data (bytearray or bytes): Data - UniRec message.\n"
+        },
+
+    {"getValues", (PyCFunction) UnirecProjection_getValues, METH_VARARGS | METH_KEYWORDS,
+        "Get values of the selected fields.\n\n"
+        "Args:\n"
+        "    data (Optional[bytearray or bytes]): Data - UniRec message (default: data set by setData()).\n\n"
+        "Returns:\n"
+        "    tuple: Values in the order of the selected fields.\n"
+        },
+
+    {"setFormat", (PyCFunction) UnirecProjection_setFormat, METH_VARARGS | METH_KEYWORDS,
+        "Use offsets of fields from a new format of records.\n\n"
+        "It is intended for handling of FormatChanged, e.g. when the received\n"
+        "format is a superset of the required one.  Only offsets of the selected\n"
+        "fields are updated, the projection is not recreated.  Data set by\n"
+        "setData() are forgotten.\n\n"
+        "Args:\n"
+        "    spec (str): UniRec format specifier (e.g. from TrapCtx.getDataFmt()).\n\n"
+        "Raises:\n"
+        "    TrapError: Some of the selected fields is not in the format.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
 };
 
-static PyTypeObject pytrap_UnirecTemplate = {
+static PyMemberDef UnirecProjection_members[] = {
+    {"fields", T_OBJECT_EX, offsetof(pytrap_unirecprojection, fields), READONLY, "Names of the selected fields."},
+    {NULL}  /* Sentinel */
+};
+
+static PySequenceMethods UnirecProjection_seqmethods = {
+    (lenfunc) UnirecProjection_len, /* lenfunc sq_length; */
+};
+
+static PyTypeObject pytrap_UnirecProjection = {
     PyVarObject_HEAD_INIT(NULL, 0)
-    "pytrap.UnirecTemplate",          /* tp_name */
-    sizeof(pytrap_unirectemplate),    /* tp_basicsize */
+    "pytrap.UnirecProjection", /* tp_name */
+    sizeof(pytrap_unirecprojection), /* tp_basicsize */
     0,                         /* tp_itemsize */
-    (destructor) UnirecTemplate_dealloc,                         /* tp_dealloc */
+    (destructor) UnirecProjection_dealloc, /* tp_dealloc */
     0,                         /* tp_print */
     0,                         /* tp_getattr */
     0,                         /* tp_setattr */
     0,                         /* tp_reserved */
     0,                         /* tp_repr */
     0,                         /* tp_as_number */
-    &UnirecTemplate_seqmethods,                         /* tp_as_sequence */
+    &UnirecProjection_seqmethods, /* tp_as_sequence */
     0,                         /* tp_as_mapping */
     0,                         /* tp_hash  */
     0,                         /* tp_call */
-    (reprfunc) UnirecTemplate_str,                         /* tp_str */
-    (getattrofunc) UnirecTemplate_getAttr,                         /* tp_getattro */
-    (setattrofunc) UnirecTemplate_setAttr,                         /* tp_setattro */
+    0,                         /* tp_str */
+    (getattrofunc) UnirecProjection_getAttr, /* tp_getattro */
+    0,                         /* tp_setattro */
     0,                         /* tp_as_buffer */
-    Py_TPFLAGS_DEFAULT |
-        Py_TPFLAGS_BASETYPE,   /* tp_flags */
-    "Class for UniRec template storage and base data access.",         /* tp_doc */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "Read-only view of selected fields of UniRec records.\n\n"
+    "It is created by UnirecTemplate.project(), values of the fields are\n"
+    "accessible as attributes (after setData()) or by getValues().\n", /* tp_doc */
     0,                         /* tp_traverse */
     0,                         /* tp_clear */
     0,                         /* tp_richcompare */
     0,                         /* tp_weaklistoffset */
-    PyObject_SelfIter,         /* tp_iter */
-    (iternextfunc) UnirecTemplate_next,                         /* tp_iternext */
-    pytrap_unirectemplate_methods,             /* tp_methods */
-    0,                         /* tp_members */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    UnirecProjection_methods,  /* tp_methods */
+    UnirecProjection_members,  /* tp_members */
     0,                         /* tp_getset */
     0,                         /* tp_base */
     0,                         /* tp_dict */
@@ -1728,442 +2647,3945 @@ static PyTypeObject pytrap_UnirecTemplate = {
     0,                         /* tp_dictoffset */
     0,                         /* tp_init */
     0,                         /* tp_alloc */
-    UnirecTemplate_new,                         /* tp_new */
+    0,                         /* tp_new */
 };
 
-
+static PyObject *
+UnirecTemplate_project(pytrap_unirectemplate *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *fields, *seq;
+    pytrap_unirecprojection *p;
+    Py_ssize_t i, n;
+    int32_t field_id, max_id = 0;
+
+    static char *kwlist[] = {"fields", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "O", kwlist, &fields)) {
+        return NULL;
+    }
+    seq = PySequence_Fast(fields, "Argument fields must be a sequence of field names.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    n = PySequence_Fast_GET_SIZE(seq);
+    p = (pytrap_unirecprojection *) pytrap_UnirecProjection.tp_alloc(&pytrap_UnirecProjection, 0);
+    if (p == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    p->fields = PyTuple_New(n);
+    p->tmplt.ids = (int16_t *) malloc(sizeof(int16_t) * (n + 1));
+    if (p->fields == NULL || p->tmplt.ids == NULL) {
+        Py_DECREF(seq);
+        Py_DECREF(p);
+        return PyErr_NoMemory();
+    }
+    for (i = 0; i < n; i++) {
+        PyObject *name = PySequence_Fast_GET_ITEM(seq, i);
+        field_id = UnirecTemplate_get_field_id(self, name);
+        if (field_id == UR_ITER_END || !ur_is_present(self->urtmplt, field_id)) {
+            Py_DECREF(seq);
+            Py_DECREF(p);
+            PyErr_SetString(TrapError, "Field was not found.");
+            return NULL;
+        }
+        Py_INCREF(name);
+        PyTuple_SET_ITEM(p->fields, i, name);
+        p->tmplt.ids[i] = field_id;
+        if (field_id > max_id) {
+            max_id = field_id;
+        }
+    }
+    Py_DECREF(seq);
+    p->tmplt.count = n;
+    p->tmplt.offset_size = max_id + 1;
+    p->tmplt.first_dynamic = UR_NO_DYNAMIC_VALUES;
+    p->tmplt.offset = (uint16_t *) malloc(sizeof(uint16_t) * (max_id + 1));
+    if (p->tmplt.offset == NULL) {
+        Py_DECREF(p);
+        return PyErr_NoMemory();
+    }
+    memset(p->tmplt.offset, 0xff, sizeof(uint16_t) * (max_id + 1));
+    UnirecProjection_set_template(p, self->urtmplt);
+    return (PyObject *) p;
+}
+
+static PyMethodDef pytrap_unirectemplate_methods[] = {
+        {"getFieldType", (PyCFunction) UnirecTemplate_getFieldType, METH_VARARGS,
+            "Get type of given field.\n\n"
+            "Args:\n"
+            "    field_name (str): Field name.\n\n"
+            "Returns:\n"
+            "    type: Type object (e.g. int, str or pytrap.UnirecIPAddr).\n"
+        },
+
+        {"getByID", (PyCFunction) UnirecTemplate_getByID, METH_VARARGS | METH_KEYWORDS,
+            "Get value of the field from the UniRec message.\n\n"
+            "Args:\n"
+            "    data (bytearray or bytes): Data - UniRec message.\n"
+            "    field_id (int): Field ID (use getFieldsDict()).\n"
+            "Returns:\n"
+            "    (object): Retrieved value of the field (depends on UniRec template).\n\n"
+            "Raises:\n"
+            "    TypeError: Data argument must be bytearray or bytes.\n"
+        },
+
+        {"get", (PyCFunction) UnirecTemplate_getByName, METH_VARARGS | METH_KEYWORDS,
+            "Get value of the field from the UniRec message.\n\n"
+            "Args:\n"
+            "    data (bytearray or bytes): Data - UniRec message.\n"
+            "    field_name (str): Field name.\n"
+            "Returns:\n"
+            "    (object): Retrieved value of the field (depends on UniRec template).\n\n"
+            "Raises:\n"
+            "    TypeError: Data argument must be bytearray or bytes.\n"
+            "    TrapError: Field name was not found.\n"
+        },
+
+        {"getColumn", (PyCFunction) UnirecTemplate_getColumn, METH_VARARGS | METH_KEYWORDS,
+            "Get values of a fixed-length field from many UniRec messages.\n\n"
+            "Values are copied into a packed array without creating Python objects,\n"
+            "e.g. TIME_FIRST column can be passed to UnirecTime.arrayAsFloat().\n\n"
+            "Args:\n"
+            "    records (list): UniRec messages (bytearray or bytes) with this template.\n"
+            "    field_name (str): Field name.\n"
+            "Returns:\n"
+            "    (bytearray): Packed values in host byte order (ur_get_size() bytes each).\n\n"
+            "Raises:\n"
+            "    TypeError: Bad type of records or the field has variable length.\n"
+            "    TrapError: Field name was not found or a message is too short.\n"
+        },
+
+        {"setByID", (PyCFunction) UnirecTemplate_setByID, METH_VARARGS | METH_KEYWORDS,
+            "Set value of the field in the UniRec message.\n\n"
+            "Args:\n"
+            "    data (bytearray or bytes): Data - UniRec message.\n"
+            "    field_id (int): Field ID.\n"
+            "    value (object): New value of the field (depends on UniRec template).\n\n"
+            "Raises:\n"
+            "    TypeError: Bad object type of value was given.\n"
+            "    TrapError: Field was not found.\n"
+        },
+
+        {"set", (PyCFunction) UnirecTemplate_set, METH_VARARGS | METH_KEYWORDS,
+            "Set value of the field in the UniRec message.\n\n"
+            "Args:\n"
+            "    data (bytearray or bytes): Data - UniRec message.\n"
+            "    field_name (str): Field name.\n"
+            "    value (object): New value of the field (depends on UniRec template).\n\n"
+            "Raises:\n"
+            "    TypeError: Bad object type of value was given.\n"
+            "    TrapError: Field was not found.\n"
+        },
+
+        {"getFieldsBytes", (PyCFunction) UnirecTemplate_getFieldsBytes, METH_VARARGS | METH_KEYWORDS,
+            "Get raw values of fields concatenated into bytes.\n\n"
+            "It is intended to build fixed-size keys (e.g. of pytrap.FastHashTable)\n"
+            "directly from the message without conversion of values into objects.\n\n"
+            "Args:\n"
+            "    fields (list(str)): Names of fields of fixed size.\n"
+            "    data (Optional[bytearray or bytes]): Data - UniRec message (default: data set by setData).\n\n"
+            "Returns:\n"
+            "    bytes: Values of fields in the given order (in the UniRec representation).\n\n"
+            "Raises:\n"
+            "    TrapError: Data was not set or field was not found.\n"
+            "    TypeError: Field of variable size was given.\n"
+        },
+
+        {"getData", (PyCFunction) UnirecTemplate_getData, METH_NOARGS,
+            "Get data that was already set using setData.\n\n"
+            "Returns:\n"
+            "    bytearray: Data - UniRec message.\n"
+        },
+
+        {"setData", (PyCFunction) UnirecTemplate_setData, METH_VARARGS | METH_KEYWORDS,
+            "Set data for attribute access.\n\n"
+            "Args:\n"
+            "    data (bytearray or bytes): Data - UniRec message.\n"
+        },
+
+        {"getFieldsDict", (PyCFunction) UnirecTemplate_getFieldsDict, METH_NOARGS,
+            "Get set of fields of the template.\n\n"
+            "Returns:\n"
+            "    Dict(str,int): Dictionary of field_id with field name as a key.\n"
+        },
+
+        {"createMessage", (PyCFunction) UnirecTemplate_createMessage, METH_VARARGS | METH_KEYWORDS,
+            "Create a message that can be filled in with values according to the template.\n\n"
+            "Args:\n"
+            "    dyn_size (Optional[int]): Maximal size of variable data (in total) (default: 0).\n\n"
+            "Returns:\n"
+            "    bytearray: Allocated memory that can be filled in using set().\n"
+        },
+
+        {"copyPlan", (PyCFunction) UnirecTemplate_copyPlan, METH_VARARGS | METH_KEYWORDS,
+            "Create plan of copying fields from records of this template into records of other template.\n\n"
+            "The plan is intended for many records, e.g. projection of received records\n"
+            "to the output template: plan.apply(in_data, out_data).\n\n"
+            "Args:\n"
+            "    other (UnirecTemplate): Destination template.\n\n"
+            "Returns:\n"
+            "    UnirecCopyPlan: Copy plan.\n"
+        },
+
+        {"project", (PyCFunction) UnirecTemplate_project, METH_VARARGS | METH_KEYWORDS,
+            "Create read-only view of selected fields of records of this template.\n\n"
+            "The view keeps offsets of the selected fields only, so that its memory and\n"
+            "cost of access do not depend on the number of fields in the format.\n\n"
+            "Args:\n"
+            "    fields (list(str)): Names of fields.\n\n"
+            "Returns:\n"
+            "    UnirecProjection: View of the fields.\n\n"
+            "Raises:\n"
+            "    TrapError: Field was not found.\n"
+        },
+
+        {"copy", (PyCFunction) UnirecTemplate_copy, METH_NOARGS,
+            "Create a new instance with the same format specifier without data.\n\n"
+            "Returns:\n"
+            "    UnirecTemplate: New copy of object (not just reference).\n"
+        },
+
+        {"strRecord", (PyCFunction) UnirecTemplate_strRecord, METH_NOARGS,
+            "Get values of record in readable format.\n\n"
+            "Returns:\n"
+            "    str: String in key=value format.\n"
+        },
+
+        {"recSize", (PyCFunction) UnirecTemplate_recSize, METH_VARARGS | METH_KEYWORDS,
+            "Get size of UniRec record.\n\n"
+            "Return total size of valid record data, i.e. number of bytes occupied by all fields."
+            "This may be less than allocated size of 'data'.\n"
+            "Args:\n"
+            "    data (Optional[bytearray or bytes]): Data of UniRec message (optional if previously set by setData)"
+            "Returns:\n"
+            "    int: Size of record data in bytes\n"
+        },
+
+        {"recFixlenSize", (PyCFunction) UnirecTemplate_recFixlenSize, METH_NOARGS,
+            "Get size of fixed part of UniRec record.\n\n"
+            "This is the minimal size of a record with given template,"
+            "i.e. the size with all variable-length fields empty.\n"
+            "Returns:\n"
+            "    int: Size of fixed part of template in bytes\n"
+        },
+
+
+        {"recVarlenSize", (PyCFunction) UnirecTemplate_recVarlenSize, METH_VARARGS | METH_KEYWORDS,
+            "Get size of variable-length part of UniRec record.\n\n"
+            "Return total size of all variable-length fields.\n"
+            "Args:\n"
+            "    data (Optional[bytearray or bytes]): Data of UniRec message (optional if previously set by setData)"
+            "Returns:\n"
+            "    int: Total size of variable-length fields in bytes\n"
+        },
+
+        {NULL, NULL, 0, NULL}
+};
+
+static PyObject *
+UnirecTemplate_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_unirectemplate *self;
+    const char *spec;
+    // TODO return error string of failure during unirec template init
+    //char *errstring;
+
+    self = (pytrap_unirectemplate *) type->tp_alloc(type, 0);
+    if (self != NULL) {
+        static char *kwlist[] = {"spec", NULL};
+        if (!PyArg_ParseTupleAndKeywords(args, kwds, "s", kwlist, &spec)) {
+            Py_DECREF(self);
+            return NULL;
+        }
+        self->urtmplt = NULL;
+        int ret;
+        if ((ret = ur_define_set_of_fields(spec)) != UR_OK) {
+            PyErr_SetString(TrapError, "ur_define_set_of_fields() failed.");
+            Py_DECREF(self);
+            return NULL;
+        }
+        /* XXX errstring */
+        //self->urtmplt = ur_create_template(spec, &errstring);
+        self->urtmplt = ur_create_template_from_ifc_spec(spec);
+        if (self->urtmplt == NULL) {
+            //PyErr_SetString(TrapError, errstring);
+            PyErr_SetString(TrapError, "Creation of UniRec template failed.");
+            //free(errstring);
+            Py_DECREF(self);
+            return NULL;
+        }
+        self = UnirecTemplate_init(self);
+    }
+
+    return (PyObject *) self;
+}
+
+static void UnirecTemplate_dealloc(pytrap_unirectemplate *self)
+{
+    if (self->urdict) {
+        Py_DECREF(self->urdict);
+    }
+    if (self->urtmplt) {
+        ur_free_template(self->urtmplt);
+    }
+    Py_XDECREF(self->data_obj); // Allow to free the original data object
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+PyObject *
+UnirecTemplate_str(pytrap_unirectemplate *self)
+{
+    char *s = ur_template_string_delimiter(self->urtmplt, ',');
+    PyObject *result;
+#if PY_MAJOR_VERSION >= 3
+    result = PyUnicode_FromFormat("(%s)", s);
+#else
+    result = PyString_FromFormat("(%s)", s);
+#endif
+    free(s);
+    return result;
+}
+
+static PyObject *
+UnirecTemplate_getAttr(pytrap_unirectemplate *self, PyObject *attr)
+{
+    int32_t field_id = UnirecTemplate_get_field_id(self, attr);
+
+    if (field_id == UR_ITER_END) {
+        return PyObject_GenericGetAttr((PyObject *) self, attr);
+    }
+
+    return UnirecTemplate_get_local(self, self->data, field_id);
+}
+
+static int
+UnirecTemplate_setAttr(pytrap_unirectemplate *self, PyObject *attr, PyObject *value)
+{
+    PyObject *v = PyDict_GetItem((PyObject *) self->urdict, attr);
+    if (v == NULL) {
+        return PyObject_GenericSetAttr((PyObject *) self, attr, value);
+    }
+    int32_t field_id;
+    field_id = (int32_t) PyLong_AsLong(v);
+
+    if (UnirecTemplate_set_local(self, self->data, field_id, value) == NULL) {
+        return EXIT_FAILURE;
+    } else {
+        return EXIT_SUCCESS;
+    }
+}
+
+Py_ssize_t UnirecTemplate_len(pytrap_unirectemplate *o)
+{
+   return o->field_count;
+}
+
+static PyObject *
+UnirecTemplate_next(pytrap_unirectemplate *self)
+{
+    PyObject *name;
+    PyObject *value;
+    PyObject *result;
+
+    if (self->iter_index < self->field_count) {
+#if PY_MAJOR_VERSION >= 3
+        name = PyUnicode_FromString(ur_get_name(self->urtmplt->ids[self->iter_index]));
+#else
+        name = PyString_FromString(ur_get_name(self->urtmplt->ids[self->iter_index]));
+#endif
+        value = UnirecTemplate_get_local(self, self->data, self->urtmplt->ids[self->iter_index]);
+        self->iter_index++;
+        result = Py_BuildValue("(OO)", name, value);
+        Py_DECREF(name);
+        Py_DECREF(value);
+        return result;
+    }
+
+    self->iter_index = 0;
+    PyErr_SetNone(PyExc_StopIteration);
+    return NULL;
+}
+
+static PySequenceMethods UnirecTemplate_seqmethods = {
+    (lenfunc) UnirecTemplate_len, /* lenfunc sq_length; */
+    0, /* binaryfunc sq_concat; */
+    0, /* ssizeargfunc sq_repeat; */
+    0, /* ssizeargfunc sq_item; */
+    0, /* void *was_sq_slice; */
+    0, /* ssizeobjargproc sq_ass_item; */
+    0, /* void *was_sq_ass_slice; */
+    0, /* objobjproc sq_contains; */
+    0, /* binaryfunc sq_inplace_concat; */
+    0 /* ssizeargfunc sq_inplace_repeat; */
+};
+
+static PyTypeObject pytrap_UnirecTemplate = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.UnirecTemplate",          /* tp_name */
+    sizeof(pytrap_unirectemplate),    /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) UnirecTemplate_dealloc,                         /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    &UnirecTemplate_seqmethods,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    (reprfunc) UnirecTemplate_str,                         /* tp_str */
+    (getattrofunc) UnirecTemplate_getAttr,                         /* tp_getattro */
+    (setattrofunc) UnirecTemplate_setAttr,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT |
+        Py_TPFLAGS_BASETYPE,   /* tp_flags */
+    "Class for UniRec template storage and base data access.",         /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    PyObject_SelfIter,         /* tp_iter */
+    (iternextfunc) UnirecTemplate_next,                         /* tp_iternext */
+    pytrap_unirectemplate_methods,             /* tp_methods */
+    0,                         /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    UnirecTemplate_new,                         /* tp_new */
+};
+
+
 /*************************/
 /*    UnirecIPAddrRange  */
 /*************************/
 
-static PyTypeObject pytrap_UnirecIPAddrRange;
+static PyTypeObject pytrap_UnirecIPAddrRange;
+
+typedef struct {
+    PyObject_HEAD
+    pytrap_unirecipaddr *start; /* low ip */
+    pytrap_unirecipaddr *end;   /* high ip*/
+} pytrap_unirecipaddrrange;
+
+static void
+UnirecIPAddrRange_dealloc(pytrap_unirecipaddrrange *self)
+{
+    Py_XDECREF(self->start);
+    Py_XDECREF(self->end);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject *
+UnirecIPAddrRange_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_unirecipaddrrange *self;
+
+    self = (pytrap_unirecipaddrrange *)type->tp_alloc(type, 0);
+    if (self != NULL) {
+        self->start = (pytrap_unirecipaddr *) pytrap_UnirecIPAddr.tp_alloc(&pytrap_UnirecIPAddr, 0);
+
+        if (self->start == NULL) {
+            return NULL;
+        }
+
+        self->end = (pytrap_unirecipaddr *) pytrap_UnirecIPAddr.tp_alloc(&pytrap_UnirecIPAddr, 0);
+
+        if (self->end == NULL) {
+            PyErr_SetString(PyExc_MemoryError, "Allocation of end address failed.");
+            Py_DECREF(self->start);
+            return NULL;
+        }
+    }
+
+    return (PyObject *)self;
+}
+
+
+static PyObject *
+UnirecIPAddrRange_isIn(pytrap_unirecipaddrrange *self, PyObject *args)
+{
+    pytrap_unirecipaddr *ipaddr = (pytrap_unirecipaddr *) args;
+    PyObject *result = Py_False;
+
+    if (!PyObject_IsInstance(args, (PyObject *) &pytrap_UnirecIPAddr)) {
+        result = Py_NotImplemented;
+    }
+
+    int cmp_result;
+    cmp_result = ip_cmp(&self->start->ip, &ipaddr->ip);
+
+    if (cmp_result == 0) {
+        /* ip address is in interval */
+        result = PyLong_FromLong(0);
+    } else if (cmp_result > 0) {
+        /* ip address is lower then interval */
+        result = PyLong_FromLong(-1);
+    } else {
+        cmp_result = ip_cmp(&self->end->ip, &ipaddr->ip);
+        if (cmp_result >= 0) {
+            /* ip address is in interval */
+            result = PyLong_FromLong(0);
+        } else {
+            /* ip address is greater then interval */
+            result = PyLong_FromLong(1);
+        }
+    }
+
+    return result;
+}
+
+
+static PyObject *
+UnirecIPAddrRange_isOverlap(pytrap_unirecipaddrrange *self, PyObject *args)
+{
+    /* compared ranges must by sorted by low ip and mask */
+    pytrap_unirecipaddrrange *other;
+
+    PyObject * tmp;
+    long cmp_result;
+
+    if (!PyArg_ParseTuple(args, "O", &other))
+        return NULL;
+
+    if (!PyObject_IsInstance((PyObject*)other, (PyObject *) &pytrap_UnirecIPAddrRange)) {
+        return Py_NotImplemented;
+    }
+
+    tmp = UnirecIPAddrRange_isIn(self, (PyObject *) other->start);
+    cmp_result = PyLong_AsLong(tmp);
+    Py_DECREF(tmp);
+
+    if (cmp_result == 0) {
+        Py_RETURN_TRUE;
+    } else {
+        Py_RETURN_FALSE;
+    }
+}
+
+static int
+UnirecIPAddrRange_contains(pytrap_unirecipaddrrange *o, pytrap_unirecipaddr *ip)
+{
+    PyObject * tmp = UnirecIPAddrRange_isIn(o, (PyObject *) ip);
+    int cmp_result = PyLong_AsLong(tmp);
+    Py_DECREF(tmp);
+    return cmp_result == 0 ? 1 : 0;
+}
+
+static uint8_t
+bit_endian_swap(uint8_t in)
+{
+    in = (in & 0xF0) >> 4 | (in & 0x0F) << 4;
+    in = (in & 0xCC) >> 2 | (in & 0x33) << 2;
+    in = (in & 0xAA) >> 1 | (in & 0x55) << 1;
+    return in;
+}
+
+/* TODO something like this can be used globally */
+#if PY_MAJOR_VERSION >= 3
+#  define CHECK_STR_CONV(pobj, cstr, csize) { \
+    if (!PyUnicode_Check(pobj)) { \
+        PyErr_SetString(PyExc_TypeError, "String or UnirecIPAddr object expected."); \
+        return -1; \
+    } else { \
+        cstr = PyUnicode_AsUTF8AndSize(pobj, &csize); \
+    } \
+} while (0)
+#else
+#  define CHECK_STR_CONV(pobj, cstr, csize) { \
+    if (!PyString_Check(pobj)) { \
+        PyErr_SetString(PyExc_TypeError, "String or UnirecIPAddr object expected."); \
+        return -1; \
+    } \
+    if (PyString_AsStringAndSize(pobj, &cstr, &csize) == -1) { \
+        return -1; \
+    } \
+} while (0)
+#endif
+
+#define COPY_IPADD(str, dest, tmp) { \
+    if (ip_from_str(str, &tmp) != 1) { \
+        PyErr_SetString(TrapError, "Could not parse given IP address."); \
+        goto exit_failure; \
+    } \
+    memcpy(&dest, &tmp, sizeof(ip_addr_t)); \
+} while (0)
+
+#define FREE_CLEAR(p) free(p);
+
+static int
+UnirecIPAddrRange_init(pytrap_unirecipaddrrange *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *start = NULL, *end = NULL;
+    char *argstr = NULL, *str = NULL, *netmask = NULL;
+    Py_ssize_t size;
+    ip_addr_t tmp_ip;
+    unsigned char mask = 0;
+    uint32_t net_mask_array[4];
+
+    static char *kwlist[] = {"start", "end", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &start, &end)) {
+        goto exit_failure;
+    }
+
+    /* start argument */
+    if (PyObject_IsInstance(start, (PyObject *) &pytrap_UnirecIPAddr)) {
+        if (!end) {
+            PyErr_SetString(PyExc_TypeError, "Missing end argument.");
+            goto exit_failure;
+        }
+        memcpy(&self->start->ip, &(((pytrap_unirecipaddr *) start)->ip), sizeof(ip_addr_t));
+    } else {
+        /* check for supported string type */
+        CHECK_STR_CONV(start, argstr, size);
+        str = strdup(argstr);
+        /* supported string type */
+        netmask = strchr(str, '/');
+        if (netmask == NULL) {
+            if (!end) {
+                PyErr_SetString(PyExc_TypeError, "End argument is required when start is not in <ip>/<mask> format.");
+                goto exit_failure;
+            }
+            /* set start IP and continue with end */
+            COPY_IPADD(str, self->start->ip, tmp_ip);
+            FREE_CLEAR(str);
+        } else {
+            if (end) {
+                PyErr_SetString(PyExc_TypeError, "Start argument is in <ip>/<mask> format - end argument must be ommited.");
+                goto exit_failure;
+            }
+
+            /* expected string in <ip>/<mask> format, e.g. 192.168.1.0/24 */
+            *netmask = '\0';
+            netmask++;
+            if (sscanf(netmask, "%" SCNu8, &mask) != 1) {
+                PyErr_Format(PyExc_TypeError, "Malformed netmask %s.", netmask);
+                goto exit_failure;
+            }
+
+            /* replace '/' with '\0' in order to convert string IP into ip_addr_t */
+            if (ip_from_str(str, &tmp_ip) != 1) {
+                PyErr_SetString(TrapError, "Could not parse given IP address.");
+                goto exit_failure;
+            }
+
+            if (ip_is4(&tmp_ip)) {
+                net_mask_array[0] = 0xFFFFFFFF >> (mask > 31 ? 0 : 32 - mask);
+                net_mask_array[0] = (bit_endian_swap((net_mask_array[0] & 0x000000FF)>>  0) <<  0) |
+                    (bit_endian_swap((net_mask_array[0] & 0x0000FF00)>>  8) <<  8) |
+                    (bit_endian_swap((net_mask_array[0] & 0x00FF0000)>> 16) << 16) |
+                    (bit_endian_swap((net_mask_array[0] & 0xFF000000)>> 24) << 24);
+
+                tmp_ip.ui32[2] = tmp_ip.ui32[2] & net_mask_array[0];
+                memcpy(&self->start->ip, &tmp_ip, 16);
+
+                tmp_ip.ui32[2] = tmp_ip.ui32[2] | (~net_mask_array[0]);
+                memcpy(&self->end->ip, &tmp_ip, 16);
+            } else {
+                // Fill every word of IPv6 address
+                net_mask_array[0] = 0xFFFFFFFF>>(mask > 31 ? 0 : 32 - mask);
+                net_mask_array[1] = 0xFFFFFFFF>>(mask > 63 ? 0 : (mask > 32 ? 64 - mask: 32));
+                net_mask_array[2] = 0xFFFFFFFF>>(mask > 95 ? 0 : (mask > 64 ? 96 - mask: 32));
+                net_mask_array[3] = 0xFFFFFFFF>>(mask > 127 ? 0 :(mask > 96 ? 128 - mask : 32));
+
+                int i;
+
+                for (i = 0; i < 4; ++i) {
+                    // Swap bits in every byte for compatibility with ip_addr_t stucture
+                    net_mask_array[i] = (bit_endian_swap((net_mask_array[i] & 0x000000FF) >> 0) <<  0) |
+                        (bit_endian_swap((net_mask_array[i] & 0x0000FF00)>>  8) <<  8) |
+                        (bit_endian_swap((net_mask_array[i] & 0x00FF0000)>> 16) << 16) |
+                        (bit_endian_swap((net_mask_array[i] & 0xFF000000)>> 24) << 24);
+
+                    self->start->ip.ui32[i] = tmp_ip.ui32[i] & net_mask_array[i];
+                    self->end->ip.ui32[i] = tmp_ip.ui32[i] | ( ~ net_mask_array[i]);
+                }
+            }
+            free(str);
+            /* we are done */
+            goto exit_success;
+        }
+    }
+
+    /* end argument */
+    if (PyObject_IsInstance(end, (PyObject *) &pytrap_UnirecIPAddr)) {
+        memcpy(&self->end->ip, &(((pytrap_unirecipaddr *) end)->ip), sizeof(ip_addr_t));
+    } else {
+        /* string is supported */
+        CHECK_STR_CONV(end, str, size);
+        COPY_IPADD(str, self->end->ip, tmp_ip);
+    }
+exit_success:
+    return 0;
+exit_failure:
+    FREE_CLEAR(str);
+    return -1;
+}
+
+static PyObject *
+UnirecIPAddrRange_compare(PyObject *a, PyObject *b, int op)
+{
+    PyObject *result;
+
+    if (!PyObject_IsInstance(a, (PyObject *) &pytrap_UnirecIPAddrRange) ||
+             !PyObject_IsInstance(b, (PyObject *) &pytrap_UnirecIPAddrRange)) {
+        result = Py_NotImplemented;
+        goto out;
+    }
+
+    pytrap_unirecipaddrrange *ur_a = (pytrap_unirecipaddrrange *) a;
+    pytrap_unirecipaddrrange *ur_b = (pytrap_unirecipaddrrange *) b;
+
+    int res_S = ip_cmp(&ur_a->start->ip, &ur_b->start->ip);
+    int res_E = ip_cmp(&ur_a->end->ip, &ur_b->end->ip);
+
+    switch (op) {
+    case Py_EQ:
+        result = (res_S == 0 && res_E == 0? Py_True : Py_False);
+        break;
+    case Py_NE:
+        result = (res_S != 0 && res_E != 0 ? Py_True : Py_False);
+        break;
+    case Py_LE:
+        result = (res_S <= 0 ? Py_True : Py_False);
+        break;
+    case Py_GE:
+        result = (res_E >= 0 ? Py_True : Py_False);
+        break;
+    case Py_LT:
+        result = (res_S < 0 ? Py_True : Py_False);
+        break;
+    case Py_GT:
+        result = (res_E > 0 ? Py_True : Py_False);
+        break;
+    default:
+        result = Py_NotImplemented;
+    }
+
+out:
+    Py_INCREF(result);
+    return result;
+}
+
+static PyObject *
+UnirecIPAddrRange_repr(pytrap_unirecipaddrrange *self)
+{
+    PyObject *ip1 = NULL, *ip2 = NULL, *res = NULL;
+
+    ip1 = UnirecIPAddr_repr(self->start);
+    ip2 = UnirecIPAddr_repr(self->end);
+#if PY_MAJOR_VERSION >= 3
+    res = PyUnicode_FromFormat("UnirecIPAddrRange(%S, %S)", ip1, ip2);
+#else
+    res = PyString_FromFormat("UnirecIPAddrRange(%s, %s)", PyString_AsString(ip1), PyString_AsString(ip2));
+#endif
+    Py_DECREF(ip1);
+    Py_DECREF(ip2);
+    return res;
+}
+
+static PyObject *
+UnirecIPAddrRange_str(pytrap_unirecipaddrrange *self)
+{
+    PyObject *ip1 = NULL, *ip2 = NULL, *res = NULL;
+    ip1 = UnirecIPAddr_str(self->start);
+    ip2 = UnirecIPAddr_str(self->end);
+#if PY_MAJOR_VERSION >= 3
+    res = PyUnicode_FromFormat("%S - %S", ip1, ip2);
+#else
+    res = PyString_FromFormat("%s - %s", PyString_AsString(ip1), PyString_AsString(ip2));
+#endif
+    Py_DECREF(ip1);
+    Py_DECREF(ip2);
+    return res;
+}
+
+static PyMemberDef UnirecIPAddrRange_members[] = {
+    {"start", T_OBJECT_EX, offsetof(pytrap_unirecipaddrrange, start), 0,
+     "Low IP address of range"},
+    {"end", T_OBJECT_EX, offsetof(pytrap_unirecipaddrrange, end), 0,
+     "High IP address of range"},
+    {NULL}  /* Sentinel */
+};
+
+
+static PyMethodDef UnirecIPAddrRange_methods[] = {
+    {"isIn", (PyCFunction) UnirecIPAddrRange_isIn, METH_O,
+        "Check if the address is in IP range.\n\n"
+        "Args:\n"
+        "    ipaddr: UnirecIPAddr struct"
+        "Returns:\n"
+        "    long: -1 if ipaddr < start of range, 0 if ipaddr is in interval, 1 if ipaddr > end of range .\n"
+        },
+
+    {"isOverlap", (PyCFunction) UnirecIPAddrRange_isOverlap, METH_VARARGS,
+        "Check if 2 ranges sorted by start IP overlap.\n\n"
+        "Args:\n"
+        "    other: UnirecIPAddrRange, second interval to compare"
+        "Returns:\n"
+        "    bool: True if ranges are overlaps.\n"
+        },
+    {NULL}  /* Sentinel */
+};
+
+
+static PySequenceMethods UnirecIPAddrRange_seqmethods = {
+    0, /* lenfunc sq_length; */
+    0, /* binaryfunc sq_concat; */
+    0, /* ssizeargfunc sq_repeat; */
+    0, /* ssizeargfunc sq_item; */
+    0, /* void *was_sq_slice; */
+    0, /* ssizeobjargproc sq_ass_item; */
+    0, /* void *was_sq_ass_slice; */
+    (objobjproc) UnirecIPAddrRange_contains, /* objobjproc sq_contains; */
+    0, /* binaryfunc sq_inplace_concat; */
+    0 /* ssizeargfunc sq_inplace_repeat; */
+};
+
+
+static PyTypeObject pytrap_UnirecIPAddrRange = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.UnirecIPAddrRange",       /* tp_name */
+    sizeof(pytrap_unirecipaddrrange), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) UnirecIPAddrRange_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    (reprfunc) UnirecIPAddrRange_repr, /* tp_repr */
+    0,                         /* tp_as_number */
+    &UnirecIPAddrRange_seqmethods, /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    (reprfunc) UnirecIPAddrRange_str, /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT |
+        Py_TPFLAGS_BASETYPE,   /* tp_flags */
+    "Unirec IPAddr Range object",   /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    (richcmpfunc) UnirecIPAddrRange_compare, /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    UnirecIPAddrRange_methods, /* tp_methods */
+    UnirecIPAddrRange_members, /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    (initproc)UnirecIPAddrRange_init,      /* tp_init */
+    0,                         /* tp_alloc */
+    UnirecIPAddrRange_new,     /* tp_new */
+};
+
+/**
+ * \brief Get bounds of UnirecIPAddrRange object (used by other parts of pytrap).
+ *
+ * \param [in] obj     object to check
+ * \param [out] start  the first IP address of the range
+ * \param [out] end    the last IP address of the range
+ * \return 1 if obj is UnirecIPAddrRange, 0 otherwise.
+ */
+int
+UnirecIPAddrRange_AsIPs(PyObject *obj, ip_addr_t *start, ip_addr_t *end)
+{
+    if (!PyObject_TypeCheck(obj, &pytrap_UnirecIPAddrRange)) {
+        return 0;
+    }
+    memcpy(start, &((pytrap_unirecipaddrrange *) obj)->start->ip, sizeof(ip_addr_t));
+    memcpy(end, &((pytrap_unirecipaddrrange *) obj)->end->ip, sizeof(ip_addr_t));
+    return 1;
+}
+
+
+
+/*********************/
+/*    FileReader     */
+/*********************/
+
+/** Flag in the length of buffer marking compressed payload (TRAP_CODEC_COMPRESSED of libtrap). */
+#define FILEREADER_COMPRESSED 0x80000000
+/** Size of the hello message header at the beginning of the file (hello_msg_header_t). */
+#define FILEREADER_HELLO_SIZE 8
+/** Size of the header of compressed payload (trap_codec_header_t). */
+#define FILEREADER_CODEC_SIZE 8
+/** Identifier of zlib codec. */
+#define FILEREADER_CODEC_ZLIB 1
+/** Initial number of rows allocated for columns. */
+#define FILEREADER_INIT_ROWS 1024
+
+static PyTypeObject pytrap_FileReader;
+
+/** zlib.decompress(), it is imported at the first compressed buffer. */
+static PyObject *filereader_decompress = NULL;
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *path;
+    char *filename;
+    PyObject *fmtspec;
+    int fmttype;
+    int fd;
+    char *map; /* whole file mapped into memory, NULL when reading by pread() */
+    Py_ssize_t file_size;
+    Py_ssize_t data_start; /* offset of the first buffer */
+    Py_ssize_t pos; /* offset of the next buffer */
+    Py_ssize_t end; /* offset where reading stops */
+    PyObject *buffer_obj; /* owner of the current payload, NULL for mapped data */
+    const char *buffer; /* payload of the current buffer */
+    Py_ssize_t buffer_size;
+    Py_ssize_t buffer_pos; /* offset of the next message in the current buffer */
+} pytrap_filereader;
+
+static int
+FileReader_read_at(pytrap_filereader *self, Py_ssize_t offset, void *dst, Py_ssize_t size)
+{
+    ssize_t ret;
+
+    if (offset + size > self->file_size) {
+        return -1;
+    }
+    if (self->map != NULL) {
+        memcpy(dst, self->map + offset, size);
+        return 0;
+    }
+    while (size > 0) {
+        ret = pread(self->fd, dst, size, offset);
+        if (ret <= 0) {
+            if (ret < 0 && errno == EINTR) {
+                continue;
+            }
+            return -1;
+        }
+        dst = (char *) dst + ret;
+        offset += ret;
+        size -= ret;
+    }
+    return 0;
+}
+
+static PyObject *
+FileReader_read_bytes(pytrap_filereader *self, Py_ssize_t offset, Py_ssize_t size)
+{
+    PyObject *result;
+
+    if (self->map != NULL) {
+        return PyBytes_FromStringAndSize(self->map + offset, size);
+    }
+    result = PyBytes_FromStringAndSize(NULL, size);
+    if (result != NULL && FileReader_read_at(self, offset, PyBytes_AS_STRING(result), size) != 0) {
+        Py_DECREF(result);
+        PyErr_Format(TrapError, "Could not read file %s.", self->filename);
+        return NULL;
+    }
+    return result;
+}
+
+static void
+FileReader_close_local(pytrap_filereader *self)
+{
+    Py_CLEAR(self->buffer_obj);
+    self->buffer = NULL;
+    self->buffer_size = self->buffer_pos = 0;
+    if (self->map != NULL) {
+        munmap(self->map, self->file_size);
+        self->map = NULL;
+    }
+    if (self->fd >= 0) {
+        close(self->fd);
+        self->fd = -1;
+    }
+}
+
+/**
+ * Decompress payload of a buffer into self->buffer_obj.
+ */
+static int
+FileReader_decompress(pytrap_filereader *self, Py_ssize_t offset, Py_ssize_t size)
+{
+    unsigned char header[FILEREADER_CODEC_SIZE];
+    uint32_t raw_length;
+    PyObject *data, *result, *zlib;
+
+    if (size < FILEREADER_CODEC_SIZE || FileReader_read_at(self, offset, header, FILEREADER_CODEC_SIZE) != 0) {
+        PyErr_Format(TrapError, "Corrupted compressed buffer at offset %zd of %s.", offset, self->filename);
+        return -1;
+    }
+    if (header[0] != FILEREADER_CODEC_ZLIB) {
+        PyErr_Format(TrapError, "Unknown codec %d of buffer at offset %zd of %s.", (int) header[0], offset, self->filename);
+        return -1;
+    }
+    memcpy(&raw_length, header + 4, sizeof(raw_length));
+    raw_length = ntohl(raw_length);
+
+    if (filereader_decompress == NULL) {
+        zlib = PyImport_ImportModule("zlib");
+        if (zlib == NULL) {
+            return -1;
+        }
+        filereader_decompress = PyObject_GetAttrString(zlib, "decompress");
+        Py_DECREF(zlib);
+        if (filereader_decompress == NULL) {
+            return -1;
+        }
+    }
+
+    data = FileReader_read_bytes(self, offset + FILEREADER_CODEC_SIZE, size - FILEREADER_CODEC_SIZE);
+    if (data == NULL) {
+        return -1;
+    }
+    result = PyObject_CallFunctionObjArgs(filereader_decompress, data, NULL);
+    Py_DECREF(data);
+    if (result == NULL) {
+        return -1;
+    }
+    if (!PyBytes_Check(result) || PyBytes_GET_SIZE(result) != raw_length) {
+        Py_DECREF(result);
+        PyErr_Format(TrapError, "Corrupted compressed buffer at offset %zd of %s.", offset, self->filename);
+        return -1;
+    }
+    self->buffer_obj = result;
+    self->buffer = PyBytes_AS_STRING(result);
+    self->buffer_size = raw_length;
+    return 0;
+}
+
+/**
+ * Load the next buffer of the file.
+ *
+ * \return 1 on success, 0 at the end of file (or chunk), -1 on error (exception is set)
+ */
+static int
+FileReader_load_buffer(pytrap_filereader *self)
+{
+    uint32_t header, size;
+    Py_ssize_t offset;
+
+    Py_CLEAR(self->buffer_obj);
+    self->buffer = NULL;
+    self->buffer_size = self->buffer_pos = 0;
+
+    if (self->fd < 0) {
+        PyErr_SetString(TrapError, "FileReader is closed.");
+        return -1;
+    }
+    if (self->pos >= self->end) {
+        return 0;
+    }
+    if (FileReader_read_at(self, self->pos, &header, sizeof(header)) != 0) {
+        PyErr_Format(TrapError, "Truncated buffer at offset %zd of %s.", self->pos, self->filename);
+        return -1;
+    }
+    header = ntohl(header);
+    size = header & ~FILEREADER_COMPRESSED;
+    offset = self->pos + sizeof(header);
+    if (offset + size > self->file_size) {
+        PyErr_Format(TrapError, "Truncated buffer at offset %zd of %s.", self->pos, self->filename);
+        return -1;
+    }
+    self->pos = offset + size;
+
+    if (header & FILEREADER_COMPRESSED) {
+        return FileReader_decompress(self, offset, size) == 0 ? 1 : -1;
+    }
+    if (self->map != NULL) {
+        self->buffer = self->map + offset;
+        self->buffer_size = size;
+        return 1;
+    }
+    self->buffer_obj = FileReader_read_bytes(self, offset, size);
+    if (self->buffer_obj == NULL) {
+        return -1;
+    }
+    self->buffer = PyBytes_AS_STRING(self->buffer_obj);
+    self->buffer_size = size;
+    return 1;
+}
+
+/**
+ * Get the next message, data are valid until the next call.
+ *
+ * \return 1 on success, 0 at the end of file (or chunk), -1 on error (exception is set)
+ */
+static int
+FileReader_next_message(pytrap_filereader *self, const char **msg, Py_ssize_t *msg_size)
+{
+    uint16_t size;
+    int ret;
+
+    while (self->buffer_pos >= self->buffer_size) {
+        if ((ret = FileReader_load_buffer(self)) <= 0) {
+            return ret;
+        }
+    }
+    if (self->buffer_size - self->buffer_pos < (Py_ssize_t) sizeof(size)) {
+        goto corrupted;
+    }
+    memcpy(&size, self->buffer + self->buffer_pos, sizeof(size));
+    size = ntohs(size);
+    if (self->buffer_pos + (Py_ssize_t) sizeof(size) + size > self->buffer_size) {
+        goto corrupted;
+    }
+    *msg = self->buffer + self->buffer_pos + sizeof(size);
+    *msg_size = size;
+    self->buffer_pos += sizeof(size) + size;
+    return 1;
+
+corrupted:
+    PyErr_Format(TrapError, "Corrupted buffer before offset %zd of %s.", self->pos, self->filename);
+    return -1;
+}
+
+static PyObject *
+FileReader_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_filereader *self;
+    PyObject *path, *end_obj = Py_None;
+    const char *filename;
+    Py_ssize_t start = 0;
+    int use_mmap = 1;
+    unsigned char hello[FILEREADER_HELLO_SIZE];
+    uint32_t spec_size;
+    struct stat st;
+    char *spec;
+
+    static char *kwlist[] = {"path", "start", "end", "mmap", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|nOi", kwlist, &path, &start, &end_obj, &use_mmap)) {
+        return NULL;
+    }
+#if PY_MAJOR_VERSION >= 3
+    filename = PyUnicode_Check(path) ? PyUnicode_AsUTF8(path) : NULL;
+#else
+    filename = PyString_Check(path) ? PyString_AsString(path) : NULL;
+#endif
+    if (filename == NULL) {
+        PyErr_SetString(PyExc_TypeError, "Argument path must be str.");
+        return NULL;
+    }
+
+    self = (pytrap_filereader *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->fd = -1;
+    Py_INCREF(path);
+    self->path = path;
+    if ((self->filename = strdup(filename)) == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+
+    self->fd = open(filename, O_RDONLY);
+    if (self->fd < 0 || fstat(self->fd, &st) != 0) {
+        PyErr_SetFromErrnoWithFilename(PyExc_IOError, filename);
+        goto failure;
+    }
+    self->file_size = st.st_size;
+    if (use_mmap && self->file_size > 0) {
+        self->map = mmap(NULL, self->file_size, PROT_READ, MAP_PRIVATE, self->fd, 0);
+        if (self->map == MAP_FAILED) {
+            self->map = NULL;
+        } else {
+            madvise(self->map, self->file_size, MADV_SEQUENTIAL);
+        }
+    }
+
+    if (FileReader_read_at(self, 0, hello, FILEREADER_HELLO_SIZE) != 0) {
+        PyErr_Format(TrapError, "File %s is not a TRAP file.", filename);
+        goto failure;
+    }
+    memcpy(&spec_size, hello + 4, sizeof(spec_size));
+    spec_size = ntohl(spec_size);
+    self->fmttype = hello[0];
+    self->data_start = FILEREADER_HELLO_SIZE + (Py_ssize_t) spec_size;
+    if (self->fmttype < TRAP_FMT_RAW || self->fmttype > TRAP_FMT_JSON || self->data_start > self->file_size) {
+        PyErr_Format(TrapError, "File %s is not a TRAP file.", filename);
+        goto failure;
+    }
+    spec = malloc(spec_size + 1);
+    if (spec == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+    if (FileReader_read_at(self, FILEREADER_HELLO_SIZE, spec, spec_size) != 0) {
+        free(spec);
+        PyErr_Format(TrapError, "File %s is not a TRAP file.", filename);
+        goto failure;
+    }
+#if PY_MAJOR_VERSION >= 3
+    self->fmtspec = PyUnicode_FromStringAndSize(spec, spec_size);
+#else
+    self->fmtspec = PyString_FromStringAndSize(spec, spec_size);
+#endif
+    free(spec);
+    if (self->fmtspec == NULL) {
+        /* corrupted format specifier */
+        if (PyErr_ExceptionMatches(PyExc_UnicodeDecodeError)) {
+            PyErr_Clear();
+            PyErr_Format(TrapError, "File %s is not a TRAP file.", filename);
+        }
+        goto failure;
+    }
+
+    self->pos = start > self->data_start ? start : self->data_start;
+    self->end = self->file_size;
+    if (end_obj != Py_None) {
+        Py_ssize_t end = PyNumber_AsSsize_t(end_obj, PyExc_OverflowError);
+        if (end == -1 && PyErr_Occurred()) {
+            goto failure;
+        }
+        if (end < self->end) {
+            self->end = end;
+        }
+    }
+    return (PyObject *) self;
+
+failure:
+    Py_DECREF(self);
+    return NULL;
+}
+
+static void
+FileReader_dealloc(pytrap_filereader *self)
+{
+    FileReader_close_local(self);
+    Py_XDECREF(self->path);
+    free(self->filename);
+    Py_XDECREF(self->fmtspec);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
+
+static PyObject *
+FileReader_next(pytrap_filereader *self)
+{
+    const char *msg;
+    Py_ssize_t size;
+
+    if (FileReader_next_message(self, &msg, &size) <= 0) {
+        return NULL;
+    }
+    return PyByteArray_FromStringAndSize(msg, size);
+}
+
+static PyObject *
+FileReader_readBuffer(pytrap_filereader *self)
+{
+    int ret = FileReader_load_buffer(self);
+
+    if (ret < 0) {
+        return NULL;
+    } else if (ret == 0) {
+        Py_RETURN_NONE;
+    }
+    /* the whole buffer is returned, messages are not iterated */
+    self->buffer_pos = self->buffer_size;
+    if (self->buffer_obj != NULL) {
+        Py_INCREF(self->buffer_obj);
+        return self->buffer_obj;
+    }
+    return PyBytes_FromStringAndSize(self->buffer, self->buffer_size);
+}
+
+typedef struct {
+    int32_t field_id;
+    Py_ssize_t size; /* size of value, 0 for variable-length field */
+    char *data; /* packed values of fixed-length field */
+    PyObject *list; /* values of variable-length field */
+} filereader_column_t;
+
+static PyObject *
+FileReader_columns(pytrap_filereader *self, PyObject *args, PyObject *keywds)
+{
+    PyObject *tmplt_obj, *fields = Py_None, *seq = NULL, *result = NULL, *value;
+    pytrap_unirectemplate *tmplt;
+    filereader_column_t *cols = NULL;
+    Py_ssize_t i, ncols, rows = 0, allocated = FILEREADER_INIT_ROWS, min_size, size;
+    const char *msg;
+    int ret;
+
+    static char *kwlist[] = {"template", "fields", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "O!|O", kwlist, &pytrap_UnirecTemplate, &tmplt_obj, &fields)) {
+        return NULL;
+    }
+    tmplt = (pytrap_unirectemplate *) tmplt_obj;
+    min_size = ur_rec_fixlen_size(tmplt->urtmplt);
+
+    if (fields == Py_None) {
+        ncols = tmplt->urtmplt->count;
+    } else {
+        seq = PySequence_Fast(fields, "Argument fields must be a sequence of field names.");
+        if (seq == NULL) {
+            return NULL;
+        }
+        ncols = PySequence_Fast_GET_SIZE(seq);
+    }
+    cols = calloc(ncols > 0 ? ncols : 1, sizeof(*cols));
+    if (cols == NULL) {
+        PyErr_NoMemory();
+        goto cleanup;
+    }
+    for (i = 0; i < ncols; i++) {
+        if (seq == NULL) {
+            cols[i].field_id = tmplt->urtmplt->ids[i];
+        } else {
+            cols[i].field_id = UnirecTemplate_get_field_id(tmplt, PySequence_Fast_GET_ITEM(seq, i));
+            if (cols[i].field_id == UR_ITER_END) {
+                PyErr_SetString(TrapError, "Field was not found.");
+                goto cleanup;
+            }
+        }
+        if (ur_is_varlen(cols[i].field_id)) {
+            if ((cols[i].list = PyList_New(0)) == NULL) {
+                goto cleanup;
+            }
+        } else {
+            cols[i].size = ur_get_size(cols[i].field_id);
+            if ((cols[i].data = malloc(allocated * cols[i].size)) == NULL) {
+                PyErr_NoMemory();
+                goto cleanup;
+            }
+        }
+    }
+
+    while ((ret = FileReader_next_message(self, &msg, &size)) > 0) {
+        if (size <= 1) {
+            /* end-of-stream message */
+            continue;
+        }
+        if (size < min_size) {
+            PyErr_Format(TrapError, "Record %zd is shorter than the template.", rows);
+            goto cleanup;
+        }
+        if (rows == allocated) {
+            allocated *= 2;
+            for (i = 0; i < ncols; i++) {
+                char *p;
+                if (cols[i].data != NULL) {
+                    if ((p = realloc(cols[i].data, allocated * cols[i].size)) == NULL) {
+                        PyErr_NoMemory();
+                        goto cleanup;
+                    }
+                    cols[i].data = p;
+                }
+            }
+        }
+        for (i = 0; i < ncols; i++) {
+            int32_t id = cols[i].field_id;
+            if (cols[i].data != NULL) {
+                memcpy(cols[i].data + rows * cols[i].size, ur_get_ptr_by_id(tmplt->urtmplt, msg, id), cols[i].size);
+                continue;
+            }
+            if (min_size + ur_get_var_offset(tmplt->urtmplt, msg, id) + ur_get_var_len(tmplt->urtmplt, msg, id) > size) {
+                PyErr_Format(TrapError, "Record %zd is corrupted.", rows);
+                goto cleanup;
+            }
+            value = PyBytes_FromStringAndSize(ur_get_ptr_by_id(tmplt->urtmplt, msg, id), ur_get_var_len(tmplt->urtmplt, msg, id));
+            if (value == NULL || PyList_Append(cols[i].list, value) != 0) {
+                Py_XDECREF(value);
+                goto cleanup;
+            }
+            Py_DECREF(value);
+        }
+        rows++;
+    }
+    if (ret < 0) {
+        goto cleanup;
+    }
+
+    result = PyDict_New();
+    if (result == NULL) {
+        goto cleanup;
+    }
+    for (i = 0; i < ncols; i++) {
+        if (cols[i].data != NULL) {
+            value = PyByteArray_FromStringAndSize(cols[i].data, rows * cols[i].size);
+        } else {
+            value = cols[i].list;
+            Py_INCREF(value);
+        }
+        if (value == NULL || PyDict_SetItemString(result, ur_get_name(cols[i].field_id), value) != 0) {
+            Py_XDECREF(value);
+            Py_CLEAR(result);
+            goto cleanup;
+        }
+        Py_DECREF(value);
+    }
+
+cleanup:
+    if (cols != NULL) {
+        for (i = 0; i < ncols; i++) {
+            free(cols[i].data);
+            Py_XDECREF(cols[i].list);
+        }
+        free(cols);
+    }
+    Py_XDECREF(seq);
+    return result;
+}
+
+static PyObject *
+FileReader_chunks(PyObject *unused, PyObject *args, PyObject *keywds)
+{
+    PyObject *paths, *seq = NULL, *readers = NULL, *result = NULL, *chunk;
+    pytrap_filereader *r;
+    Py_ssize_t i, n, count, total = 0, target, chunk_start, pos;
+    uint32_t header;
+
+    static char *kwlist[] = {"paths", "n", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, keywds, "On", kwlist, &paths, &n)) {
+        return NULL;
+    }
+    if (n < 1) {
+        PyErr_SetString(PyExc_ValueError, "Number of chunks must be positive.");
+        return NULL;
+    }
+    seq = PySequence_Fast(paths, "Argument paths must be a sequence of file names.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    count = PySequence_Fast_GET_SIZE(seq);
+    if ((readers = PyList_New(count)) == NULL || (result = PyList_New(0)) == NULL) {
+        goto failure;
+    }
+    for (i = 0; i < count; i++) {
+        r = (pytrap_filereader *) PyObject_CallFunctionObjArgs((PyObject *) &pytrap_FileReader, PySequence_Fast_GET_ITEM(seq, i), NULL);
+        if (r == NULL) {
+            goto failure;
+        }
+        PyList_SET_ITEM(readers, i, (PyObject *) r);
+        total += r->file_size - r->data_start;
+    }
+    target = (total + n - 1) / n;
+
+    for (i = 0; i < count; i++) {
+        r = (pytrap_filereader *) PyList_GET_ITEM(readers, i);
+        chunk_start = pos = r->data_start;
+        while (pos < r->file_size) {
+            if (FileReader_read_at(r, pos, &header, sizeof(header)) != 0) {
+                PyErr_Format(TrapError, "Truncated buffer at offset %zd of %s.", pos, r->filename);
+                goto failure;
+            }
+            pos += sizeof(header) + (ntohl(header) & ~FILEREADER_COMPRESSED);
+            if (pos - chunk_start >= target || pos >= r->file_size) {
+                chunk = Py_BuildValue("(Onn)", r->path, chunk_start, pos);
+                if (chunk == NULL || PyList_Append(result, chunk) != 0) {
+                    Py_XDECREF(chunk);
+                    goto failure;
+                }
+                Py_DECREF(chunk);
+                chunk_start = pos;
+            }
+        }
+    }
+
+    Py_DECREF(readers);
+    Py_DECREF(seq);
+    return result;
+
+failure:
+    Py_XDECREF(readers);
+    Py_XDECREF(result);
+    Py_DECREF(seq);
+    return NULL;
+}
+
+static PyObject *
+FileReader_close(pytrap_filereader *self)
+{
+    FileReader_close_local(self);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+FileReader_enter(pytrap_filereader *self)
+{
+    Py_INCREF(self);
+    return (PyObject *) self;
+}
+
+static PyObject *
+FileReader_exit(pytrap_filereader *self, PyObject *args)
+{
+    FileReader_close_local(self);
+    Py_RETURN_FALSE;
+}
+
+static PyMemberDef FileReader_members[] = {
+    {"path", T_OBJECT_EX, offsetof(pytrap_filereader, path), READONLY,
+     "Path of the file"},
+    {"fmttype", T_INT, offsetof(pytrap_filereader, fmttype), READONLY,
+     "Data format type of the file (FMT_RAW, FMT_UNIREC or FMT_JSON)"},
+    {"fmtspec", T_OBJECT_EX, offsetof(pytrap_filereader, fmtspec), READONLY,
+     "Data format specifier of the file (e.g. UniRec template)"},
+    {NULL}  /* Sentinel */
+};
+
+static PyMethodDef FileReader_methods[] = {
+    {"readBuffer", (PyCFunction) FileReader_readBuffer, METH_NOARGS,
+        "Read the next buffer of messages.\n\n"
+        "Compressed buffers are decompressed. Unread messages of the current buffer are skipped.\n\n"
+        "Returns:\n"
+        "    (bytes): Payload of the buffer (sequence of messages, each prefixed by 2B length\n"
+        "        in network byte order) or None at the end of file (chunk).\n\n"
+        "Raises:\n"
+        "    TrapError: File is corrupted or compressed by unknown codec.\n"
+        },
+
+    {"columns", (PyCFunction) FileReader_columns, METH_VARARGS | METH_KEYWORDS,
+        "Read all remaining messages and decode them into columns.\n\n"
+        "Values of fixed-length fields are copied into packed arrays (as by\n"
+        "UnirecTemplate.getColumn()) without creating Python objects.\n"
+        "End-of-stream messages (1B or shorter) are skipped.\n\n"
+        "Args:\n"
+        "    template (UnirecTemplate): Template of messages, e.g. UnirecTemplate(reader.fmtspec).\n"
+        "    fields (Optional[list]): Names of fields to decode, all fields of template by default.\n"
+        "Returns:\n"
+        "    (dict): Field name -> bytearray of packed values in host byte order (ur_get_size()\n"
+        "        bytes each) for fixed-length fields or list of bytes for variable-length fields.\n\n"
+        "Raises:\n"
+        "    TrapError: Field name was not found, a message does not match the template or file is corrupted.\n"
+        },
+
+    {"chunks", (PyCFunction) FileReader_chunks, METH_VARARGS | METH_KEYWORDS | METH_STATIC,
+        "Split files into chunks of buffers that can be read in parallel.\n\n"
+        "Chunks have similar size and they do not cross boundaries of files.\n\n"
+        "Args:\n"
+        "    paths (list): Names of files.\n"
+        "    n (int): Requested number of chunks.\n"
+        "Returns:\n"
+        "    (list): Tuples (path, start, end) to be passed to FileReader().\n"
+        },
+
+    {"close", (PyCFunction) FileReader_close, METH_NOARGS,
+        "Close the file."
+        },
+
+    {"__enter__", (PyCFunction) FileReader_enter, METH_NOARGS, ""},
+    {"__exit__", (PyCFunction) FileReader_exit, METH_VARARGS, ""},
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PyTypeObject pytrap_FileReader = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.FileReader",       /* tp_name */
+    sizeof(pytrap_filereader), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) FileReader_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    0,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "FileReader(path, start=0, end=None, mmap=True)\n\n"
+    "Offline reader of files stored by TRAP file output interface.\n"
+    "It does not need any TrapCtx, iteration yields messages (bytearray) of the file.\n\n"
+    "Args:\n"
+    "    path (str): Name of the file.\n"
+    "    start (Optional[int]): Offset of the first buffer to read (see chunks()).\n"
+    "    end (Optional[int]): Offset where reading stops.\n"
+    "    mmap (Optional[bool]): Map the file into memory instead of reading it.\n"
+    "        The file must not be truncated while it is read, access to the\n"
+    "        missing part of a mapped file kills the process by SIGBUS.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    PyObject_SelfIter,         /* tp_iter */
+    (iternextfunc) FileReader_next, /* tp_iternext */
+    FileReader_methods,        /* tp_methods */
+    FileReader_members,        /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    FileReader_new,            /* tp_new */
+};
+
+
+/*********************/
+/* UnirecFilter      */
+/*********************/
+
+/*
+ * Filter expressions are compiled into a tree of nodes stored in one array.
+ * Leaves compare a field of a record with constants, the tree is evaluated
+ * directly on the raw record without creating Python objects.
+ */
+
+/** Types of nodes of a compiled filter. */
+enum {
+    URFILTER_AND,
+    URFILTER_OR,
+    URFILTER_NOT,
+    URFILTER_CMP_UINT, // unsigned integer, char or time field
+    URFILTER_CMP_INT, // signed integer field
+    URFILTER_CMP_DOUBLE, // any numeric field compared with a real number
+    URFILTER_CMP_IP,
+    URFILTER_CMP_STR, // string or bytes field
+    URFILTER_IN_UINT, // sorted array of uint64_t
+    URFILTER_IN_INT, // sorted array of int64_t
+    URFILTER_IN_IP, // array of urfilter_prefix_t
+    URFILTER_IN_STR // array of urfilter_str_t
+};
+
+/** Comparison operators, membership uses EQ (in) and NE (not in). */
+enum {
+    URFILTER_EQ,
+    URFILTER_NE,
+    URFILTER_LT,
+    URFILTER_LE,
+    URFILTER_GT,
+    URFILTER_GE
+};
+
+/** Classes of field types with the same handling in filters. */
+enum {
+    URFILTER_CLASS_UINT,
+    URFILTER_CLASS_INT,
+    URFILTER_CLASS_DOUBLE,
+    URFILTER_CLASS_TIME,
+    URFILTER_CLASS_IP,
+    URFILTER_CLASS_STR
+};
+
+/** Types of constants in filter expressions. */
+enum {
+    URFILTER_LIT_UINT,
+    URFILTER_LIT_INT, // negative integer
+    URFILTER_LIT_DOUBLE,
+    URFILTER_LIT_IP,
+    URFILTER_LIT_STR
+};
+
+typedef struct {
+    ip_addr_t net; // masked address
+    ip_addr_t mask;
+} urfilter_prefix_t;
+
+typedef struct {
+    char *str;
+    Py_ssize_t len;
+} urfilter_str_t;
+
+typedef struct {
+    uint8_t type;
+    uint8_t op;
+    int16_t field_id;
+    int32_t left; // operands of logical nodes
+    int32_t right;
+    union {
+        uint64_t u;
+        int64_t i;
+        double d;
+        urfilter_prefix_t ip;
+        urfilter_str_t str;
+        struct {
+            void *items;
+            Py_ssize_t count;
+        } set;
+    } value;
+} urfilter_node_t;
+
+typedef struct {
+    int type;
+    int full; // IP address is not a prefix
+    uint64_t u;
+    int64_t i;
+    double d;
+    urfilter_prefix_t ip;
+    urfilter_str_t str;
+} urfilter_literal_t;
+
+typedef struct {
+    PyObject_HEAD
+    pytrap_unirectemplate *template; // owner of the ur_template_t used for evaluation
+    PyObject *expression;
+    urfilter_node_t *nodes;
+    int32_t node_count;
+    int32_t root;
+} pytrap_unirecfilter;
+
+typedef struct {
+    pytrap_unirecfilter *filter;
+    const char *expr;
+    const char *pos;
+    int depth; // nesting of parentheses and negations
+} urfilter_parser_t;
+
+/** Maximal nesting of parentheses and negations, it bounds recursion of parser and evaluation. */
+#define URFILTER_MAX_DEPTH 256
+
+static PyTypeObject pytrap_UnirecFilter;
+
+#define URFILTER_COMPARE(op, a, b) \
+    ((op) == URFILTER_EQ ? (a) == (b) : (op) == URFILTER_NE ? (a) != (b) : \
+     (op) == URFILTER_LT ? (a) < (b) : (op) == URFILTER_LE ? (a) <= (b) : \
+     (op) == URFILTER_GT ? (a) > (b) : (a) >= (b))
+
+static inline uint64_t
+urfilter_get_uint(int16_t field_id, const char *p)
+{
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_CHAR:
+    case UR_TYPE_UINT8:
+        return *(uint8_t *) p;
+    case UR_TYPE_UINT16:
+        return *(uint16_t *) p;
+    case UR_TYPE_UINT32:
+        return *(uint32_t *) p;
+    default:
+        // UR_TYPE_UINT64, UR_TYPE_TIME
+        return *(uint64_t *) p;
+    }
+}
+
+static inline int64_t
+urfilter_get_int(int16_t field_id, const char *p)
+{
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_INT8:
+        return *(int8_t *) p;
+    case UR_TYPE_INT16:
+        return *(int16_t *) p;
+    case UR_TYPE_INT32:
+        return *(int32_t *) p;
+    default:
+        return *(int64_t *) p;
+    }
+}
+
+static inline double
+urfilter_get_double(int16_t field_id, const char *p)
+{
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_INT8:
+    case UR_TYPE_INT16:
+    case UR_TYPE_INT32:
+    case UR_TYPE_INT64:
+        return (double) urfilter_get_int(field_id, p);
+    case UR_TYPE_FLOAT:
+        return *(float *) p;
+    case UR_TYPE_DOUBLE:
+        return *(double *) p;
+    default:
+        return (double) urfilter_get_uint(field_id, p);
+    }
+}
+
+static inline int
+urfilter_prefix_match(const urfilter_prefix_t *prefix, const ip_addr_t *ip)
+{
+    return (ip->ui64[0] & prefix->mask.ui64[0]) == prefix->net.ui64[0] &&
+           (ip->ui64[1] & prefix->mask.ui64[1]) == prefix->net.ui64[1];
+}
+
+static inline int
+urfilter_find_uint(const uint64_t *items, Py_ssize_t count, uint64_t value)
+{
+    Py_ssize_t low = 0, high = count;
+
+    while (low < high) {
+        Py_ssize_t mid = low + (high - low) / 2;
+        if (items[mid] < value) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    return low < count && items[low] == value;
+}
+
+static inline int
+urfilter_find_int(const int64_t *items, Py_ssize_t count, int64_t value)
+{
+    Py_ssize_t low = 0, high = count;
+
+    while (low < high) {
+        Py_ssize_t mid = low + (high - low) / 2;
+        if (items[mid] < value) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    return low < count && items[low] == value;
+}
+
+/**
+ * \brief Evaluate a node of the filter on a record.
+ *
+ * The record must be at least static_size long.
+ * \return 1 if the record matches, 0 if it does not, -1 with exception set on error
+ */
+static int
+UnirecFilter_eval(const pytrap_unirecfilter *self, int32_t index, const char *data, Py_ssize_t size)
+{
+    const urfilter_node_t *n = &self->nodes[index];
+    const ur_template_t *tmplt = self->template->urtmplt;
+    const char *p;
+    Py_ssize_t i, len = 0;
+    ip_addr_t ip;
+    int r;
+
+    /* chains of && and || are right-deep, continue with the right operand without recursion */
+    while (n->type == URFILTER_AND || n->type == URFILTER_OR) {
+        r = UnirecFilter_eval(self, n->left, data, size);
+        if (r != (n->type == URFILTER_AND)) {
+            return r;
+        }
+        n = &self->nodes[n->right];
+    }
+    if (n->type == URFILTER_NOT) {
+        r = UnirecFilter_eval(self, n->left, data, size);
+        return r < 0 ? r : !r;
+    }
+
+    if (ur_is_static(n->field_id)) {
+        p = data + tmplt->offset[n->field_id];
+    } else {
+        Py_ssize_t offset = tmplt->static_size + ur_get_var_offset(tmplt, data, n->field_id);
+        len = ur_get_var_len(tmplt, data, n->field_id);
+        if (offset + len > size) {
+            PyErr_SetString(TrapError, "Message is too short.");
+            return -1;
+        }
+        p = data + offset;
+    }
+
+    switch (n->type) {
+    case URFILTER_CMP_UINT:
+        return URFILTER_COMPARE(n->op, urfilter_get_uint(n->field_id, p), n->value.u);
+    case URFILTER_CMP_INT:
+        return URFILTER_COMPARE(n->op, urfilter_get_int(n->field_id, p), n->value.i);
+    case URFILTER_CMP_DOUBLE:
+        return URFILTER_COMPARE(n->op, urfilter_get_double(n->field_id, p), n->value.d);
+    case URFILTER_CMP_IP:
+        memcpy(&ip, p, sizeof(ip));
+        if (n->op == URFILTER_EQ || n->op == URFILTER_NE) {
+            return urfilter_prefix_match(&n->value.ip, &ip) == (n->op == URFILTER_EQ);
+        }
+        r = ip_cmp(&ip, &n->value.ip.net);
+        return URFILTER_COMPARE(n->op, r, 0);
+    case URFILTER_CMP_STR:
+        r = len == n->value.str.len && memcmp(p, n->value.str.str, len) == 0;
+        return r == (n->op == URFILTER_EQ);
+    case URFILTER_IN_UINT:
+        r = urfilter_find_uint(n->value.set.items, n->value.set.count, urfilter_get_uint(n->field_id, p));
+        return r == (n->op == URFILTER_EQ);
+    case URFILTER_IN_INT:
+        r = urfilter_find_int(n->value.set.items, n->value.set.count, urfilter_get_int(n->field_id, p));
+        return r == (n->op == URFILTER_EQ);
+    case URFILTER_IN_IP:
+        memcpy(&ip, p, sizeof(ip));
+        r = 0;
+        for (i = 0; i < n->value.set.count && !r; i++) {
+            r = urfilter_prefix_match(&((urfilter_prefix_t *) n->value.set.items)[i], &ip);
+        }
+        return r == (n->op == URFILTER_EQ);
+    case URFILTER_IN_STR:
+        r = 0;
+        for (i = 0; i < n->value.set.count && !r; i++) {
+            const urfilter_str_t *s = &((urfilter_str_t *) n->value.set.items)[i];
+            r = len == s->len && memcmp(p, s->str, len) == 0;
+        }
+        return r == (n->op == URFILTER_EQ);
+    }
+    return 0;
+}
+
+/**
+ * \brief Evaluate the filter on a whole record.
+ *
+ * \return 1 if the record matches, 0 if it does not, -1 with exception set on error
+ */
+static inline int
+UnirecFilter_match_record(const pytrap_unirecfilter *self, const char *data, Py_ssize_t size)
+{
+    if (size < self->template->urtmplt->static_size) {
+        PyErr_SetString(TrapError, "Message is too short.");
+        return -1;
+    }
+    return UnirecFilter_eval(self, self->root, data, size);
+}
+
+static int
+urfilter_field_class(int16_t field_id)
+{
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_INT8:
+    case UR_TYPE_INT16:
+    case UR_TYPE_INT32:
+    case UR_TYPE_INT64:
+        return URFILTER_CLASS_INT;
+    case UR_TYPE_FLOAT:
+    case UR_TYPE_DOUBLE:
+        return URFILTER_CLASS_DOUBLE;
+    case UR_TYPE_TIME:
+        return URFILTER_CLASS_TIME;
+    case UR_TYPE_IP:
+        return URFILTER_CLASS_IP;
+    case UR_TYPE_STRING:
+    case UR_TYPE_BYTES:
+        return URFILTER_CLASS_STR;
+    default:
+        return URFILTER_CLASS_UINT;
+    }
+}
+
+static void
+urfilter_skip_spaces(urfilter_parser_t *p)
+{
+    while (isspace((unsigned char) *p->pos)) {
+        p->pos++;
+    }
+}
+
+/**
+ * \brief Consume the token if it follows, keywords must not be followed by a name character.
+ */
+static int
+urfilter_accept(urfilter_parser_t *p, const char *token)
+{
+    size_t len = strlen(token);
+
+    urfilter_skip_spaces(p);
+    if (strncmp(p->pos, token, len) != 0) {
+        return 0;
+    }
+    if (isalpha((unsigned char) token[0]) && (isalnum((unsigned char) p->pos[len]) || p->pos[len] == '_')) {
+        return 0;
+    }
+    p->pos += len;
+    return 1;
+}
+
+static int32_t
+urfilter_syntax_error(urfilter_parser_t *p, const char *expected)
+{
+    PyErr_Format(PyExc_ValueError, "Syntax error at position %d of filter: expected %s.",
+                 (int) (p->pos - p->expr), expected);
+    return -1;
+}
+
+/**
+ * \brief Append a zeroed node of the given type.
+ *
+ * \return Index of the node, -1 with exception set on error.
+ */
+static int32_t
+urfilter_add_node(urfilter_parser_t *p, uint8_t type)
+{
+    pytrap_unirecfilter *f = p->filter;
+    urfilter_node_t *nodes;
+
+    /* capacity is the next power of two */
+    if ((f->node_count & (f->node_count - 1)) == 0) {
+        nodes = realloc(f->nodes, sizeof(*nodes) * (f->node_count ? f->node_count * 2 : 1));
+        if (nodes == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        f->nodes = nodes;
+    }
+    memset(&f->nodes[f->node_count], 0, sizeof(*nodes));
+    f->nodes[f->node_count].type = type;
+    return f->node_count++;
+}
+
+static void
+urfilter_make_prefix(urfilter_prefix_t *prefix, const ip_addr_t *addr, int length)
+{
+    int i, bits;
+
+    if (ip_is4(addr)) {
+        prefix->mask.ui64[0] = UINT64_MAX;
+        prefix->mask.ui32[2] = htonl(length ? UINT32_MAX << (32 - length) : 0);
+        prefix->mask.ui32[3] = UINT32_MAX;
+    } else {
+        for (i = 0; i < 16; i++) {
+            bits = length - 8 * i;
+            bits = bits < 0 ? 0 : (bits > 8 ? 8 : bits);
+            prefix->mask.bytes[i] = (uint8_t) (0xff00 >> bits);
+        }
+    }
+    prefix->net.ui64[0] = addr->ui64[0] & prefix->mask.ui64[0];
+    prefix->net.ui64[1] = addr->ui64[1] & prefix->mask.ui64[1];
+}
+
+/**
+ * \brief Parse a constant: number, IP address or prefix, or quoted string.
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+urfilter_parse_literal(urfilter_parser_t *p, urfilter_literal_t *lit)
+{
+    char word[64], *slash, *end;
+    const char *c;
+    size_t len;
+    int dots = 0, bits;
+    long length;
+    ip_addr_t addr;
+
+    memset(lit, 0, sizeof(*lit));
+    urfilter_skip_spaces(p);
+    if (*p->pos == '"' || *p->pos == '\'') {
+        char quote = *p->pos;
+        lit->type = URFILTER_LIT_STR;
+        lit->str.str = malloc(strlen(p->pos) + 1);
+        if (lit->str.str == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        for (c = p->pos + 1; *c != quote; c++) {
+            if (*c == '\\' && c[1] != '\0') {
+                c++;
+            } else if (*c == '\0') {
+                free(lit->str.str);
+                return urfilter_syntax_error(p, "closing quote");
+            }
+            lit->str.str[lit->str.len++] = *c;
+        }
+        p->pos = c + 1;
+        return 0;
+    }
+
+    len = strcspn(p->pos, " \t\r\n,(){}!=<>&|");
+    if (len == 0) {
+        return urfilter_syntax_error(p, "value");
+    }
+    if (len >= sizeof(word)) {
+        goto invalid;
+    }
+    memcpy(word, p->pos, len);
+    word[len] = '\0';
+    for (c = word; *c != '\0'; c++) {
+        dots += *c == '.';
+    }
+
+    if (strchr(word, ':') != NULL || strchr(word, '/') != NULL || dots == 3) {
+        slash = strchr(word, '/');
+        if (slash != NULL) {
+            *slash = '\0';
+        }
+        if (!ip_from_str(word, &addr)) {
+            goto invalid;
+        }
+        bits = ip_is4(&addr) ? 32 : 128;
+        length = bits;
+        if (slash != NULL) {
+            length = strtol(slash + 1, &end, 10);
+            if (slash[1] == '\0' || *end != '\0' || length < 0 || length > bits) {
+                *slash = '/';
+                goto invalid;
+            }
+        }
+        lit->type = URFILTER_LIT_IP;
+        lit->full = length == bits;
+        urfilter_make_prefix(&lit->ip, &addr, (int) length);
+    } else {
+        errno = 0;
+        if (word[0] == '-') {
+            lit->type = URFILTER_LIT_INT;
+            lit->i = strtoll(word, &end, 0);
+        } else {
+            lit->type = URFILTER_LIT_UINT;
+            lit->u = strtoull(word, &end, 0);
+        }
+        if (*end != '\0' || errno != 0) {
+            lit->type = URFILTER_LIT_DOUBLE;
+            lit->d = strtod(word, &end);
+            if (*end != '\0') {
+                goto invalid;
+            }
+        }
+    }
+    p->pos += len;
+    return 0;
+
+invalid:
+    PyErr_Format(PyExc_ValueError, "Invalid value at position %d of filter.", (int) (p->pos - p->expr));
+    return -1;
+}
+
+/**
+ * \brief Convert a constant to the representation of URFILTER_CMP_UINT and URFILTER_IN_UINT.
+ *
+ * Constants for time fields are in seconds.
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+urfilter_literal_uint(int16_t field_id, const urfilter_literal_t *lit, uint64_t *value)
+{
+    int time = urfilter_field_class(field_id) == URFILTER_CLASS_TIME;
+    uint64_t max;
+
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_CHAR:
+    case UR_TYPE_UINT8:
+        max = UINT8_MAX;
+        break;
+    case UR_TYPE_UINT16:
+        max = UINT16_MAX;
+        break;
+    case UR_TYPE_UINT32:
+        max = UINT32_MAX;
+        break;
+    default:
+        max = UINT64_MAX;
+    }
+    if (lit->type == URFILTER_LIT_UINT && !time && lit->u <= max) {
+        *value = lit->u;
+    } else if (lit->type == URFILTER_LIT_UINT && time && lit->u <= UINT32_MAX) {
+        *value = ur_time_from_sec_msec(lit->u, 0);
+    } else if (lit->type == URFILTER_LIT_DOUBLE && time && lit->d >= 0 && lit->d < 4294967296.0) {
+        *value = ur_time_from_sec_msec((uint64_t) lit->d, (uint64_t) ((lit->d - (uint64_t) lit->d) * 1000 + 0.5));
+    } else if (lit->type == URFILTER_LIT_INT || lit->type == URFILTER_LIT_UINT || lit->type == URFILTER_LIT_DOUBLE) {
+        PyErr_Format(PyExc_ValueError, "Value out of range of field %s.", ur_get_name(field_id));
+        return -1;
+    } else {
+        PyErr_Format(PyExc_TypeError, "Value does not match type of field %s.", ur_get_name(field_id));
+        return -1;
+    }
+    return 0;
+}
+
+/**
+ * \brief Convert a constant to the representation of URFILTER_CMP_INT and URFILTER_IN_INT.
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+urfilter_literal_int(int16_t field_id, const urfilter_literal_t *lit, int64_t *value)
+{
+    int64_t min, max;
+
+    switch (ur_get_type(field_id)) {
+    case UR_TYPE_INT8:
+        min = INT8_MIN;
+        max = INT8_MAX;
+        break;
+    case UR_TYPE_INT16:
+        min = INT16_MIN;
+        max = INT16_MAX;
+        break;
+    case UR_TYPE_INT32:
+        min = INT32_MIN;
+        max = INT32_MAX;
+        break;
+    default:
+        min = INT64_MIN;
+        max = INT64_MAX;
+    }
+    if ((lit->type == URFILTER_LIT_INT && lit->i >= min) || (lit->type == URFILTER_LIT_UINT && lit->u <= (uint64_t) max)) {
+        *value = lit->type == URFILTER_LIT_INT ? lit->i : (int64_t) lit->u;
+    } else if (lit->type == URFILTER_LIT_INT || lit->type == URFILTER_LIT_UINT) {
+        PyErr_Format(PyExc_ValueError, "Value out of range of field %s.", ur_get_name(field_id));
+        return -1;
+    } else {
+        PyErr_Format(PyExc_TypeError, "Value does not match type of field %s.", ur_get_name(field_id));
+        return -1;
+    }
+    return 0;
+}
+
+/**
+ * \brief Create a node comparing the field with the constant.
+ *
+ * Strings are moved from the constant to the node.
+ * \return Index of the node, -1 with exception set on error.
+ */
+static int32_t
+urfilter_compare_node(urfilter_parser_t *p, int16_t field_id, uint8_t op, urfilter_literal_t *lit)
+{
+    urfilter_node_t n;
+    int32_t index;
+
+    memset(&n, 0, sizeof(n));
+    n.op = op;
+    n.field_id = field_id;
+    switch (urfilter_field_class(field_id)) {
+    case URFILTER_CLASS_UINT:
+        if (lit->type == URFILTER_LIT_DOUBLE) {
+            n.type = URFILTER_CMP_DOUBLE;
+            n.value.d = lit->d;
+        } else {
+            n.type = URFILTER_CMP_UINT;
+            if (urfilter_literal_uint(field_id, lit, &n.value.u) != 0) {
+                return -1;
+            }
+        }
+        break;
+    case URFILTER_CLASS_TIME:
+        n.type = URFILTER_CMP_UINT;
+        if (urfilter_literal_uint(field_id, lit, &n.value.u) != 0) {
+            return -1;
+        }
+        break;
+    case URFILTER_CLASS_INT:
+        if (lit->type == URFILTER_LIT_DOUBLE) {
+            n.type = URFILTER_CMP_DOUBLE;
+            n.value.d = lit->d;
+        } else {
+            n.type = URFILTER_CMP_INT;
+            if (urfilter_literal_int(field_id, lit, &n.value.i) != 0) {
+                return -1;
+            }
+        }
+        break;
+    case URFILTER_CLASS_DOUBLE:
+        n.type = URFILTER_CMP_DOUBLE;
+        if (lit->type == URFILTER_LIT_UINT) {
+            n.value.d = (double) lit->u;
+        } else if (lit->type == URFILTER_LIT_INT) {
+            n.value.d = (double) lit->i;
+        } else if (lit->type == URFILTER_LIT_DOUBLE) {
+            n.value.d = lit->d;
+        } else {
+            goto type_error;
+        }
+        break;
+    case URFILTER_CLASS_IP:
+        if (lit->type != URFILTER_LIT_IP) {
+            goto type_error;
+        }
+        if (!lit->full && op != URFILTER_EQ && op != URFILTER_NE) {
+            PyErr_SetString(PyExc_ValueError, "IP prefix can be compared by == or != only.");
+            return -1;
+        }
+        n.type = URFILTER_CMP_IP;
+        n.value.ip = lit->ip;
+        break;
+    case URFILTER_CLASS_STR:
+        if (lit->type != URFILTER_LIT_STR) {
+            goto type_error;
+        }
+        if (op != URFILTER_EQ && op != URFILTER_NE) {
+            PyErr_SetString(PyExc_ValueError, "Strings can be compared by == or != only.");
+            return -1;
+        }
+        n.type = URFILTER_CMP_STR;
+        n.value.str = lit->str;
+        lit->str.str = NULL;
+        break;
+    }
+
+    index = urfilter_add_node(p, n.type);
+    if (index < 0) {
+        free(n.value.str.str);
+        return -1;
+    }
+    p->filter->nodes[index] = n;
+    return index;
+
+type_error:
+    PyErr_Format(PyExc_TypeError, "Value does not match type of field %s.", ur_get_name(field_id));
+    return -1;
+}
+
+/**
+ * \brief Add a constant to the set of a URFILTER_IN_* node.
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+urfilter_set_add(urfilter_parser_t *p, int32_t index, urfilter_literal_t *lit)
+{
+    urfilter_node_t *n = &p->filter->nodes[index];
+    size_t item_size;
+    Py_ssize_t count = n->value.set.count;
+    char *item;
+    void *items;
+
+    switch (n->type) {
+    case URFILTER_IN_IP:
+        item_size = sizeof(urfilter_prefix_t);
+        break;
+    case URFILTER_IN_STR:
+        item_size = sizeof(urfilter_str_t);
+        break;
+    default:
+        item_size = sizeof(uint64_t);
+    }
+    /* capacity is the next power of two */
+    if ((count & (count - 1)) == 0) {
+        items = realloc(n->value.set.items, item_size * (count ? count * 2 : 1));
+        if (items == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        n->value.set.items = items;
+    }
+    item = (char *) n->value.set.items + item_size * count;
+
+    switch (n->type) {
+    case URFILTER_IN_UINT:
+        if (urfilter_literal_uint(n->field_id, lit, (uint64_t *) item) != 0) {
+            return -1;
+        }
+        break;
+    case URFILTER_IN_INT:
+        if (urfilter_literal_int(n->field_id, lit, (int64_t *) item) != 0) {
+            return -1;
+        }
+        break;
+    case URFILTER_IN_IP:
+        if (lit->type != URFILTER_LIT_IP) {
+            goto type_error;
+        }
+        memcpy(item, &lit->ip, sizeof(lit->ip));
+        break;
+    case URFILTER_IN_STR:
+        if (lit->type != URFILTER_LIT_STR) {
+            goto type_error;
+        }
+        memcpy(item, &lit->str, sizeof(lit->str));
+        lit->str.str = NULL;
+        break;
+    }
+    n->value.set.count++;
+    return 0;
+
+type_error:
+    PyErr_Format(PyExc_TypeError, "Value does not match type of field %s.", ur_get_name(n->field_id));
+    return -1;
+}
+
+static int
+urfilter_cmp_uint(const void *a, const void *b)
+{
+    uint64_t x = *(const uint64_t *) a, y = *(const uint64_t *) b;
+    return (x > y) - (x < y);
+}
+
+static int
+urfilter_cmp_int(const void *a, const void *b)
+{
+    int64_t x = *(const int64_t *) a, y = *(const int64_t *) b;
+    return (x > y) - (x < y);
+}
+
+/**
+ * \brief Parse the set (or a single constant) after the in operator.
+ */
+static int32_t
+urfilter_parse_in(urfilter_parser_t *p, int16_t field_id, uint8_t op)
+{
+    urfilter_literal_t lit;
+    urfilter_node_t *n;
+    int32_t index;
+    uint8_t type;
+    int ret;
+
+    switch (urfilter_field_class(field_id)) {
+    case URFILTER_CLASS_UINT:
+    case URFILTER_CLASS_TIME:
+        type = URFILTER_IN_UINT;
+        break;
+    case URFILTER_CLASS_INT:
+        type = URFILTER_IN_INT;
+        break;
+    case URFILTER_CLASS_IP:
+        type = URFILTER_IN_IP;
+        break;
+    case URFILTER_CLASS_STR:
+        type = URFILTER_IN_STR;
+        break;
+    default:
+        PyErr_Format(PyExc_TypeError, "Operator in is not supported for field %s.", ur_get_name(field_id));
+        return -1;
+    }
+    index = urfilter_add_node(p, type);
+    if (index < 0) {
+        return -1;
+    }
+    p->filter->nodes[index].op = op;
+    p->filter->nodes[index].field_id = field_id;
+
+    if (!urfilter_accept(p, "{")) {
+        ret = urfilter_parse_literal(p, &lit) != 0 || urfilter_set_add(p, index, &lit) != 0;
+        free(lit.str.str);
+        return ret ? -1 : index;
+    }
+    if (!urfilter_accept(p, "}")) {
+        do {
+            ret = urfilter_parse_literal(p, &lit) != 0 || urfilter_set_add(p, index, &lit) != 0;
+            free(lit.str.str);
+            if (ret) {
+                return -1;
+            }
+        } while (urfilter_accept(p, ","));
+        if (!urfilter_accept(p, "}")) {
+            return urfilter_syntax_error(p, "',' or '}'");
+        }
+    }
+
+    n = &p->filter->nodes[index];
+    if (type == URFILTER_IN_UINT) {
+        qsort(n->value.set.items, n->value.set.count, sizeof(uint64_t), urfilter_cmp_uint);
+    } else if (type == URFILTER_IN_INT) {
+        qsort(n->value.set.items, n->value.set.count, sizeof(int64_t), urfilter_cmp_int);
+    }
+    return index;
+}
+
+static int32_t urfilter_parse_or(urfilter_parser_t *p);
+
+static int32_t
+urfilter_parse_primary(urfilter_parser_t *p)
+{
+    static const struct {
+        const char *token;
+        uint8_t op;
+    } operators[] = {
+        {"==", URFILTER_EQ}, {"!=", URFILTER_NE}, {"<=", URFILTER_LE},
+        {">=", URFILTER_GE}, {"<", URFILTER_LT}, {">", URFILTER_GT}
+    };
+    urfilter_literal_t lit;
+    const char *start;
+    char name[128];
+    int16_t field_id;
+    int32_t index;
+    size_t i;
+
+    if (urfilter_accept(p, "(")) {
+        if (++p->depth > URFILTER_MAX_DEPTH) {
+            PyErr_SetString(PyExc_ValueError, "Filter is nested too deeply.");
+            return -1;
+        }
+        index = urfilter_parse_or(p);
+        if (index >= 0 && !urfilter_accept(p, ")")) {
+            return urfilter_syntax_error(p, "')'");
+        }
+        p->depth--;
+        return index;
+    }
+
+    urfilter_skip_spaces(p);
+    start = p->pos;
+    if (!isalpha((unsigned char) *p->pos) && *p->pos != '_') {
+        return urfilter_syntax_error(p, "field name");
+    }
+    while (isalnum((unsigned char) *p->pos) || *p->pos == '_') {
+        p->pos++;
+    }
+    if (p->pos - start >= (Py_ssize_t) sizeof(name)) {
+        p->pos = start;
+        return urfilter_syntax_error(p, "field name");
+    }
+    memcpy(name, start, p->pos - start);
+    name[p->pos - start] = '\0';
+    field_id = ur_get_id_by_name(name);
+    if (field_id < 0 || !ur_is_present(p->filter->template->urtmplt, field_id)) {
+        PyErr_Format(TrapError, "Field %s was not found in the template.", name);
+        return -1;
+    }
+
+    if (urfilter_accept(p, "in")) {
+        return urfilter_parse_in(p, field_id, URFILTER_EQ);
+    }
+    if (urfilter_accept(p, "not")) {
+        if (!urfilter_accept(p, "in")) {
+            return urfilter_syntax_error(p, "'in'");
+        }
+        return urfilter_parse_in(p, field_id, URFILTER_NE);
+    }
+    for (i = 0; i < sizeof(operators) / sizeof(operators[0]); i++) {
+        if (urfilter_accept(p, operators[i].token)) {
+            if (urfilter_parse_literal(p, &lit) != 0) {
+                return -1;
+            }
+            index = urfilter_compare_node(p, field_id, operators[i].op, &lit);
+            free(lit.str.str);
+            return index;
+        }
+    }
+    return urfilter_syntax_error(p, "comparison operator or 'in'");
+}
+
+static int32_t
+urfilter_parse_not(urfilter_parser_t *p)
+{
+    int32_t child, index;
 
-typedef struct {
-    PyObject_HEAD
-    pytrap_unirecipaddr *start; /* low ip */
-    pytrap_unirecipaddr *end;   /* high ip*/
-} pytrap_unirecipaddrrange;
+    urfilter_skip_spaces(p);
+    if ((p->pos[0] == '!' && p->pos[1] != '=' && urfilter_accept(p, "!")) || urfilter_accept(p, "not")) {
+        if (++p->depth > URFILTER_MAX_DEPTH) {
+            PyErr_SetString(PyExc_ValueError, "Filter is nested too deeply.");
+            return -1;
+        }
+        child = urfilter_parse_not(p);
+        if (child < 0 || (index = urfilter_add_node(p, URFILTER_NOT)) < 0) {
+            return -1;
+        }
+        p->filter->nodes[index].left = child;
+        p->depth--;
+        return index;
+    }
+    return urfilter_parse_primary(p);
+}
+
+static int32_t
+urfilter_parse_and(urfilter_parser_t *p)
+{
+    int32_t first, right, index, last = -1;
+
+    first = urfilter_parse_not(p);
+    while (first >= 0 && (urfilter_accept(p, "&&") || urfilter_accept(p, "and"))) {
+        right = urfilter_parse_not(p);
+        if (right < 0 || (index = urfilter_add_node(p, URFILTER_AND)) < 0) {
+            return -1;
+        }
+        /* the chain is right-deep, the evaluation iterates over it */
+        if (last < 0) {
+            p->filter->nodes[index].left = first;
+            first = index;
+        } else {
+            p->filter->nodes[index].left = p->filter->nodes[last].right;
+            p->filter->nodes[last].right = index;
+        }
+        p->filter->nodes[index].right = right;
+        last = index;
+    }
+    return first;
+}
+
+static int32_t
+urfilter_parse_or(urfilter_parser_t *p)
+{
+    int32_t first, right, index, last = -1;
+
+    first = urfilter_parse_and(p);
+    while (first >= 0 && (urfilter_accept(p, "||") || urfilter_accept(p, "or"))) {
+        right = urfilter_parse_and(p);
+        if (right < 0 || (index = urfilter_add_node(p, URFILTER_OR)) < 0) {
+            return -1;
+        }
+        /* the chain is right-deep, the evaluation iterates over it */
+        if (last < 0) {
+            p->filter->nodes[index].left = first;
+            first = index;
+        } else {
+            p->filter->nodes[index].left = p->filter->nodes[last].right;
+            p->filter->nodes[last].right = index;
+        }
+        p->filter->nodes[index].right = right;
+        last = index;
+    }
+    return first;
+}
 
 static void
-UnirecIPAddrRange_dealloc(pytrap_unirecipaddrrange *self)
+UnirecFilter_dealloc(pytrap_unirecfilter *self)
 {
-    Py_XDECREF(self->start);
-    Py_XDECREF(self->end);
-    Py_TYPE(self)->tp_free((PyObject*)self);
+    int32_t i;
+    Py_ssize_t j;
+
+    for (i = 0; i < self->node_count; i++) {
+        urfilter_node_t *n = &self->nodes[i];
+        if (n->type == URFILTER_CMP_STR) {
+            free(n->value.str.str);
+        } else if (n->type >= URFILTER_IN_UINT) {
+            if (n->type == URFILTER_IN_STR) {
+                for (j = 0; j < n->value.set.count; j++) {
+                    free(((urfilter_str_t *) n->value.set.items)[j].str);
+                }
+            }
+            free(n->value.set.items);
+        }
+    }
+    free(self->nodes);
+    Py_XDECREF(self->template);
+    Py_XDECREF(self->expression);
+    Py_TYPE(self)->tp_free((PyObject *) self);
 }
 
 static PyObject *
-UnirecIPAddrRange_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+UnirecFilter_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 {
-    pytrap_unirecipaddrrange *self;
+    pytrap_unirecfilter *self;
+    pytrap_unirectemplate *template;
+    urfilter_parser_t parser;
+    const char *expression;
 
-    self = (pytrap_unirecipaddrrange *)type->tp_alloc(type, 0);
-    if (self != NULL) {
-        self->start = (pytrap_unirecipaddr *) pytrap_UnirecIPAddr.tp_alloc(&pytrap_UnirecIPAddr, 0);
+    static char *kwlist[] = {"template", "expression", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!s", kwlist, &pytrap_UnirecTemplate, &template, &expression)) {
+        return NULL;
+    }
 
-        if (self->start == NULL) {
+    self = (pytrap_unirecfilter *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    Py_INCREF(template);
+    self->template = template;
+#if PY_MAJOR_VERSION >= 3
+    self->expression = PyUnicode_FromString(expression);
+#else
+    self->expression = PyString_FromString(expression);
+#endif
+    if (self->expression == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+
+    parser.filter = self;
+    parser.expr = expression;
+    parser.pos = expression;
+    parser.depth = 0;
+    self->root = urfilter_parse_or(&parser);
+    if (self->root >= 0 && (urfilter_skip_spaces(&parser), *parser.pos != '\0')) {
+        urfilter_syntax_error(&parser, "end of filter");
+        self->root = -1;
+    }
+    if (self->root < 0) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    return (PyObject *) self;
+}
+
+/**
+ * \brief Get data and size of a record (bytes or bytearray).
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+urfilter_get_record(PyObject *obj, const char **data, Py_ssize_t *size)
+{
+    if (PyByteArray_Check(obj)) {
+        *data = PyByteArray_AsString(obj);
+        *size = PyByteArray_Size(obj);
+    } else if (PyBytes_Check(obj)) {
+        *data = PyBytes_AS_STRING(obj);
+        *size = PyBytes_GET_SIZE(obj);
+    } else {
+        PyErr_SetString(PyExc_TypeError, "Record must be bytearray or bytes.");
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *
+UnirecFilter_match(pytrap_unirecfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *dataObj;
+    const char *data;
+    Py_ssize_t size;
+    int r;
+
+    static char *kwlist[] = {"data", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &dataObj)) {
+        return NULL;
+    }
+    if (urfilter_get_record(dataObj, &data, &size) != 0) {
+        return NULL;
+    }
+    r = UnirecFilter_match_record(self, data, size);
+    if (r < 0) {
+        return NULL;
+    }
+    return PyBool_FromLong(r);
+}
+
+static PyObject *
+UnirecFilter_filter(pytrap_unirecfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *records, *seq, *result, *item;
+    const char *data;
+    Py_ssize_t i, n, size;
+    int r;
+
+    static char *kwlist[] = {"records", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &records)) {
+        return NULL;
+    }
+    seq = PySequence_Fast(records, "Argument records must be a sequence.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    result = PyList_New(0);
+    if (result == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    n = PySequence_Fast_GET_SIZE(seq);
+    for (i = 0; i < n; i++) {
+        item = PySequence_Fast_GET_ITEM(seq, i);
+        if (urfilter_get_record(item, &data, &size) != 0 ||
+            (r = UnirecFilter_match_record(self, data, size)) < 0 ||
+            (r && PyList_Append(result, item) != 0)) {
+            Py_DECREF(seq);
+            Py_DECREF(result);
             return NULL;
         }
+    }
+    Py_DECREF(seq);
+    return result;
+}
 
-        self->end = (pytrap_unirecipaddr *) pytrap_UnirecIPAddr.tp_alloc(&pytrap_UnirecIPAddr, 0);
+static PyObject *
+UnirecFilter_filterBuffer(pytrap_unirecfilter *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *buffer, *result, *msg;
+    const char *data;
+    Py_ssize_t pos = 0, size;
+    uint16_t msg_size;
+    int r;
+
+    static char *kwlist[] = {"buffer", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &buffer)) {
+        return NULL;
+    }
+    if (urfilter_get_record(buffer, &data, &size) != 0) {
+        return NULL;
+    }
+    result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+    while (pos < size) {
+        if (size - pos < (Py_ssize_t) sizeof(msg_size)) {
+            goto corrupted;
+        }
+        memcpy(&msg_size, data + pos, sizeof(msg_size));
+        msg_size = ntohs(msg_size);
+        pos += sizeof(msg_size);
+        if (pos + msg_size > size) {
+            goto corrupted;
+        }
+        /* end-of-stream messages are skipped */
+        if (msg_size > 1) {
+            r = UnirecFilter_match_record(self, data + pos, msg_size);
+            if (r < 0) {
+                goto failure;
+            }
+            if (r) {
+                msg = PyBytes_FromStringAndSize(data + pos, msg_size);
+                if (msg == NULL || PyList_Append(result, msg) != 0) {
+                    Py_XDECREF(msg);
+                    goto failure;
+                }
+                Py_DECREF(msg);
+            }
+        }
+        pos += msg_size;
+    }
+    return result;
 
-        if (self->end == NULL) {
-            PyErr_SetString(PyExc_MemoryError, "Allocation of end address failed.");
-            Py_DECREF(self->start);
+corrupted:
+    PyErr_Format(TrapError, "Corrupted buffer at offset %zd.", pos);
+failure:
+    Py_DECREF(result);
+    return NULL;
+}
+
+static PyMethodDef UnirecFilter_methods[] = {
+    {"match", (PyCFunction) UnirecFilter_match, METH_VARARGS | METH_KEYWORDS,
+        "Evaluate the filter on a record.\n\n"
+        "Args:\n"
+        "    data (bytearray or bytes): Data - UniRec message.\n\n"
+        "Returns:\n"
+        "    bool: True if the record matches the filter.\n\n"
+        "Raises:\n"
+        "    TrapError: Message is too short for the template.\n"
+        },
+
+    {"filter", (PyCFunction) UnirecFilter_filter, METH_VARARGS | METH_KEYWORDS,
+        "Select records matching the filter.\n\n"
+        "Args:\n"
+        "    records (list): UniRec messages (bytearray or bytes).\n\n"
+        "Returns:\n"
+        "    list: Matching messages (the same objects), in the original order.\n\n"
+        "Raises:\n"
+        "    TrapError: Message is too short for the template.\n"
+        },
+
+    {"filterBuffer", (PyCFunction) UnirecFilter_filterBuffer, METH_VARARGS | METH_KEYWORDS,
+        "Select records matching the filter from a buffer of messages.\n\n"
+        "Python objects are created only for the matching messages.\n"
+        "End-of-stream messages (1B or shorter) are skipped.\n\n"
+        "Args:\n"
+        "    buffer (bytes): Messages, each prefixed by 2B length in network byte order\n"
+        "        (e.g. FileReader.readBuffer()).\n\n"
+        "Returns:\n"
+        "    list: Matching messages (bytes).\n\n"
+        "Raises:\n"
+        "    TrapError: Buffer is corrupted or a message is too short for the template.\n"
+        },
+
+    {NULL, NULL, 0, NULL}
+};
+
+static PyMemberDef UnirecFilter_members[] = {
+    {"template", T_OBJECT_EX, offsetof(pytrap_unirecfilter, template), READONLY, "UniRec template of filtered records."},
+    {"expression", T_OBJECT_EX, offsetof(pytrap_unirecfilter, expression), READONLY, "Source of the filter."},
+    {NULL}  /* Sentinel */
+};
+
+static PyTypeObject pytrap_UnirecFilter = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pytrap.UnirecFilter",     /* tp_name */
+    sizeof(pytrap_unirecfilter), /* tp_basicsize */
+    0,                         /* tp_itemsize */
+    (destructor) UnirecFilter_dealloc, /* tp_dealloc */
+    0,                         /* tp_print */
+    0,                         /* tp_getattr */
+    0,                         /* tp_setattr */
+    0,                         /* tp_reserved */
+    0,                         /* tp_repr */
+    0,                         /* tp_as_number */
+    0,                         /* tp_as_sequence */
+    0,                         /* tp_as_mapping */
+    0,                         /* tp_hash  */
+    0,                         /* tp_call */
+    0,                         /* tp_str */
+    0,                         /* tp_getattro */
+    0,                         /* tp_setattro */
+    0,                         /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "UnirecFilter(template, expression)\n\n"
+    "    Filter of UniRec records compiled from an expression.\n\n"
+    "    The filter is evaluated on raw messages, values of fields are not\n"
+    "    converted into Python objects.  Expression consists of comparisons\n"
+    "    of fields with constants (==, !=, <, <=, >, >=), membership tests\n"
+    "    (in, not in) and logical operators (&&, ||, ! or and, or, not), e.g.:\n\n"
+    "        PROTOCOL == 6 && DST_PORT in {22, 2222} && SRC_IP in 10.0.0.0/8\n\n"
+    "    Constants are numbers, IP addresses or prefixes (addr/len), and quoted\n"
+    "    strings.  IP fields compared by == with a prefix match any address of\n"
+    "    the prefix.  Time fields are compared with seconds.  Constants must\n"
+    "    be in the range of the type of the field.  Parentheses and negations\n"
+    "    can be nested up to 256 levels.\n\n"
+    "    Args:\n"
+    "        template (UnirecTemplate): Template of filtered records.\n"
+    "        expression (str): Filter expression.\n\n"
+    "    Raises:\n"
+    "        ValueError: Syntax error or invalid constant in expression.\n"
+    "        TypeError: Constant does not match type of field.\n"
+    "        TrapError: Field was not found in the template.\n", /* tp_doc */
+    0,                         /* tp_traverse */
+    0,                         /* tp_clear */
+    0,                         /* tp_richcompare */
+    0,                         /* tp_weaklistoffset */
+    0,                         /* tp_iter */
+    0,                         /* tp_iternext */
+    UnirecFilter_methods,      /* tp_methods */
+    UnirecFilter_members,      /* tp_members */
+    0,                         /* tp_getset */
+    0,                         /* tp_base */
+    0,                         /* tp_dict */
+    0,                         /* tp_descr_get */
+    0,                         /* tp_descr_set */
+    0,                         /* tp_dictoffset */
+    0,                         /* tp_init */
+    0,                         /* tp_alloc */
+    UnirecFilter_new,          /* tp_new */
+};
+
+PyObject *
+pytrap_compileFilter(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    return UnirecFilter_new(&pytrap_UnirecFilter, args, kwds);
+}
+
+/*********************/
+/* Aggregator        */
+/*********************/
+
+/*
+ * Groups are kept in open-addressing hash tables, one table per pane (step
+ * of the window).  A window is closed when the newest time seen exceeds its
+ * end by the allowed delay, results of sliding windows are merged from the
+ * panes they cover.
+ */
+
+/** Aggregation functions. */
+enum {
+    URAGGR_COUNT,
+    URAGGR_SUM,
+    URAGGR_MIN,
+    URAGGR_MAX,
+    URAGGR_AVG
+};
+
+static const char *uraggr_func_names[] = {"count", "sum", "min", "max", "avg"};
+
+/** Minimal number of slots of hash tables and entries allocated at once. */
+#define URAGGR_MIN_SIZE 64
+
+typedef union {
+    uint64_t u;
+    int64_t i;
+    double d;
+} uraggr_value_t;
+
+typedef struct {
+    uint8_t func;
+    uint8_t cls; // URFILTER_CLASS_* of the state (UINT, INT or DOUBLE)
+    int16_t field_id; // aggregated field, unused by count
+    int16_t out_id; // field of the result
+    uint16_t slot; // index of the first value in the state of a group, avg uses two
+} uraggr_func_t;
+
+typedef struct {
+    uint32_t *slots; // index of the entry + 1, 0 for an empty slot
+    uint32_t mask; // number of slots - 1
+    char *entries; // groups: hash (8B), key and state
+    uint32_t count;
+    uint32_t alloc;
+} uraggr_table_t;
+
+typedef struct {
+    PyObject_HEAD
+    pytrap_unirectemplate *template;
+    ur_template_t *out_tmplt;
+    PyObject *fmtspec;
+    PyObject *results; // list of closed windows
+    int16_t *key_ids;
+    uint32_t *key_offsets; // offsets of key fields in the key
+    int key_count;
+    uint32_t key_size; // aligned to 8B
+    uraggr_func_t *funcs;
+    int func_count;
+    size_t entry_size;
+    int16_t time_id;
+    int columns;
+
+    int64_t window; // milliseconds, 0 for a single window until flush()
+    int64_t step;
+    int64_t delay;
+    int64_t panes_per_window;
+    int64_t pane_count; // size of the ring of panes
+    uraggr_table_t *panes;
+    uraggr_table_t merged; // results of a sliding window
+    int started;
+    int64_t watermark; // the newest time seen
+    int64_t next_end; // the last pane of the next window to close
+    int64_t last_pane; // the newest pane with data
+    uint64_t groups; // groups in all panes
+    unsigned long long late;
+    unsigned long long partial_late; // records added to open windows only
+    char *key;
+    char *record;
+} pytrap_aggregator;
+
+static PyTypeObject pytrap_Aggregator;
+
+static inline uint64_t
+uraggr_hash(const char *key, uint32_t size)
+{
+    uint64_t h = size, k;
+    uint32_t i;
+
+    for (i = 0; i < size; i += 8) {
+        memcpy(&k, key + i, sizeof(k));
+        h ^= k;
+        h *= 0x9e3779b97f4a7c15ULL;
+        h ^= h >> 29;
+    }
+    return h;
+}
+
+static void
+uraggr_table_free(uraggr_table_t *t)
+{
+    free(t->slots);
+    free(t->entries);
+    memset(t, 0, sizeof(*t));
+}
+
+static void
+uraggr_table_clear(uraggr_table_t *t)
+{
+    if (t->count > 0) {
+        memset(t->slots, 0, sizeof(uint32_t) * (t->mask + 1));
+        t->count = 0;
+    }
+}
+
+#define URAGGR_ENTRY(self, t, index) ((t)->entries + (size_t) (index) * (self)->entry_size)
+
+/**
+ * \brief Find the group of the key, create it if it does not exist.
+ *
+ * \param [out] created  Set to 1 if the group was created (its state is not initialized).
+ * \return Pointer to the entry of the group, NULL on memory error.
+ */
+static char *
+uraggr_table_get(const pytrap_aggregator *self, uraggr_table_t *t, const char *key, uint64_t hash, int *created)
+{
+    uint32_t i, j, size, *slots;
+    char *entry;
+
+    if (t->slots != NULL) {
+        for (i = hash & t->mask; t->slots[i] != 0; i = (i + 1) & t->mask) {
+            entry = URAGGR_ENTRY(self, t, t->slots[i] - 1);
+            if (*(uint64_t *) entry == hash && memcmp(entry + 8, key, self->key_size) == 0) {
+                *created = 0;
+                return entry;
+            }
+        }
+    }
+
+    /* grow when the load reaches 3/4 */
+    if (t->slots == NULL || (t->count + 1) * 4 > (t->mask + 1) * 3) {
+        size = t->slots == NULL ? URAGGR_MIN_SIZE : (t->mask + 1) * 2;
+        slots = calloc(size, sizeof(uint32_t));
+        if (slots == NULL) {
+            return NULL;
+        }
+        for (j = 0; j < t->count; j++) {
+            uint64_t h = *(uint64_t *) URAGGR_ENTRY(self, t, j);
+            for (i = h & (size - 1); slots[i] != 0; i = (i + 1) & (size - 1));
+            slots[i] = j + 1;
+        }
+        free(t->slots);
+        t->slots = slots;
+        t->mask = size - 1;
+    }
+    if (t->count == t->alloc) {
+        size = t->alloc == 0 ? URAGGR_MIN_SIZE : t->alloc * 2;
+        entry = realloc(t->entries, self->entry_size * size);
+        if (entry == NULL) {
             return NULL;
         }
+        t->entries = entry;
+        t->alloc = size;
+    }
+    for (i = hash & t->mask; t->slots[i] != 0; i = (i + 1) & t->mask);
+    t->slots[i] = ++t->count;
+    entry = URAGGR_ENTRY(self, t, t->count - 1);
+    *(uint64_t *) entry = hash;
+    memcpy(entry + 8, key, self->key_size);
+    *created = 1;
+    return entry;
+}
+
+static inline void
+uraggr_combine(uint8_t func, uint8_t cls, uraggr_value_t *s, uraggr_value_t v)
+{
+    switch (func) {
+    case URAGGR_COUNT:
+        s->u += v.u;
+        break;
+    case URAGGR_SUM:
+        if (cls == URFILTER_CLASS_INT) {
+            s->i += v.i;
+        } else if (cls == URFILTER_CLASS_DOUBLE) {
+            s->d += v.d;
+        } else {
+            s->u += v.u;
+        }
+        break;
+    case URAGGR_MIN:
+        if ((cls == URFILTER_CLASS_INT && v.i < s->i) || (cls == URFILTER_CLASS_DOUBLE && v.d < s->d) ||
+            (cls == URFILTER_CLASS_UINT && v.u < s->u)) {
+            *s = v;
+        }
+        break;
+    case URAGGR_MAX:
+        if ((cls == URFILTER_CLASS_INT && v.i > s->i) || (cls == URFILTER_CLASS_DOUBLE && v.d > s->d) ||
+            (cls == URFILTER_CLASS_UINT && v.u > s->u)) {
+            *s = v;
+        }
+        break;
+    }
+}
+
+/**
+ * \brief Update state of a group by a record.
+ */
+static inline void
+uraggr_update(const uraggr_func_t *f, uraggr_value_t *state, const ur_template_t *tmplt, const char *data, int created)
+{
+    uraggr_value_t *s = &state[f->slot], v;
+    const char *p;
+
+    if (f->func == URAGGR_COUNT) {
+        s->u = created ? 1 : s->u + 1;
+        return;
+    }
+    p = data + tmplt->offset[f->field_id];
+    switch (f->cls) {
+    case URFILTER_CLASS_INT:
+        v.i = urfilter_get_int(f->field_id, p);
+        break;
+    case URFILTER_CLASS_DOUBLE:
+        v.d = urfilter_get_double(f->field_id, p);
+        break;
+    default:
+        v.u = urfilter_get_uint(f->field_id, p);
+    }
+    if (f->func == URAGGR_AVG) {
+        s[0].d = (created ? 0 : s[0].d) + v.d;
+        s[1].u = created ? 1 : s[1].u + 1;
+    } else if (created) {
+        *s = v;
+    } else {
+        uraggr_combine(f->func, f->cls, s, v);
+    }
+}
+
+/**
+ * \brief Merge all groups of the table into the merged table.
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+uraggr_merge(pytrap_aggregator *self, const uraggr_table_t *t)
+{
+    const char *src;
+    uraggr_value_t *s, *o;
+    char *dst;
+    uint32_t j;
+    int i, created;
+
+    for (j = 0; j < t->count; j++) {
+        src = URAGGR_ENTRY(self, t, j);
+        dst = uraggr_table_get(self, &self->merged, src + 8, *(uint64_t *) src, &created);
+        if (dst == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        if (created) {
+            memcpy(dst, src, self->entry_size);
+            continue;
+        }
+        s = (uraggr_value_t *) (dst + 8 + self->key_size);
+        o = (uraggr_value_t *) (src + 8 + self->key_size);
+        for (i = 0; i < self->func_count; i++) {
+            const uraggr_func_t *f = &self->funcs[i];
+            if (f->func == URAGGR_AVG) {
+                s[f->slot].d += o[f->slot].d;
+                s[f->slot + 1].u += o[f->slot + 1].u;
+            } else {
+                uraggr_combine(f->func, f->func == URAGGR_COUNT ? URFILTER_CLASS_UINT : f->cls, &s[f->slot], o[f->slot]);
+            }
+        }
     }
-
-    return (PyObject *)self;
+    return 0;
 }
 
-
-static PyObject *
-UnirecIPAddrRange_isIn(pytrap_unirecipaddrrange *self, PyObject *args)
+/**
+ * \brief Store a result into a field of the output record.
+ */
+static inline void
+uraggr_store(char *p, int16_t out_id, int cls, uraggr_value_t v)
 {
-    pytrap_unirecipaddr *ipaddr = (pytrap_unirecipaddr *) args;
-    PyObject *result = Py_False;
+    uint64_t u;
+    double d;
 
-    if (!PyObject_IsInstance(args, (PyObject *) &pytrap_UnirecIPAddr)) {
-        result = Py_NotImplemented;
+    if (cls == URFILTER_CLASS_DOUBLE) {
+        d = v.d;
+        u = v.d < 0 ? (uint64_t) (int64_t) v.d : (uint64_t) v.d;
+    } else {
+        d = cls == URFILTER_CLASS_INT ? (double) v.i : (double) v.u;
+        u = v.u;
+    }
+    switch (ur_get_type(out_id)) {
+    case UR_TYPE_CHAR:
+    case UR_TYPE_UINT8:
+    case UR_TYPE_INT8:
+        *(uint8_t *) p = (uint8_t) u;
+        break;
+    case UR_TYPE_UINT16:
+    case UR_TYPE_INT16:
+        *(uint16_t *) p = (uint16_t) u;
+        break;
+    case UR_TYPE_UINT32:
+    case UR_TYPE_INT32:
+        *(uint32_t *) p = (uint32_t) u;
+        break;
+    case UR_TYPE_FLOAT:
+        *(float *) p = (float) d;
+        break;
+    case UR_TYPE_DOUBLE:
+        *(double *) p = d;
+        break;
+    default:
+        // UR_TYPE_UINT64, UR_TYPE_INT64, UR_TYPE_TIME
+        *(uint64_t *) p = u;
     }
+}
 
-    int cmp_result;
-    cmp_result = ip_cmp(&self->start->ip, &ipaddr->ip);
+/**
+ * \brief Fill the output record by the key and results of a group.
+ */
+static void
+uraggr_fill_record(pytrap_aggregator *self, const char *entry)
+{
+    const uraggr_value_t *state = (const uraggr_value_t *) (entry + 8 + self->key_size);
+    uraggr_value_t v;
+    int i;
 
-    if (cmp_result == 0) {
-        /* ip address is in interval */
-        result = PyLong_FromLong(0);
-    } else if (cmp_result > 0) {
-        /* ip address is lower then interval */
-        result = PyLong_FromLong(-1);
-    } else {
-        cmp_result = ip_cmp(&self->end->ip, &ipaddr->ip);
-        if (cmp_result >= 0) {
-            /* ip address is in interval */
-            result = PyLong_FromLong(0);
+    for (i = 0; i < self->key_count; i++) {
+        memcpy(self->record + self->out_tmplt->offset[self->key_ids[i]], entry + 8 + self->key_offsets[i],
+               ur_get_size(self->key_ids[i]));
+    }
+    for (i = 0; i < self->func_count; i++) {
+        const uraggr_func_t *f = &self->funcs[i];
+        if (f->func == URAGGR_AVG) {
+            v.d = state[f->slot].d / state[f->slot + 1].u;
+            uraggr_store(self->record + self->out_tmplt->offset[f->out_id], f->out_id, URFILTER_CLASS_DOUBLE, v);
         } else {
-            /* ip address is greater then interval */
-            result = PyLong_FromLong(1);
+            uraggr_store(self->record + self->out_tmplt->offset[f->out_id], f->out_id,
+                         f->func == URAGGR_COUNT ? URFILTER_CLASS_UINT : f->cls, state[f->slot]);
         }
     }
-
-    return result;
 }
 
-
 static PyObject *
-UnirecIPAddrRange_isOverlap(pytrap_unirecipaddrrange *self, PyObject *args)
+uraggr_time(int64_t ms)
 {
-    /* compared ranges must by sorted by low ip and mask */
-    pytrap_unirecipaddrrange *other;
+    pytrap_unirectime *t = (pytrap_unirectime *) pytrap_UnirecTime.tp_alloc(&pytrap_UnirecTime, 0);
 
-    PyObject * tmp;
-    long cmp_result;
+    if (t != NULL) {
+        t->timestamp = ur_time_from_sec_msec(ms / 1000, ms % 1000);
+    }
+    return (PyObject *) t;
+}
 
-    if (!PyArg_ParseTuple(args, "O", &other))
-        return NULL;
+/**
+ * \brief Append results of groups of the table to the list of closed windows.
+ *
+ * \param [in] start  Start of the window (ms), -1 if no window is used.
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+Aggregator_emit(pytrap_aggregator *self, const uraggr_table_t *t, int64_t start, int64_t end)
+{
+    PyObject *result, *item, *window;
+    uint16_t size = self->out_tmplt->static_size;
+    uint32_t j;
+    int i;
 
-    if (!PyObject_IsInstance((PyObject*)other, (PyObject *) &pytrap_UnirecIPAddrRange)) {
-        return Py_NotImplemented;
+    if (self->columns) {
+        result = PyDict_New();
+        for (i = 0; result != NULL && i < self->out_tmplt->count; i++) {
+            int16_t id = self->out_tmplt->ids[i];
+            item = PyByteArray_FromStringAndSize(NULL, (Py_ssize_t) t->count * ur_get_size(id));
+            if (item == NULL || PyDict_SetItemString(result, ur_get_name(id), item) != 0) {
+                Py_XDECREF(item);
+                Py_CLEAR(result);
+                break;
+            }
+            Py_DECREF(item);
+        }
+    } else {
+        result = PyList_New(t->count);
+    }
+    if (result == NULL) {
+        return -1;
     }
 
-    tmp = UnirecIPAddrRange_isIn(self, (PyObject *) other->start);
-    cmp_result = PyLong_AsLong(tmp);
-    Py_DECREF(tmp);
+    for (j = 0; j < t->count; j++) {
+        uraggr_fill_record(self, URAGGR_ENTRY(self, t, j));
+        if (!self->columns) {
+            item = PyBytes_FromStringAndSize(self->record, size);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return -1;
+            }
+            PyList_SET_ITEM(result, j, item);
+            continue;
+        }
+        for (i = 0; i < self->out_tmplt->count; i++) {
+            int16_t id = self->out_tmplt->ids[i];
+            item = PyDict_GetItemString(result, ur_get_name(id));
+            memcpy(PyByteArray_AS_STRING(item) + (size_t) j * ur_get_size(id),
+                   self->record + self->out_tmplt->offset[id], ur_get_size(id));
+        }
+    }
 
-    if (cmp_result == 0) {
-        Py_RETURN_TRUE;
+    if (start < 0) {
+        window = Py_BuildValue("(OON)", Py_None, Py_None, result);
     } else {
-        Py_RETURN_FALSE;
+        window = Py_BuildValue("(NNN)", uraggr_time(start), uraggr_time(end), result);
     }
+    if (window == NULL || PyList_Append(self->results, window) != 0) {
+        Py_XDECREF(window);
+        return -1;
+    }
+    Py_DECREF(window);
+    return 0;
 }
 
-static int
-UnirecIPAddrRange_contains(pytrap_unirecipaddrrange *o, pytrap_unirecipaddr *ip)
+static inline uraggr_table_t *
+Aggregator_pane(pytrap_aggregator *self, int64_t pane)
 {
-    PyObject * tmp = UnirecIPAddrRange_isIn(o, (PyObject *) ip);
-    int cmp_result = PyLong_AsLong(tmp);
-    Py_DECREF(tmp);
-    return cmp_result == 0 ? 1 : 0;
+    return &self->panes[((pane % self->pane_count) + self->pane_count) % self->pane_count];
 }
 
-static uint8_t
-bit_endian_swap(uint8_t in)
+/**
+ * \brief Close windows that end at least delay before the given time.
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+Aggregator_close(pytrap_aggregator *self, int64_t until)
 {
-    in = (in & 0xF0) >> 4 | (in & 0x0F) << 4;
-    in = (in & 0xCC) >> 2 | (in & 0x33) << 2;
-    in = (in & 0xAA) >> 1 | (in & 0x55) << 1;
-    return in;
+    uraggr_table_t *pane, *t;
+    int64_t e, first;
+
+    while ((self->next_end + 1) * self->step + self->delay <= until) {
+        if (self->groups == 0) {
+            /* skip empty windows at once */
+            self->next_end = (until - self->delay) / self->step;
+            break;
+        }
+        e = self->next_end;
+        first = e - self->panes_per_window + 1;
+        if (self->panes_per_window == 1) {
+            t = Aggregator_pane(self, e);
+        } else {
+            uraggr_table_clear(&self->merged);
+            for (; first <= e; first++) {
+                if (uraggr_merge(self, Aggregator_pane(self, first)) != 0) {
+                    return -1;
+                }
+            }
+            first = e - self->panes_per_window + 1;
+            t = &self->merged;
+        }
+        if (t->count > 0 && Aggregator_emit(self, t, first * self->step, (e + 1) * self->step) != 0) {
+            return -1;
+        }
+        /* the first pane of the window is not covered by any other window */
+        pane = Aggregator_pane(self, first);
+        self->groups -= pane->count;
+        uraggr_table_clear(pane);
+        self->next_end++;
+    }
+    return 0;
 }
 
-/* TODO something like this can be used globally */
-#if PY_MAJOR_VERSION >= 3
-#  define CHECK_STR_CONV(pobj, cstr, csize) { \
-    if (!PyUnicode_Check(pobj)) { \
-        PyErr_SetString(PyExc_TypeError, "String or UnirecIPAddr object expected."); \
-        return -1; \
-    } else { \
-        cstr = PyUnicode_AsUTF8AndSize(pobj, &csize); \
-    } \
-} while (0)
-#else
-#  define CHECK_STR_CONV(pobj, cstr, csize) { \
-    if (!PyString_Check(pobj)) { \
-        PyErr_SetString(PyExc_TypeError, "String or UnirecIPAddr object expected."); \
-        return -1; \
-    } \
-    if (PyString_AsStringAndSize(pobj, &cstr, &csize) == -1) { \
-        return -1; \
-    } \
-} while (0)
-#endif
-
-#define COPY_IPADD(str, dest, tmp) { \
-    if (ip_from_str(str, &tmp) != 1) { \
-        PyErr_SetString(TrapError, "Could not parse given IP address."); \
-        goto exit_failure; \
-    } \
-    memcpy(&dest, &tmp, sizeof(ip_addr_t)); \
-} while (0)
-
-#define FREE_CLEAR(p) free(p);
-
+/**
+ * \brief Add a record to the state.
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
 static int
-UnirecIPAddrRange_init(pytrap_unirecipaddrrange *self, PyObject *args, PyObject *kwds)
+Aggregator_add_record(pytrap_aggregator *self, const char *data, Py_ssize_t size)
 {
-    PyObject *start = NULL, *end = NULL;
-    char *argstr = NULL, *str = NULL, *netmask = NULL;
-    Py_ssize_t size;
-    ip_addr_t tmp_ip;
-    unsigned char mask = 0;
-    uint32_t net_mask_array[4];
+    const ur_template_t *tmplt = self->template->urtmplt;
+    uraggr_table_t *pane = self->panes;
+    uraggr_value_t *state;
+    ur_time_t time;
+    int64_t t, p;
+    char *entry;
+    int i, created;
+
+    if (size < tmplt->static_size) {
+        PyErr_SetString(TrapError, "Message is too short.");
+        return -1;
+    }
+    if (self->window > 0) {
+        memcpy(&time, data + tmplt->offset[self->time_id], sizeof(time));
+        t = (int64_t) ur_time_get_sec(time) * 1000 + ur_time_get_msec(time);
+        p = t / self->step;
+        if (!self->started) {
+            self->started = 1;
+            self->watermark = t;
+            self->last_pane = p;
+            /* windows before the first record are open for delayed records */
+            self->next_end = p - (self->delay + self->step - 1) / self->step;
+        }
+        if (t > self->watermark) {
+            self->watermark = t;
+            if (Aggregator_close(self, t) != 0) {
+                return -1;
+            }
+        }
+        if (p + self->panes_per_window - 1 < self->next_end) {
+            self->late++;
+            return 0;
+        }
+        if (p < self->next_end) {
+            /* the pane is in sliding windows that were already closed */
+            self->partial_late++;
+        }
+        if (p > self->last_pane) {
+            self->last_pane = p;
+        }
+        pane = Aggregator_pane(self, p);
+    }
 
-    static char *kwlist[] = {"start", "end", NULL};
+    for (i = 0; i < self->key_count; i++) {
+        memcpy(self->key + self->key_offsets[i], data + tmplt->offset[self->key_ids[i]], ur_get_size(self->key_ids[i]));
+    }
+    entry = uraggr_table_get(self, pane, self->key, uraggr_hash(self->key, self->key_size), &created);
+    if (entry == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    self->groups += created;
+    state = (uraggr_value_t *) (entry + 8 + self->key_size);
+    for (i = 0; i < self->func_count; i++) {
+        uraggr_update(&self->funcs[i], state, tmplt, data, created);
+    }
+    return 0;
+}
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &start, &end)) {
-        goto exit_failure;
+static void
+Aggregator_dealloc(pytrap_aggregator *self)
+{
+    int64_t i;
+
+    if (self->panes != NULL) {
+        for (i = 0; i < self->pane_count; i++) {
+            uraggr_table_free(&self->panes[i]);
+        }
+        free(self->panes);
     }
+    uraggr_table_free(&self->merged);
+    if (self->out_tmplt != NULL) {
+        ur_free_template(self->out_tmplt);
+    }
+    free(self->key_ids);
+    free(self->key_offsets);
+    free(self->funcs);
+    free(self->key);
+    free(self->record);
+    Py_XDECREF(self->template);
+    Py_XDECREF(self->fmtspec);
+    Py_XDECREF(self->results);
+    Py_TYPE(self)->tp_free((PyObject *) self);
+}
 
-    /* start argument */
-    if (PyObject_IsInstance(start, (PyObject *) &pytrap_UnirecIPAddr)) {
-        if (!end) {
-            PyErr_SetString(PyExc_TypeError, "Missing end argument.");
-            goto exit_failure;
+/**
+ * \brief Get ID of a field of the input template.
+ *
+ * \return ID of the field, -1 with exception set on error
+ */
+static int16_t
+Aggregator_field_id(pytrap_aggregator *self, PyObject *name)
+{
+    int32_t field_id = UnirecTemplate_get_field_id(self->template, name);
+
+    if (field_id == UR_ITER_END) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetString(TrapError, "Field was not found.");
         }
-        memcpy(&self->start->ip, &(((pytrap_unirecipaddr *) start)->ip), sizeof(ip_addr_t));
-    } else {
-        /* check for supported string type */
-        CHECK_STR_CONV(start, argstr, size);
-        str = strdup(argstr);
-        /* supported string type */
-        netmask = strchr(str, '/');
-        if (netmask == NULL) {
-            if (!end) {
-                PyErr_SetString(PyExc_TypeError, "End argument is required when start is not in <ip>/<mask> format.");
-                goto exit_failure;
-            }
-            /* set start IP and continue with end */
-            COPY_IPADD(str, self->start->ip, tmp_ip);
-            FREE_CLEAR(str);
-        } else {
-            if (end) {
-                PyErr_SetString(PyExc_TypeError, "Start argument is in <ip>/<mask> format - end argument must be ommited.");
-                goto exit_failure;
-            }
+        return -1;
+    }
+    return field_id;
+}
 
-            /* expected string in <ip>/<mask> format, e.g. 192.168.1.0/24 */
-            *netmask = '\0';
-            netmask++;
-            if (sscanf(netmask, "%" SCNu8, &mask) != 1) {
-                PyErr_Format(PyExc_TypeError, "Malformed netmask %s.", netmask);
-                goto exit_failure;
-            }
+/**
+ * \brief Parse an aggregation (output name -> function or (function, field)).
+ *
+ * \return 0 on success, -1 with exception set on error
+ */
+static int
+Aggregator_parse_func(pytrap_aggregator *self, uraggr_func_t *f, PyObject *name, PyObject *spec, int slot)
+{
+    const char *out_name, *func_name;
+    PyObject *field = name;
+    ur_field_type_t type;
+    int cls;
+    int32_t out_id;
 
-            /* replace '/' with '\0' in order to convert string IP into ip_addr_t */
-            if (ip_from_str(str, &tmp_ip) != 1) {
-                PyErr_SetString(TrapError, "Could not parse given IP address.");
-                goto exit_failure;
-            }
+    if (!PyArg_Parse(name, "s", &out_name)) {
+        return -1;
+    }
+    if ((PyTuple_Check(spec) || PyList_Check(spec)) && PySequence_Size(spec) == 2) {
+        field = PySequence_Fast_GET_ITEM(spec, 1);
+        spec = PySequence_Fast_GET_ITEM(spec, 0);
+    }
+    if (!PyArg_Parse(spec, "s", &func_name)) {
+        PyErr_SetString(PyExc_TypeError, "Aggregation must be a function name or a pair (function, field).");
+        return -1;
+    }
+    for (f->func = URAGGR_COUNT; f->func <= URAGGR_AVG; f->func++) {
+        if (strcmp(func_name, uraggr_func_names[f->func]) == 0) {
+            break;
+        }
+    }
+    if (f->func > URAGGR_AVG) {
+        PyErr_Format(PyExc_ValueError, "Unknown aggregation function %s.", func_name);
+        return -1;
+    }
+    f->slot = slot;
 
-            if (ip_is4(&tmp_ip)) {
-                net_mask_array[0] = 0xFFFFFFFF >> (mask > 31 ? 0 : 32 - mask);
-                net_mask_array[0] = (bit_endian_swap((net_mask_array[0] & 0x000000FF)>>  0) <<  0) |
-                    (bit_endian_swap((net_mask_array[0] & 0x0000FF00)>>  8) <<  8) |
-                    (bit_endian_swap((net_mask_array[0] & 0x00FF0000)>> 16) << 16) |
-                    (bit_endian_swap((net_mask_array[0] & 0xFF000000)>> 24) << 24);
+    if (f->func == URAGGR_COUNT) {
+        cls = URFILTER_CLASS_UINT;
+        type = UR_TYPE_UINT64;
+    } else {
+        if ((f->field_id = Aggregator_field_id(self, field)) < 0) {
+            return -1;
+        }
+        cls = urfilter_field_class(f->field_id);
+        type = ur_get_type(f->field_id);
+        if (cls == URFILTER_CLASS_IP || cls == URFILTER_CLASS_STR ||
+            (cls == URFILTER_CLASS_TIME && (f->func == URAGGR_SUM || f->func == URAGGR_AVG))) {
+            PyErr_Format(PyExc_TypeError, "Function %s cannot be applied to field %s.", func_name, ur_get_name(f->field_id));
+            return -1;
+        }
+        if (cls == URFILTER_CLASS_TIME) {
+            cls = URFILTER_CLASS_UINT;
+        }
+        if (f->func == URAGGR_AVG) {
+            type = UR_TYPE_DOUBLE;
+            cls = URFILTER_CLASS_DOUBLE;
+        } else if (f->func == URAGGR_SUM) {
+            type = cls == URFILTER_CLASS_INT ? UR_TYPE_INT64 : (cls == URFILTER_CLASS_DOUBLE ? UR_TYPE_DOUBLE : UR_TYPE_UINT64);
+        }
+    }
+    f->cls = cls;
 
-                tmp_ip.ui32[2] = tmp_ip.ui32[2] & net_mask_array[0];
-                memcpy(&self->start->ip, &tmp_ip, 16);
+    /* results are not truncated to the type of an existing field (e.g. uint32 PACKETS) */
+    out_id = ur_define_field(out_name, type);
+    if (out_id == UR_E_TYPE_MISMATCH) {
+        PyErr_Format(PyExc_TypeError, "Field %s is defined with another type than the result of %s, "
+                     "use another name of the output field.", out_name, func_name);
+        return -1;
+    } else if (out_id < 0) {
+        PyErr_Format(PyExc_ValueError, "Invalid name of output field %s.", out_name);
+        return -1;
+    }
+    f->out_id = out_id;
+    return 0;
+}
 
-                tmp_ip.ui32[2] = tmp_ip.ui32[2] | (~net_mask_array[0]);
-                memcpy(&self->end->ip, &tmp_ip, 16);
-            } else {
-                // Fill every word of IPv6 address
-                net_mask_array[0] = 0xFFFFFFFF>>(mask > 31 ? 0 : 32 - mask);
-                net_mask_array[1] = 0xFFFFFFFF>>(mask > 63 ? 0 : (mask > 32 ? 64 - mask: 32));
-                net_mask_array[2] = 0xFFFFFFFF>>(mask > 95 ? 0 : (mask > 64 ? 96 - mask: 32));
-                net_mask_array[3] = 0xFFFFFFFF>>(mask > 127 ? 0 :(mask > 96 ? 128 - mask : 32));
+static PyObject *
+Aggregator_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    pytrap_aggregator *self;
+    pytrap_unirectemplate *template;
+    PyObject *keys, *aggs, *seq = NULL, *name, *spec, *time_field = NULL;
+    double window = 0, step = 0, delay = 0;
+    char *names = NULL, *fmtspec;
+    size_t names_len = 1;
+    Py_ssize_t i, pos = 0;
+    int j, slot = 0, columns = 0;
+
+    static char *kwlist[] = {"template", "keys", "aggs", "window", "step", "delay", "time_field", "columns", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!OO!|dddOi", kwlist, &pytrap_UnirecTemplate, &template,
+                                     &keys, &PyDict_Type, &aggs, &window, &step, &delay, &time_field, &columns)) {
+        return NULL;
+    }
+    if (step == 0) {
+        step = window;
+    }
+    if (window < 0 || step < 0 || delay < 0 || (window == 0 && step > 0) ||
+        (window > 0 && (step < 0.001 || fmod(window, step) != 0))) {
+        PyErr_SetString(PyExc_ValueError, "Window must be a positive multiple of step.");
+        return NULL;
+    }
 
-                int i;
+    self = (pytrap_aggregator *) type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    Py_INCREF(template);
+    self->template = template;
+    self->columns = columns;
+    self->window = (int64_t) (window * 1000);
+    self->step = self->window > 0 ? (int64_t) (step * 1000) : 1;
+    self->delay = (int64_t) (delay * 1000);
+    self->results = PyList_New(0);
+    if (self->results == NULL) {
+        goto failure;
+    }
 
-                for (i = 0; i < 4; ++i) {
-                    // Swap bits in every byte for compatibility with ip_addr_t stucture
-                    net_mask_array[i] = (bit_endian_swap((net_mask_array[i] & 0x000000FF) >> 0) <<  0) |
-                        (bit_endian_swap((net_mask_array[i] & 0x0000FF00)>>  8) <<  8) |
-                        (bit_endian_swap((net_mask_array[i] & 0x00FF0000)>> 16) << 16) |
-                        (bit_endian_swap((net_mask_array[i] & 0xFF000000)>> 24) << 24);
+    if (self->window > 0) {
+        if (time_field == NULL) {
+#if PY_MAJOR_VERSION >= 3
+            time_field = PyUnicode_FromString("TIME_FIRST");
+#else
+            time_field = PyString_FromString("TIME_FIRST");
+#endif
+        } else {
+            Py_INCREF(time_field);
+        }
+        self->time_id = time_field == NULL ? -1 : Aggregator_field_id(self, time_field);
+        Py_XDECREF(time_field);
+        if (self->time_id < 0) {
+            goto failure;
+        }
+        if (ur_get_type(self->time_id) != UR_TYPE_TIME) {
+            PyErr_Format(PyExc_TypeError, "Field %s is not of time type.", ur_get_name(self->time_id));
+            goto failure;
+        }
+    }
 
-                    self->start->ip.ui32[i] = tmp_ip.ui32[i] & net_mask_array[i];
-                    self->end->ip.ui32[i] = tmp_ip.ui32[i] | ( ~ net_mask_array[i]);
-                }
+    /* keys */
+    seq = PySequence_Fast(keys, "Argument keys must be a sequence of field names.");
+    if (seq == NULL) {
+        goto failure;
+    }
+    self->key_count = PySequence_Fast_GET_SIZE(seq);
+    self->key_ids = malloc(sizeof(int16_t) * (self->key_count + 1));
+    self->key_offsets = malloc(sizeof(uint32_t) * (self->key_count + 1));
+    if (self->key_ids == NULL || self->key_offsets == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+    for (j = 0; j < self->key_count; j++) {
+        if ((self->key_ids[j] = Aggregator_field_id(self, PySequence_Fast_GET_ITEM(seq, j))) < 0) {
+            goto failure;
+        }
+        if (!ur_is_static(self->key_ids[j])) {
+            PyErr_Format(PyExc_TypeError, "Key field %s must have fixed length.", ur_get_name(self->key_ids[j]));
+            goto failure;
+        }
+        self->key_offsets[j] = self->key_size;
+        self->key_size += ur_get_size(self->key_ids[j]);
+        names_len += strlen(ur_get_name(self->key_ids[j])) + 1;
+    }
+    Py_CLEAR(seq);
+    self->key_size = (self->key_size + 7) & ~7U;
+
+    /* aggregations */
+    self->func_count = PyDict_Size(aggs);
+    self->funcs = calloc(self->func_count + 1, sizeof(uraggr_func_t));
+    if (self->funcs == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+    for (j = 0; PyDict_Next(aggs, &pos, &name, &spec); j++) {
+        if (Aggregator_parse_func(self, &self->funcs[j], name, spec, slot) != 0) {
+            goto failure;
+        }
+        slot += self->funcs[j].func == URAGGR_AVG ? 2 : 1;
+        names_len += strlen(ur_get_name(self->funcs[j].out_id)) + 1;
+    }
+    self->entry_size = 8 + self->key_size + sizeof(uraggr_value_t) * slot;
+
+    /* output template */
+    names = calloc(names_len, 1);
+    if (names == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+    for (j = 0; j < self->key_count + self->func_count; j++) {
+        int16_t id = j < self->key_count ? self->key_ids[j] : self->funcs[j - self->key_count].out_id;
+        for (i = 0; i < j; i++) {
+            if (id == (i < self->key_count ? self->key_ids[i] : self->funcs[i - self->key_count].out_id)) {
+                PyErr_Format(PyExc_ValueError, "Duplicate output field %s.", ur_get_name(id));
+                goto failure;
             }
-            free(str);
-            /* we are done */
-            goto exit_success;
         }
+        if (j > 0) {
+            strcat(names, ",");
+        }
+        strcat(names, ur_get_name(id));
+    }
+    self->out_tmplt = ur_create_template(names, NULL);
+    free(names);
+    if (self->out_tmplt == NULL) {
+        PyErr_SetString(TrapError, "Creation of UniRec template failed.");
+        goto failure;
+    }
+    fmtspec = ur_template_string(self->out_tmplt);
+    if (fmtspec == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+#if PY_MAJOR_VERSION >= 3
+    self->fmtspec = PyUnicode_FromString(fmtspec);
+#else
+    self->fmtspec = PyString_FromString(fmtspec);
+#endif
+    free(fmtspec);
+    if (self->fmtspec == NULL) {
+        goto failure;
     }
 
-    /* end argument */
-    if (PyObject_IsInstance(end, (PyObject *) &pytrap_UnirecIPAddr)) {
-        memcpy(&self->end->ip, &(((pytrap_unirecipaddr *) end)->ip), sizeof(ip_addr_t));
+    /* state */
+    if (self->window > 0) {
+        self->panes_per_window = self->window / self->step;
+        self->pane_count = self->panes_per_window + (self->delay + self->step - 1) / self->step + 2;
     } else {
-        /* string is supported */
-        CHECK_STR_CONV(end, str, size);
-        COPY_IPADD(str, self->end->ip, tmp_ip);
+        self->panes_per_window = 1;
+        self->pane_count = 1;
     }
-exit_success:
-    return 0;
-exit_failure:
-    FREE_CLEAR(str);
-    return -1;
+    self->panes = calloc(self->pane_count, sizeof(uraggr_table_t));
+    self->key = calloc(self->key_size + 8, 1);
+    self->record = calloc(self->out_tmplt->static_size + 1, 1);
+    if (self->panes == NULL || self->key == NULL || self->record == NULL) {
+        PyErr_NoMemory();
+        goto failure;
+    }
+    return (PyObject *) self;
+
+failure:
+    Py_XDECREF(seq);
+    Py_DECREF(self);
+    return NULL;
 }
 
 static PyObject *
-UnirecIPAddrRange_compare(PyObject *a, PyObject *b, int op)
+Aggregator_add(pytrap_aggregator *self, PyObject *args, PyObject *kwds)
 {
-    PyObject *result;
+    PyObject *dataObj;
+    const char *data;
+    Py_ssize_t size;
 
-    if (!PyObject_IsInstance(a, (PyObject *) &pytrap_UnirecIPAddrRange) ||
-             !PyObject_IsInstance(b, (PyObject *) &pytrap_UnirecIPAddrRange)) {
-        result = Py_NotImplemented;
-        goto out;
+    static char *kwlist[] = {"data", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &dataObj)) {
+        return NULL;
     }
+    if (urfilter_get_record(dataObj, &data, &size) != 0 || Aggregator_add_record(self, data, size) != 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
 
-    pytrap_unirecipaddrrange *ur_a = (pytrap_unirecipaddrrange *) a;
-    pytrap_unirecipaddrrange *ur_b = (pytrap_unirecipaddrrange *) b;
+static PyObject *
+Aggregator_addMany(pytrap_aggregator *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *records, *seq;
+    const char *data;
+    Py_ssize_t i, n, size;
 
-    int res_S = ip_cmp(&ur_a->start->ip, &ur_b->start->ip);
-    int res_E = ip_cmp(&ur_a->end->ip, &ur_b->end->ip);
+    static char *kwlist[] = {"records", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &records)) {
+        return NULL;
+    }
+    seq = PySequence_Fast(records, "Argument records must be a sequence.");
+    if (seq == NULL) {
+        return NULL;
+    }
+    n = PySequence_Fast_GET_SIZE(seq);
+    for (i = 0; i < n; i++) {
+        if (urfilter_get_record(PySequence_Fast_GET_ITEM(seq, i), &data, &size) != 0 ||
+            Aggregator_add_record(self, data, size) != 0) {
+            Py_DECREF(seq);
+            return NULL;
+        }
+    }
+    Py_DECREF(seq);
+    Py_RETURN_NONE;
+}
 
-    switch (op) {
-    case Py_EQ:
-        result = (res_S == 0 && res_E == 0? Py_True : Py_False);
-        break;
-    case Py_NE:
-        result = (res_S != 0 && res_E != 0 ? Py_True : Py_False);
-        break;
-    case Py_LE:
-        result = (res_S <= 0 ? Py_True : Py_False);
-        break;
-    case Py_GE:
-        result = (res_E >= 0 ? Py_True : Py_False);
-        break;
-    case Py_LT:
-        result = (res_S < 0 ? Py_True : Py_False);
-        break;
-    case Py_GT:
-        result = (res_E > 0 ? Py_True : Py_False);
-        break;
-    default:
-        result = Py_NotImplemented;
+static PyObject *
+Aggregator_addBuffer(pytrap_aggregator *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *buffer;
+    const char *data;
+    Py_ssize_t pos = 0, size;
+    uint16_t msg_size;
+
+    static char *kwlist[] = {"buffer", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &buffer)) {
+        return NULL;
     }
+    if (urfilter_get_record(buffer, &data, &size) != 0) {
+        return NULL;
+    }
+    while (pos < size) {
+        if (size - pos < (Py_ssize_t) sizeof(msg_size)) {
+            goto corrupted;
+        }
+        memcpy(&msg_size, data + pos, sizeof(msg_size));
+        msg_size = ntohs(msg_size);
+        pos += sizeof(msg_size);
+        if (pos + msg_size > size) {
+            goto corrupted;
+        }
+        /* end-of-stream messages are skipped */
+        if (msg_size > 1 && Aggregator_add_record(self, data + pos, msg_size) != 0) {
+            return NULL;
+        }
+        pos += msg_size;
+    }
+    Py_RETURN_NONE;
 
-out:
-    Py_INCREF(result);
-    return result;
+corrupted:
+    PyErr_Format(TrapError, "Corrupted buffer at offset %zd.", pos);
+    return NULL;
 }
 
 static PyObject *
-UnirecIPAddrRange_repr(pytrap_unirecipaddrrange *self)
+Aggregator_results(pytrap_aggregator *self)
 {
-    PyObject *ip1 = NULL, *ip2 = NULL, *res = NULL;
+    PyObject *results = self->results;
 
-    ip1 = UnirecIPAddr_repr(self->start);
-    ip2 = UnirecIPAddr_repr(self->end);
-#if PY_MAJOR_VERSION >= 3
-    res = PyUnicode_FromFormat("UnirecIPAddrRange(%S, %S)", ip1, ip2);
-#else
-    res = PyString_FromFormat("UnirecIPAddrRange(%s, %s)", PyString_AsString(ip1), PyString_AsString(ip2));
-#endif
-    Py_DECREF(ip1);
-    Py_DECREF(ip2);
-    return res;
+    self->results = PyList_New(0);
+    if (self->results == NULL) {
+        self->results = results;
+        return NULL;
+    }
+    return results;
 }
 
 static PyObject *
-UnirecIPAddrRange_str(pytrap_unirecipaddrrange *self)
+Aggregator_flush(pytrap_aggregator *self)
 {
-    PyObject *ip1 = NULL, *ip2 = NULL, *res = NULL;
-    ip1 = UnirecIPAddr_str(self->start);
-    ip2 = UnirecIPAddr_str(self->end);
-#if PY_MAJOR_VERSION >= 3
-    res = PyUnicode_FromFormat("%S - %S", ip1, ip2);
-#else
-    res = PyString_FromFormat("%s - %s", PyString_AsString(ip1), PyString_AsString(ip2));
-#endif
-    Py_DECREF(ip1);
-    Py_DECREF(ip2);
-    return res;
-}
+    int64_t i;
 
-static PyMemberDef UnirecIPAddrRange_members[] = {
-    {"start", T_OBJECT_EX, offsetof(pytrap_unirecipaddrrange, start), 0,
-     "Low IP address of range"},
-    {"end", T_OBJECT_EX, offsetof(pytrap_unirecipaddrrange, end), 0,
-     "High IP address of range"},
-    {NULL}  /* Sentinel */
-};
+    if (self->window == 0) {
+        if (self->panes[0].count > 0 && Aggregator_emit(self, &self->panes[0], -1, -1) != 0) {
+            return NULL;
+        }
+        uraggr_table_clear(&self->panes[0]);
+        self->groups = 0;
+    } else if (self->started) {
+        if (Aggregator_close(self, (self->last_pane + self->panes_per_window) * self->step + self->delay) != 0) {
+            return NULL;
+        }
+        for (i = 0; i < self->pane_count; i++) {
+            uraggr_table_clear(&self->panes[i]);
+        }
+        self->groups = 0;
+        self->started = 0;
+    }
+    return Aggregator_results(self);
+}
 
+static PyMethodDef Aggregator_methods[] = {
+    {"add", (PyCFunction) Aggregator_add, METH_VARARGS | METH_KEYWORDS,
+        "Add a record.\n\n"
+        "Args:\n"
+        "    data (bytearray or bytes): Data - UniRec message.\n\n"
+        "Raises:\n"
+        "    TrapError: Message is too short for the template.\n"
+        },
 
-static PyMethodDef UnirecIPAddrRange_methods[] = {
-    {"isIn", (PyCFunction) UnirecIPAddrRange_isIn, METH_O,
-        "Check if the address is in IP range.\n\n"
+    {"addMany", (PyCFunction) Aggregator_addMany, METH_VARARGS | METH_KEYWORDS,
+        "Add records.\n\n"
         "Args:\n"
-        "    ipaddr: UnirecIPAddr struct"
-        "Returns:\n"
-        "    long: -1 if ipaddr < start of range, 0 if ipaddr is in interval, 1 if ipaddr > end of range .\n"
+        "    records (list): UniRec messages (bytearray or bytes).\n\n"
+        "Raises:\n"
+        "    TrapError: Message is too short for the template.\n"
         },
 
-    {"isOverlap", (PyCFunction) UnirecIPAddrRange_isOverlap, METH_VARARGS,
-        "Check if 2 ranges sorted by start IP overlap.\n\n"
+    {"addBuffer", (PyCFunction) Aggregator_addBuffer, METH_VARARGS | METH_KEYWORDS,
+        "Add records from a buffer of messages.\n\n"
+        "End-of-stream messages (1B or shorter) are skipped.\n\n"
         "Args:\n"
-        "    other: UnirecIPAddrRange, second interval to compare"
+        "    buffer (bytes): Messages, each prefixed by 2B length in network byte order\n"
+        "        (e.g. FileReader.readBuffer()).\n\n"
+        "Raises:\n"
+        "    TrapError: Buffer is corrupted or a message is too short for the template.\n"
+        },
+
+    {"results", (PyCFunction) Aggregator_results, METH_NOARGS,
+        "Get windows closed since the last call.\n\n"
         "Returns:\n"
-        "    bool: True if ranges are overlaps.\n"
+        "    list: Tuples (start, end, result) where start and end are UnirecTime\n"
+        "        (None without window) and result is a list of UniRec messages\n"
+        "        in format fmtspec, one per group, or a dict of columns (field name ->\n"
+        "        bytearray of packed values) if columns was set.\n"
         },
-    {NULL}  /* Sentinel */
-};
 
+    {"flush", (PyCFunction) Aggregator_flush, METH_NOARGS,
+        "Close all windows (e.g. at the end of data) and get results.\n\n"
+        "Returns:\n"
+        "    list: Closed windows, see results().\n"
+        },
 
-static PySequenceMethods UnirecIPAddrRange_seqmethods = {
-    0, /* lenfunc sq_length; */
-    0, /* binaryfunc sq_concat; */
-    0, /* ssizeargfunc sq_repeat; */
-    0, /* ssizeargfunc sq_item; */
-    0, /* void *was_sq_slice; */
-    0, /* ssizeobjargproc sq_ass_item; */
-    0, /* void *was_sq_ass_slice; */
-    (objobjproc) UnirecIPAddrRange_contains, /* objobjproc sq_contains; */
-    0, /* binaryfunc sq_inplace_concat; */
-    0 /* ssizeargfunc sq_inplace_repeat; */
+    {NULL, NULL, 0, NULL}
 };
 
+static PyMemberDef Aggregator_members[] = {
+    {"fmtspec", T_OBJECT_EX, offsetof(pytrap_aggregator, fmtspec), READONLY, "UniRec format of results."},
+    {"late", T_ULONGLONG, offsetof(pytrap_aggregator, late), READONLY, "Number of records dropped because their windows were closed."},
+    {"partial_late", T_ULONGLONG, offsetof(pytrap_aggregator, partial_late), READONLY,
+        "Number of records added only to open sliding windows because some of their windows were closed."},
+    {NULL}  /* Sentinel */
+};
 
-static PyTypeObject pytrap_UnirecIPAddrRange = {
+static PyTypeObject pytrap_Aggregator = {
     PyVarObject_HEAD_INIT(NULL, 0)
-    "pytrap.UnirecIPAddrRange",       /* tp_name */
-    sizeof(pytrap_unirecipaddrrange), /* tp_basicsize */
+    "pytrap.Aggregator",       /* tp_name */
+    sizeof(pytrap_aggregator), /* tp_basicsize */
     0,                         /* tp_itemsize */
-    (destructor) UnirecIPAddrRange_dealloc, /* tp_dealloc */
+    (destructor) Aggregator_dealloc, /* tp_dealloc */
     0,                         /* tp_print */
     0,                         /* tp_getattr */
     0,                         /* tp_setattr */
     0,                         /* tp_reserved */
-    (reprfunc) UnirecIPAddrRange_repr, /* tp_repr */
+    0,                         /* tp_repr */
     0,                         /* tp_as_number */
-    &UnirecIPAddrRange_seqmethods, /* tp_as_sequence */
+    0,                         /* tp_as_sequence */
     0,                         /* tp_as_mapping */
     0,                         /* tp_hash  */
     0,                         /* tp_call */
-    (reprfunc) UnirecIPAddrRange_str, /* tp_str */
+    0,                         /* tp_str */
     0,                         /* tp_getattro */
     0,                         /* tp_setattro */
     0,                         /* tp_as_buffer */
-    Py_TPFLAGS_DEFAULT |
-        Py_TPFLAGS_BASETYPE,   /* tp_flags */
-    "Unirec IPAddr Range object",   /* tp_doc */
+    Py_TPFLAGS_DEFAULT,        /* tp_flags */
+    "Aggregator(template, keys, aggs, window=0, step=0, delay=0, time_field='TIME_FIRST', columns=False)\n\n"
+    "    Group-by aggregation of UniRec records in time windows.\n\n"
+    "    Records are grouped by values of key fields, the state of groups is kept\n"
+    "    in C, values are not converted into Python objects.  Sum is uint64,\n"
+    "    int64 or double, count is uint64, avg is double and min and max have\n"
+    "    the type of the field.  An output field that is already defined with\n"
+    "    another type (e.g. sum of uint32 PACKETS stored as PACKETS) is rejected.\n\n"
+    "    Windows are based on time_field of records.  A window is closed when\n"
+    "    a record newer than its end + delay is added, records of closed windows\n"
+    "    are dropped (see late).  In sliding windows, a record whose earlier windows\n"
+    "    are closed is added to its open windows only, so the closed ones miss it\n"
+    "    (see partial_late).\n\n"
+    "    Args:\n"
+    "        template (UnirecTemplate): Template of records.\n"
+    "        keys (list): Names of fixed-length key fields.\n"
+    "        aggs (dict): Output field name -> function ('count', 'sum', 'min',\n"
+    "            'max', 'avg') of the field of the same name or (function, field).\n"
+    "        window (Optional[float]): Length of windows in seconds, 0 for one window\n"
+    "            closed by flush().\n"
+    "        step (Optional[float]): Step of sliding windows in seconds, window (tumbling\n"
+    "            windows) by default.\n"
+    "        delay (Optional[float]): Time to wait for delayed records in seconds.\n"
+    "        time_field (Optional[str]): Time field of records.\n"
+    "        columns (Optional[bool]): Return results as columns instead of UniRec messages.\n\n"
+    "    Raises:\n"
+    "        TrapError: Field was not found.\n"
+    "        TypeError: Function cannot be applied to the field or output field\n"
+    "            is defined with another type.\n"
+    "        ValueError: Unknown function or invalid window.\n", /* tp_doc */
     0,                         /* tp_traverse */
     0,                         /* tp_clear */
-    (richcmpfunc) UnirecIPAddrRange_compare, /* tp_richcompare */
+    0,                         /* tp_richcompare */
     0,                         /* tp_weaklistoffset */
     0,                         /* tp_iter */
     0,                         /* tp_iternext */
-    UnirecIPAddrRange_methods, /* tp_methods */
-    UnirecIPAddrRange_members, /* tp_members */
+    Aggregator_methods,        /* tp_methods */
+    Aggregator_members,        /* tp_members */
     0,                         /* tp_getset */
     0,                         /* tp_base */
     0,                         /* tp_dict */
     0,                         /* tp_descr_get */
     0,                         /* tp_descr_set */
     0,                         /* tp_dictoffset */
-    (initproc)UnirecIPAddrRange_init,      /* tp_init */
+    0,                         /* tp_init */
     0,                         /* tp_alloc */
-    UnirecIPAddrRange_new,     /* tp_new */
+    Aggregator_new,            /* tp_new */
 };
 
 
-
 /**
  * \brief Initialize UniRec template class and add it to pytrap module.
  *
@@ -2202,6 +6624,41 @@ init_unirectemplate(PyObject *m)
     Py_INCREF(&pytrap_UnirecTemplate);
     PyModule_AddObject(m, "UnirecTemplate", (PyObject *) &pytrap_UnirecTemplate);
 
+    /* Add CopyPlan */
+    if (PyType_Ready(&pytrap_UnirecCopyPlan) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_UnirecCopyPlan);
+    PyModule_AddObject(m, "UnirecCopyPlan", (PyObject *) &pytrap_UnirecCopyPlan);
+
+    /* Add Projection */
+    if (PyType_Ready(&pytrap_UnirecProjection) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_UnirecProjection);
+    PyModule_AddObject(m, "UnirecProjection", (PyObject *) &pytrap_UnirecProjection);
+
+    /* Add Filter */
+    if (PyType_Ready(&pytrap_UnirecFilter) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_UnirecFilter);
+    PyModule_AddObject(m, "UnirecFilter", (PyObject *) &pytrap_UnirecFilter);
+
+    /* Add Aggregator */
+    if (PyType_Ready(&pytrap_Aggregator) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_Aggregator);
+    PyModule_AddObject(m, "Aggregator", (PyObject *) &pytrap_Aggregator);
+
+    /* Add FileReader */
+    if (PyType_Ready(&pytrap_FileReader) < 0) {
+        return EXIT_FAILURE;
+    }
+    Py_INCREF(&pytrap_FileReader);
+    PyModule_AddObject(m, "FileReader", (PyObject *) &pytrap_FileReader);
+
     PyDateTime_IMPORT;
 
     return EXIT_SUCCESS;
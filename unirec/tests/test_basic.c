@@ -261,6 +261,103 @@ int main(int argc, char **argv)
       }
       ur_free_template(tmplt);
    }
+   // Copy plans give the same records as ur_copy_fields()
+   {
+      const char *dst_specs[] = {"BAR,NEW,STR2,STR1", "STR2,NEW", "FOO,BAR,IP", "STR3,STR1,BAR", "BAR,STR1,STR2,NEW"};
+      ur_template_t *src_tmplt = ur_create_template("BAR,STR1,STR2,NEW", NULL);
+      if (src_tmplt == NULL || ur_define_field("STR3", UR_TYPE_STRING) < 0) {
+         fprintf(stderr, "Error during creating template\n");
+         return 1;
+      }
+      for (int i = 0; i < sizeof(dst_specs) / sizeof(dst_specs[0]); i++) {
+         ur_template_t *dst_tmplt = ur_create_template(dst_specs[i], NULL);
+         ur_copy_plan_t *plan = ur_create_copy_plan(dst_tmplt, src_tmplt);
+         char *rec1 = ur_create_record(dst_tmplt, 512), *rec2 = ur_create_record(dst_tmplt, 512);
+         if (dst_tmplt == NULL || plan == NULL || rec1 == NULL || rec2 == NULL) {
+            fprintf(stderr, "Error during creating copy plan\n");
+            return 1;
+         }
+         if (ur_is_present(dst_tmplt, ur_get_id_by_name("STR3"))) {
+            // field that is not copied keeps its value
+            ur_set_string(dst_tmplt, rec1, ur_get_id_by_name("STR3"), "keep");
+            ur_set_string(dst_tmplt, rec2, ur_get_id_by_name("STR3"), "keep");
+         }
+         uint32_t size = ur_copy_plan_dst_size(plan, rec2, buffer2);
+         ur_copy_fields(dst_tmplt, rec1, src_tmplt, buffer2);
+         ur_copy_fields_by_plan(plan, rec2, buffer2);
+         if (size != ur_rec_size(dst_tmplt, rec1) || ur_rec_size(dst_tmplt, rec1) != ur_rec_size(dst_tmplt, rec2) ||
+             memcmp(rec1, rec2, ur_rec_size(dst_tmplt, rec1)) != 0) {
+            fprintf(stderr, "Copy plan of %s gives different record.\n", dst_specs[i]);
+            return 1;
+         }
+         ur_free_copy_plan(plan);
+         ur_free_record(rec1);
+         ur_free_record(rec2);
+         ur_free_template(dst_tmplt);
+      }
+      // identical templates
+      ur_copy_plan_t *plan = ur_create_copy_plan(src_tmplt, src_tmplt);
+      char *rec = ur_create_record(src_tmplt, 512);
+      ur_copy_fields_by_plan(plan, rec, buffer2);
+      if (memcmp(rec, buffer2, ur_rec_size(src_tmplt, buffer2)) != 0) {
+         fprintf(stderr, "Copy plan of the same template gives different record.\n");
+         return 1;
+      }
+      ur_free_copy_plan(plan);
+      ur_free_record(rec);
+      ur_free_template(src_tmplt);
+   }
+
+   // Many run-time fields, lookup by name and undefinition
+   {
+      char name[32];
+      int ids[1000];
+      for (int i = 0; i < 1000; i++) {
+         sprintf(name, "DYN_%d", i);
+         ids[i] = ur_define_field(name, UR_TYPE_UINT32);
+         if (ids[i] < 0) {
+            fprintf(stderr, "Can't define field %s.\n", name);
+            return 1;
+         }
+      }
+      for (int i = 0; i < 1000; i += 2) {
+         sprintf(name, "DYN_%d", i);
+         if (ur_undefine_field(name) != UR_OK) {
+            fprintf(stderr, "Can't undefine field %s.\n", name);
+            return 1;
+         }
+      }
+      for (int i = 0; i < 1000; i++) {
+         sprintf(name, "DYN_%d", i);
+         int id = ur_get_id_by_name(name);
+         if ((i % 2 == 0 && id != UR_E_INVALID_NAME) || (i % 2 == 1 && id != ids[i])) {
+            fprintf(stderr, "Bad ID %d of field %s.\n", id, name);
+            return 1;
+         }
+      }
+      if (ur_define_field("DYN_1", UR_TYPE_UINT32) != ids[1] || ur_define_field("DYN_1", UR_TYPE_UINT8) != UR_E_TYPE_MISMATCH ||
+          ur_get_id_by_name("FOO") != F_FOO) {
+         fprintf(stderr, "Lookup of defined field failed.\n");
+         return 1;
+      }
+
+      // repeated definition of the same set and its redefinition after undefine
+      const char *spec = "uint32 DYN_0,uint32 DYN_1";
+      if (ur_define_set_of_fields(spec) != UR_OK || ur_define_set_of_fields(spec) != UR_OK ||
+          ur_get_id_by_name("DYN_0") < 0) {
+         fprintf(stderr, "ur_define_set_of_fields() failed.\n");
+         return 1;
+      }
+      if (ur_undefine_field("DYN_0") != UR_OK || ur_get_id_by_name("DYN_0") != UR_E_INVALID_NAME ||
+          ur_define_set_of_fields(spec) != UR_OK || ur_get_id_by_name("DYN_0") < 0) {
+         fprintf(stderr, "Field DYN_0 was not redefined.\n");
+         return 1;
+      }
+      if (ur_define_set_of_fields("uint8 DYN_1") != UR_E_TYPE_MISMATCH) {
+         fprintf(stderr, "Type mismatch was not detected.\n");
+         return 1;
+      }
+   }
    //deallocation
    free(buffer);
    free(buffer2);
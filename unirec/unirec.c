@@ -120,6 +120,117 @@ ur_static_field_specs_t UR_FIELD_SPECS_STATIC;
 
 const char UR_MEMORY_ERROR [] = "Memory allocation error";
 
+/**
+ * Cache of ifc_data_fmt strings whose fields are defined, see ur_define_set_of_fields().
+ */
+static struct {
+   char *spec;
+   uint32_t hash;
+} ur_ifc_spec_cache[UR_IFC_SPEC_CACHE_SIZE];
+static int ur_ifc_spec_cache_next = 0;
+
+/**
+ * Hash of a string (FNV-1a)
+ */
+static inline uint32_t ur_string_hash(const char *str)
+{
+   uint32_t hash = 2166136261U;
+   while (*str != 0) {
+      hash ^= (uint8_t) *(str++);
+      hash *= 16777619U;
+   }
+   return hash;
+}
+
+/**
+ * Find slot of the name in the hash index of field names.
+ * \return Index of the slot with ID of the field or of the empty slot where the name belongs.
+ */
+static inline uint32_t ur_field_index_slot(const char *name)
+{
+   uint32_t mask = ur_field_specs.ur_field_index_size - 1;
+   uint32_t i = ur_string_hash(name) & mask;
+   ur_field_id_t id;
+   while ((id = ur_field_specs.ur_field_index[i]) != UR_INVALID_FIELD && strcmp(name, ur_field_specs.ur_field_names[id]) != 0) {
+      i = (i + 1) & mask;
+   }
+   return i;
+}
+
+/**
+ * Create the hash index of field names of given size (power of 2) with all defined fields.
+ * \return UR_OK on success, UR_E_MEMORY otherwise (the old index is kept)
+ */
+static int ur_field_index_rebuild(uint32_t size)
+{
+   ur_field_id_t *index = (ur_field_id_t *) malloc(sizeof(ur_field_id_t) * size);
+   if (index == NULL) {
+      return UR_E_MEMORY;
+   }
+   for (uint32_t i = 0; i < size; i++) {
+      index[i] = UR_INVALID_FIELD;
+   }
+   free(ur_field_specs.ur_field_index);
+   ur_field_specs.ur_field_index = index;
+   ur_field_specs.ur_field_index_size = size;
+   for (int id = 0; id < ur_field_specs.ur_last_id; id++) {
+      if (ur_field_specs.ur_field_names[id] != NULL) {
+         index[ur_field_index_slot(ur_field_specs.ur_field_names[id])] = id;
+      }
+   }
+   return UR_OK;
+}
+
+/**
+ * Make sure the hash index of field names has space for given number of fields.
+ * The index is kept at most half full.
+ * \return UR_OK on success, UR_E_MEMORY otherwise
+ */
+static int ur_field_index_reserve(uint32_t count)
+{
+   uint32_t size = ur_field_specs.ur_field_index_size;
+   if (ur_field_specs.ur_field_index != NULL && count * 2 <= size) {
+      return UR_OK;
+   }
+   if (size < UR_INITIAL_SIZE_FIELD_INDEX) {
+      size = UR_INITIAL_SIZE_FIELD_INDEX;
+   }
+   while (count * 2 > size) {
+      size *= 2;
+   }
+   return ur_field_index_rebuild(size);
+}
+
+/**
+ * Remove the field from the hash index of field names.
+ * Following items of the cluster are moved to keep the probing sequences unbroken.
+ */
+static void ur_field_index_remove(ur_field_id_t field_id)
+{
+   uint32_t mask = ur_field_specs.ur_field_index_size - 1;
+   uint32_t i = ur_field_index_slot(ur_field_specs.ur_field_names[field_id]);
+   ur_field_id_t id;
+   ur_field_specs.ur_field_index[i] = UR_INVALID_FIELD;
+   i = (i + 1) & mask;
+   while ((id = ur_field_specs.ur_field_index[i]) != UR_INVALID_FIELD) {
+      ur_field_specs.ur_field_index[i] = UR_INVALID_FIELD;
+      ur_field_specs.ur_field_index[ur_field_index_slot(ur_field_specs.ur_field_names[id])] = id;
+      i = (i + 1) & mask;
+   }
+}
+
+/**
+ * Forget all ifc_data_fmt strings remembered by ur_define_set_of_fields().
+ */
+static void ur_ifc_spec_cache_clear()
+{
+   for (int i = 0; i < UR_IFC_SPEC_CACHE_SIZE; i++) {
+      free(ur_ifc_spec_cache[i].spec);
+      ur_ifc_spec_cache[i].spec = NULL;
+   }
+   ur_ifc_spec_cache_next = 0;
+}
+
 int ur_init(ur_static_field_specs_t field_specs_static)
 {
    int i, j;
@@ -163,6 +274,17 @@ int ur_init(ur_static_field_specs_t field_specs_static)
       }
       strcpy(ur_field_specs.ur_field_names[i], field_specs_static.ur_field_names[i]);
    }
+   ur_field_specs.ur_field_index = NULL;
+   ur_field_specs.ur_field_index_size = 0;
+   if (ur_field_index_reserve(ur_field_specs.ur_allocated_fields) != UR_OK) {
+      for (j = 0; j < field_specs_static.ur_last_id; j++) {
+         free(ur_field_specs.ur_field_names[j]);
+      }
+      free(ur_field_specs.ur_field_names);
+      free(ur_field_specs.ur_field_types);
+      free(ur_field_specs.ur_field_sizes);
+      return UR_E_MEMORY;
+   }
    ur_field_specs.intialized = UR_INITIALIZED;
    return UR_OK;
 }
@@ -479,6 +601,16 @@ int ur_define_set_of_fields(const char *ifc_data_fmt)
    char *field_name, *field_type;
    int field_name_length = UR_DEFAULT_LENGTH_OF_FIELD_NAME, field_type_length = UR_DEFAULT_LENGTH_OF_FIELD_TYPE;
    int field_id = 0, field_type_id = 0;
+   uint32_t spec_hash = ur_string_hash(ifc_data_fmt);
+   //skip the set which has been defined recently
+   if (ur_field_specs.intialized == UR_INITIALIZED) {
+      for (int i = 0; i < UR_IFC_SPEC_CACHE_SIZE; i++) {
+         if (ur_ifc_spec_cache[i].spec != NULL && ur_ifc_spec_cache[i].hash == spec_hash &&
+             strcmp(ur_ifc_spec_cache[i].spec, ifc_data_fmt) == 0) {
+            return UR_OK;
+         }
+      }
+   }
    field_name = (char *) malloc(sizeof(char) * field_name_length);
    if (field_name == NULL) {
       return UR_E_MEMORY;
@@ -521,6 +653,11 @@ int ur_define_set_of_fields(const char *ifc_data_fmt)
       free(field_name);
    }
    free(field_type);
+   //remember the set (failure of allocation only disables the shortcut)
+   free(ur_ifc_spec_cache[ur_ifc_spec_cache_next].spec);
+   ur_ifc_spec_cache[ur_ifc_spec_cache_next].spec = strdup(ifc_data_fmt);
+   ur_ifc_spec_cache[ur_ifc_spec_cache_next].hash = spec_hash;
+   ur_ifc_spec_cache_next = (ur_ifc_spec_cache_next + 1) % UR_IFC_SPEC_CACHE_SIZE;
    return UR_OK;
 }
 
@@ -578,17 +715,20 @@ int ur_define_field(const char *name, ur_field_type_t type)
       }
    }
    //check if the field is already defined
-   for (int i = 0; i < ur_field_specs.ur_last_id; i++) {
-      if (ur_field_specs.ur_field_names[i] != NULL && strcmp(name, ur_field_specs.ur_field_names[i]) == 0) {
-         if (type == ur_field_specs.ur_field_types[i]) {
-            //name exists and type is equal
-            return i;
-         } else {
-            //name exists, but type is different
-            return UR_E_TYPE_MISMATCH;
-         }
+   insert_id = ur_get_id_by_name(name);
+   if (insert_id >= 0) {
+      if (type == ur_field_specs.ur_field_types[insert_id]) {
+         //name exists and type is equal
+         return insert_id;
+      } else {
+         //name exists, but type is different
+         return UR_E_TYPE_MISMATCH;
       }
    }
+   //make space in the index for the new field
+   if (ur_field_index_reserve(ur_field_specs.ur_last_id + 1) != UR_OK) {
+      return UR_E_MEMORY;
+   }
    //create new field
    name_copy = (char *) calloc(sizeof(char), strlen(name) + 1);
    if (name_copy == NULL) {
@@ -605,6 +745,7 @@ int ur_define_field(const char *name, ur_field_type_t type)
    ur_field_specs.ur_field_names[insert_id] = name_copy;
    ur_field_specs.ur_field_sizes[insert_id] = ur_size_of(type);
    ur_field_specs.ur_field_types[insert_id] = type;
+   ur_field_specs.ur_field_index[ur_field_index_slot(name_copy)] = insert_id;
    return insert_id;
 }
 
@@ -624,8 +765,11 @@ int ur_undefine_field_by_id(ur_field_id_t field_id)
          //error during allocation
          return UR_E_MEMORY;
       }
+      ur_field_index_remove(field_id);
       free(ur_field_specs.ur_field_names[field_id]);
       ur_field_specs.ur_field_names[field_id] = NULL;
+      //remembered sets of fields may contain the field
+      ur_ifc_spec_cache_clear();
       undefined_item->id = field_id;
       undefined_item->next = ur_field_specs.ur_undefine_fields;
       ur_field_specs.ur_undefine_fields = undefined_item;
@@ -635,12 +779,10 @@ int ur_undefine_field_by_id(ur_field_id_t field_id)
 
 int ur_undefine_field(const char *name)
 {
-   int i;
    //find id of field
-   for (i = ur_field_specs.ur_last_statically_defined_id; i < ur_field_specs.ur_last_id; i++) {
-      if (ur_field_specs.ur_field_names[i] != NULL && strcmp(name, ur_field_specs.ur_field_names[i]) == 0) {
-         return ur_undefine_field_by_id(i);
-      }
+   int id = ur_get_id_by_name(name);
+   if (id >= ur_field_specs.ur_last_statically_defined_id) {
+      return ur_undefine_field_by_id(id);
    }
    //field with given name was not found
    return  UR_E_INVALID_NAME;
@@ -676,6 +818,10 @@ void ur_finalize()
    if (ur_field_specs.ur_field_types != NULL) {
       free(ur_field_specs.ur_field_types);
    }
+   free(ur_field_specs.ur_field_index);
+   ur_field_specs.ur_field_index = NULL;
+   ur_field_specs.ur_field_index_size = 0;
+   ur_ifc_spec_cache_clear();
    ur_field_specs.ur_field_names = UR_FIELD_SPECS_STATIC.ur_field_names;
    ur_field_specs.ur_field_sizes = UR_FIELD_SPECS_STATIC.ur_field_sizes;
    ur_field_specs.ur_field_types = UR_FIELD_SPECS_STATIC.ur_field_types;
@@ -689,6 +835,11 @@ void ur_finalize()
 // Find field ID given its name
 int ur_get_id_by_name(const char *name)
 {
+   if (ur_field_specs.ur_field_index != NULL) {
+      ur_field_id_t id = ur_field_specs.ur_field_index[ur_field_index_slot(name)];
+      return id != UR_INVALID_FIELD ? id : UR_E_INVALID_NAME;
+   }
+   //UniRec is not initialized, static fields only
    for (int id = 0; id < ur_field_specs.ur_last_id; id++) {
       if (ur_field_specs.ur_field_names[id] != NULL && strcmp(name, ur_field_specs.ur_field_names[id]) == 0) {
          return id;
@@ -1177,6 +1328,110 @@ void ur_copy_fields(const ur_template_t *dst_tmplt, void *dst, const ur_template
    }
 }
 
+ur_copy_plan_t *ur_create_copy_plan(const ur_template_t *dst_tmplt, const ur_template_t *src_tmplt)
+{
+   ur_copy_plan_t *plan;
+   ur_copy_run_t *run = NULL;
+   int dst_var_count = 0;
+   plan = (ur_copy_plan_t *) calloc(1, sizeof(ur_copy_plan_t));
+   if (plan == NULL) {
+      return NULL;
+   }
+   plan->src_tmplt = src_tmplt;
+   plan->dst_tmplt = dst_tmplt;
+   plan->runs = (ur_copy_run_t *) malloc(sizeof(ur_copy_run_t) * (src_tmplt->count + 1));
+   plan->var_ids = (ur_field_id_t *) malloc(sizeof(ur_field_id_t) * (dst_tmplt->count + 1));
+   if (plan->runs == NULL || plan->var_ids == NULL) {
+      ur_free_copy_plan(plan);
+      return NULL;
+   }
+   // static fields in order of source record, adjacent ones are merged
+   for (int i = 0; i < src_tmplt->count; i++) {
+      ur_field_id_t id = src_tmplt->ids[i];
+      if (ur_is_varlen(id) || !ur_is_present(dst_tmplt, id)) {
+         continue;
+      }
+      if (run != NULL && run->src_offset + run->size == src_tmplt->offset[id] &&
+          run->dst_offset + run->size == dst_tmplt->offset[id]) {
+         run->size += ur_get_size(id);
+      } else {
+         run = &plan->runs[plan->run_count++];
+         run->src_offset = src_tmplt->offset[id];
+         run->dst_offset = dst_tmplt->offset[id];
+         run->size = ur_get_size(id);
+      }
+   }
+   // variable-length fields in order of destination record
+   for (int i = 0; i < dst_tmplt->count; i++) {
+      ur_field_id_t id = dst_tmplt->ids[i];
+      if (!ur_is_varlen(id)) {
+         continue;
+      }
+      dst_var_count++;
+      if (ur_is_present(src_tmplt, id)) {
+         plan->var_ids[plan->var_count++] = id;
+      }
+   }
+   plan->var_all = (plan->var_count == dst_var_count);
+   return plan;
+}
+
+void ur_copy_fields_by_plan(const ur_copy_plan_t *plan, void *dst, const void *src)
+{
+   const ur_template_t *src_tmplt = plan->src_tmplt, *dst_tmplt = plan->dst_tmplt;
+   if (src_tmplt == dst_tmplt) {
+      memcpy(dst, src, ur_rec_size(src_tmplt, src));
+      return;
+   }
+   for (int i = 0; i < plan->run_count; i++) {
+      memcpy((char *) dst + plan->runs[i].dst_offset, (const char *) src + plan->runs[i].src_offset, plan->runs[i].size);
+   }
+   if (plan->var_all) {
+      // all variable-length data of destination is replaced, store it sequentially
+      uint16_t offset = 0, len;
+      for (int i = 0; i < plan->var_count; i++) {
+         ur_field_id_t id = plan->var_ids[i];
+         len = ur_get_var_len(src_tmplt, src, id);
+         memcpy((char *) dst + dst_tmplt->static_size + offset, ur_get_ptr_by_id(src_tmplt, src, id), len);
+         ur_set_var_offset(dst_tmplt, dst, id, offset);
+         ur_set_var_len(dst_tmplt, dst, id, len);
+         offset += len;
+      }
+   } else {
+      for (int i = 0; i < plan->var_count; i++) {
+         ur_field_id_t id = plan->var_ids[i];
+         ur_set_var(dst_tmplt, dst, id, ur_get_ptr_by_id(src_tmplt, src, id), ur_get_var_len(src_tmplt, src, id));
+      }
+   }
+}
+
+uint32_t ur_copy_plan_dst_size(const ur_copy_plan_t *plan, const void *dst, const void *src)
+{
+   const ur_template_t *src_tmplt = plan->src_tmplt, *dst_tmplt = plan->dst_tmplt;
+   uint32_t size = dst_tmplt->static_size;
+   if (!plan->var_all) {
+      size += ur_rec_varlen_size(dst_tmplt, dst);
+   }
+   for (int i = 0; i < plan->var_count; i++) {
+      ur_field_id_t id = plan->var_ids[i];
+      size += ur_get_var_len(src_tmplt, src, id);
+      if (!plan->var_all) {
+         size -= ur_get_var_len(dst_tmplt, dst, id);
+      }
+   }
+   return size;
+}
+
+void ur_free_copy_plan(ur_copy_plan_t *plan)
+{
+   if (plan == NULL) {
+      return;
+   }
+   free(plan->runs);
+   free(plan->var_ids);
+   free(plan);
+}
+
 // Function for iterating over all fields in a given template
 ur_iter_t ur_iter_fields(const ur_template_t *tmplt, ur_iter_t id)
 {
@@ -66,6 +66,8 @@ extern "C" {
 #define UR_DEFAULT_LENGTH_OF_FIELD_NAME 128 /// Length of name (string) of a field
 #define UR_DEFAULT_LENGTH_OF_FIELD_TYPE 16 /// Length of type (string) of a field
 #define UR_INITIAL_SIZE_FIELDS_TABLE 5 ///< Initial size of free space in fields tables
+#define UR_INITIAL_SIZE_FIELD_INDEX 64 ///< Initial size of hash index of field names
+#define UR_IFC_SPEC_CACHE_SIZE 16 ///< Number of ifc_data_fmt strings remembered by ur_define_set_of_fields()
 #define UR_FIELD_ID_MAX INT16_MAX       ///< Max ID of a field
 #define UR_FIELDS(...)        ///<  Definition of UniRec fields
 //Iteration constants
@@ -154,6 +156,13 @@ typedef struct {
    ur_field_id_t ur_allocated_fields;
    ur_field_id_linked_list_t * ur_undefine_fields; ///< linked list of free (undefined) IDs
    uint8_t intialized;  ///< If the UniRec is initialized by function ur_init variable is set to UR_INITIALIZED, otherwise 0
+   /**
+    * Hash index of names of fields (open addressing with linear probing),
+    * items are IDs of fields or UR_INVALID_FIELD for empty slots.
+    * It is created by ur_init().
+    */
+   ur_field_id_t *ur_field_index;
+   uint32_t ur_field_index_size; ///< Size of ur_field_index (power of 2)
 } ur_field_specs_t;
 
 /** \brief Sorting fields structure
@@ -180,6 +189,29 @@ typedef struct {
    uint32_t ifc_out;   ///< output interface number (stored only if the direction == UR_TMPLT_DIRECTION_BI)
 } ur_template_t;
 
+/** \brief Run of bytes copied by a copy plan.
+ * It covers one or more static fields that are adjacent in both records.
+ */
+typedef struct {
+   uint16_t src_offset; ///< Offset of the run in source record
+   uint16_t dst_offset; ///< Offset of the run in destination record
+   uint16_t size;       ///< Size of the run
+} ur_copy_run_t;
+
+/** \brief Plan of copying fields between records of two templates.
+ * It is created by ur_create_copy_plan() and used by ur_copy_fields_by_plan().
+ * The plan refers to both templates, it must not be used after any of them is freed.
+ */
+typedef struct {
+   const ur_template_t *src_tmplt; ///< Source template
+   const ur_template_t *dst_tmplt; ///< Destination template
+   ur_copy_run_t *runs;    ///< Runs of static fields in order of source record
+   uint16_t run_count;     ///< Number of runs
+   ur_field_id_t *var_ids; ///< Common variable-length fields in order of destination record
+   uint16_t var_count;     ///< Number of common variable-length fields
+   uint8_t var_all;        ///< All variable-length fields of destination template are copied
+} ur_copy_plan_t;
+
 /** \brief Receive data from interface
  * Receive data with specified template from libtrap interface. If the receiving template is
  * subset of sending template, it will define new fields and expand receiving template.
@@ -509,6 +541,9 @@ int ur_define_field(const char *name, ur_field_type_t type);
  * If the field already exists and type is equal nothing will happen. If the type is not equal
  * an error will be returned.
  * Example ifc_data_fmt: "uint32 FOO,uint8 BAR,float FOO2"
+ * The last UR_IFC_SPEC_CACHE_SIZE successfully defined strings are remembered,
+ * so that repeated definitions of the same set (e.g. after every format change
+ * of an input interface) are not parsed again.
  * \param[in] ifc_data_fmt String containing types and names of fields delimited by comma.
  * \return UR_OK on success
  * UR_E_MEMORY if there is an allocation problem.
@@ -706,6 +741,7 @@ ur_template_t *ur_expand_template(const char *ifc_data_fmt, ur_template_t *tmplt
  * template (function ur_create_template_from_ifc_spec).
  * The string describing fields contain types and names of fields separated by commas.
  * Example ifc_data_fmt: "uint32 FOO,uint8 BAR,float FOO2"
+ * Repeated definitions of the same string are cheap, see ur_define_set_of_fields().
  * Order of fields is not important (templates with the same set of fields are
  * equivalent).
  * In case of success the given template will be destroyed and new template will be returned.
@@ -819,6 +855,43 @@ char *ur_get_var_as_str(const ur_template_t *tmplt, const void *rec, ur_field_id
  */
 void ur_copy_fields(const ur_template_t *dst_tmplt, void *dst, const ur_template_t *src_tmplt, const void *src);
 
+/**
+ * \brief Create plan of copying fields between records of two templates.
+ * The plan is intended for copying of many records, e.g. projection of input
+ * records to an output template.  Static fields adjacent in both records are
+ * merged into runs copied by a single memcpy(), variable-length fields are
+ * copied after them.  The plan must be freed by ur_free_copy_plan().
+ * \param[in] dst_tmplt Pointer to destination UniRec template
+ * \param[in] src_tmplt Pointer to source UniRec template
+ * \return Pointer to the plan, NULL on allocation error.
+ */
+ur_copy_plan_t *ur_create_copy_plan(const ur_template_t *dst_tmplt, const ur_template_t *src_tmplt);
+
+/**
+ * \brief Copy data from one UniRec record to another by a copy plan.
+ * The result is the same as of ur_copy_fields() with the templates of the plan.
+ * "dst" must point to a memory of enough size.
+ * \param[in] plan Pointer to the plan created by ur_create_copy_plan()
+ * \param[in] dst Pointer to destination record
+ * \param[in] src Pointer to source record
+ */
+void ur_copy_fields_by_plan(const ur_copy_plan_t *plan, void *dst, const void *src);
+
+/**
+ * \brief Get size of destination record after copying by a copy plan.
+ * \param[in] plan Pointer to the plan created by ur_create_copy_plan()
+ * \param[in] dst Pointer to destination record (with valid variable-length fields)
+ * \param[in] src Pointer to source record
+ * \return Size of destination record in bytes.
+ */
+uint32_t ur_copy_plan_dst_size(const ur_copy_plan_t *plan, const void *dst, const void *src);
+
+/**
+ * \brief Free copy plan.
+ * \param[in] plan Pointer to the plan created by ur_create_copy_plan(), it can be NULL
+ */
+void ur_free_copy_plan(ur_copy_plan_t *plan);
+
 /**
  * \brief Copy data from one UniRec to another.
  * Procedure gets template and void pointer of source and destination.